@@ -0,0 +1,121 @@
+"""Measures how backups of a live database affect checkout latency
+
+A till thread pays for orders through OrderSystem on its own connection to a
+database file while backups are taken from another connection. Checkout
+latency during each kind of backup is compared with latency without one, in
+the default rollback journal mode or in WAL mode.
+
+Usage:
+    python ./benchmarks/bench_backups.py --profile medium
+    python ./benchmarks/bench_backups.py --profile medium --wal
+"""
+import argparse
+from pathlib import Path
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from harness import build_database, percentile
+
+# pylint: disable=wrong-import-order
+from backups import Backups, BackupProgress
+from order_system import OrderSystem
+
+
+def till(
+    path: Path, item_ids: list[int], stop: threading.Event, latencies: list[float]
+):
+    """Pays for orders of a few items until stopped, timing each checkout"""
+    conn = sqlite3.connect(path, timeout=30)
+    order_system = OrderSystem(conn)
+    rng = random.Random(23)
+    while not stop.is_set():
+        started = time.perf_counter()
+        order_id = order_system.new_order(1)
+        for item_id in rng.sample(item_ids, 3):
+            order_system.add_order_item(order_id, item_id)
+        order_system.pay_for_order(order_id, 1)
+        latencies.append((time.perf_counter() - started) * 1000)
+        # A till checks out an order every few milliseconds at most
+        time.sleep(0.002)
+    conn.close()
+
+
+def during(path: Path, item_ids: list[int], backup) -> tuple[list[float], float, str]:
+    """Runs the till while a backup runs, or for a second without one"""
+    stop = threading.Event()
+    latencies: list[float] = []
+    thread = threading.Thread(target=till, args=(path, item_ids, stop, latencies))
+    thread.start()
+    time.sleep(0.2)
+    latencies.clear()
+    started = time.perf_counter()
+    note = backup() if backup is not None else time.sleep(1.0)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+    return latencies, elapsed, note or ""
+
+
+def main():
+    """Entry point for the backup benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="medium")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--wal", action="store_true")
+    parser.add_argument("--pages", type=int, default=256)
+    parser.add_argument("--sleep", type=float, default=0.005)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "store.db"
+        conn, dataset = build_database(args.profile, args.seed, str(path))
+        if args.wal:
+            conn.execute("PRAGMA journal_mode = WAL;")
+        conn.close()
+        item_ids = [item[0] for item in dataset.items]
+        backups = Backups(path, Path(directory) / "backups", keep=2)
+
+        def blocking_copy():
+            source = sqlite3.connect(path)
+            target = sqlite3.connect(Path(directory) / "copy.db")
+            source.backup(target)
+            target.close()
+            source.close()
+
+        def steps():
+            progress = BackupProgress()
+
+            def record(state: BackupProgress):
+                progress.steps, progress.restarts = state.steps, state.restarts
+
+            backups.create("steps", args.pages, args.sleep, progress=record)
+            return f"{progress.steps} steps, {progress.restarts} restarts"
+
+        variants = {
+            "no backup": None,
+            "copy in one step": blocking_copy,
+            f"steps of {args.pages} pages": steps,
+            "vacuum into": lambda: backups.create("vacuum") and None,
+        }
+        mode = "WAL" if args.wal else "rollback journal"
+        print(f"{args.profile}, {path.stat().st_size / 1024:.0f} KiB, {mode}")
+        print(
+            f"{'':<22}{'backup s':>9}{'orders':>8}"
+            + f"{'p50 ms':>8}{'p99 ms':>8}{'max ms':>8}"
+        )
+        for name, backup in variants.items():
+            latencies, elapsed, note = during(path, item_ids, backup)
+            latencies.sort()
+            print(
+                f"{name:<22}{elapsed:>9.2f}{len(latencies):>8}"
+                + f"{statistics.median(latencies):>8.2f}"
+                + f"{percentile(latencies, 0.99):>8.2f}{latencies[-1]:>8.2f}  {note}"
+            )
+
+
+if __name__ == "__main__":
+    main()
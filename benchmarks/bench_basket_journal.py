@@ -0,0 +1,177 @@
+"""Measures the cost per scan of journaling baskets against committing each scan
+
+A stream of scans is rung up into baskets of random sizes, each paid for
+once full. Before draft orders, every scan was an insert committed to a
+database file, which is timed first. The basket journal is timed with an
+fsync for every change, with changes sharing an fsync within the sync
+interval, and with an fsync only when a basket is paid for, which still
+survives the process dying. The bytes written for each byte of changes show
+the write amplification of rewriting the journal, and reading the journal
+back is timed with many open baskets. Files are written to --directory,
+which should be on the disk the tills use, since fsync costs nothing on a
+memory filesystem.
+
+Usage:
+    python ./benchmarks/bench_basket_journal.py --profile medium --scans 5000
+    python ./benchmarks/bench_basket_journal.py --directory /var/tmp
+"""
+import argparse
+import math
+import os
+from pathlib import Path
+import random
+import tempfile
+import time
+from typing import Callable
+
+from harness import Measurement, build_database, measure, print_results
+
+# pylint: disable=wrong-import-order
+from basket_journal import BasketJournal
+from order_system import Item, OrderSystem
+
+
+def basket_sizes(scans: int, largest: int, rng: random.Random) -> list[int]:
+    """Splits a stream of scans into baskets of random sizes
+
+    Args:
+        scans (int): scans in the stream
+        largest (int): most scans in a basket
+        rng (random.Random): random source
+
+    Returns:
+        list[int]: scans of each basket
+    """
+    sizes = []
+    while scans > 0:
+        sizes.append(min(scans, rng.randint(1, largest)))
+        scans -= sizes[-1]
+    return sizes
+
+
+def ring_up(
+    sizes: list[int], scan: Callable[[], None], pay: Callable[[], None]
+) -> Callable[[], None]:
+    """Creates an operation that makes the next scan, paying for full baskets"""
+    state = {"basket": 0, "scanned": 0}
+
+    def next_scan():
+        scan()
+        state["scanned"] += 1
+        if state["scanned"] == sizes[state["basket"] % len(sizes)]:
+            pay()
+            state["basket"] += 1
+            state["scanned"] = 0
+
+    return next_scan
+
+
+def ring_up_journal(
+    journal: BasketJournal, sizes: list[int], items: list[Item], rng: random.Random
+) -> Callable[[], None]:
+    """Creates an operation that journals the next scan, closing full baskets"""
+    basket = {"id": journal.open_basket(1)}
+
+    def pay_basket():
+        journal.close_basket(basket["id"], 0)
+        basket["id"] = journal.open_basket(1)
+
+    return ring_up(
+        sizes, lambda: journal.add_item(basket["id"], rng.choice(items)), pay_basket
+    )
+
+
+def main():
+    """Entry point for the basket journal benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="small")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--largest-basket", type=int, default=40)
+    parser.add_argument("--open-baskets", type=int, default=200)
+    parser.add_argument("--directory", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = basket_sizes(args.scans, args.largest_basket, rng)
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        conn, dataset = build_database(
+            args.profile, args.seed, str(Path(directory, "retail.db"))
+        )
+        items = [
+            Item(item_id, name, price, category_id, gst, pst)
+            for item_id, name, price, gst, pst, category_id in dataset.items
+        ]
+        order_system = OrderSystem(conn)
+        order = {"id": order_system.new_order(1)}
+
+        def pay_order():
+            order_system.pay_for_order(order["id"], 1)
+            order["id"] = order_system.new_order(1)
+
+        results: dict[str, Measurement] = {
+            "scan/commit_per_scan": measure(
+                ring_up(
+                    sizes,
+                    lambda: order_system.add_order_item(
+                        order["id"], rng.choice(items).item_id
+                    ),
+                    pay_order,
+                ),
+                10,
+                args.scans,
+            )
+        }
+        conn.close()
+
+        journals = {}
+        for name, sync_interval in (
+            ("fsync_each", 0.0),
+            ("fsync_batched", 0.05),
+            ("fsync_on_pay", math.inf),
+        ):
+            journal = BasketJournal(Path(directory, f"{name}.log"), sync_interval)
+            results[f"scan/journal_{name}"] = measure(
+                ring_up_journal(journal, sizes, items, rng), 10, args.scans
+            )
+            journals[name] = journal
+        print(f"{args.scans} scans in {len(sizes)} baskets")
+        print_results(results)
+
+        print()
+        print(
+            f"{'journal':<16}{'fsyncs':>8}{'rewrites':>10}{'bytes':>10}"
+            + f"{'amplified':>11}"
+        )
+        for name, journal in journals.items():
+            # Bytes written for each byte of changes appended
+            amplified = (
+                journal.bytes_written + journal.bytes_rewritten
+            ) / journal.bytes_written
+            print(
+                f"{name:<16}{journal.syncs:>8}{journal.compactions:>10}"
+                + f"{journal.path.stat().st_size:>10}{amplified:>11.2f}"
+            )
+            journal.close()
+
+        # Many baskets left open by a crash, read back when the app starts
+        path = Path(directory, "crashed.log")
+        journal = BasketJournal(path, math.inf)
+        for _ in range(args.open_baskets):
+            basket_id = journal.open_basket(1)
+            for _ in range(rng.randint(1, args.largest_basket)):
+                journal.add_item(basket_id, rng.choice(items))
+        journal.close()
+        started = time.perf_counter()
+        restored = BasketJournal(path)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(
+            f"\nRestored {len(restored.baskets)} open baskets from"
+            + f" {path.stat().st_size} bytes in {elapsed:.1f} ms"
+        )
+        restored.close()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Benchmarks the items bought together engine against SQL self-joins
+
+Order lines are generated straight into the orders and order_items tables,
+with item popularity following a Zipf distribution, so the engine can be
+built from millions of lines. Building, ranking and adding paid orders are
+timed, and rankings are checked against a self-join of order_items.
+
+Usage:
+    python ./benchmarks/bench_baskets.py --lines 10000000
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+import numpy as np
+
+from harness import Measurement, create_schema, measure, print_results
+
+# pylint: disable=wrong-import-order
+from basket_system import BasketSystem
+
+SELF_JOIN = """
+SELECT
+    other.item_id,
+    COUNT(*) AS count
+FROM
+    order_items AS line
+    INNER JOIN order_items AS other ON line.order_id = other.order_id
+    AND other.item_id != line.item_id
+WHERE
+    line.item_id = ?
+GROUP BY
+    other.item_id
+ORDER BY
+    count DESC,
+    other.item_id
+LIMIT
+    ?;
+"""
+
+
+def generate_lines(
+    num_lines: int, num_items: int, seed: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Generates order lines with Zipf distributed items
+
+    Args:
+        num_lines (int): approximate number of lines
+        num_items (int): number of distinct items
+        seed (int): seed for the random source
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: order id and item id of each line,
+            items distinct within an order
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 13, size=num_lines // 6)
+    order_ids = np.repeat(np.arange(1, len(sizes) + 1, dtype=np.int64), sizes)[:num_lines]
+    weights = 1.0 / np.arange(1, num_items + 1) ** 1.1
+    item_ids = rng.choice(num_items, size=len(order_ids), p=weights / weights.sum()) + 1
+    # Repeated items in an order become one line
+    lines = np.unique((order_ids << 32) | item_ids)
+    return lines >> 32, lines & 0xFFFFFFFF
+
+
+def populate(conn: sqlite3.Connection, order_ids: np.ndarray, item_ids: np.ndarray):
+    """Writes generated lines as paid orders
+
+    Args:
+        conn (sqlite3.Connection): connection with the app's tables
+        order_ids (np.ndarray): order of each line
+        item_ids (np.ndarray): item of each line
+    """
+    conn.executemany(
+        "INSERT INTO orders(id, user_id, payment_type, timestamp)"
+        + " VALUES (?, 1, 1, '2023-01-01 12:00:00');",
+        ((order_id,) for order_id in np.unique(order_ids).tolist()),
+    )
+    conn.executemany(
+        "INSERT INTO order_items(order_id, item_id, quantity) VALUES (?, ?, 1);",
+        zip(order_ids.tolist(), item_ids.tolist()),
+    )
+    conn.commit()
+
+
+def main():
+    """Entry point for the basket benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10_000_000)
+    parser.add_argument("--items", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=23)
+    parser.add_argument("--repetitions", type=int, default=1000)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(":memory:")
+    create_schema(conn)
+    order_ids, item_ids = generate_lines(args.lines, args.items, args.seed)
+    populate(conn, order_ids, item_ids)
+    print(f"{len(order_ids)} order lines in {order_ids[-1]} orders")
+
+    basket_system = BasketSystem(conn)
+    started = time.perf_counter()
+    basket_system.build()
+    engine = basket_system.co_occurrence
+    print(
+        f"Built in {time.perf_counter() - started:.2f} s,"
+        + f" {len(engine.keys)} item pairs,"
+        + f" {(engine.keys.nbytes + engine.counts.nbytes) / 2**20:.0f} MiB"
+    )
+
+    rng = random.Random(args.seed)
+    popular = [1, 2, 10, 100]
+    for item_id in popular:
+        expected = conn.execute(SELF_JOIN, (item_id, 5)).fetchall()
+        actual = [
+            (association.other_item_id, association.count)
+            for association in basket_system.get_bought_together(item_id, 5, "count")
+        ]
+        if actual != expected:
+            print(f"MISMATCH item {item_id}: {actual} != {expected}")
+
+    def uncached():
+        engine._top.clear()  # pylint: disable=protected-access
+        return basket_system.get_bought_together(rng.randint(1, args.items))
+
+    next_order = int(order_ids[-1]) + 1
+
+    def add_order():
+        nonlocal next_order
+        items = rng.sample(range(1, args.items + 1), 6)
+        conn.execute(
+            "INSERT INTO orders(id, user_id, payment_type) VALUES (?, 1, 1);",
+            (next_order,),
+        )
+        conn.executemany(
+            "INSERT INTO order_items(order_id, item_id, quantity) VALUES (?, ?, 1);",
+            [(next_order, item_id) for item_id in items],
+        )
+        basket_system.add_paid_order(next_order)
+        next_order += 1
+
+    results: dict[str, Measurement] = {
+        "engine/top_cached": measure(
+            lambda: basket_system.get_bought_together(1), 10, args.repetitions
+        ),
+        "engine/top_uncached": measure(uncached, 10, args.repetitions),
+        "engine/add_paid_order": measure(add_order, 10, args.repetitions),
+        "engine/top_after_orders": measure(uncached, 10, args.repetitions),
+        "sql/self_join_popular": measure(
+            lambda: conn.execute(SELF_JOIN, (1, 5)).fetchall(), 0, 3
+        ),
+    }
+    conn.execute("CREATE INDEX order_items_item ON order_items(item_id);")
+    results["sql/self_join_indexed_popular"] = measure(
+        lambda: conn.execute(SELF_JOIN, (1, 5)).fetchall(), 1, 5
+    )
+    results["sql/self_join_indexed_random"] = measure(
+        lambda: conn.execute(SELF_JOIN, (rng.randint(1, args.items), 5)).fetchall(),
+        1,
+        20,
+    )
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
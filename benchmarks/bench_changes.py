@@ -0,0 +1,100 @@
+"""Measures the change log under checkout load
+
+Checkouts open an order, add items and pay for it, recording an event for
+each step. They are timed with events published to no subscribers and to
+several, and against a change log that records nothing, to show what the
+durable change table costs. Consumers catching up from a checkpoint are then
+timed reading the events back.
+
+Usage:
+    python ./benchmarks/bench_changes.py --profile medium --file
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from harness import Measurement, build_database, measure, print_results
+
+# pylint: disable=wrong-import-order
+from change_log import ORDER_PAID, ChangeEvent, ChangeLog
+from order_system import OrderSystem
+
+
+class SilentChangeLog(ChangeLog):
+    """Change log that records nothing, the cost of checkouts without events"""
+
+    def record(self, *args, **kwargs) -> int:
+        return 0
+
+
+def main():
+    """Entry point for the change log benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="medium")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--items-per-order", type=int, default=8)
+    parser.add_argument("--subscribers", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--repetitions", type=int, default=500)
+    parser.add_argument(
+        "--file", action="store_true", help="use a database file instead of memory"
+    )
+    args = parser.parse_args()
+
+    uri = ":memory:"
+    if args.file:
+        handle, uri = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+    conn, dataset = build_database(args.profile, args.seed, uri)
+    rng = random.Random(args.seed)
+    item_ids = [item[0] for item in dataset.items]
+
+    def checkout(order_system: OrderSystem) -> list[int]:
+        order_id = order_system.new_order(1)
+        for item_id in rng.sample(item_ids, args.items_per_order):
+            order_system.add_order_item(order_id, item_id)
+        order_system.pay_for_order(order_id, 1)
+        # One event to open, one per item and one to pay
+        return [order_id] * (args.items_per_order + 2)
+
+    silent = OrderSystem(conn, changes=SilentChangeLog(conn))
+    unsubscribed = OrderSystem(conn)
+    subscribed = OrderSystem(conn)
+    received: list[ChangeEvent] = []
+    for _ in range(args.subscribers - 1):
+        subscribed.changes.subscribe(received.append)
+    paid: list[ChangeEvent] = []
+    subscribed.changes.subscribe(paid.append, (ORDER_PAID,))
+
+    first = subscribed.changes.last_sequence()
+    results: dict[str, Measurement] = {
+        "checkout/without_events": measure(
+            lambda: checkout(silent), args.warmup, args.repetitions
+        ),
+        "checkout/no_subscribers": measure(
+            lambda: checkout(unsubscribed), args.warmup, args.repetitions
+        ),
+        f"checkout/{args.subscribers}_subscribers": measure(
+            lambda: checkout(subscribed), args.warmup, args.repetitions
+        ),
+    }
+    recorded = subscribed.changes.last_sequence() - first
+    print(f"{recorded} events recorded, {len(received) + len(paid)} delivered")
+
+    # Consumers that were away catch up from their checkpoint
+    results["catch_up/all_events"] = measure(
+        lambda: subscribed.changes.get_changes(first), 1, 5
+    )
+    results["catch_up/paid_orders"] = measure(
+        lambda: subscribed.changes.get_changes(first, (ORDER_PAID,)), 1, 5
+    )
+    print_results(results)
+
+    conn.close()
+    if args.file:
+        os.remove(uri)
+
+
+if __name__ == "__main__":
+    main()
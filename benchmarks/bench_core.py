@@ -0,0 +1,162 @@
+"""Benchmarks the hot paths of the billing core without the GUI
+
+Usage:
+    python ./benchmarks/bench_core.py run --profiles small medium --output results.json
+    python ./benchmarks/bench_core.py compare before.json after.json
+"""
+import argparse
+import random
+import sqlite3
+import sys
+from typing import Any, Callable
+
+from harness import (
+    Measurement,
+    build_database,
+    busiest_day,
+    compare_results,
+    measure,
+    print_results,
+    read_results,
+    write_results,
+)
+
+# pylint: disable=wrong-import-order
+from customer_system import CustomerSystem
+from inventory_system import InventorySystem
+from order_system import OrderSystem
+from report_system import ReportSystem
+from workloads import Dataset
+
+
+def core_operations(
+    conn: sqlite3.Connection, dataset: Dataset, rng: random.Random
+) -> dict[str, Callable[[], Any]]:
+    """Creates the operations benchmarked against a populated database
+
+    Args:
+        conn (sqlite3.Connection): populated database
+        dataset (Dataset): rows the database was populated with
+        rng (random.Random): random source for choosing arguments
+
+    Returns:
+        dict[str, Callable[[], Any]]: operations keyed by name
+    """
+    order_system = OrderSystem(conn)
+    report_system = ReportSystem(conn)
+    inventory_system = InventorySystem(conn)
+    customer_system = CustomerSystem(conn)
+
+    day = busiest_day(dataset)
+    first_day = dataset.orders[0][5][:10]
+    last_day = dataset.orders[-1][5][:10]
+    order_ids = [order[0] for order in dataset.orders]
+    item_ids = [item[0] for item in dataset.items]
+    last_count_id = dataset.inventory_counts[-1][0]
+    open_order = order_system.new_order(1)
+
+    return {
+        "order.add_order_item": lambda: order_system.add_order_item(
+            open_order, rng.choice(item_ids)
+        ),
+        "order.get_order_details": lambda: order_system.get_order_details(
+            rng.choice(order_ids)
+        ).items,
+        "report.hourly_for_date": lambda: report_system.get_hourly_sales_for_date(day),
+        "report.hourly_for_range": lambda: report_system.get_hourly_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.daily_for_range": lambda: report_system.get_daily_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.cashier_for_date": lambda: report_system.get_cashier_sales_for_date(day),
+        "report.cashier_for_range": lambda: report_system.get_cashier_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.item_for_date": lambda: report_system.get_item_sales_for_date(day),
+        "report.item_for_range": lambda: report_system.get_item_sales_for_date_range(
+            first_day, last_day
+        ),
+        "inventory.get_inventory_details": inventory_system.get_inventory_details,
+        "inventory.get_inventory_snapshot": inventory_system.get_inventory_snapshot,
+        "inventory.get_latest_count": inventory_system.get_latest_count,
+        "inventory.get_count_details": lambda: inventory_system.get_count_details(
+            last_count_id
+        ),
+        "customer.search_by_name": lambda: customer_system.search_orders_by_name("an"),
+        "customer.search_by_email": lambda: customer_system.search_orders_by_email(
+            ".edu"
+        ),
+        "customer.search_by_phone": lambda: customer_system.search_orders_by_phone_number(
+            "555"
+        ),
+    }
+
+
+def run(
+    profiles: list[str], seed: str, warmup: int, repetitions: int
+) -> dict[str, Measurement]:
+    """Runs every core operation against each workload profile
+
+    Args:
+        profiles (list[str]): names of the workload profiles
+        seed (str): seed for the dataset and argument choices
+        warmup (int): untimed runs of each operation
+        repetitions (int): timed runs of each operation
+
+    Returns:
+        dict[str, Measurement]: measurements keyed by "profile/operation"
+    """
+    results = {}
+    for profile in profiles:
+        print(f"Building {profile} dataset...", file=sys.stderr)
+        conn, dataset = build_database(profile, seed)
+        rng = random.Random(seed)
+        for name, operation in core_operations(conn, dataset, rng).items():
+            print(f"  {name}", file=sys.stderr)
+            results[f"{profile}/{name}"] = measure(operation, warmup, repetitions)
+        conn.close()
+    return results
+
+
+def main():
+    """Entry point for the core benchmarks"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--profiles", nargs="+", default=["small", "medium"])
+    run_parser.add_argument("--seed", default="Team23")
+    run_parser.add_argument("--warmup", type=int, default=3)
+    run_parser.add_argument("--repetitions", type=int, default=20)
+    run_parser.add_argument("--output", default="bench_results.json")
+
+    compare_parser = subparsers.add_parser("compare", help="diff two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown of the median that counts as a regression",
+    )
+
+    args = parser.parse_args()
+    if args.command == "run":
+        results = run(args.profiles, args.seed, args.warmup, args.repetitions)
+        write_results(
+            args.output,
+            results,
+            {"profiles": args.profiles, "seed": args.seed},
+        )
+        print_results(results)
+    else:
+        regressions = compare_results(
+            read_results(args.baseline), read_results(args.candidate), args.threshold
+        )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
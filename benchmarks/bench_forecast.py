@@ -0,0 +1,122 @@
+"""Times the demand forecast and checks it against the week that followed
+
+The forecast is refreshed from scratch, one day later and with nothing new,
+and compared with a loop that reads and smooths each item's sales on its
+own. The forecast made a week before the last day is then compared with
+that week's actual sales, next to a plain average of the last 28 days, or
+of every day since the first sale if there are fewer.
+
+Usage:
+    python ./benchmarks/bench_forecast.py --profile large
+"""
+import argparse
+import datetime
+
+import numpy as np
+
+from harness import Measurement, build_database, measure, print_results
+
+# pylint: disable=wrong-import-order
+from forecast_system import HISTORY_DAYS, ForecastSystem
+
+ITEM_SALES = """
+SELECT
+    DATE(TIMESTAMP) AS day,
+    SUM(quantity)
+FROM
+    orders
+    INNER JOIN order_items ON orders.id = order_items.order_id
+WHERE
+    payment_type IS NOT NULL
+    AND item_id = ?
+    AND TIMESTAMP >= ?
+    AND TIMESTAMP < ?
+GROUP BY
+    day;
+"""
+
+
+def per_item_levels(conn, end: datetime.date, smoothing: float) -> dict[int, float]:
+    """Smooths the daily sales of each item with one query per item"""
+    start = end - datetime.timedelta(days=HISTORY_DAYS - 1)
+    levels = {}
+    for (item_id,) in conn.execute("SELECT id FROM items;").fetchall():
+        sold = dict(
+            conn.execute(
+                ITEM_SALES,
+                (item_id, str(start), str(end + datetime.timedelta(days=1))),
+            ).fetchall()
+        )
+        level = 0.0
+        for offset in range(HISTORY_DAYS):
+            day = str(start + datetime.timedelta(days=offset))
+            level += smoothing * (max(sold.get(day, 0), 0) - level)
+        levels[item_id] = level
+    return levels
+
+
+def main():
+    """Entry point for the forecast benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="large")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repetitions", type=int, default=10)
+    args = parser.parse_args()
+
+    conn, dataset = build_database(args.profile, args.seed)
+    end = datetime.date.fromisoformat(dataset.orders[-1][5][:10]) - datetime.timedelta(
+        days=1
+    )
+    week_before = end - datetime.timedelta(days=7)
+
+    # Forecast a week ago against what sold in the week since
+    forecast_system = ForecastSystem(conn)
+    forecast_system.refresh(week_before)
+    forecast = forecast_system.level * 7
+    # Averaged over the days the store was open, if fewer than 28
+    first_day = datetime.date.fromisoformat(dataset.orders[0][5][:10])
+    window = min(28, (week_before - first_day).days + 1)
+    moving_average = forecast_system.sales[-window:].clip(0).sum(axis=0) * 7 / window
+    forecast_system.refresh(end)
+    actual = forecast_system.sales[-7:].clip(0).sum(axis=0)
+    forecast = np.resize(forecast, len(actual))
+    moving_average = np.resize(moving_average, len(actual))
+    for name, predicted in (("forecast", forecast), ("28 day average", moving_average)):
+        error = np.abs(predicted - actual).sum() / max(actual.sum(), 1)
+        print(f"Next week's sales, {name}: {error:.1%} weighted absolute error")
+
+    # Steps through the last days one at a time, as the window is reopened
+    stepping = ForecastSystem(conn)
+    days = iter(
+        end - datetime.timedelta(days=offset)
+        for offset in range(args.warmup + args.repetitions, -1, -1)
+    )
+    stepping.refresh(next(days))
+
+    results: dict[str, Measurement] = {
+        "per_item/levels": measure(
+            lambda: per_item_levels(conn, end, forecast_system.smoothing), 0, 3
+        ),
+        "forecast/refresh_full": measure(
+            lambda: ForecastSystem(conn).refresh(end), args.warmup, args.repetitions
+        ),
+        "forecast/refresh_next_day": measure(
+            lambda: stepping.refresh(next(days)), args.warmup, args.repetitions
+        ),
+        "forecast/refresh_unchanged": measure(
+            lambda: forecast_system.refresh(end), args.warmup, args.repetitions
+        ),
+        "forecast/suggestions": measure(
+            lambda: forecast_system.get_reorder_suggestions(
+                dict.fromkeys(range(1, forecast_system.sales.shape[1]), 10)
+            ),
+            args.warmup,
+            args.repetitions,
+        ),
+    }
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measures reading the inventory screen's data in one query against three
+
+The screen used to read the inventory report, list every count to find the
+latest one and read that count's details, each pass rescanning the sales.
+The single snapshot query is timed against those three calls on each
+workload profile, after checking both give the same quantities, along with
+finding the latest count by listing every count against the accessor.
+
+Usage:
+    python ./benchmarks/bench_inventory_snapshot.py --profiles small medium large
+"""
+import argparse
+import functools
+
+from harness import Measurement, build_database, measure, print_results
+
+# pylint: disable=wrong-import-order
+from inventory_system import InventorySystem
+
+
+def read_separately(inventory_system: InventorySystem) -> list[tuple]:
+    """Reads the screen's data with the three calls it used to make"""
+    report = inventory_system.get_inventory_details()
+    counts = inventory_system.list_inventory_counts()
+    previous = {
+        count.item_id: count.previous_quantity
+        for count in inventory_system.get_count_details(counts[-1].count_id)
+    }
+    return [
+        (
+            item.item_id,
+            item.day_quantity,
+            item.month_quantity,
+            item.count_quantity,
+            previous.get(item.item_id, 0),
+            item.adjustment_quantity,
+            item.quantity_sold,
+        )
+        for item in report
+    ]
+
+
+def read_snapshot(inventory_system: InventorySystem) -> list[tuple]:
+    """Reads the screen's data with the snapshot query"""
+    return [
+        (
+            item.item_id,
+            item.day_quantity,
+            item.month_quantity,
+            item.count_quantity,
+            item.previous_quantity,
+            item.adjustment_quantity,
+            item.quantity_sold,
+        )
+        for item in inventory_system.get_inventory_snapshot()
+    ]
+
+
+def main():
+    """Entry point for the inventory snapshot benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["small", "medium"])
+    parser.add_argument("--seed", default="Team23")
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        conn, dataset = build_database(profile, args.seed)
+        inventory_system = InventorySystem(conn)
+        if read_separately(inventory_system) != read_snapshot(inventory_system):
+            raise AssertionError(f"Snapshot differs from the report on {profile}")
+        # Each timed call is bound to this profile's inventory system
+        results: dict[str, Measurement] = {
+            "screen/three_queries": measure(
+                functools.partial(read_separately, inventory_system), 2, 20
+            ),
+            "screen/snapshot": measure(
+                functools.partial(read_snapshot, inventory_system), 2, 20
+            ),
+            "latest_count/list_all": measure(
+                lambda system=inventory_system: system.list_inventory_counts()[-1:],
+                2,
+                50,
+            ),
+            "latest_count/accessor": measure(
+                lambda system=inventory_system: [system.get_latest_count()], 2, 50
+            ),
+        }
+        print(
+            f"\n{profile}: {len(dataset.orders)} orders,"
+            + f" {len(dataset.inventory_counts)} counts"
+        )
+        print_results(results)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
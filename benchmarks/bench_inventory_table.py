@@ -0,0 +1,129 @@
+"""Measures sorting, filtering and refreshing the inventory screen's rows
+
+Rows for generated catalogs are sorted the way the screen used to, by
+reading each cell's text back and parsing it as a number, and through the
+table model's typed values, alone and with a category and name filter.
+Reloading is timed with nothing changed and with a few items sold. The
+Treeview calls each sort and refresh need are counted instead of timed,
+since timing them needs a display.
+
+Usage:
+    python ./benchmarks/bench_inventory_table.py --catalogs 1000 10000 100000
+"""
+import argparse
+import random
+
+from harness import Measurement, measure, print_results
+
+# pylint: disable=wrong-import-order
+from forecast_system import ReorderSuggestion
+from inventory_system import InventorySnapshotRecord
+from inventory_table import InventoryTable
+
+
+def generate_rows(num_items: int, num_categories: int, rng: random.Random):
+    """Generates an inventory snapshot and suggestions"""
+    snapshot, suggestions = [], {}
+    for item_id in range(1, num_items + 1):
+        category_id = rng.randint(1, num_categories)
+        counted = rng.randint(0, 300)
+        snapshot.append(
+            InventorySnapshotRecord(
+                category_id,
+                f"Department {category_id}",
+                item_id,
+                f"Item {item_id}",
+                "2023-12-05",
+                rng.randint(0, 10),
+                rng.randint(0, 100),
+                counted,
+                counted + rng.randint(-3, 3),
+                rng.randint(-5, 5),
+                rng.randint(0, 200),
+            )
+        )
+        demand = rng.random() * 10
+        suggestions[item_id] = ReorderSuggestion(
+            item_id,
+            demand * 7,
+            demand,
+            counted / demand if demand > 0.5 else None,
+            rng.randint(0, 50),
+            rng.randint(0, 100),
+        )
+    return snapshot, suggestions
+
+
+def sort_text(cells: list[tuple[str, str]], descending: bool) -> list[str]:
+    """Sorts (text, row) pairs like the screen did, parsing each cell's text"""
+
+    def sort_key(value: str) -> float:
+        try:
+            return float(value)
+        except ValueError:
+            return float("inf")
+
+    cells.sort(key=lambda cell: (sort_key(cell[0]), cell[0]), reverse=descending)
+    return [row for _, row in cells]
+
+
+def compare_catalog(num_items: int, args: argparse.Namespace):
+    """Times sorting, filtering and refreshing a catalog of num_items items"""
+    rng = random.Random(args.seed)
+    snapshot, suggestions = generate_rows(num_items, args.categories, rng)
+    table = InventoryTable()
+    table.load(snapshot, suggestions)
+    # The text of each cell of the column, as the Treeview held it
+    cells = [(row.values()[8], str(row.item_id)) for row in table.rows.values()]
+
+    def sort_model() -> list[int]:
+        table.sort_by("Days of Cover")
+        return table.view()
+
+    def filter_model() -> list[int]:
+        table.set_filter(rng.randint(1, args.categories), "1")
+        view = table.view()
+        table.set_filter()
+        return view
+
+    def sell_items():
+        for item in rng.sample(snapshot, args.sold):
+            item.day_quantity += 1
+            item.quantity_sold += 1
+        return table.load(snapshot, suggestions)[0]
+
+    results: dict[str, Measurement] = {
+        "sort/cell_text": measure(lambda: sort_text(list(cells), True), 2, 10),
+        "sort/model": measure(sort_model, 2, 10),
+        "sort/two_columns": measure(
+            lambda: (table.sort_by("Sold Today"), table.view())[1], 2, 10
+        ),
+        "filter/category_and_name": measure(filter_model, 2, 10),
+        "load/unchanged": measure(lambda: table.load(snapshot, suggestions)[0], 2, 10),
+        f"load/{args.sold}_sold": measure(sell_items, 2, 10),
+    }
+    print(f"\n{num_items} items")
+    print_results(results)
+    # Sorting used to read and move every row, refreshing to delete and
+    # insert every row
+    print(
+        f"Treeview calls: sort {2 * num_items} before, 1 now;"
+        + f" refresh {2 * num_items} before, {len(sell_items()) + 1} now"
+    )
+
+
+def main():
+    """Entry point for the inventory table benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalogs", type=int, nargs="+", default=[1000, 10_000])
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--sold", type=int, default=20)
+    args = parser.parse_args()
+
+    for num_items in args.catalogs:
+        compare_catalog(num_items, args)
+
+
+if __name__ == "__main__":
+    main()
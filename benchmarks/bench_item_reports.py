@@ -0,0 +1,77 @@
+"""Compares item sales reports priced by joining items against stored line prices
+
+"join" is the previous query, which prices every order line with the item's
+current price. "stored" is the current report, which sums the price recorded
+on each line and only looks up names for the aggregated rows.
+
+Usage:
+    python ./benchmarks/bench_item_reports.py --profile medium
+"""
+import argparse
+import datetime
+
+from harness import Measurement, build_database, busiest_day, measure, print_results
+
+# pylint: disable=wrong-import-order
+from records import iter_records
+from report_system import ItemSales, ReportSystem
+
+JOIN_QUERY = """
+SELECT
+    item_id,
+    name AS item_name,
+    category_id,
+    category AS category_name,
+    SUM(quantity) AS quantity,
+    SUM(quantity) * items.price AS subtotal,
+    SUM(quantity) * items.price * items.gst * 0.05 AS gst_total,
+    SUM(quantity) * items.price * items.pst * 0.06 AS pst_total
+FROM
+    orders
+    LEFT JOIN order_items ON orders.id = order_items.order_id
+    LEFT JOIN items ON order_items.item_id = items.id
+    LEFT JOIN categories ON items.category_id = categories.id
+WHERE
+    DATE(TIMESTAMP) BETWEEN ? AND ?
+GROUP BY
+    order_items.item_id;
+"""
+
+
+def main():
+    """Entry point for the item report benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="medium")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--repetitions", type=int, default=20)
+    args = parser.parse_args()
+
+    conn, dataset = build_database(args.profile, args.seed)
+    report_system = ReportSystem(conn)
+    day = busiest_day(dataset)
+    first_day = datetime.date.fromisoformat(dataset.orders[0][5][:10])
+    last_day = datetime.date.fromisoformat(dataset.orders[-1][5][:10])
+    ranges = {"day": (day, day), "range": (first_day, last_day)}
+
+    results: dict[str, Measurement] = {}
+    for name, (start, end) in ranges.items():
+        results[f"{args.profile}/join/{name}"] = measure(
+            lambda start=start, end=end: list(
+                iter_records(conn.execute(JOIN_QUERY, (start, end)), ItemSales.from_row)
+            ),
+            args.warmup,
+            args.repetitions,
+        )
+        results[f"{args.profile}/stored/{name}"] = measure(
+            lambda start=start, end=end: report_system.get_item_sales_for_date_range(
+                start, end
+            ),
+            args.warmup,
+            args.repetitions,
+        )
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Measures opening the order screen and searching large catalogs
+
+Catalogs of generated item names are loaded into a fresh database. Opening
+the order screen is timed reading every category's items like it did before,
+against reading only the category names and the first tab's items. Building
+the search index is timed once per catalog, then searches for one to three
+letters, whole words, several words, text inside words and codes.
+
+Creating the buttons themselves needs a display, so when one is available
+the buttons of every tab are timed against those of the first tab.
+
+Usage:
+    python ./benchmarks/bench_item_search.py --catalogs 10000 100000
+"""
+import argparse
+import functools
+import random
+import sqlite3
+import time
+from tkinter import Button, Frame, TclError, Tk
+
+from harness import Measurement, create_schema, measure, print_results
+
+# pylint: disable=wrong-import-order
+from item_codes import store_code
+from item_search import ItemSearch
+from order_system import Item
+
+ADJECTIVES = (
+    "organic fresh frozen classic original light spicy sweet salted smoked "
+    + "roasted whole lean crunchy creamy dark mild extra large mini"
+).split()
+PRODUCTS = (
+    "milk cheese yogurt butter bread bagel muffin cookie cracker chips salsa "
+    + "coffee tea cola juice water soda apple banana orange grape berry tomato "
+    + "potato onion carrot lettuce pepper chicken beef pork salmon tuna shrimp "
+    + "rice pasta noodle sauce soup cereal oats granola honey jam peanut almond "
+    + "soap shampoo towel tissue detergent battery candle"
+).split()
+SIZES = "100g 250g 500g 1kg 2kg 355ml 500ml 1l 2l 4l 6pk 12pk 24pk".split()
+SYLLABLES = "ka ro mi su ve la do ne ti br gr pl st an or el".split()
+
+
+def generate_catalog(
+    num_items: int, num_categories: int, seed: str
+) -> tuple[list[tuple], list[tuple]]:
+    """Generates categories and items with brand, product and size names
+
+    Args:
+        num_items (int): items in the catalog
+        num_categories (int): categories the items are spread over
+        seed (str): seed for the random source
+
+    Returns:
+        tuple[list[tuple], list[tuple]]: category rows and item rows
+    """
+    rng = random.Random(seed)
+    brands = sorted(
+        {
+            "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+            for _ in range(num_items // 50 + 20)
+        }
+    )
+    categories = [(i, f"Department {i}") for i in range(1, num_categories + 1)]
+    items = []
+    for item_id in range(1, num_items + 1):
+        name = " ".join(
+            (
+                rng.choice(brands),
+                rng.choice(ADJECTIVES),
+                rng.choice(PRODUCTS),
+                rng.choice(SIZES),
+            )
+        ).title()
+        items.append(
+            (
+                item_id,
+                name,
+                round(rng.uniform(0.5, 40), 2),
+                1,
+                rng.random() < 0.5,
+                rng.randint(1, num_categories),
+                store_code(item_id),
+            )
+        )
+    return categories, items
+
+
+def read_all_categories(conn: sqlite3.Connection) -> dict[str, list[Item]]:
+    """Reads every category's items, as the order screen did when opened"""
+    categories: dict[str, list[Item]] = {}
+    for category_id, category in conn.execute("SELECT id, category FROM categories;"):
+        cur = conn.execute(
+            "SELECT id, name, price, gst, pst, category_id FROM items"
+            + " WHERE category_id = ?;",
+            (category_id,),
+        )
+        categories[category] = list(map(Item.from_row, cur.fetchall()))
+    return categories
+
+
+def read_first_tab(conn: sqlite3.Connection) -> list[Item]:
+    """Reads the category names and the items of the first one only"""
+    categories = conn.execute("SELECT id, category FROM categories;").fetchall()
+    cur = conn.execute(
+        "SELECT id, name, price, gst, pst, category_id FROM items"
+        + " WHERE category_id = ?;",
+        (categories[0][0],),
+    )
+    return list(map(Item.from_row, cur.fetchall()))
+
+
+def time_buttons(root: Tk, tabs: list[list[Item]]) -> float:
+    """Creates a button per item like a category tab, returning seconds taken"""
+    started = time.perf_counter()
+    frame = Frame(root)
+    for tab_items in tabs:
+        tab = Frame(frame)
+        for i, item in enumerate(tab_items):
+            Button(tab, text=item.name).grid(row=i // 6, column=i % 6)
+    root.update_idletasks()
+    elapsed = time.perf_counter() - started
+    frame.destroy()
+    return elapsed
+
+
+def main():
+    """Entry point for the item search benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalogs", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--seed", default="Team23")
+    args = parser.parse_args()
+
+    try:
+        root = Tk()
+        root.withdraw()
+    except TclError:
+        root = None
+        print("No display, skipping the buttons")
+
+    for num_items in args.catalogs:
+        categories, items = generate_catalog(num_items, args.categories, args.seed)
+        conn = sqlite3.connect(":memory:")
+        create_schema(conn)
+        conn.executemany(
+            "INSERT INTO categories(id, category) VALUES (?, ?);", categories
+        )
+        conn.executemany(
+            "INSERT INTO items(id, name, price, gst, pst, category_id, barcode)"
+            + " VALUES (?, ?, ?, ?, ?, ?, ?);",
+            items,
+        )
+        conn.commit()
+
+        item_search = ItemSearch(conn)
+        started = time.perf_counter()
+        item_search.load()
+        print(
+            f"\n{num_items} items, search index built in"
+            + f" {time.perf_counter() - started:.2f} s"
+        )
+        rng = random.Random(args.seed)
+        # Rows are (id, name, price, gst, pst, category_id, barcode)
+        names = [name for _, name, *_ in rng.sample(items, 200)]
+        codes = [code for *_, code in rng.sample(items, 200)]
+        queries = {
+            "one_letter": [name[:1] for name in names],
+            "three_letters": [name[:3] for name in names],
+            "whole_word": [name.split()[2] for name in names],
+            "two_words": [" ".join(name.split()[1:3]) for name in names],
+            "inside_word": [name.split()[2][1:5] for name in names],
+            "code_prefix": [code[:9] for code in codes],
+            "no_match": ["zzq" for _ in names],
+        }
+        results: dict[str, Measurement] = {
+            "open/all_tabs": measure(
+                functools.partial(read_all_categories, conn), 1, 5
+            ),
+            "open/first_tab": measure(functools.partial(read_first_tab, conn), 3, 20),
+        }
+        for name, texts in queries.items():
+            # Each repetition runs 200 searches, shown per search
+            result = measure(
+                lambda texts=texts, search=item_search.search: [
+                    search(text) for text in texts
+                ],
+                3,
+                20,
+            )
+            result.p50_ms /= len(texts)
+            result.p99_ms /= len(texts)
+            results[f"search/{name}"] = result
+        print_results(results)
+
+        if root is not None:
+            everything = time_buttons(root, list(read_all_categories(conn).values()))
+            first = time_buttons(root, [read_first_tab(conn)])
+            print(f"buttons: all tabs {everything:.2f} s, first tab {first:.2f} s")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
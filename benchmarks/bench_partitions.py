@@ -0,0 +1,201 @@
+"""Checks and times the app's queries before and after archiving closed months
+
+A generated workload is written to a database file, every report, inventory
+report, customer search and order lookup is read, then every month but the
+last is archived into partitions. The same calls must give the same results
+afterwards, and both runs are timed.
+
+Usage:
+    python ./benchmarks/bench_partitions.py --profile medium
+"""
+import argparse
+import datetime
+import math
+from pathlib import Path
+import random
+import sqlite3
+import tempfile
+from typing import Any, Callable
+
+from harness import Measurement, build_database, busiest_day, measure, print_results
+
+# pylint: disable=wrong-import-order
+from customer_system import CustomerSystem
+from inventory_system import InventorySystem
+from order_system import OrderSystem
+from partitions import Partitions, month_start
+from report_system import ReportSystem
+from workloads import Dataset
+
+
+def operations(
+    conn: sqlite3.Connection, partitions: Partitions, dataset: Dataset
+) -> dict[str, Callable[[], Any]]:
+    """Creates the operations compared across archiving
+
+    Args:
+        conn (sqlite3.Connection): populated database
+        partitions (Partitions): partitions of the database
+        dataset (Dataset): rows the database was populated with
+
+    Returns:
+        dict[str, Callable[[], Any]]: operations keyed by name
+    """
+    order_system = OrderSystem(conn, partitions)
+    report_system = ReportSystem(conn, partitions)
+    inventory_system = InventorySystem(conn, partitions)
+    customer_system = CustomerSystem(conn, partitions)
+
+    day = busiest_day(dataset)
+    first_day = datetime.date.fromisoformat(dataset.orders[0][5][:10])
+    last_day = datetime.date.fromisoformat(dataset.orders[-1][5][:10])
+    order_ids = random.Random(1).sample([order[0] for order in dataset.orders], 20)
+    count_ids = [count[0] for count in dataset.inventory_counts]
+
+    return {
+        "order.get_order_details": lambda: [
+            order_system.get_order_details(order_id) for order_id in order_ids
+        ],
+        "order.get_order_details_for_return": lambda: [
+            order_system.get_order_details_for_return(order_id) for order_id in order_ids
+        ],
+        "report.hourly_for_date": lambda: report_system.get_hourly_sales_for_date(day),
+        "report.hourly_for_range": lambda: report_system.get_hourly_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.daily_for_range": lambda: report_system.get_daily_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.cashier_for_range": lambda: report_system.get_cashier_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.item_for_date": lambda: report_system.get_item_sales_for_date(day),
+        "report.item_for_range": lambda: report_system.get_item_sales_for_date_range(
+            first_day, last_day
+        ),
+        "inventory.get_inventory_details": inventory_system.get_inventory_details,
+        "inventory.get_inventory_snapshot": inventory_system.get_inventory_snapshot,
+        "inventory.get_count_details": lambda: [
+            inventory_system.get_count_details(count_id) for count_id in count_ids
+        ],
+        "customer.search_by_name": lambda: customer_system.search_orders_by_name("an"),
+        "customer.get_customer_order_by_id": lambda: [
+            customer_system.get_customer_order_by_id(order_id) for order_id in order_ids
+        ],
+    }
+
+
+def checkout(order_system: OrderSystem, item_ids: list[int], rng: random.Random) -> int:
+    """Rings up and pays for an order of three items
+
+    Args:
+        order_system (OrderSystem): order system to check out with
+        item_ids (list[int]): items to choose from
+        rng (random.Random): random source for choosing items
+
+    Returns:
+        int: id of the paid order
+    """
+    order_id = order_system.new_order(1)
+    for item_id in rng.sample(item_ids, 3):
+        order_system.add_order_item(order_id, item_id)
+    order_system.pay_for_order(order_id, 1)
+    return order_id
+
+
+def normalize(value: Any) -> Any:
+    """Converts a result into a form that compares regardless of row order
+
+    Args:
+        value (Any): result of an operation
+
+    Returns:
+        Any: comparable result
+    """
+    if isinstance(value, list):
+        return sorted((normalize(item) for item in value), key=repr)
+    if isinstance(value, float):
+        return round(value, 6)
+    if hasattr(value, "__slots__"):
+        return tuple(normalize(getattr(value, name)) for name in value.__slots__)
+    return value
+
+
+def matches(before: Any, after: Any) -> bool:
+    """Compares two normalized results, allowing for float rounding
+
+    Args:
+        before (Any): result before archiving
+        after (Any): result after archiving
+
+    Returns:
+        bool: whether the results are the same
+    """
+    if isinstance(before, (list, tuple)) and isinstance(after, (list, tuple)):
+        return len(before) == len(after) and all(map(matches, before, after))
+    if isinstance(before, float) and isinstance(after, float):
+        return math.isclose(before, after, rel_tol=1e-9, abs_tol=1e-6)
+    return before == after
+
+
+def main():
+    """Entry point for the partition benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="medium")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn, dataset = build_database(
+            args.profile, args.seed, str(Path(directory) / "retail.db")
+        )
+        partitions = Partitions(conn, str(Path(directory) / "archive"))
+        calls = operations(conn, partitions, dataset)
+
+        results: dict[str, Measurement] = {}
+        expected = {}
+        for name, operation in calls.items():
+            expected[name] = normalize(operation())
+            results[f"main/{name}"] = measure(operation, args.warmup, args.repetitions)
+        # Checkouts run after the reads so they do not change the expected results
+        order_system = OrderSystem(conn, partitions)
+        item_ids = [item[0] for item in dataset.items]
+        rng = random.Random(args.seed)
+        results["main/order.checkout"] = measure(
+            lambda: checkout(order_system, item_ids, rng), args.warmup, args.repetitions
+        )
+
+        conn.execute(
+            "DELETE FROM order_items WHERE order_id IN"
+            + " (SELECT id FROM orders WHERE id > ?);",
+            (dataset.orders[-1][0],),
+        )
+        conn.execute("DELETE FROM orders WHERE id > ?;", (dataset.orders[-1][0],))
+        conn.commit()
+
+        last_month = month_start(dataset.orders[-1][5][:7])
+        archived = partitions.archive_closed_months(0, last_month)
+        remaining = conn.execute("SELECT COUNT(*) FROM orders;").fetchone()[0]
+        print(
+            f"Archived {sum(partition.num_orders for partition in archived)} orders"
+            + f" into {len(archived)} partitions, {remaining} left in main"
+        )
+
+        for name, operation in calls.items():
+            if not matches(expected[name], normalize(operation())):
+                print(f"MISMATCH {name}")
+            results[f"partitioned/{name}"] = measure(
+                operation, args.warmup, args.repetitions
+            )
+        results["partitioned/order.checkout"] = measure(
+            lambda: checkout(order_system, item_ids, rng), args.warmup, args.repetitions
+        )
+        partitions.detach_all()
+        conn.close()
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
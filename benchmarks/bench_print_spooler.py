@@ -0,0 +1,108 @@
+"""Measures printing bills through the spooler against printing in the handler
+
+Bills of a workload profile are printed to a fake printer that takes a
+fixed time for each job, like a printer driver or an lp run, or to a
+printer setting given with --printer. The time a button handler is blocked
+is timed for writing each bill to the printer itself, as the finalize
+window used to, against submitting it to the spooler. Bursts of bills, as
+when reprinting several receipts, are timed until the last one is printed,
+with the spooler writing them as fewer jobs after waiting its coalescing
+window for more. The bills are then printed through a printer that fails
+its first writes, and every bill must come out once and in order, or an
+AssertionError is raised.
+
+Usage:
+    python ./benchmarks/bench_print_spooler.py --profile small
+    python ./benchmarks/bench_print_spooler.py --printer command:cat --burst 50
+"""
+import argparse
+import itertools
+from typing import Callable
+
+from harness import Measurement, build_database, measure, print_results
+
+# pylint: disable=wrong-import-order
+from order_system import OrderSystem
+from print_spooler import FakePrinter, PrintSpooler, Sink, open_sink
+
+
+def render_bills(profile: str, seed: str, count: int) -> list[str]:
+    """Renders the bills of the first paid orders of a workload profile"""
+    conn, dataset = build_database(profile, seed)
+    order_system = OrderSystem(conn)
+    order_ids = [row[0] for row in dataset.orders if row[3] is not None]
+    bills = [
+        order_system.get_order_details(order_id).to_string()
+        for order_id in order_ids[:count]
+    ]
+    conn.close()
+    return bills
+
+
+def burst(bills: list[str], size: int, send: Callable[[str], None]) -> Callable:
+    """Creates an operation that sends the next size bills each time"""
+    next_bill = itertools.cycle(bills).__next__
+    return lambda: [send(next_bill()) for _ in range(size)]
+
+
+def main():
+    """Entry point for the print spooler benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="small")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--printer", default=None, help="printer setting to use")
+    parser.add_argument("--printer-delay", type=float, default=30.0, help="ms a job")
+    parser.add_argument("--bills", type=int, default=200)
+    parser.add_argument("--burst", type=int, default=20)
+    args = parser.parse_args()
+
+    bills = render_bills(args.profile, args.seed, args.bills)
+
+    def printer() -> Sink:
+        if args.printer is None:
+            return FakePrinter(delay=args.printer_delay / 1000)
+        return open_sink(args.printer)
+
+    direct = printer()
+    spooler = PrintSpooler(printer())
+    results: dict[str, Measurement] = {
+        "handler/direct": measure(burst(bills, 1, direct.write), 2, 20),
+        "handler/spooled": measure(burst(bills, 1, spooler.submit), 2, 20),
+    }
+    spooler.wait()
+    writes = spooler.writes
+    results[f"burst_{args.burst}/direct"] = measure(
+        burst(bills, args.burst, direct.write), 0, 5
+    )
+
+    def spool_burst() -> list[int]:
+        job_ids = burst(bills, args.burst, spooler.submit)()
+        spooler.wait()
+        return job_ids
+
+    results[f"burst_{args.burst}/spooled"] = measure(spool_burst, 0, 5)
+    burst_writes = (spooler.writes - writes) / 5
+    spooler.stop()
+    print(f"{args.profile}: {len(bills)} bills to {spooler.sink.name}")
+    print_results(results)
+    print()
+
+    # Every bill is printed once and in order, through failed writes
+    fake = FakePrinter(fail_writes=3)
+    spooler = PrintSpooler(fake, retry_delay=0.01)
+    for bill in bills:
+        spooler.submit(bill)
+    spooler.wait()
+    spooler.stop()
+    if fake.printed() != bills or len(spooler.take_failed()) > 0:
+        raise AssertionError("The printer did not print every bill once, in order")
+
+    print(
+        f"{args.burst} bills printed in {burst_writes:.1f} jobs by the spooler,"
+        + f" {len(fake.writes)} jobs for {len(bills)} bills after"
+        + f" {fake.attempts - len(fake.writes)} failed writes"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Measures keeping receipts in the journal against one file per bill
+
+Every paid order of a workload profile is rendered as its bill, then written
+the way the finalize window used to, as a file per bill under bills/, and
+appended to a receipt journal, which starts a compressed segment every
+month. Reprinting a bill is timed by finding its file by order number in
+the directory against reading its slot, and a week of receipts is read from
+the files named for those days against a range scan of the journal. The
+files and bytes each leaves on disk are printed after.
+
+Usage:
+    python ./benchmarks/bench_receipt_journal.py --profile medium
+    python ./benchmarks/bench_receipt_journal.py --profile small --directory /var/tmp
+"""
+import argparse
+import datetime
+import itertools
+from pathlib import Path
+import random
+import tempfile
+from typing import Callable
+
+from harness import Measurement, build_database, measure, print_results
+
+# pylint: disable=wrong-import-order
+from order_system import OrderSystem
+from receipt_journal import BILL_PATTERN, ReceiptJournal
+
+
+def render_bills(order_system: OrderSystem, order_ids: list[int]) -> list[tuple]:
+    """Renders the bill of each order with its order id and time"""
+    bills = []
+    for order_id in order_ids:
+        order = order_system.get_order_details(order_id)
+        bills.append((order_id, order.timestamp, order.to_string()))
+    return bills
+
+
+def each(bills: list[tuple], write: Callable[[tuple], None]) -> Callable[[], None]:
+    """Creates an operation that writes the next bill each time it is called"""
+    remaining = iter(bills)
+    return lambda: write(next(remaining))
+
+
+def disk_usage(paths: list[Path]) -> tuple[int, int]:
+    """Counts files and the bytes they take on disk"""
+    return len(paths), sum(path.stat().st_blocks * 512 for path in paths)
+
+
+def main():
+    """Entry point for the receipt journal benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="small")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--reprints", type=int, default=100)
+    parser.add_argument("--directory", default=None)
+    args = parser.parse_args()
+
+    conn, dataset = build_database(args.profile, args.seed)
+    order_ids = [row[0] for row in dataset.orders if row[3] is not None]
+    bills = render_bills(OrderSystem(conn), order_ids)
+    conn.close()
+    rng = random.Random(args.seed)
+    reprinted = rng.sample(order_ids, min(args.reprints, len(order_ids)))
+    first_day = datetime.date.fromisoformat(bills[len(bills) // 2][1][:10])
+    week = [first_day + datetime.timedelta(days=day) for day in range(7)]
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        bill_directory = Path(directory, "bills")
+        bill_directory.mkdir()
+
+        def write_file(bill: tuple):
+            order_id, timestamp, text = bill
+            # Named like the finalize window named them
+            stamp = timestamp.replace(" ", "-").replace(":", "-")
+            path = bill_directory / f"bill-{stamp}-{order_id}.txt"
+            path.write_text(text, encoding="utf-8")
+
+        journal = ReceiptJournal(Path(directory, "receipts"))
+
+        def append(bill: tuple):
+            order_id, timestamp, text = bill
+            # Flushed at the end, as bill files were never flushed
+            journal.append(
+                order_id, text, datetime.date.fromisoformat(timestamp[:10]), sync=False
+            )
+
+        results: dict[str, Measurement] = {
+            "write/bill_files": measure(each(bills, write_file), 0, len(bills)),
+            "write/journal": measure(each(bills, append), 0, len(bills)),
+        }
+        next_reprint = itertools.cycle(reprinted).__next__
+
+        def find_file() -> str:
+            order_id = next_reprint()
+            path = next(bill_directory.glob(f"bill-*-{order_id}.txt"))
+            return path.read_text(encoding="utf-8")
+
+        def read_week_files() -> list[str]:
+            days = {str(day) for day in week}
+            return [
+                path.read_text(encoding="utf-8")
+                for path in sorted(bill_directory.iterdir())
+                if (match := BILL_PATTERN.search(path.name)) is not None
+                and match.group(1) in days
+            ]
+
+        results["reprint/find_file"] = measure(find_file, 2, min(20, len(reprinted)))
+        results["reprint/journal"] = measure(
+            lambda: [journal.get_receipt(next_reprint())], 2, len(reprinted)
+        )
+        results["week/bill_files"] = measure(read_week_files, 1, 5)
+        results["week/journal"] = measure(
+            lambda: journal.get_receipts(week[0], week[-1]), 1, 5
+        )
+        if [bill.text for bill in journal.get_receipts(week[0], week[-1])] != (
+            read_week_files()
+        ):
+            raise AssertionError("The journal and bill files hold different bills")
+        journal.close()
+
+        print(f"{args.profile}: {len(bills)} bills")
+        print_results(results)
+        print()
+        for name, paths in (
+            ("bill files", list(bill_directory.iterdir())),
+            ("journal", list(Path(directory, "receipts").iterdir())),
+        ):
+            count, size = disk_usage(paths)
+            print(f"{name:<12}{count:>8} files{size / 1024:>12.0f} KiB on disk")
+
+
+if __name__ == "__main__":
+    main()
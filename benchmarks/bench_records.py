@@ -0,0 +1,132 @@
+"""Compares memory use of reading large query results as lists and iterators
+
+"before" rebuilds the previous approach: fetchall() into tuples, then a list of
+non-slotted dataclasses. "list" is the current get_ method and "iter" consumes
+the matching iter_ method without keeping the records.
+
+Usage:
+    python ./benchmarks/bench_records.py --profile medium
+"""
+import argparse
+import dataclasses
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from harness import build_database
+
+# pylint: disable=wrong-import-order
+from customer_system import CustomerOrder, CustomerSystem
+from orderSystem import OrderSummary, OrderSystem
+
+SUMMARY_QUERY = (
+    "SELECT id, customer_id, user_id, timestamp, num_items, subtotal, gst_total,"
+    + " pst_total FROM order_summary;"
+)
+CUSTOMER_ORDER_QUERY = (
+    "SELECT order_id, customer_name, phone_number, email, payment_type, cashier,"
+    + " timestamp, subtotal, gst_total, pst_total FROM customer_orders;"
+)
+
+
+def unslotted(record_type: type) -> type:
+    """Creates a plain dataclass with the same fields as a record type
+
+    Args:
+        record_type (type): slotted dataclass
+
+    Returns:
+        type: dataclass storing its fields in an instance dictionary
+    """
+    return dataclasses.make_dataclass(
+        record_type.__name__,
+        [(field.name, field.type) for field in dataclasses.fields(record_type)],
+    )
+
+
+def profile_memory(operation: Callable[[], Any]) -> tuple[float, float]:
+    """Measures the time and peak memory allocated by an operation
+
+    Args:
+        operation (Callable[[], Any]): operation to measure
+
+    Returns:
+        tuple[float, float]: time in ms and peak allocation in KiB
+    """
+    start = time.perf_counter()
+    operation()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak / 1024
+
+
+def consume(records: Any, column: str) -> float:
+    """Aggregates records one at a time without keeping them
+
+    Args:
+        records (Any): iterable of records
+        column (str): numeric attribute to sum
+
+    Returns:
+        float: sum of the attribute
+    """
+    total = 0.0
+    for record in records:
+        total += getattr(record, column) or 0.0
+    return total
+
+
+def main():
+    """Entry point for the record memory benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="medium")
+    parser.add_argument("--seed", default="Team23")
+    args = parser.parse_args()
+
+    conn, _ = build_database(args.profile, args.seed)
+    order_system = OrderSystem(conn)
+    customer_system = CustomerSystem(conn)
+    old_summary = unslotted(OrderSummary)
+    old_customer_order = unslotted(CustomerOrder)
+
+    scans: dict[str, dict[str, Callable[[], Any]]] = {
+        "order summaries": {
+            "before": lambda: list(
+                map(
+                    lambda row: old_summary(*row),
+                    conn.execute(SUMMARY_QUERY).fetchall(),
+                )
+            ),
+            "list": order_system.get_all_order_summaries,
+            "iter": lambda: consume(order_system.iter_all_order_summaries(), "subtotal"),
+        },
+        "customer orders": {
+            "before": lambda: list(
+                map(
+                    lambda row: old_customer_order(*row),
+                    conn.execute(CUSTOMER_ORDER_QUERY).fetchall(),
+                )
+            ),
+            "list": lambda: customer_system.search_orders_by_name(""),
+            "iter": lambda: consume(customer_system.iter_orders_by_name(""), "subtotal"),
+        },
+        "order items": {
+            "before": order_system.get_all_order_items,
+            "list": order_system.get_all_order_items,
+            "iter": lambda: sum(row[4] for row in order_system.iter_all_order_items()),
+        },
+    }
+
+    print(f"{'scan':<16}  {'variant':<7}  {'time ms':>9}  {'peak KiB':>10}")
+    for scan, variants in scans.items():
+        for variant, operation in variants.items():
+            elapsed_ms, peak_kib = profile_memory(operation)
+            print(f"{scan:<16}  {variant:<7}  {elapsed_ms:>9.1f}  {peak_kib:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Measures item entry by barcode at scanner speed
+
+Codes are looked up in the in-memory map and, for comparison, by queries
+against the barcode index and without it. A stream of scans arriving at a
+fixed rate is then replayed against an order, applying each scan as it
+arrives like the item buttons do, or applying the scans of each burst
+together like the order screen's scan input. Time spent applying scans is
+measured, while time waiting for scans and redrawing the order on screen is
+simulated, so the reported latency from a scan to the order updating
+includes scans queued behind slower updates.
+
+Usage:
+    python ./benchmarks/bench_scans.py --profile medium --rates 10 50 200
+    python ./benchmarks/bench_scans.py --update-ms 0 --file
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Callable, Optional
+
+from harness import Measurement, build_database, measure, percentile, print_results
+
+# pylint: disable=wrong-import-order
+from item_codes import ItemCodes, ScanQueue
+from order_system import OrderSystem
+
+
+def replay(
+    codes: list[str],
+    rate: float,
+    apply: Callable[[list[str]], None],
+    window_ms: Optional[float],
+    update_ms: float,
+) -> tuple[list[float], int]:
+    """Replays scans arriving at a rate, returning each scan's latency
+
+    Args:
+        codes (list[str]): codes scanned, in order
+        rate (float): scans per second
+        apply (Callable[[list[str]], None]): applies scans to the order
+        window_ms (Optional[float]): scans within this long of the first of
+            a burst are applied together, each alone if None
+        update_ms (float): time taken to redraw the order after each update
+
+    Returns:
+        tuple[list[float], int]: sorted latencies in ms, and updates made
+    """
+    arrivals = [i * 1000 / rate for i in range(len(codes))]
+    latencies = []
+    updates = 0
+    clock = 0.0
+    i = 0
+    while i < len(codes):
+        clock = max(clock, arrivals[i])
+        end = i + 1
+        if window_ms is not None:
+            clock = max(clock, arrivals[i] + window_ms)
+            while end < len(codes) and arrivals[end] <= clock:
+                end += 1
+        started = time.perf_counter()
+        apply(codes[i:end])
+        clock += (time.perf_counter() - started) * 1000 + update_ms
+        latencies.extend(clock - arrival for arrival in arrivals[i:end])
+        updates += 1
+        i = end
+    return sorted(latencies), updates
+
+
+def compare_lookups(
+    conn: sqlite3.Connection, item_codes: ItemCodes, scanned: list[str]
+) -> dict[str, Measurement]:
+    """Times looking codes up in memory against querying for them"""
+
+    def query(sql: str) -> list[int]:
+        return [conn.execute(sql, (code,)).fetchone()[0] for code in scanned]
+
+    return {
+        "lookup/memory_map": measure(
+            lambda: [item_codes.lookup(code) for code in scanned], 3, 20
+        ),
+        "lookup/barcode_index": measure(
+            lambda: query("SELECT id FROM items WHERE barcode = ?;"), 3, 20
+        ),
+        "lookup/no_index": measure(
+            lambda: query("SELECT id FROM items NOT INDEXED WHERE barcode = ?;"), 1, 5
+        ),
+    }
+
+
+def scan_appliers(
+    conn: sqlite3.Connection, item_codes: ItemCodes, items_per_order: int
+) -> tuple[Callable[[list[str]], None], Callable[[list[str]], None]]:
+    """Creates functions applying scans to an order one at a time or together
+
+    Both pay for the order and start another once it has items_per_order
+    scans.
+    """
+    order_system = OrderSystem(conn)
+    queue = ScanQueue()
+    lines = [0]
+    state = {"order_id": order_system.new_order(1)}
+
+    def next_order(count: int):
+        # Pay for the order once it has a basket's worth of scans
+        lines[0] += count
+        if lines[0] >= items_per_order:
+            order_system.pay_for_order(state["order_id"], 1)
+            state["order_id"] = order_system.new_order(1)
+            lines[0] = 0
+
+    def each_scan(burst: list[str]):
+        for code in burst:
+            item_id = item_codes.lookup(code)
+            if item_id is not None:
+                order_system.add_order_item(state["order_id"], item_id)
+            order_system.get_order_details(state["order_id"])
+        next_order(len(burst))
+
+    def batched(burst: list[str]):
+        for code in burst:
+            queue.push(code)
+        quantities, _ = queue.drain(item_codes)
+        order_system.add_order_items(state["order_id"], quantities)
+        order_system.get_order_details(state["order_id"])
+        next_order(len(burst))
+
+    return each_scan, batched
+
+
+def print_replay(
+    stream: list[str],
+    rate: float,
+    appliers: list[tuple[str, Callable[[list[str]], None], Optional[float]]],
+    update_ms: float,
+):
+    """Replays a stream of scans at a rate with each applier, printing latencies"""
+    for name, apply, window_ms in appliers:
+        latencies, updates = replay(stream, rate, apply, window_ms, update_ms)
+        print(
+            f"{rate:>8.0f}  {name:<10}{updates:>8}"
+            + f"{percentile(latencies, 0.5):>9.2f}"
+            + f"{percentile(latencies, 0.99):>9.2f}"
+        )
+
+
+def main():
+    """Entry point for the scan benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="medium")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--rates", type=float, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--items-per-order", type=int, default=30)
+    parser.add_argument("--window-ms", type=float, default=20)
+    parser.add_argument(
+        "--update-ms",
+        type=float,
+        default=10,
+        help="time to redraw the order on screen, which cannot be measured headless",
+    )
+    parser.add_argument(
+        "--file", action="store_true", help="use a database file instead of memory"
+    )
+    args = parser.parse_args()
+
+    uri = ":memory:"
+    if args.file:
+        handle, uri = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+    conn, _ = build_database(args.profile, args.seed, uri)
+    item_codes = ItemCodes(conn)
+    item_codes.assign_store_codes()
+    item_codes.load()
+    rng = random.Random(args.seed)
+    codes = list(item_codes.codes)
+    scanned = [rng.choice(codes) for _ in range(1000)]
+    print_results(compare_lookups(conn, item_codes, scanned))
+
+    each_scan, batched = scan_appliers(conn, item_codes, args.items_per_order)
+    stream = [rng.choice(codes) for _ in range(args.scans)]
+    print()
+    print(f"{'scans/s':>8}  {'apply':<10}{'updates':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for rate in args.rates:
+        print_replay(
+            stream,
+            rate,
+            [("each scan", each_scan, None), ("batched", batched, args.window_ms)],
+            args.update_ms,
+        )
+
+    conn.close()
+    if args.file:
+        os.remove(uri)
+
+
+if __name__ == "__main__":
+    main()
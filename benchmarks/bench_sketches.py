@@ -0,0 +1,155 @@
+"""Compares approximate reports merged from daily sketches against exact queries
+
+Distinct customers per week and basket value quantiles by cashier are
+computed exactly from order_summary and estimated from the sketches, and
+the time and error of each are printed. Merging the sketches costs about
+the same for every day while the exact queries cost more for every order,
+so which of them is faster depends on the orders a day of the profile, and
+is printed after the timings.
+
+Usage:
+    python ./benchmarks/bench_sketches.py --profile large
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from harness import Measurement, build_database, measure, print_results
+
+# pylint: disable=wrong-import-order
+from analytics_system import AnalyticsSystem
+
+WEEKLY_CUSTOMERS = """
+SELECT
+    (JULIANDAY(DATE(TIMESTAMP)) - JULIANDAY(?)) / 7 AS week,
+    COUNT(*),
+    COUNT(DISTINCT customer_id)
+FROM
+    order_summary
+WHERE
+    DATE(TIMESTAMP) BETWEEN ? AND ?
+GROUP BY
+    CAST(week AS INTEGER);
+"""
+
+CASHIER_BASKETS = """
+SELECT
+    user_id,
+    subtotal
+FROM
+    order_summary
+WHERE
+    DATE(TIMESTAMP) BETWEEN ? AND ?;
+"""
+
+
+def exact_weekly_customers(conn, start: datetime.date, end: datetime.date) -> list[int]:
+    """Counts distinct customers of each week exactly"""
+    return [
+        row[2] for row in conn.execute(WEEKLY_CUSTOMERS, (start, start, end))
+    ]
+
+
+def exact_cashier_medians(conn, start: datetime.date, end: datetime.date) -> dict:
+    """Gets the median and 90th percentile basket value of each cashier exactly"""
+    baskets: dict[int, list[float]] = {}
+    for user_id, subtotal in conn.execute(CASHIER_BASKETS, (start, end)):
+        baskets.setdefault(user_id, []).append(subtotal)
+    return {
+        user_id: (
+            statistics.median(values),
+            statistics.quantiles(values, n=10, method="inclusive")[-1],
+        )
+        for user_id, values in baskets.items()
+    }
+
+
+def main():
+    """Entry point for the sketch benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="large")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    conn, dataset = build_database(args.profile, args.seed)
+    analytics_system = AnalyticsSystem(conn)
+    start = datetime.date.fromisoformat(dataset.orders[0][5][:10])
+    end = datetime.date.fromisoformat(dataset.orders[-1][5][:10])
+
+    built = time.perf_counter()
+    days = analytics_system.build_closed_days(end + datetime.timedelta(days=1))
+    built = time.perf_counter() - built
+    size = conn.execute(
+        "SELECT SUM(LENGTH(customers) + LENGTH(basket_values) + LENGTH(basket_items))"
+        + " FROM daily_sketches;"
+    ).fetchone()[0]
+    print(f"Built sketches of {len(days)} days in {built:.2f} s, {size / 1024:.0f} KiB")
+
+    exact_weeks = exact_weekly_customers(conn, start, end)
+    approximate_weeks = analytics_system.get_approximate_sales_by_period(start, end)
+    week_errors = [
+        abs(sales.distinct_customers - exact) / exact
+        for sales, exact in zip(approximate_weeks, exact_weeks)
+        if exact > 0
+    ]
+    print(
+        f"Weekly distinct customers: {len(week_errors)} weeks,"
+        + f" mean error {statistics.fmean(week_errors):.2%},"
+        + f" max error {max(week_errors):.2%}"
+        + f" (standard error {approximate_weeks[0].customers_error:.2%})"
+    )
+
+    exact_cashiers = exact_cashier_medians(conn, start, end)
+    for sales in analytics_system.get_approximate_sales_by_cashier(start, end):
+        median, p90 = exact_cashiers[sales.user_id]
+        print(
+            f"Cashier {sales.username}: median {sales.median_basket_value:.2f}"
+            + f" (exact {median:.2f}), p90 {sales.p90_basket_value:.2f}"
+            + f" (exact {p90:.2f}), bound {sales.quantile_error:.0%}"
+        )
+
+    results: dict[str, Measurement] = {
+        "exact/weekly_customers": measure(
+            lambda: exact_weekly_customers(conn, start, end),
+            args.warmup,
+            args.repetitions,
+        ),
+        "sketch/weekly_customers": measure(
+            lambda: analytics_system.get_approximate_sales_by_period(start, end),
+            args.warmup,
+            args.repetitions,
+        ),
+        "exact/cashier_baskets": measure(
+            lambda: exact_cashier_medians(conn, start, end),
+            args.warmup,
+            args.repetitions,
+        ),
+        "sketch/cashier_baskets": measure(
+            lambda: analytics_system.get_approximate_sales_by_cashier(start, end),
+            args.warmup,
+            args.repetitions,
+        ),
+        "sketch/whole_range": measure(
+            lambda: analytics_system.get_approximate_sales(start, end),
+            args.warmup,
+            args.repetitions,
+        ),
+    }
+    print_results(results)
+
+    per_day = len(dataset.orders) / max(1, len(days))
+    for report in ("weekly_customers", "cashier_baskets"):
+        exact = results[f"exact/{report}"].p50_ms
+        sketch = results[f"sketch/{report}"].p50_ms
+        faster = "from the sketches" if sketch < exact else "exactly"
+        print(
+            f"{report} at {per_day:.0f} orders a day:"
+            + f" {max(exact, sketch) / min(exact, sketch):.1f}x faster {faster}"
+        )
+
+
+if __name__ == "__main__":
+    main()
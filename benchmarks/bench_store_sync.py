@@ -0,0 +1,109 @@
+"""Measures shipping a day of store activity to head office
+
+A store database is populated with a workload profile and exported in full,
+then a day of checkouts is run and exported as an incremental batch. Export
+time and batch size are compared with copying the whole database file.
+Batches of several stores are then imported into a fresh head office
+database, reading them in one process and in one process per store.
+
+Usage:
+    python ./benchmarks/bench_store_sync.py --profiles small medium --stores 4
+"""
+import argparse
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from harness import ROOT, build_database
+
+# pylint: disable=wrong-import-order
+from order_system import OrderSystem
+from store_sync import Batch, HeadOffice, StoreExporter
+
+
+def checkouts(conn: sqlite3.Connection, item_ids: list[int], count: int, seed: str):
+    """Runs paid checkouts of a few items each through the order system"""
+    rng = random.Random(seed)
+    order_system = OrderSystem(conn)
+    for _ in range(count):
+        order_id = order_system.new_order(1)
+        for item_id in rng.sample(item_ids, rng.randint(1, 8)):
+            order_system.add_order_item(order_id, item_id)
+        order_system.pay_for_order(order_id, 1)
+
+
+def import_time(paths: list[Path], directory: Path, workers: int) -> float:
+    """Imports batches into a new head office database and times it"""
+    path = directory / f"head_office_{workers}.db"
+    conn = sqlite3.connect(path)
+    with open(ROOT / "create_tables_sqlite.sql", encoding="utf8") as sql_file:
+        conn.executescript(sql_file.read())
+    started = time.perf_counter()
+    HeadOffice(conn).import_batches(paths, workers)
+    elapsed = time.perf_counter() - started
+    conn.close()
+    path.unlink()
+    return elapsed
+
+
+def main():
+    """Entry point for the store sync benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["small", "medium"])
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--orders", type=int, default=150, help="checkouts in a day")
+    parser.add_argument("--stores", type=int, default=4)
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            database = directory / "store.db"
+            conn, dataset = build_database(profile, args.seed, str(database))
+            exporter = StoreExporter(conn, 1)
+
+            started = time.perf_counter()
+            full = exporter.export(directory / "outbox", full=True)
+            full_seconds = time.perf_counter() - started
+            checkouts(conn, [item[0] for item in dataset.items], args.orders, args.seed)
+            started = time.perf_counter()
+            day = exporter.export(directory / "outbox")
+            day_seconds = time.perf_counter() - started
+            conn.close()
+
+            started = time.perf_counter()
+            shutil.copyfile(database, directory / "copy.db")
+            copy_seconds = time.perf_counter() - started
+            print(
+                f"{profile}: {len(dataset.orders)} orders,"
+                + f" database {database.stat().st_size / 1024:.0f} KiB"
+                + f" copied in {copy_seconds * 1000:.1f} ms"
+            )
+            print(
+                f"  full export {full.stat().st_size / 1024:.0f} KiB"
+                + f" in {full_seconds * 1000:.0f} ms,"
+                + f" day of {args.orders} orders {day.stat().st_size / 1024:.1f} KiB"
+                + f" in {day_seconds * 1000:.1f} ms"
+            )
+
+            # The same batches shipped by several stores
+            paths = []
+            for store_id in range(1, args.stores + 1):
+                for path in (full, day):
+                    batch = Batch.read(path)
+                    batch.store_id = store_id
+                    paths.append(batch.write(directory / "stores"))
+            day_paths = [path for path in paths if "-full" not in path.name]
+            for workers in (1, args.stores):
+                print(
+                    f"  import {args.stores} stores, {workers} processes:"
+                    + f" full and day {import_time(paths, directory, workers):.2f} s,"
+                    + f" day only {import_time(day_paths, directory, workers):.3f} s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Shared helpers for the headless benchmarks"""
+from dataclasses import asdict, dataclass
+import datetime
+import json
+from pathlib import Path
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+from typing import Any, Callable, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "data_generators"))
+
+# pylint: disable=wrong-import-position
+from migrations import backfill_order_item_prices
+from order_system import OrderSystem
+from workloads import PROFILES, Dataset, generate_dataset, load_customers
+
+
+@dataclass
+class Measurement:
+    """Latency distribution and throughput of one benchmarked operation"""
+
+    repetitions: int
+    mean_ms: float
+    min_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+    rows: int
+    rows_per_second: float
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Gets a percentile from sorted samples using the nearest rank
+
+    Args:
+        samples (list[float]): sorted samples
+        fraction (float): percentile as a fraction between 0 and 1
+
+    Returns:
+        float: the sample at the percentile
+    """
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def count_rows(result: Any) -> int:
+    """Counts the rows returned by an operation
+
+    Args:
+        result (Any): value returned by the operation
+
+    Returns:
+        int: length of the result if it has one, otherwise 1
+    """
+    try:
+        return len(result)
+    except TypeError:
+        return 1
+
+
+def measure(
+    operation: Callable[[], Any], warmup: int = 3, repetitions: int = 20
+) -> Measurement:
+    """Times an operation after warming it up
+
+    Args:
+        operation (Callable[[], Any]): operation to time
+        warmup (int, optional): untimed runs before measuring. Defaults to 3.
+        repetitions (int, optional): timed runs. Defaults to 20.
+
+    Returns:
+        Measurement: latency distribution of the timed runs
+    """
+    for _ in range(warmup):
+        operation()
+
+    samples = []
+    rows = 0
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        result = operation()
+        samples.append((time.perf_counter() - start) * 1000)
+        rows += count_rows(result)
+    samples.sort()
+
+    total_seconds = sum(samples) / 1000
+    return Measurement(
+        repetitions=repetitions,
+        mean_ms=statistics.fmean(samples),
+        min_ms=samples[0],
+        p50_ms=percentile(samples, 0.5),
+        p90_ms=percentile(samples, 0.9),
+        p99_ms=percentile(samples, 0.99),
+        max_ms=samples[-1],
+        rows=rows,
+        rows_per_second=rows / total_seconds if total_seconds > 0 else 0.0,
+    )
+
+
+def create_schema(conn: sqlite3.Connection):
+    """Creates the app's tables on a connection
+
+    Args:
+        conn (sqlite3.Connection): connection to create the tables on
+    """
+    with open(ROOT / "create_tables_sqlite.sql", encoding="utf8") as sql_file:
+        conn.executescript(sql_file.read())
+    conn.commit()
+
+
+def load_dataset(conn: sqlite3.Connection, dataset: Dataset):
+    """Bulk loads a generated dataset
+
+    Args:
+        conn (sqlite3.Connection): connection with the app's tables
+        dataset (Dataset): rows to insert
+    """
+    for table, columns, rows in dataset.tables():
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});",
+            rows,
+        )
+    conn.commit()
+
+
+def build_database(
+    profile_name: str, seed: str = "Team23", uri: str = ":memory:"
+) -> tuple[sqlite3.Connection, Dataset]:
+    """Creates a database populated with a workload profile
+
+    Args:
+        profile_name (str): name of the workload profile
+        seed (str, optional): seed for the random source. Defaults to "Team23".
+        uri (str, optional): database to populate. Defaults to ":memory:".
+
+    Returns:
+        tuple[sqlite3.Connection, Dataset]: populated connection and its rows
+    """
+    dataset = generate_dataset(
+        PROFILES[profile_name], seed, load_customers(str(ROOT / "test_data/Customers.csv"))
+    )
+    conn = sqlite3.connect(uri)
+    create_schema(conn)
+    load_dataset(conn, dataset)
+    backfill_order_item_prices(conn)
+    OrderSystem(conn).backfill_order_totals()
+    return conn, dataset
+
+
+def busiest_day(dataset: Dataset) -> datetime.date:
+    """Finds the day with the most orders in a dataset
+
+    Args:
+        dataset (Dataset): generated rows
+
+    Returns:
+        datetime.date: day with the most orders
+    """
+    days: dict[str, int] = {}
+    for order in dataset.orders:
+        day = order[5][:10]
+        days[day] = days.get(day, 0) + 1
+    return datetime.date.fromisoformat(max(days, key=lambda day: days[day]))
+
+
+def environment() -> dict[str, str]:
+    """Describes the environment a benchmark ran in
+
+    Returns:
+        dict[str, str]: python, sqlite and platform versions
+    """
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def write_results(
+    path: str, results: dict[str, Measurement], meta: Optional[dict[str, Any]] = None
+):
+    """Writes benchmark results to a json file
+
+    Args:
+        path (str): file to write
+        results (dict[str, Measurement]): measurements keyed by benchmark name
+        meta (Optional[dict[str, Any]], optional): extra run information.
+            Defaults to None.
+    """
+    document = {
+        "meta": {**environment(), **(meta or {})},
+        "results": {name: asdict(result) for name, result in results.items()},
+    }
+    with open(path, "w", encoding="utf8") as results_file:
+        json.dump(document, results_file, indent=2)
+
+
+def read_results(path: str) -> dict[str, Measurement]:
+    """Reads benchmark results written by write_results
+
+    Args:
+        path (str): file to read
+
+    Returns:
+        dict[str, Measurement]: measurements keyed by benchmark name
+    """
+    with open(path, encoding="utf8") as results_file:
+        document = json.load(results_file)
+    return {
+        name: Measurement(**result) for name, result in document["results"].items()
+    }
+
+
+def print_results(results: dict[str, Measurement]):
+    """Prints a table of benchmark results
+
+    Args:
+        results (dict[str, Measurement]): measurements keyed by benchmark name
+    """
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'p50 ms':>9}  {'p99 ms':>9}  {'rows/s':>12}")
+    for name, result in results.items():
+        print(
+            f"{name:<{width}}  {result.p50_ms:>9.3f}  {result.p99_ms:>9.3f}"
+            + f"  {result.rows_per_second:>12.0f}"
+        )
+
+
+def compare_results(
+    baseline: dict[str, Measurement],
+    candidate: dict[str, Measurement],
+    threshold: float = 0.1,
+) -> list[str]:
+    """Prints the change in median latency between two result sets
+
+    Args:
+        baseline (dict[str, Measurement]): earlier results
+        candidate (dict[str, Measurement]): results to check
+        threshold (float, optional): relative slowdown that counts as a
+            regression. Defaults to 0.1.
+
+    Returns:
+        list[str]: names of the benchmarks that regressed
+    """
+    regressions = []
+    names = [name for name in candidate if name in baseline]
+    width = max((len(name) for name in names), default=10)
+    print(f"{'benchmark':<{width}}  {'before':>9}  {'after':>9}  {'change':>8}")
+    for name in names:
+        before = baseline[name].p50_ms
+        after = candidate[name].p50_ms
+        change = (after - before) / before if before > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<{width}}  {before:>9.3f}  {after:>9.3f}  {change:>+8.1%}{flag}")
+    return regressions
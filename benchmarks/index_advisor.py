@@ -0,0 +1,408 @@
+"""Explains every query of the billing core and prices each index on checkout
+
+Every public method of ReportSystem, InventorySystem, CustomerSystem and
+OrderSystem is run against a generated dataset while its statements are
+recorded. Each statement is then run under EXPLAIN QUERY PLAN and flagged when
+it scans a whole table, builds a temporary B-tree or an automatic index.
+
+Indexes on the tables written by checkout slow down every sale. Each one is
+dropped in turn to measure how many sqlite virtual machine instructions and
+how much time it adds to a checkout, and its size is read from dbstat. The
+instruction count is exact, the time is only meaningful for expensive indexes.
+
+Usage:
+    python ./benchmarks/index_advisor.py --profile large
+"""
+import argparse
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from typing import Any, Callable
+
+from harness import build_database, busiest_day
+
+# pylint: disable=wrong-import-order
+from customer_system import CustomerSystem
+from inventory_system import InventorySystem
+from order_system import OrderSystem
+from report_system import ReportSystem
+from workloads import Dataset
+
+WRITE_PATTERN = re.compile(r"^\s*(?:INSERT\s+INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+
+
+class RecordingConnection(sqlite3.Connection):
+    """Connection that records the statements run on it
+
+    Create with sqlite3.connect(uri, factory=RecordingConnection).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.operation = ""
+        self.statements: dict[str, tuple[str, str, Any]] = {}
+
+    def execute(self, sql, parameters=(), /):
+        key = " ".join(sql.split())
+        if self.operation and key not in self.statements:
+            self.statements[key] = (self.operation, sql, parameters)
+        return super().execute(sql, parameters)
+
+
+def query_operations(
+    conn: sqlite3.Connection, dataset: Dataset
+) -> dict[str, Callable[[], Any]]:
+    """Creates a call of every public query and write of the core systems
+
+    Args:
+        conn (sqlite3.Connection): populated database
+        dataset (Dataset): rows the database was populated with
+
+    Returns:
+        dict[str, Callable[[], Any]]: operations keyed by name, run in order
+    """
+    order_system = OrderSystem(conn)
+    report_system = ReportSystem(conn)
+    inventory_system = InventorySystem(conn)
+    customer_system = CustomerSystem(conn)
+
+    day = busiest_day(dataset)
+    first_day = dataset.orders[0][5][:10]
+    last_day = dataset.orders[-1][5][:10]
+    order_id = dataset.orders[len(dataset.orders) // 2][0]
+    item_id = dataset.items[0][0]
+    count_id = dataset.inventory_counts[-1][0]
+    customer_id = dataset.customers[0][0]
+    state: dict[str, int] = {}
+
+    def checkout():
+        state["order"] = order_system.new_order(1)
+        order_system.add_customer_to_order(state["order"], customer_id)
+        order_system.add_order_item(state["order"], item_id)
+        order_system.remove_order_item(state["order"], item_id)
+        order_system.add_order_item(state["order"], item_id)
+        order_system.pay_for_order(state["order"], 1)
+        return order_system.order_paid(state["order"])
+
+    def return_order():
+        state["return"] = order_system.new_return_order(1, state["order"])
+        order_system.set_order_item(state["return"], item_id, -1)
+        order_system.pay_for_order(state["return"], 1)
+
+    def count():
+        state["count"] = inventory_system.create_count()
+        inventory_system.set_item_in_count(state["count"], item_id, 10)
+
+    def adjustment():
+        adjustment_id = inventory_system.create_adjustment("advisor")
+        inventory_system.set_item_in_adjustment(adjustment_id, item_id, -1)
+
+    return {
+        "order.checkout": checkout,
+        "order.return": return_order,
+        "order.get_order_details": lambda: order_system.get_order_details(order_id),
+        "order.get_order_details_for_return": lambda: (
+            order_system.get_order_details_for_return(order_id)
+        ),
+        "order.create_customer": lambda: order_system.create_customer("Advisor"),
+        "order.get_all_customers": order_system.get_all_customers,
+        "order.backfill_order_totals": order_system.backfill_order_totals,
+        "report.hourly_for_date": lambda: report_system.get_hourly_sales_for_date(day),
+        "report.hourly_for_range": lambda: report_system.get_hourly_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.daily_for_range": lambda: report_system.get_daily_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.cashier_for_date": lambda: report_system.get_cashier_sales_for_date(day),
+        "report.cashier_for_range": lambda: report_system.get_cashier_sales_for_date_range(
+            first_day, last_day
+        ),
+        "report.item_for_date": lambda: report_system.get_item_sales_for_date(day),
+        "report.item_for_range": lambda: report_system.get_item_sales_for_date_range(
+            first_day, last_day
+        ),
+        "inventory.count": count,
+        "inventory.adjustment": adjustment,
+        "inventory.list_inventory_counts": inventory_system.list_inventory_counts,
+        "inventory.get_count_details": lambda: inventory_system.get_count_details(
+            count_id
+        ),
+        "inventory.get_inventory_details": inventory_system.get_inventory_details,
+        "inventory.get_inventory_snapshot": inventory_system.get_inventory_snapshot,
+        "customer.get_customer_order_by_id": lambda: (
+            customer_system.get_customer_order_by_id(order_id)
+        ),
+        "customer.search_by_name": lambda: customer_system.search_orders_by_name("an"),
+        "customer.search_by_email": lambda: customer_system.search_orders_by_email(
+            ".edu"
+        ),
+        "customer.search_by_phone": lambda: customer_system.search_orders_by_phone_number(
+            "555"
+        ),
+    }
+
+
+def table_sizes(conn: sqlite3.Connection) -> dict[str, int]:
+    """Counts the rows of each table in a database
+
+    Args:
+        conn (sqlite3.Connection): database to read
+
+    Returns:
+        dict[str, int]: number of rows keyed by table name
+    """
+    names = [
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_schema WHERE type = 'table';")
+    ]
+    return {
+        name: conn.execute(f"SELECT COUNT(*) FROM {name};").fetchone()[0]
+        for name in names
+    }
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters: Any) -> list[str]:
+    """Gets the query plan of a statement
+
+    Args:
+        conn (sqlite3.Connection): database to explain against
+        sql (str): statement to explain
+        parameters (Any): parameters of the statement
+
+    Returns:
+        list[str]: lines of the query plan, indented by depth
+    """
+    depths: dict[int, int] = {0: 0}
+    plan = []
+    for node_id, parent_id, _, detail in conn.cursor().execute(
+        f"EXPLAIN QUERY PLAN {sql}", parameters
+    ):
+        depths[node_id] = depths.get(parent_id, 0) + 1
+        plan.append(f"{'  ' * depths[node_id]}{detail}")
+    return plan
+
+
+def plan_warnings(plan: list[str], tables: dict[str, int]) -> list[str]:
+    """Finds the steps of a query plan that do more work than an index lookup
+
+    Args:
+        plan (list[str]): lines of a query plan
+        tables (dict[str, int]): rows of each real table, scans of subqueries
+            are not flagged
+
+    Returns:
+        list[str]: descriptions of full scans, temp B-trees and automatic indexes
+    """
+    warnings = []
+    for line in plan:
+        detail = line.strip()
+        scan = re.match(r"SCAN (\w+)", detail)
+        if scan is not None and scan.group(1) in tables:
+            warnings.append(f"scan of {tables[scan.group(1)]} rows: {detail}")
+        if "TEMP B-TREE" in detail:
+            warnings.append(detail.lower())
+        if "AUTOMATIC" in detail:
+            warnings.append(f"automatic index: {detail}")
+    return warnings
+
+
+def run_checkouts(
+    conn: sqlite3.Connection, item_ids: list[int], rng: random.Random, checkouts: int
+):
+    """Pays for orders of five random items
+
+    Args:
+        conn (sqlite3.Connection): populated database
+        item_ids (list[int]): ids of items that can be sold
+        rng (random.Random): random source for choosing items
+        checkouts (int): orders to pay for
+    """
+    order_system = OrderSystem(conn)
+    for _ in range(checkouts):
+        order_id = order_system.new_order(1)
+        for item_id in rng.sample(item_ids, 5):
+            order_system.add_order_item(order_id, item_id)
+        order_system.pay_for_order(order_id, 1)
+
+
+def checkout_time(conn: sqlite3.Connection, item_ids: list[int], checkouts: int) -> float:
+    """Measures the mean time of a checkout
+
+    Args:
+        conn (sqlite3.Connection): populated database
+        item_ids (list[int]): ids of items that can be sold
+        checkouts (int): checkouts to time
+
+    Returns:
+        float: mean time of a checkout in microseconds
+    """
+    start = time.perf_counter()
+    run_checkouts(conn, item_ids, random.Random("index-advisor"), checkouts)
+    return (time.perf_counter() - start) * 1_000_000 / checkouts
+
+
+def checkout_instructions(
+    conn: sqlite3.Connection, item_ids: list[int], checkouts: int
+) -> float:
+    """Counts the virtual machine instructions sqlite runs for a checkout
+
+    Args:
+        conn (sqlite3.Connection): populated database
+        item_ids (list[int]): ids of items that can be sold
+        checkouts (int): checkouts to count
+
+    Returns:
+        float: mean instructions of a checkout
+    """
+    instructions = 0
+
+    def count() -> int:
+        nonlocal instructions
+        instructions += 1
+        return 0
+
+    conn.set_progress_handler(count, 1)
+    try:
+        run_checkouts(conn, item_ids, random.Random("index-advisor"), checkouts)
+    finally:
+        conn.set_progress_handler(None, 1)
+    return instructions / checkouts
+
+
+def index_costs(
+    conn: sqlite3.Connection,
+    item_ids: list[int],
+    written_tables: set[str],
+    checkouts: int,
+    rounds: int,
+) -> list[tuple[str, str, float, float, int]]:
+    """Measures what each index on the checkout tables adds to a checkout
+
+    Timed batches with and without the index alternate so growth of the
+    database affects both equally.
+
+    Args:
+        conn (sqlite3.Connection): populated database
+        item_ids (list[int]): ids of items that can be sold
+        written_tables (set[str]): tables written by checkout
+        checkouts (int): checkouts in each batch
+        rounds (int): timed batches with and without each index
+
+    Returns:
+        list[tuple[str, str, float, float, int]]: index, table, instructions
+            and microseconds added per checkout, and size in bytes
+    """
+    checkout_time(conn, item_ids, checkouts)
+    sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name;"))
+    placeholders = ", ".join("?" for _ in written_tables)
+    indexes = conn.execute(
+        f"""
+SELECT
+    name,
+    tbl_name,
+    sql
+FROM
+    sqlite_schema
+WHERE
+    type = 'index'
+    AND tbl_name IN ({placeholders})
+ORDER BY
+    tbl_name,
+    name;
+""",
+        sorted(written_tables),
+    ).fetchall()
+
+    costs = []
+    for name, table, sql in indexes:
+        if sql is None:
+            # Indexes of UNIQUE constraints cannot be dropped
+            costs.append((name, table, float("nan"), float("nan"), sizes.get(name, 0)))
+            continue
+        with_index = [checkout_instructions(conn, item_ids, checkouts)]
+        without_index = []
+        for _ in range(rounds):
+            with_index.append(checkout_time(conn, item_ids, checkouts))
+            conn.execute(f"DROP INDEX {name};")
+            if len(without_index) == 0:
+                without_index.append(checkout_instructions(conn, item_ids, checkouts))
+            without_index.append(checkout_time(conn, item_ids, checkouts))
+            conn.execute(sql)
+            conn.commit()
+        costs.append(
+            (
+                name,
+                table,
+                with_index[0] - without_index[0],
+                statistics.median(with_index[1:]) - statistics.median(without_index[1:]),
+                sizes.get(name, 0),
+            )
+        )
+    return costs
+
+
+def main():
+    """Entry point for the index advisor"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="large")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--checkouts", type=int, default=200, help="checkouts per batch")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    print(f"Building {args.profile} dataset...", file=sys.stderr)
+    source, dataset = build_database(args.profile, args.seed)
+    conn = sqlite3.connect(":memory:", factory=RecordingConnection)
+    source.backup(conn)
+    source.close()
+
+    for name, operation in query_operations(conn, dataset).items():
+        conn.operation = name
+        operation()
+    conn.operation = ""
+
+    tables = table_sizes(conn)
+    written_tables = set()
+    flagged = 0
+    for operation, sql, parameters in conn.statements.values():
+        write = WRITE_PATTERN.match(sql)
+        if write is not None and operation in ("order.checkout", "order.return"):
+            written_tables.add(write.group(1))
+        plan = explain(conn, sql, parameters)
+        warnings = plan_warnings(plan, tables)
+        if len(warnings) == 0 and not args.verbose:
+            continue
+        flagged += len(warnings) > 0
+        print(f"{operation}: {' '.join(sql.split())[:100]}")
+        for line in plan:
+            print(f"    {line}")
+        for warning in warnings:
+            print(f"  ! {warning}")
+    print(f"\n{flagged} of {len(conn.statements)} statements flagged\n")
+
+    item_ids = [item[0] for item in dataset.items]
+    print(
+        f"Checkout: {checkout_instructions(conn, item_ids, args.checkouts):.0f}"
+        + f" instructions, {checkout_time(conn, item_ids, args.checkouts):.1f} us"
+    )
+    print(f"Cost of indexes on {', '.join(sorted(written_tables))}")
+    print(
+        f"{'index':<32}  {'table':<12}  {'instr/checkout':>14}"
+        + f"  {'us/checkout':>11}  {'KiB':>8}"
+    )
+    for name, table, instructions, microseconds, size in index_costs(
+        conn, item_ids, written_tables, args.checkouts, args.rounds
+    ):
+        print(
+            f"{name:<32}  {table:<12}  {instructions:>14.0f}"
+            + f"  {microseconds:>11.1f}  {size / 1024:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
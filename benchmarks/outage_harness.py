@@ -0,0 +1,337 @@
+"""Simulates registers selling through outages of a stand-in store database
+
+Several registers sell and take returns against one store database file,
+each through a connection that can be cut off. Registers lose the store for
+random stretches, statements fail part way through orders, and some commits
+succeed with their reply lost, so the register believes the order failed.
+Registers queue what they cannot write and replay their queues every few
+steps. Some returns are looked up just before their register is cut off, so
+they can refund items another register returns in the meantime.
+
+Once every register is back and its queue replayed, the store is checked:
+every sale and return appears exactly once with the lines it was rung up
+with, ids on receipts match the store, each register's ids come from its
+own blocks, and the sales refunded more than they sold are exactly the ones
+reported as conflicts. Any difference raises an AssertionError.
+
+Usage:
+    python ./benchmarks/outage_harness.py --registers 4 --steps 5000
+    python ./benchmarks/outage_harness.py --outage-rate 0.05 --lost-commit-rate 0.02
+"""
+import argparse
+from dataclasses import dataclass, replace
+from pathlib import Path
+import random
+import sqlite3
+import tempfile
+
+from harness import build_database
+
+# pylint: disable=wrong-import-order
+from draft_orders import DraftOrder, DraftOrders
+from order_ids import OrderIds
+from order_system import Item, Order, OrderSystem
+from register_queue import RegisterQueue
+
+
+class FlakyConnection(sqlite3.Connection):
+    """Connection to the store that fails while its register is cut off
+
+    Create with sqlite3.connect(path, factory=FlakyConnection). Rolling back
+    always works, as sqlite releases a lost connection's locks.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.down = False
+        self.rng = random.Random()
+        # Chance of a statement failing, and of a commit's reply being lost
+        self.statement_failure_rate = 0.0
+        self.lost_commit_rate = 0.0
+        self.failures = 0
+        self.lost_commits = 0
+
+    def _check(self):
+        """[Internal] Fails like an unreachable database file"""
+        if self.down or self.rng.random() < self.statement_failure_rate:
+            self.failures += 1
+            raise sqlite3.OperationalError("unable to open database file")
+
+    def execute(self, sql, parameters=(), /):
+        self._check()
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        self._check()
+        return super().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        self._check()
+        super().commit()
+        if self.rng.random() < self.lost_commit_rate:
+            self.lost_commits += 1
+            raise sqlite3.OperationalError("disk I/O error")
+
+
+@dataclass
+class Register:
+    """A register with its own connection to the store and its own queue"""
+
+    register_id: int
+    conn: FlakyConnection
+    draft_orders: DraftOrders
+    queue: RegisterQueue
+    outage_left: int = 0
+    outages: int = 0
+
+
+@dataclass
+class Totals:
+    """Counts of what happened during the simulation"""
+
+    sales: int = 0
+    returns: int = 0
+    queued: int = 0
+    refused_returns: int = 0
+    duplicates: int = 0
+
+
+def open_register(
+    path: Path, directory: Path, register_id: int, block_size: int, seed: str
+) -> Register:
+    """Connects a register to the store, with its queue in a directory"""
+    conn = sqlite3.connect(path, factory=FlakyConnection)
+    conn.rng.seed(f"{seed}-{register_id}")
+    order_ids = OrderIds(conn, register_id, block_size)
+    queue = RegisterQueue(directory / f"register-{register_id}-queue.db")
+    draft_orders = DraftOrders(OrderSystem(conn, order_ids=order_ids))
+    return Register(register_id, conn, draft_orders, queue)
+
+
+def sync_all(registers: list[Register], totals: Totals, conflicts: set[int]):
+    """Replays the queue of every register that can reach the store"""
+    for register in registers:
+        if register.conn.down:
+            continue
+        result = register.queue.sync(register.draft_orders)
+        totals.duplicates += result.duplicates
+        conflicts.update(result.conflicts)
+
+
+def check_store(
+    path: Path,
+    placed: dict[str, tuple[int, DraftOrder, Order]],
+    conflicts: set[int],
+):
+    """Checks the store holds every order once, and conflicts were reported
+
+    Raises:
+        AssertionError: if the store differs from what the registers sold
+    """
+    conn = sqlite3.connect(path)
+    stored = {
+        key: (order_id, order_reference)
+        for key, order_id, order_reference in conn.execute(
+            "SELECT idempotency_key, id, order_reference FROM orders"
+            + " WHERE idempotency_key IS NOT NULL;"
+        )
+    }
+    if set(stored) != set(placed):
+        raise AssertionError(
+            f"{len(set(placed) - set(stored))} orders missing,"
+            + f" {len(set(stored) - set(placed))} unexpected"
+        )
+    blocks: dict[int, list[tuple[int, int]]] = {}
+    for register_id, first_id, last_id in conn.execute(
+        "SELECT register_id, first_id, last_id FROM order_id_blocks;"
+    ):
+        blocks.setdefault(register_id, []).append((first_id, last_id))
+    for key, (register_id, draft, receipt) in placed.items():
+        order_id = stored[key][0]
+        if receipt.order_id not in (0, order_id):
+            raise AssertionError(f"Receipt {receipt.order_id} was stored as {order_id}")
+        if not any(first <= order_id <= last for first, last in blocks[register_id]):
+            raise AssertionError(f"Order {order_id} is outside register {register_id}")
+        lines = sorted(
+            conn.execute(
+                "SELECT item_id, quantity FROM order_items WHERE order_id = ?;",
+                (order_id,),
+            )
+        )
+        expected = sorted(
+            (line.item_id, line.quantity) for line in draft.lines.values()
+        )
+        if lines != expected:
+            raise AssertionError(f"Order {order_id} has lines {lines}, not {expected}")
+
+    # Sales with an item refunded more than it was sold
+    over_returned = {
+        sale_id
+        for (sale_id,) in conn.execute(
+            """
+SELECT
+    DISTINCT sale_id
+FROM
+    (
+        SELECT
+            family.sale_id,
+            order_items.item_id
+        FROM
+            (
+                SELECT
+                    id AS sale_id,
+                    id AS order_id
+                FROM
+                    orders
+                WHERE
+                    order_reference IS NULL
+                UNION ALL
+                SELECT
+                    order_reference,
+                    id
+                FROM
+                    orders
+                WHERE
+                    order_reference IS NOT NULL
+            ) family
+            JOIN order_items ON order_items.order_id = family.order_id
+        GROUP BY
+            family.sale_id,
+            order_items.item_id
+        HAVING
+            SUM(order_items.quantity) < 0
+    );
+"""
+        )
+    }
+    reported = {
+        reference for order_id, reference in stored.values() if order_id in conflicts
+    }
+    conn.close()
+    if over_returned != reported:
+        raise AssertionError(
+            f"Over-returned sales {sorted(over_returned)},"
+            + f" reported {sorted(reported)}"
+        )
+
+
+def main():
+    """Entry point for the outage harness"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="small")
+    parser.add_argument("--seed", default="Team23")
+    parser.add_argument("--registers", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=3000)
+    parser.add_argument("--block-size", type=int, default=50)
+    parser.add_argument("--outage-rate", type=float, default=0.02)
+    parser.add_argument("--longest-outage", type=int, default=60)
+    parser.add_argument("--statement-failure-rate", type=float, default=0.005)
+    parser.add_argument("--lost-commit-rate", type=float, default=0.01)
+    parser.add_argument("--return-rate", type=float, default=0.2)
+    parser.add_argument("--cut-off-rate", type=float, default=0.3)
+    parser.add_argument("--recent-receipts", type=int, default=10)
+    parser.add_argument("--sync-every", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as temp:
+        directory = Path(temp)
+        path = directory / "store.db"
+        conn, dataset = build_database(args.profile, args.seed, str(path))
+        conn.close()
+        items = [
+            Item(item_id, name, price, category_id, gst, pst)
+            for item_id, name, price, gst, pst, category_id in dataset.items
+        ]
+        registers = [
+            open_register(path, directory, register_id, args.block_size, args.seed)
+            for register_id in range(1, args.registers + 1)
+        ]
+        for register in registers:
+            register.conn.statement_failure_rate = args.statement_failure_rate
+            register.conn.lost_commit_rate = args.lost_commit_rate
+
+        # Register, draft and receipt of every order placed or queued
+        placed: dict[str, tuple[int, DraftOrder, Order]] = {}
+        receipts: list[Order] = []
+        conflicts: set[int] = set()
+        totals = Totals()
+        for step in range(args.steps):
+            for register in registers:
+                if register.outage_left > 0:
+                    register.outage_left -= 1
+                    register.conn.down = register.outage_left > 0
+                elif rng.random() < args.outage_rate:
+                    register.outage_left = rng.randint(1, args.longest_outage)
+                    register.conn.down = True
+                    register.outages += 1
+
+            register = rng.choice(registers)
+            if len(receipts) > 0 and rng.random() < args.return_rate:
+                # Customers bring back recent purchases, often the same one twice
+                receipt = rng.choice(receipts[-args.recent_receipts :])
+                try:
+                    sold = register.queue.find_order_for_return(
+                        register.draft_orders.order_system, receipt.order_id
+                    )
+                except (KeyError, sqlite3.OperationalError):
+                    totals.refused_returns += 1
+                    continue
+                draft = DraftOrder(1, order_reference=receipt.order_id)
+                for item in sold.items:
+                    if item.quantity > 0 and rng.random() < 0.5:
+                        quantity = rng.randint(1, item.quantity)
+                        draft.lines[item.item_id] = replace(item, quantity=-quantity)
+                if len(draft.lines) == 0:
+                    continue
+                # The store can be lost while the cashier picks what to return
+                if rng.random() < args.cut_off_rate:
+                    register.outage_left = rng.randint(1, args.longest_outage)
+                    register.conn.down = True
+                    register.outages += 1
+                totals.returns += 1
+            else:
+                draft = DraftOrder(1)
+                for item in rng.sample(items, rng.randint(1, 8)):
+                    draft.add_item(item, rng.randint(1, 3))
+                totals.sales += 1
+            order = register.queue.place_order(register.draft_orders, draft, 1)
+            placed[draft.key] = (register.register_id, draft, order)
+            if order.order_reference is None and order.order_id != 0:
+                receipts.append(order)
+            if step % args.sync_every == 0:
+                sync_all(registers, totals, conflicts)
+
+        totals.queued = sum(register.queue.count() for register in registers)
+        for register in registers:
+            register.conn.down = False
+            register.conn.statement_failure_rate = 0.0
+            register.conn.lost_commit_rate = 0.0
+        sync_all(registers, totals, conflicts)
+        left = sum(register.queue.count() for register in registers)
+        if left > 0:
+            raise AssertionError(f"{left} orders still queued after the outages")
+        check_store(path, placed, conflicts)
+
+        print(
+            f"{totals.sales} sales and {totals.returns} returns on"
+            + f" {args.registers} registers over {args.steps} steps"
+        )
+        print(f"{'register':<10}{'outages':>9}{'failures':>10}{'lost':>6}")
+        for register in registers:
+            print(
+                f"{register.register_id:<10}{register.outages:>9}"
+                + f"{register.conn.failures:>10}{register.conn.lost_commits:>6}"
+            )
+            register.queue.close()
+            register.conn.close()
+        print(
+            f"{totals.queued} orders queued at the end, {totals.duplicates}"
+            + f" replays already in the store, {len(conflicts)} conflicting"
+            + f" returns, {totals.refused_returns} returns not found"
+        )
+        print("Store matches every register's sales")
+
+
+if __name__ == "__main__":
+    main()
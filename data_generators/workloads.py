@@ -0,0 +1,471 @@
+"""Named workload profiles for generating realistic store traffic"""
+import bisect
+import csv
+from dataclasses import dataclass, field
+import datetime
+import itertools
+import random
+from typing import Callable, Iterator
+
+item_quantities = [1, 2, 3]
+quantity_probabilities = [30, 10, 1]
+
+payment_types = ["Cash", "Debit", "Credit"]
+
+categories = [
+    "Drinks",
+    "Snacks",
+    "Produce",
+    "Bakery",
+    "Cosmetics",
+    "Gadgets",
+    "Fruit",
+]
+
+users = ["owner", "cashier", "cashier2", "cashier3", "cashier4"]
+
+# Relative number of orders started in each hour of the day. The store opens at
+# 7am, has a lunch rush, a larger after-work peak and closes at 10pm.
+DIURNAL_WEIGHTS = (
+    0, 0, 0, 0, 0, 0, 0, 2,
+    4, 5, 6, 8, 11, 10, 7, 6,
+    8, 12, 13, 10, 7, 5, 3, 0,
+)  # fmt: skip
+
+# Doorbuster hours: early opening, heavy morning and a long flat afternoon
+DOORBUSTER_WEIGHTS = (
+    0, 0, 0, 0, 0, 6, 14, 16,
+    15, 12, 10, 10, 11, 10, 9, 9,
+    10, 11, 11, 9, 7, 5, 3, 1,
+)  # fmt: skip
+
+# Relative traffic for each day of the week, Monday first
+WEEKDAY_WEIGHTS = (0.85, 0.8, 0.85, 0.95, 1.2, 1.45, 0.9)
+
+
+@dataclass(frozen=True)
+class WorkloadProfile:
+    """Describes the shape of the traffic generated for a store"""
+
+    name: str
+    start_day: datetime.date
+    end_day: datetime.date
+    orders_per_day: int
+    items_per_category: int
+    zipf_exponent: float
+    return_rate: float
+    count_every_days: int
+    items_per_order: tuple[int, int] = (1, 7)
+    hourly_weights: tuple[int, ...] = DIURNAL_WEIGHTS
+    weekday_weights: tuple[float, ...] = WEEKDAY_WEIGHTS
+    special_days: dict[datetime.date, float] = field(default_factory=dict)
+
+    def day_multiplier(self, day: datetime.date) -> float:
+        """Gets the traffic multiplier for a day relative to orders_per_day
+
+        Args:
+            day (datetime.date): day to get the multiplier for
+
+        Returns:
+            float: multiplier from the weekday curve and any special day
+        """
+        mean_weight = sum(self.weekday_weights) / len(self.weekday_weights)
+        weekday = self.weekday_weights[day.weekday()] / mean_weight
+        return weekday * self.special_days.get(day, 1.0)
+
+
+PROFILES = {
+    "small": WorkloadProfile(
+        name="small",
+        start_day=datetime.date(2023, 11, 1),
+        end_day=datetime.date(2023, 12, 1),
+        orders_per_day=60,
+        items_per_category=20,
+        zipf_exponent=1.0,
+        return_rate=0.01,
+        count_every_days=7,
+    ),
+    "medium": WorkloadProfile(
+        name="medium",
+        start_day=datetime.date(2023, 7, 1),
+        end_day=datetime.date(2023, 12, 6),
+        orders_per_day=150,
+        items_per_category=54,
+        zipf_exponent=1.1,
+        return_rate=0.02,
+        count_every_days=7,
+    ),
+    "large": WorkloadProfile(
+        name="large",
+        start_day=datetime.date(2022, 1, 1),
+        end_day=datetime.date(2024, 1, 1),
+        orders_per_day=600,
+        items_per_category=300,
+        zipf_exponent=1.2,
+        return_rate=0.025,
+        count_every_days=7,
+        items_per_order=(1, 12),
+    ),
+    "black-friday": WorkloadProfile(
+        name="black-friday",
+        start_day=datetime.date(2023, 11, 20),
+        end_day=datetime.date(2023, 11, 28),
+        orders_per_day=1500,
+        items_per_category=100,
+        zipf_exponent=1.4,
+        return_rate=0.04,
+        count_every_days=1,
+        items_per_order=(1, 9),
+        hourly_weights=DOORBUSTER_WEIGHTS,
+        special_days={
+            datetime.date(2023, 11, 24): 4.0,
+            datetime.date(2023, 11, 25): 2.5,
+            datetime.date(2023, 11, 26): 1.8,
+            datetime.date(2023, 11, 27): 2.2,
+        },
+    ),
+}
+
+
+@dataclass
+class Dataset:
+    """Rows generated for every seeded table, in insertion order"""
+
+    payment_types: list[tuple] = field(default_factory=list)
+    users: list[tuple] = field(default_factory=list)
+    categories: list[tuple] = field(default_factory=list)
+    items: list[tuple] = field(default_factory=list)
+    customers: list[tuple] = field(default_factory=list)
+    orders: list[tuple] = field(default_factory=list)
+    order_items: list[tuple] = field(default_factory=list)
+    inventory_counts: list[tuple] = field(default_factory=list)
+    inventory_count_items: list[tuple] = field(default_factory=list)
+    stock_adjustments: list[tuple] = field(default_factory=list)
+    stock_adjustment_items: list[tuple] = field(default_factory=list)
+
+    def tables(self) -> Iterator[tuple[str, tuple[str, ...], list[tuple]]]:
+        """Iterates through the generated tables
+
+        Yields:
+            tuple[str, tuple[str, ...], list[tuple]]: table name, columns and rows
+        """
+        for table, columns in TABLE_COLUMNS.items():
+            yield table, columns, getattr(self, table)
+
+
+TABLE_COLUMNS = {
+    "payment_types": ("id", "payment_type"),
+    "users": ("id", "username", "user_hash", "is_manager"),
+    "categories": ("id", "category"),
+    "items": ("id", "name", "price", "gst", "pst", "category_id"),
+    "customers": ("id", "customer_name", "phone_number", "email"),
+    "orders": (
+        "id",
+        "customer_id",
+        "user_id",
+        "payment_type",
+        "order_reference",
+        "timestamp",
+    ),
+    "order_items": ("order_id", "item_id", "quantity"),
+    "inventory_counts": ("id", "ts"),
+    "inventory_count_items": ("count_id", "item_id", "quantity"),
+    "stock_adjustments": ("id", "reason", "ts"),
+    "stock_adjustment_items": ("adjustment_id", "item_id", "quantity"),
+}
+
+
+def date_range(start_date: datetime.date, end_date: datetime.date):
+    """Iterates through range of days
+
+    Args:
+        start_date (datetime.date): Start day of range, inclusive
+        end_date (datetime.date): End day of the range, exclusive
+
+    Yields:
+        datetime.date: Each day within the range
+    """
+    num_days = (end_date - start_date).days
+    for n in range(num_days):
+        yield start_date + datetime.timedelta(n)
+
+
+def load_customers(path: str = "test_data/Customers.csv") -> list[dict[str, str]]:
+    """Loads the customer pool used for generated orders
+
+    Args:
+        path (str, optional): path to csv file. Defaults to "test_data/Customers.csv".
+
+    Returns:
+        list[dict[str, str]]: customers with name, email and phone_number keys
+    """
+    with open(path, encoding="utf8") as customer_csv:
+        return list(csv.DictReader(customer_csv))
+
+
+def zipf_cumulative_weights(
+    num_items: int, exponent: float, rng: random.Random
+) -> tuple[list[int], list[float]]:
+    """Assigns each item a random popularity rank following Zipf's law
+
+    Args:
+        num_items (int): number of items in the catalog
+        exponent (float): skew of the distribution, 0 is uniform
+        rng (random.Random): random source
+
+    Returns:
+        tuple[list[int], list[float]]: item ids by rank and cumulative weights
+    """
+    ranked_ids = list(range(1, num_items + 1))
+    rng.shuffle(ranked_ids)
+    weights = [1 / (rank**exponent) for rank in range(1, num_items + 1)]
+    return ranked_ids, list(itertools.accumulate(weights))
+
+
+def count_timestamps(profile: WorkloadProfile) -> list[datetime.datetime]:
+    """Lists when the inventory is counted during a profile
+
+    Weekly or longer cadences count on Sundays, shorter ones start right away.
+
+    Args:
+        profile (WorkloadProfile): shape of the generated traffic
+
+    Returns:
+        list[datetime.datetime]: midnight of every day with a count
+    """
+    first_count = profile.start_day
+    if profile.count_every_days >= 7:
+        first_count += datetime.timedelta(days=(6 - first_count.weekday()) % 7)
+    return [
+        datetime.datetime.combine(d, datetime.time())
+        for d in date_range(profile.start_day, profile.end_day)
+        if (d - first_count).days >= 0
+        and (d - first_count).days % profile.count_every_days == 0
+    ]
+
+
+def generate_return(
+    profile: WorkloadProfile, rng: random.Random, sale: tuple
+) -> tuple | None:
+    """Draws a partial return of a sale within two weeks of it
+
+    Args:
+        profile (WorkloadProfile): shape of the generated traffic
+        rng (random.Random): random source
+        sale (tuple): timestamp, customer id and basket of the sale
+
+    Returns:
+        tuple | None: the return transaction, None if it would fall before
+            the sale or after the profile ends
+    """
+    timestamp, customer_id, basket, _ = sale
+    return_day = timestamp.date() + datetime.timedelta(days=rng.randint(0, 14))
+    return_hour = rng.choices(range(24), profile.hourly_weights)[0]
+    return_ts = datetime.datetime.combine(
+        return_day,
+        datetime.time(return_hour, rng.randint(0, 59), rng.randint(0, 59)),
+    )
+    if timestamp >= return_ts or return_day >= profile.end_day:
+        return None
+    returned = rng.sample(basket, k=rng.randint(1, len(basket)))
+    return (
+        return_ts,
+        customer_id,
+        [(item_id, -quantity) for item_id, quantity in returned],
+        sale,
+    )
+
+
+def generate_transactions(
+    profile: WorkloadProfile,
+    rng: random.Random,
+    num_customers: int,
+    num_items: int,
+) -> tuple[list[tuple], dict[int, int]]:
+    """Draws every sale and return of a profile
+
+    Args:
+        profile (WorkloadProfile): shape of the generated traffic
+        rng (random.Random): random source
+        num_customers (int): size of the customer pool
+        num_items (int): size of the catalog
+
+    Returns:
+        tuple[list[tuple], dict[int, int]]: (timestamp, customer_id, basket,
+            original sale) for every transaction in time order, and the
+            database id of each customer of the pool that was used
+    """
+    ranked_ids, cum_weights = zipf_cumulative_weights(
+        num_items, profile.zipf_exponent, rng
+    )
+
+    def choose_basket() -> list[tuple[int, int]]:
+        num_items = rng.randint(*profile.items_per_order)
+        basket: set[int] = set()
+        while len(basket) < min(num_items, len(ranked_ids)):
+            rank = bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+            basket.add(ranked_ids[min(rank, len(ranked_ids) - 1)])
+        return [
+            (item_id, rng.choices(item_quantities, quantity_probabilities)[0])
+            for item_id in sorted(basket)
+        ]
+
+    # Customers get database ids in the order they are first used
+    customer_ids: dict[int, int] = {}
+    transactions: list[tuple] = []
+    for d in date_range(profile.start_day, profile.end_day):
+        num_orders = round(
+            profile.orders_per_day * profile.day_multiplier(d) * rng.uniform(0.9, 1.1)
+        )
+        for hour in rng.choices(range(24), profile.hourly_weights, k=num_orders):
+            customer_id = customer_ids.setdefault(
+                rng.randrange(num_customers), len(customer_ids) + 1
+            )
+            sale = (
+                datetime.datetime.combine(
+                    d, datetime.time(hour, rng.randint(0, 59), rng.randint(0, 59))
+                ),
+                customer_id,
+                choose_basket(),
+                None,
+            )
+            transactions.append(sale)
+
+            # Some sales are partially returned within two weeks
+            if rng.random() < profile.return_rate:
+                returned = generate_return(profile, rng, sale)
+                if returned is not None:
+                    transactions.append(returned)
+    transactions.sort(key=lambda transaction: transaction[0])
+    return transactions, customer_ids
+
+
+def add_orders(dataset: Dataset, transactions: list[tuple], rng: random.Random):
+    """Numbers transactions as orders with a cashier and payment type
+
+    Args:
+        dataset (Dataset): dataset with users and payment types
+        transactions (list[tuple]): transactions in time order
+        rng (random.Random): random source
+    """
+    cashier_ids = [user[0] for user in dataset.users]
+    payment_type_ids = [payment_type[0] for payment_type in dataset.payment_types]
+    order_ids: dict[int, int] = {}
+    for order_id, transaction in enumerate(transactions, start=1):
+        timestamp, customer_id, basket, original = transaction
+        order_ids[id(transaction)] = order_id
+        order_reference = None if original is None else order_ids[id(original)]
+        dataset.orders.append(
+            (
+                order_id,
+                customer_id,
+                rng.choice(cashier_ids),
+                rng.choice(payment_type_ids),
+                order_reference,
+                str(timestamp),
+            )
+        )
+        for item_id, quantity in basket:
+            dataset.order_items.append((order_id, item_id, quantity))
+
+
+def add_customers(
+    dataset: Dataset, customer_pool: list[dict[str, str]], customer_ids: dict[int, int]
+):
+    """Adds the customers of the pool that placed orders, by database id
+
+    Args:
+        dataset (Dataset): dataset to add the customers to
+        customer_pool (list[dict[str, str]]): customers drawn from
+        customer_ids (dict[int, int]): database id of each customer used
+    """
+    for customer_index, customer_id in customer_ids.items():
+        customer = customer_pool[customer_index]
+        dataset.customers.append(
+            (
+                customer_id,
+                customer["name"],
+                customer["phone_number"],
+                customer["email"],
+            )
+        )
+    dataset.customers.sort()
+
+
+def add_counts(
+    dataset: Dataset, timestamps: list[datetime.datetime], rng: random.Random
+):
+    """Adds inventory counts of the catalog, each followed by adjustments
+
+    Args:
+        dataset (Dataset): dataset with items
+        timestamps (list[datetime.datetime]): when the counts are taken
+        rng (random.Random): random source
+    """
+    item_ids = [item[0] for item in dataset.items]
+    for count_id, ts in enumerate(timestamps, start=1):
+        dataset.inventory_counts.append((count_id, str(ts)))
+        for item_id in item_ids:
+            dataset.inventory_count_items.append((count_id, item_id, rng.randint(1, 10)))
+
+        # Stock adjustments follow each count and touch a tenth of the catalog
+        adjustment_ts = ts + datetime.timedelta(hours=1)
+        dataset.stock_adjustments.append(
+            (count_id, f"Reason {count_id}", str(adjustment_ts))
+        )
+        for item_id in sorted(rng.sample(item_ids, k=max(1, len(item_ids) // 10))):
+            dataset.stock_adjustment_items.append((count_id, item_id, rng.randint(-5, 5)))
+
+
+def generate_dataset(
+    profile: WorkloadProfile,
+    seed: str = "Team23",
+    customer_pool: list[dict[str, str]] | None = None,
+    hash_password: Callable[[str], str] = lambda password: password,
+) -> Dataset:
+    """Generates every seeded table for a workload profile
+
+    The same profile and seed always produce the same dataset.
+
+    Args:
+        profile (WorkloadProfile): shape of the generated traffic
+        seed (str, optional): seed for the random source. Defaults to "Team23".
+        customer_pool (list[dict[str, str]] | None, optional): customers to draw
+            from. Defaults to the customers in test_data/Customers.csv.
+        hash_password (Callable[[str], str], optional): hashes user passwords.
+            Defaults to storing the password unchanged.
+
+    Returns:
+        Dataset: generated rows
+    """
+    rng = random.Random(f"{seed}:{profile.name}")
+    if customer_pool is None:
+        customer_pool = load_customers()
+    dataset = Dataset()
+
+    dataset.payment_types = [
+        (i + 1, payment_type) for i, payment_type in enumerate(payment_types)
+    ]
+    dataset.users = [
+        (i + 1, user, hash_password(user), 1 if user == "owner" else 0)
+        for i, user in enumerate(users)
+    ]
+    dataset.categories = [
+        (index + 1, category) for index, category in enumerate(categories)
+    ]
+    for item_id, ((category_index, category), b) in enumerate(
+        itertools.product(enumerate(categories), range(profile.items_per_category)),
+        start=1,
+    ):
+        taxed = 0 if category in ("Produce", "Fruit") else 1
+        dataset.items.append(
+            (item_id, f"{category} {b}", b / 2 + 0.49, taxed, taxed, category_index + 1)
+        )
+
+    transactions, customer_ids = generate_transactions(
+        profile, rng, len(customer_pool), len(dataset.items)
+    )
+    add_orders(dataset, transactions, rng)
+    add_customers(dataset, customer_pool, customer_ids)
+    add_counts(dataset, count_timestamps(profile), rng)
+    return dataset
@@ -1,8 +1,9 @@
 from tkinter import Tk, Toplevel
-from tkinter.ttk import Treeview
+from tkinter.ttk import Combobox, Treeview
 from tkinter import *
 
 from app import App
+from inventory_table import InventoryTable
 from inventory_count_screen import InventoryCountScreen
 from inventory_adjustment_screen import InventoryAdjustmentScreen
 
@@ -14,12 +15,13 @@ class InventoryView(Toplevel):
         super().__init__(*args, **kwargs)
         self.app = app
         self.parent = parent
-        self.geometry("1000x600")
+        self.geometry("1400x600")
         self.title("Inventory Management")
         self.columnconfigure(0, weight=1)
         self.rowconfigure(1, weight=2)
 
-        self.report = self.app.inventory_system.get_inventory_details()
+        # Rows are sorted and filtered in the model, only changed rows are redrawn
+        self.table = InventoryTable()
 
         button_frame = Frame(self)
 
@@ -30,6 +32,24 @@ class InventoryView(Toplevel):
             button_frame, text="Create Adjustment", command=self.open_adjustment_screen
         ).grid(row=0, column=1)
 
+        self.categories = {"All Categories": None}
+        for category_id, category_name in self.app.get_categories().items():
+            self.categories[category_name] = category_id
+        Label(button_frame, text="Category").grid(row=0, column=2)
+        self.category = StringVar(value="All Categories")
+        category_box = Combobox(
+            button_frame,
+            textvariable=self.category,
+            values=list(self.categories),
+            state="readonly",
+        )
+        category_box.grid(row=0, column=3)
+        category_box.bind("<<ComboboxSelected>>", self.filter_tree)
+        Label(button_frame, text="Name").grid(row=0, column=4)
+        self.name_filter = StringVar()
+        self.name_filter.trace_add("write", self.filter_tree)
+        Entry(button_frame, textvariable=self.name_filter).grid(row=0, column=5)
+
         button_frame.grid(row=0, column=0)
 
         self.headings = (
@@ -39,11 +59,17 @@ class InventoryView(Toplevel):
             "Total Sold",
             "Theoretical Quantity",
             "Actual Quantity",
-            "Difference"
+            "Difference",
+            "Sold Per Day",
+            "Days of Cover",
+            "Reorder Point",
+            "Suggested Order",
         )
         self.item_list = Treeview(self, columns=self.headings, selectmode="browse")
 
-        self.item_list.heading("#0", text="Item Name")
+        self.item_list.heading(
+            "#0", text="Item Name", command=lambda: self.sort_tree("Item Name")
+        )
         self.item_list.heading(
             0, text="ID", command=lambda: self.sort_tree("ID")
         )
@@ -65,6 +91,18 @@ class InventoryView(Toplevel):
         self.item_list.heading(
             6, text="Difference", command=lambda: self.sort_tree("Difference"),
         )
+        self.item_list.heading(
+            7, text="Sold Per Day", command=lambda: self.sort_tree("Sold Per Day"),
+        )
+        self.item_list.heading(
+            8, text="Days of Cover", command=lambda: self.sort_tree("Days of Cover"),
+        )
+        self.item_list.heading(
+            9, text="Reorder Point", command=lambda: self.sort_tree("Reorder Point"),
+        )
+        self.item_list.heading(
+            10, text="Suggested Order", command=lambda: self.sort_tree("Suggested Order"),
+        )
 
         self.item_list.column("#0", width=100)
         self.item_list.column(0, width=75)
@@ -74,21 +112,18 @@ class InventoryView(Toplevel):
         self.item_list.column(4, width=75)
         self.item_list.column(5, width=75)
         self.item_list.column(6, width=75)
-
-        # self.insert_data()
+        self.item_list.column(7, width=75)
+        self.item_list.column(8, width=75)
+        self.item_list.column(9, width=75)
+        self.item_list.column(10, width=75)
+
+        # Headings show an arrow on the column sorted by first
+        self.heading_text = {
+            column: self.item_list.heading(column, "text")
+            for column in ("#0", *self.headings)
+        }
 
         self.item_list.grid(row=1, column=0, sticky="nesw")
-        # create a dicitonary to store order for each colunmn
-        self.sort_order = {
-            "ID": None,
-            "Item Name": None,
-            "Sold Today": None,
-            "Sold This Month": None,
-            "Actual Quantity": None,
-            "Theoretical Quantity": None,
-            "Total Sold": None,
-            "Difference": None
-        }
 
         self.insert_data()
 
@@ -96,56 +131,63 @@ class InventoryView(Toplevel):
 
     def insert_data(self):
         "Inserts data into the window in tabular form"
-        report = self.app.inventory_system.get_inventory_details()
-        counts = self.app.inventory_system.list_inventory_counts()
-        counts = self.app.inventory_system.get_count_details(counts[-1].count_id)
-
-        
-        self.item_list.delete(*self.item_list.get_children())
-        for i, item in enumerate(report, start=0):
-            theoretical_inventory = counts[i].previous_quantity - item.quantity_sold +item.adjustment_quantity
-            actual_inventory = item.count_quantity - item.quantity_sold + item.adjustment_quantity
-            self.item_list.insert(
-                "",
-                "end",
-                text=item.name,
-                values=(
-                    item.item_id,
-                    item.day_quantity,
-                    item.month_quantity,
-                    item.quantity_sold,
-                    theoretical_inventory,
-                    actual_inventory,
-                    theoretical_inventory - actual_inventory,
+        # Stock, the last two counts and sales in one query
+        report = self.app.inventory_system.get_inventory_snapshot()
+
+        # Only days closed since the window was last opened are read
+        self.app.forecast_system.refresh()
+        suggestions = self.app.forecast_system.get_reorder_suggestions(
+            {
+                item.item_id: item.count_quantity
+                - item.quantity_sold
+                + item.adjustment_quantity
+                for item in report
+            }
+        )
+
+        changed, removed = self.table.load(report, suggestions)
+        self.render(changed, removed)
+
+    def render(self, changed=(), removed=()):
+        """Redraws changed rows, then shows the model's rows in its order
+
+        Args:
+            changed (Iterable[int], optional): ids of rows added or changed.
+                Defaults to ().
+            removed (Iterable[int], optional): ids of rows removed.
+                Defaults to ().
+        """
+        for item_id in removed:
+            self.item_list.delete(str(item_id))
+        for item_id in changed:
+            row = self.table.rows[item_id]
+            if self.item_list.exists(str(item_id)):
+                self.item_list.item(str(item_id), text=row.name, values=row.values())
+            else:
+                self.item_list.insert(
+                    "", "end", iid=str(item_id), text=row.name, values=row.values()
                 )
-            )
-            
+        # One call reorders the rows shown and detaches the rows filtered out
+        shown = [str(item_id) for item_id in self.table.view()]
+        if tuple(shown) != self.item_list.get_children():
+            self.item_list.set_children("", *shown)
 
     def sort_tree(self, column):
         """Sort item in descending and ascending order"""
-
-        # Get data and toggle sorting order
-        data = [
-            (self.item_list.set(child, column), child)
-            for child in self.item_list.get_children("")
-        ]
-
-        if self.sort_order[column] is None or self.sort_order[column] == "asc":
-            data.sort(key=lambda x: (self.sort_key(x[0]), x[0]), reverse=True)
-            self.sort_order[column] = "desc"
-        else:
-            data.sort(key=lambda x: (self.sort_key(x[0]), x[0]))
-            self.sort_order[column] = "asc"
-
-        for index, item in enumerate(data):
-            self.item_list.move(item[1], "", index)
-
-    def sort_key(self, value):
-        """Check the value is integer or not"""
-        try:
-            return int(value)
-        except ValueError:
-            return value
+        descending = self.table.sort_by(column)
+        for heading, text in self.heading_text.items():
+            self.item_list.heading(heading, text=text)
+        heading = "#0" if column == "Item Name" else column
+        arrow = "▼" if descending else "▲"
+        self.item_list.heading(heading, text=f"{self.heading_text[heading]} {arrow}")
+        self.render()
+
+    def filter_tree(self, *_args):
+        """Shows only the items of the chosen category with the name typed"""
+        self.table.set_filter(
+            self.categories[self.category.get()], self.name_filter.get()
+        )
+        self.render()
 
     def open_count_screen(self):
         "Opens the inventory count screen"
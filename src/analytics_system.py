@@ -0,0 +1,615 @@
+"""Approximate reports over long date ranges, merged from per-day sketches
+
+The paid orders of each closed day are summarized once into sketches of the
+distinct customers, basket values and basket sizes, overall and for each
+cashier. Once a month has ended its daily sketches are also merged into a
+monthly rollup. Reports over any range merge the rollups of its whole months
+and the sketches of its remaining days instead of reading its orders, and
+state the error of their estimates.
+
+Usage:
+    python ./src/analytics_system.py retail.db
+"""
+import argparse
+from dataclasses import dataclass
+import datetime
+import sqlite3
+from typing import Any, Iterable, Optional
+
+from partitions import Partitions, next_month
+from sketches import HyperLogLog, QuantileSketch
+
+# Precision of the distinct customer sketches, 1.6% standard error
+HLL_PRECISION = 12
+
+# Largest relative error of basket value and size quantiles
+QUANTILE_ACCURACY = 0.01
+
+
+@dataclass(slots=True)
+class SalesSketch:
+    """Sketches of the paid orders over a period"""
+
+    num_orders: int
+    customers: HyperLogLog
+    basket_values: QuantileSketch
+    basket_items: QuantileSketch
+
+    @staticmethod
+    def empty() -> "SalesSketch":
+        """Creates sketches without any orders
+
+        Returns:
+            SalesSketch: empty sketches
+        """
+        return SalesSketch(
+            0,
+            HyperLogLog(HLL_PRECISION),
+            QuantileSketch(QUANTILE_ACCURACY),
+            QuantileSketch(QUANTILE_ACCURACY),
+        )
+
+    @staticmethod
+    def from_row(row: Any) -> "SalesSketch":
+        """Converts a sqlite row to a SalesSketch
+
+        Args:
+            row (Any): Row from the database
+
+        Returns:
+            SalesSketch: sketches of a day
+        """
+        num_orders, customers, basket_values, basket_items = row
+        return SalesSketch(
+            num_orders,
+            HyperLogLog.from_bytes(customers),
+            QuantileSketch.from_bytes(basket_values),
+            QuantileSketch.from_bytes(basket_items),
+        )
+
+    def to_row(self) -> tuple[int, bytes, bytes, bytes]:
+        """Converts the sketches to the columns they are stored in
+
+        Returns:
+            tuple[int, bytes, bytes, bytes]: num_orders, customers,
+                basket_values and basket_items
+        """
+        return (
+            self.num_orders,
+            self.customers.to_bytes(),
+            self.basket_values.to_bytes(),
+            self.basket_items.to_bytes(),
+        )
+
+    def add_order(self, customer_id: Optional[int], subtotal: float, num_items: int):
+        """Adds a paid order to the sketches
+
+        Args:
+            customer_id (Optional[int]): customer of the order, orders without
+                a customer are not counted as customers
+            subtotal (float): value of the basket before taxes
+            num_items (int): number of items in the basket
+        """
+        self.num_orders += 1
+        if customer_id is not None:
+            self.customers.add(customer_id)
+        self.basket_values.add(subtotal)
+        self.basket_items.add(num_items)
+
+    def merge(self, others: Iterable["SalesSketch"]):
+        """Adds the orders of other sketches to these
+
+        Args:
+            others (Iterable[SalesSketch]): sketches to add
+        """
+        others = list(others)
+        self.num_orders += sum(other.num_orders for other in others)
+        self.customers.merge(*(other.customers for other in others))
+        self.basket_values.merge(*(other.basket_values for other in others))
+        self.basket_items.merge(*(other.basket_items for other in others))
+
+
+@dataclass(slots=True)
+class ApproximateSales:
+    """Represents estimated sales statistics over a period"""
+
+    start: str
+    end: str
+    user_id: Optional[int]
+    username: Optional[str]
+    num_orders: int
+    distinct_customers: float
+    mean_basket_value: Optional[float]
+    median_basket_value: Optional[float]
+    p90_basket_value: Optional[float]
+    median_basket_items: Optional[float]
+    p90_basket_items: Optional[float]
+    customers_error: float
+    quantile_error: float
+
+    @staticmethod
+    def from_sketch(
+        start: str,
+        end: str,
+        sketch: SalesSketch,
+        user_id: Optional[int] = None,
+        username: Optional[str] = None,
+    ) -> "ApproximateSales":
+        """Estimates statistics from the sketches of a period
+
+        Args:
+            start (str): first day of the period
+            end (str): last day of the period
+            sketch (SalesSketch): sketches of the period
+            user_id (Optional[int], optional): cashier the sketches are for.
+                Defaults to None.
+            username (Optional[str], optional): name of the cashier.
+                Defaults to None.
+
+        Returns:
+            ApproximateSales: estimated statistics
+        """
+        return ApproximateSales(
+            start,
+            end,
+            user_id,
+            username,
+            sketch.num_orders,
+            sketch.customers.estimate(),
+            sketch.basket_values.mean(),
+            sketch.basket_values.quantile(0.5),
+            sketch.basket_values.quantile(0.9),
+            sketch.basket_items.quantile(0.5),
+            sketch.basket_items.quantile(0.9),
+            sketch.customers.relative_error,
+            sketch.basket_values.relative_accuracy,
+        )
+
+
+class AnalyticsSystem:
+    """Analytics System Class"""
+
+    def __init__(
+        self, conn: sqlite3.Connection, partitions: Optional[Partitions] = None
+    ) -> None:
+        self.conn = conn
+        self.partitions = partitions
+
+    def build_day(self, day: datetime.date | str) -> int:
+        """Builds the sketches of a day, replacing any built before
+
+        Args:
+            day (datetime.date | str): day to summarize
+
+        Returns:
+            int: number of paid orders in the day
+        """
+        day = str(day)
+        schemas = ["main"]
+        if self.partitions is not None:
+            schemas.extend(
+                self.partitions.attach(partition)
+                for partition in self.partitions.overlapping(day, day)
+            )
+        total = SalesSketch.empty()
+        cashiers: dict[int, SalesSketch] = {}
+        for schema in schemas:
+            cur = self.conn.execute(
+                f"""
+SELECT
+    user_id,
+    customer_id,
+    subtotal,
+    num_items
+FROM
+    {schema}.order_summary
+WHERE
+    DATE(TIMESTAMP) = ?;
+""",
+                (day,),
+            )
+            for user_id, customer_id, subtotal, num_items in cur:
+                total.add_order(customer_id, subtotal, num_items)
+                if user_id not in cashiers:
+                    cashiers[user_id] = SalesSketch.empty()
+                cashiers[user_id].add_order(customer_id, subtotal, num_items)
+
+        self.conn.execute("DELETE FROM daily_sketches WHERE day = ?;", (day,))
+        self.conn.execute("DELETE FROM daily_cashier_sketches WHERE day = ?;", (day,))
+        # The month's rollup is rebuilt from its days by build_closed_days
+        self.conn.execute("DELETE FROM monthly_sketches WHERE month = ?;", (day[:7],))
+        self.conn.execute(
+            "DELETE FROM monthly_cashier_sketches WHERE month = ?;", (day[:7],)
+        )
+        if total.num_orders > 0:
+            self.conn.execute(
+                """
+INSERT INTO
+    daily_sketches(day, num_orders, customers, basket_values, basket_items)
+VALUES
+    (?, ?, ?, ?, ?);
+""",
+                (day, *total.to_row()),
+            )
+            self.conn.executemany(
+                """
+INSERT INTO
+    daily_cashier_sketches(
+        day,
+        user_id,
+        num_orders,
+        customers,
+        basket_values,
+        basket_items
+    )
+VALUES
+    (?, ?, ?, ?, ?, ?);
+""",
+                [
+                    (day, user_id, *sketch.to_row())
+                    for user_id, sketch in cashiers.items()
+                ],
+            )
+        self.conn.commit()
+        return total.num_orders
+
+    def build_closed_days(self, today: Optional[datetime.date] = None) -> list[str]:
+        """Builds the sketches of every day before today that has none
+
+        Months that have ended are then rolled up.
+
+        Args:
+            today (Optional[datetime.date], optional): current date, its
+                orders are not summarized yet. Defaults to today.
+
+        Returns:
+            list[str]: days that were built
+        """
+        today = today or datetime.date.today()
+        schemas = ["main"]
+        if self.partitions is not None:
+            schemas.extend(
+                self.partitions.attach(partition)
+                for partition in self.partitions.list_partitions()
+            )
+        days: set[str] = set()
+        for schema in schemas:
+            cur = self.conn.execute(
+                f"""
+SELECT DISTINCT
+    DATE(TIMESTAMP)
+FROM
+    {schema}.orders
+WHERE
+    payment_type IS NOT NULL
+    AND DATE(TIMESTAMP) < ?
+    AND DATE(TIMESTAMP) NOT IN (
+        SELECT
+            day
+        FROM
+            main.daily_sketches
+    );
+""",
+                (str(today),),
+            )
+            days.update(row[0] for row in cur)
+        for day in sorted(days):
+            self.build_day(day)
+        self.build_ended_months(today)
+        return sorted(days)
+
+    def build_ended_months(self, today: Optional[datetime.date] = None) -> list[str]:
+        """Merges the daily sketches of ended months without a rollup
+
+        Args:
+            today (Optional[datetime.date], optional): current date, its month
+                is not rolled up yet. Defaults to today.
+
+        Returns:
+            list[str]: months that were rolled up
+        """
+        today = today or datetime.date.today()
+        months = [
+            row[0]
+            for row in self.conn.execute(
+                """
+SELECT DISTINCT
+    SUBSTR(day, 1, 7) AS month
+FROM
+    daily_sketches
+WHERE
+    day < ?
+    AND month NOT IN (
+        SELECT
+            month
+        FROM
+            monthly_sketches
+    )
+ORDER BY
+    month;
+""",
+                (str(today.replace(day=1)),),
+            )
+        ]
+        for month in months:
+            days = (f"{month}-01", f"{month}-31")
+            total = SalesSketch.empty()
+            total.merge(
+                SalesSketch.from_row(row[1:])
+                for row in self._read_sketches("daily_sketches", *days)
+            )
+            cashiers: dict[int, list[SalesSketch]] = {}
+            daily = self._read_sketches("daily_cashier_sketches", *days)
+            for user_id, *sketch in daily:
+                cashiers.setdefault(user_id, []).append(SalesSketch.from_row(sketch))
+            self.conn.execute(
+                """
+INSERT INTO
+    monthly_sketches(month, num_orders, customers, basket_values, basket_items)
+VALUES
+    (?, ?, ?, ?, ?);
+""",
+                (month, *total.to_row()),
+            )
+            for user_id, sketches in cashiers.items():
+                sketch = SalesSketch.empty()
+                sketch.merge(sketches)
+                self.conn.execute(
+                    """
+INSERT INTO
+    monthly_cashier_sketches(
+        month,
+        user_id,
+        num_orders,
+        customers,
+        basket_values,
+        basket_items
+    )
+VALUES
+    (?, ?, ?, ?, ?, ?);
+""",
+                    (month, user_id, *sketch.to_row()),
+                )
+            self.conn.commit()
+        return months
+
+    def _read_sketches(
+        self,
+        table: str,
+        start: str,
+        end: str,
+        user_id: Optional[int] = None,
+    ) -> sqlite3.Cursor:
+        """[Internal] Reads the daily sketches in a date range
+
+        Args:
+            table (str): daily_sketches or daily_cashier_sketches
+            start (str): start of date range(inclusive)
+            end (str): end of date range(inclusive)
+            user_id (Optional[int], optional): cashier to read. Defaults to None.
+
+        Returns:
+            sqlite3.Cursor: rows of user_id, num_orders and the sketch columns
+        """
+        user = "user_id" if table == "daily_cashier_sketches" else "NULL"
+        condition = "" if user_id is None else "AND user_id = ?"
+        return self.conn.execute(
+            f"""
+SELECT
+    {user} AS user_id,
+    num_orders,
+    customers,
+    basket_values,
+    basket_items
+FROM
+    {table}
+WHERE
+    day BETWEEN ? AND ? {condition};
+""",
+            (start, end) if user_id is None else (start, end, user_id),
+        )
+
+    def _read_range(
+        self,
+        cashiers: bool,
+        start: datetime.date | str,
+        end: datetime.date | str,
+        user_id: Optional[int] = None,
+    ) -> sqlite3.Cursor:
+        """[Internal] Reads the sketches covering a date range
+
+        Whole months with a rollup are read from it, other days from their
+        daily sketches.
+
+        Args:
+            cashiers (bool): whether sketches of each cashier are read
+            start (datetime.date | str): start of date range(inclusive)
+            end (datetime.date | str): end of date range(inclusive)
+            user_id (Optional[int], optional): cashier to read. Defaults to None.
+
+        Returns:
+            sqlite3.Cursor: rows of user_id, num_orders and the sketch columns
+        """
+        start = datetime.date.fromisoformat(str(start))
+        end = datetime.date.fromisoformat(str(end))
+        first_month = (start if start.day == 1 else next_month(start)).strftime("%Y-%m")
+        if end + datetime.timedelta(days=1) == next_month(end):
+            last_month = end.strftime("%Y-%m")
+        else:
+            last_month = (end.replace(day=1) - datetime.timedelta(days=1)).strftime(
+                "%Y-%m"
+            )
+        prefix = "cashier_" if cashiers else ""
+        user = "user_id" if cashiers else "NULL"
+        condition = "" if user_id is None else "AND user_id = :user_id"
+        return self.conn.execute(
+            f"""
+SELECT
+    {user} AS user_id,
+    num_orders,
+    customers,
+    basket_values,
+    basket_items
+FROM
+    monthly_{prefix}sketches
+WHERE
+    month BETWEEN :first_month AND :last_month {condition}
+UNION ALL
+SELECT
+    {user} AS user_id,
+    num_orders,
+    customers,
+    basket_values,
+    basket_items
+FROM
+    daily_{prefix}sketches
+WHERE
+    day BETWEEN :start AND :end
+    AND SUBSTR(day, 1, 7) NOT IN (
+        SELECT
+            month
+        FROM
+            monthly_sketches
+        WHERE
+            month BETWEEN :first_month AND :last_month
+    ) {condition};
+""",
+            {
+                "first_month": first_month,
+                "last_month": last_month,
+                "start": str(start),
+                "end": str(end),
+                "user_id": user_id,
+            },
+        )
+
+    def get_sketch(
+        self,
+        start: datetime.date | str,
+        end: datetime.date | str,
+        user_id: Optional[int] = None,
+    ) -> SalesSketch:
+        """Merges the sketches of the days in a date range
+
+        Args:
+            start (datetime.date | str): start of date range(inclusive)
+            end (datetime.date | str): end of date range(inclusive)
+            user_id (Optional[int], optional): cashier to get sketches for,
+                every cashier if None. Defaults to None.
+
+        Returns:
+            SalesSketch: sketches of the range
+        """
+        cur = self._read_range(user_id is not None, start, end, user_id)
+        sketch = SalesSketch.empty()
+        sketch.merge(SalesSketch.from_row(row[1:]) for row in cur)
+        return sketch
+
+    def get_approximate_sales(
+        self, start: datetime.date | str, end: datetime.date | str
+    ) -> ApproximateSales:
+        """Estimates sales statistics over a date range
+
+        Args:
+            start (datetime.date | str): start of date range(inclusive)
+            end (datetime.date | str): end of date range(inclusive)
+
+        Returns:
+            ApproximateSales: estimated statistics of the range
+        """
+        return ApproximateSales.from_sketch(
+            str(start), str(end), self.get_sketch(start, end)
+        )
+
+    def get_approximate_sales_by_period(
+        self, start: datetime.date, end: datetime.date, days: int = 7
+    ) -> list[ApproximateSales]:
+        """Estimates sales statistics for each period of a date range
+
+        Every day of the range is merged, at about the same cost however
+        many orders it had, so for short periods of a store with fewer than
+        about 150 orders a day, counting distinct customers exactly from
+        order_summary is faster than this estimate.
+
+        Args:
+            start (datetime.date): start of date range(inclusive), first day
+                of the first period
+            end (datetime.date): end of date range(inclusive)
+            days (int, optional): length of each period. Defaults to 7.
+
+        Returns:
+            list[ApproximateSales]: estimated statistics of each period with
+                sales
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    day,
+    num_orders,
+    customers,
+    basket_values,
+    basket_items
+FROM
+    daily_sketches
+WHERE
+    day BETWEEN ? AND ?
+ORDER BY
+    day;
+""",
+            (str(start), str(end)),
+        )
+        periods: dict[int, list[SalesSketch]] = {}
+        for day, *sketch in cur:
+            period = (datetime.date.fromisoformat(day) - start).days // days
+            periods.setdefault(period, []).append(SalesSketch.from_row(sketch))
+
+        sales = []
+        for period, sketches in periods.items():
+            first = start + datetime.timedelta(days=period * days)
+            last = min(first + datetime.timedelta(days=days - 1), end)
+            sketch = SalesSketch.empty()
+            sketch.merge(sketches)
+            sales.append(ApproximateSales.from_sketch(str(first), str(last), sketch))
+        return sales
+
+    def get_approximate_sales_by_cashier(
+        self, start: datetime.date | str, end: datetime.date | str
+    ) -> list[ApproximateSales]:
+        """Estimates sales statistics of each cashier over a date range
+
+        Args:
+            start (datetime.date | str): start of date range(inclusive)
+            end (datetime.date | str): end of date range(inclusive)
+
+        Returns:
+            list[ApproximateSales]: estimated statistics of each cashier with
+                sales
+        """
+        usernames = dict(self.conn.execute("SELECT id, username FROM users;"))
+        cashiers: dict[int, list[SalesSketch]] = {}
+        for user_id, *sketch in self._read_range(True, start, end):
+            cashiers.setdefault(user_id, []).append(SalesSketch.from_row(sketch))
+
+        sales = []
+        for user_id in sorted(cashiers):
+            sketch = SalesSketch.empty()
+            sketch.merge(cashiers[user_id])
+            sales.append(
+                ApproximateSales.from_sketch(
+                    str(start), str(end), sketch, user_id, usernames.get(user_id)
+                )
+            )
+        return sales
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the sketches of closed days")
+    parser.add_argument("database")
+    parser.add_argument("--archive", default="archive")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    analytics = AnalyticsSystem(connection, Partitions(connection, args.archive))
+    built = analytics.build_closed_days()
+    print(f"Built sketches of {len(built)} days")
+    connection.close()
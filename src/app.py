@@ -1,33 +1,251 @@
+import atexit
 import csv
 from datetime import date
+import functools
+import json
+from pathlib import Path
 import random
 import sqlite3
-from typing import Optional
+import sys
+from typing import Iterable, Optional
 
 import bcrypt
+from analytics_system import AnalyticsSystem
+from backups import BackupFile, Backups
+from basket_journal import BasketJournal
+from basket_system import BasketSystem
+from change_log import ChangeLog
 from customer_system import CustomerSystem
+from draft_orders import DraftOrder, DraftOrders
+from forecast_system import ForecastSystem
 from inventory_system import InventorySystem
-
-from order_system import Item, OrderSystem, User
+from item_codes import ItemCodes
+from item_search import ItemSearch
+
+from migrations import backfill_order_item_prices, has_unpriced_order_items
+from order_ids import OrderIds, numbering_key
+from order_system import Item, Order, OrderSystem, User
+from partitions import Partitions
+from print_spooler import PrintJob, PrintSpooler, open_sink
+from query_instrumentation import InstrumentedConnection, enable_slow_query_log
+from receipt_journal import ReceiptJournal
+from register_queue import RegisterQueue, SyncResult
 from report_system import ReportSystem
 
 
 class App:
     """Base class for the app"""
 
-    def __init__(self, uri: str = ":memory:") -> None:
+    def __init__(
+        self,
+        uri: str = ":memory:",
+        instrument_queries: bool = False,
+        register_id: int = 1,
+        data_directory: str = ".",
+        printer: Optional[str] = None,
+    ) -> None:
         random.seed("Team 23")
-        self.conn = sqlite3.connect(uri)
+        if instrument_queries:
+            self.conn = sqlite3.connect(uri, factory=InstrumentedConnection)
+            enable_slow_query_log()
+            atexit.register(self.dump_query_stats)
+        else:
+            self.conn = sqlite3.connect(uri)
         self.create_tables()
         self._seed_data_from_file()
 
-        self.order_system = OrderSystem(self.conn)
+        # Closed months archived with partitions.py are attached when read
+        self.partitions = Partitions(self.conn)
+
+        # Changes to orders and inventory are announced to other systems
+        self.changes = ChangeLog(self.conn)
+
+        # This register numbers its orders from blocks of ids it leases
+        self.order_ids = OrderIds(self.conn, register_id)
+        self.order_system = OrderSystem(
+            self.conn, self.partitions, self.changes, self.order_ids
+        )
+        self.draft_orders = DraftOrders(self.order_system)
+
+        # The register's queue and journals are kept under journal/ and
+        # receipts/ here, and only opened when first used
+        self.register_id = register_id
+        self.data_directory = Path(data_directory)
+        self.printer = printer
+
+        # Seed orders are written without line prices and totals, databases
+        # upgraded by migrations.py already have theirs
+        if has_unpriced_order_items(self.conn):
+            backfill_order_item_prices(self.conn)
+        if self.order_system.has_untotalled_orders():
+            self.order_system.backfill_order_totals()
+
+        self.report_system = ReportSystem(self.conn, self.partitions)
+
+        self.customer_system = CustomerSystem(self.conn, self.partitions)
+
+        # Seed items have no manufacturer barcodes, so they get in-store codes
+        self.item_codes = ItemCodes(self.conn)
+        self.item_codes.assign_store_codes()
+        self.item_codes.load()
+
+        # Item names and codes are searched in memory as they are typed
+        self.item_search = ItemSearch(self.conn)
+        self.item_search.load()
 
-        self.report_system = ReportSystem(self.conn)
+        self.inventory_system = InventorySystem(
+            self.conn, self.partitions, self.changes
+        )
+
+        # Sales are read when the inventory screen first refreshes the forecast
+        self.forecast_system = ForecastSystem(self.conn, self.partitions)
+
+        # Sketches are built by "python ./src/analytics_system.py <database>"
+        self.analytics_system = AnalyticsSystem(self.conn, self.partitions)
+
+        # Items bought together are counted when first asked for, then as
+        # orders are paid
+        self.basket_system = BasketSystem(self.conn, self.partitions, self.changes)
+
+    @functools.cached_property
+    def register_queue(self) -> RegisterQueue:
+        """Orders paid while the database is unreachable, waiting for it
 
-        self.customer_system = CustomerSystem(self.conn)
+        Ids taken by queued orders are skipped when the queue is opened, which
+        the dashboard does as soon as it is shown, before any order is placed.
+        The queue is keyed by the database's numbering, like the receipts, so
+        orders queued for a database that was recreated are not replayed to
+        the new one.
+        """
+        name = f"register-{self.register_id}-{numbering_key(self.conn)}-queue.db"
+        queue = RegisterQueue(self.data_directory / "journal" / name)
+        self.order_ids.skip_past(queue.highest_order_id())
+        return queue
+
+    @functools.cached_property
+    def basket_journal(self) -> BasketJournal:
+        """Baskets being rung up, journaled and restored after a crash"""
+        return BasketJournal(
+            self.data_directory / "journal" / f"register-{self.register_id}.log"
+        )
+
+    @functools.cached_property
+    def receipt_journal(self) -> ReceiptJournal:
+        """Printed receipts, kept in one journal per register for reprinting
 
-        self.inventory_system = InventorySystem(self.conn)
+        Receipts are keyed by the database's numbering, since a database kept
+        in memory numbers its orders from the start on every run.
+        """
+        journal = ReceiptJournal(
+            self.data_directory / "receipts" / f"register-{self.register_id}",
+            key=numbering_key(self.conn),
+        )
+        atexit.register(journal.close)
+        return journal
+
+    @functools.cached_property
+    def print_spooler(self) -> PrintSpooler:
+        """Prints bills from a worker thread so the till never waits for them
+
+        Bills still queued are printed before the app exits, see
+        stop_printing().
+        """
+        spooler = PrintSpooler(open_sink(self.printer))
+        atexit.register(self.stop_printing)
+        return spooler
+
+    def stop_printing(self, timeout: float = 5.0) -> list[PrintJob]:
+        """Prints the bills still queued and stops the print spooler
+
+        Bills that could not be printed in time, or at all, are listed on
+        stderr so they can be reprinted from the search screen.
+
+        Args:
+            timeout (float, optional): seconds to wait for queued bills.
+                Defaults to 5.0.
+
+        Returns:
+            list[PrintJob]: bills that were not printed
+        """
+        if "print_spooler" not in self.__dict__:
+            return []
+        atexit.unregister(self.stop_printing)
+        unprinted = self.print_spooler.stop(timeout)
+        unprinted += self.print_spooler.take_failed()
+        if len(unprinted) > 0:
+            print(
+                "Not printed: " + ", ".join(job.title for job in unprinted),
+                file=sys.stderr,
+            )
+        return unprinted
+
+    def place_order(self, draft: DraftOrder, payment_type: int) -> Order:
+        """Places a paid order, queueing it if the database is unreachable
+
+        Args:
+            draft (DraftOrder): order rung up in memory
+            payment_type (int): id of payment type
+
+        Returns:
+            Order: details of the order for its receipt
+        """
+        return self.register_queue.place_order(self.draft_orders, draft, payment_type)
+
+    def get_order_details_for_return(self, order_id: int) -> Order:
+        """Gets an order to return, from the queue if the database is unreachable
+
+        Args:
+            order_id (int): id of order to get
+
+        Returns:
+            Order: details of the order, with quantities updated by returns
+        """
+        return self.register_queue.find_order_for_return(self.order_system, order_id)
+
+    def sync_queued_orders(self) -> SyncResult:
+        """Replays orders queued while the database was unreachable
+
+        Returns:
+            SyncResult: orders applied, skipped, left waiting and conflicting
+        """
+        return self.register_queue.sync(self.draft_orders)
+
+    def print_bill(self, bill_content: str, title: str = "Bill") -> int:
+        """Queues a bill for the register's printer
+
+        Args:
+            bill_content (str): bill to print
+            title (str, optional): name of the bill if printing fails.
+                Defaults to "Bill".
+
+        Returns:
+            int: id of the print job
+        """
+        return self.print_spooler.submit(bill_content, title)
+
+    def backup_database(self, directory: str = "backups") -> BackupFile:
+        """Backs up the database, keeping the newest generations
+
+        Args:
+            directory (str, optional): directory of the backups.
+                Defaults to "backups".
+
+        Returns:
+            BackupFile: the new backup
+        """
+        return Backups(self.conn, directory).create()
+
+    def dump_query_stats(self, path: str = "logs/query_stats.json"):
+        """Writes statistics for every sql statement run so far
+
+        Only available when the app was created with instrument_queries.
+        Summarize the file with "python ./src/query_instrumentation.py <path>".
+
+        Args:
+            path (str, optional): file to write. Defaults to "logs/query_stats.json".
+        """
+        if isinstance(self.conn, InstrumentedConnection):
+            self.conn.stats.dump(path)
 
     def seed_orders(self):
         """Seed random orders for testing"""
@@ -202,7 +420,13 @@ class App:
         return cur.lastrowid
 
     def add_item(
-        self, name: str, price: float, gst: bool, pst: bool, category_id: int
+        self,
+        name: str,
+        price: float,
+        gst: bool,
+        pst: bool,
+        category_id: int,
+        barcode: Optional[str] = None,
     ) -> int:
         """Add a new item to the database
 
@@ -212,6 +436,8 @@ class App:
             gst (bool): if gst is charged on the item
             pst (bool): if pst is charged on the item
             category_id (int): category for the new item
+            barcode (Optional[str], optional): barcode or SKU scanned at the
+                till. Defaults to None.
 
         Raises:
             RuntimeError: if db did not set last row id
@@ -220,12 +446,18 @@ class App:
             int: id of the new item
         """
         cur = self.conn.execute(
-            "INSERT INTO items(name, price, gst,pst, category_id) VALUES (?, ?, ?, ?, ?);",
-            (name, price, gst, pst, category_id),
+            "INSERT INTO items(name, price, gst, pst, category_id, barcode)"
+            + " VALUES (?, ?, ?, ?, ?, ?);",
+            (name, price, gst, pst, category_id, barcode),
         )
         self.conn.commit()
         if cur.lastrowid is None:
             raise RuntimeError
+        if barcode is not None:
+            self.item_codes.codes[barcode] = cur.lastrowid
+        self.item_search.add(
+            Item(cur.lastrowid, name, price, category_id, gst, pst), barcode
+        )
         return cur.lastrowid
 
     def get_all_items(self) -> list[Item]:
@@ -234,9 +466,27 @@ class App:
         Returns:
             list[Item]: list of items from the database
         """
-        cur = self.conn.execute("SELECT * FROM items;")
+        cur = self.conn.execute(
+            "SELECT id, name, price, gst, pst, category_id FROM items;"
+        )
         return list(map(Item.from_row, cur.fetchall()))
 
+    def get_items(self, item_ids: Iterable[int]) -> dict[int, Item]:
+        """Get several items by id in one query
+
+        Args:
+            item_ids (Iterable[int]): ids of the items
+
+        Returns:
+            dict[int, Item]: map of item id to item, without unknown ids
+        """
+        cur = self.conn.execute(
+            "SELECT id, name, price, gst, pst, category_id FROM items"
+            + " WHERE id IN (SELECT value FROM json_each(?));",
+            (json.dumps(list(item_ids)),),
+        )
+        return {item.item_id: item for item in map(Item.from_row, cur.fetchall())}
+
     def get_items_by_category(self, category_id: int) -> list[Item]:
         """Get all items from a given category
 
@@ -247,10 +497,21 @@ class App:
             list[Item]: list of items belonging to the category
         """
         cur = self.conn.execute(
-            "SELECT * FROM items WHERE category_id = ?;", (category_id,)
+            "SELECT id, name, price, gst, pst, category_id FROM items"
+            + " WHERE category_id = ?;",
+            (category_id,),
         )
         return list(map(Item.from_row, cur.fetchall()))
 
+    def get_categories(self) -> dict[int, str]:
+        """Get the name of every category
+
+        Returns:
+            dict[int, str]: map of category id to name
+        """
+        cur = self.conn.execute("SELECT id, category FROM categories;")
+        return dict(cur.fetchall())
+
     def get_all_categories(self) -> dict[str, list[Item]]:
         """Get all categories and items
 
@@ -0,0 +1,242 @@
+"""Backs up a live database without stalling checkout
+
+Backups are copied with the sqlite online backup API a few pages at a time,
+sleeping between steps so tills writing to the database only wait for one
+step. A write from another connection between steps makes sqlite start the
+copy again, so after max_restarts it is copied in a single step instead. On a
+database in WAL mode, VACUUM INTO copies a snapshot from a reader
+connection without blocking writers at all. Every backup passes an
+integrity check before it gets its final name, and only the newest
+generations are kept.
+
+Usage:
+    python ./src/backups.py retail.db --directory backups --keep 7
+    python ./src/backups.py retail.db --method vacuum
+"""
+import argparse
+from dataclasses import dataclass
+import datetime
+from pathlib import Path
+import sqlite3
+from typing import Any, Callable, Optional
+
+# Backup methods, "steps" uses the online backup API
+METHODS = ("steps", "vacuum")
+
+
+@dataclass(slots=True)
+class BackupFile:
+    """Represents a generation of backups of a database"""
+
+    path: Path
+    created: datetime.datetime
+    size: int
+
+
+@dataclass(slots=True)
+class BackupProgress:
+    """Pages copied by a backup in steps, and how often it started again"""
+
+    remaining: int = -1
+    total: int = 0
+    steps: int = 0
+    restarts: int = 0
+
+
+class _TooManyRestarts(Exception):
+    """[Internal] Stops a backup in steps that keeps being restarted"""
+
+
+class Backups:
+    """Backups Class"""
+
+    def __init__(
+        self,
+        source: str | Path | sqlite3.Connection,
+        directory: str | Path = "backups",
+        keep: int = 7,
+        name: Optional[str] = None,
+    ) -> None:
+        """Creates backups of a database file or an open connection
+
+        Args:
+            source (str | Path | sqlite3.Connection): database file, opened
+                with a connection of its own for each backup, or a connection
+                whose writes are all made through it, such as the app's
+            directory (str | Path, optional): directory of the backups.
+                Defaults to "backups".
+            keep (int, optional): generations kept. Defaults to 7.
+            name (Optional[str], optional): start of the backup file names.
+                Defaults to the source file's name, or "retail".
+        """
+        self.source = source
+        self.directory = Path(directory)
+        self.keep = keep
+        if name is None and isinstance(source, sqlite3.Connection):
+            name = "retail"
+        self.name = name or Path(source).stem
+
+    def _connect(self) -> sqlite3.Connection:
+        """[Internal] Opens the source database for reading"""
+        if isinstance(self.source, sqlite3.Connection):
+            return self.source
+        return sqlite3.connect(self.source)
+
+    def list_backups(self) -> list[BackupFile]:
+        """Lists the backups of the database, oldest first
+
+        Returns:
+            list[BackupFile]: backups found in the directory
+        """
+        backups = []
+        for path in self.directory.glob(f"{self.name}-*.db"):
+            try:
+                created = datetime.datetime.strptime(
+                    path.stem[len(self.name) + 1 :], "%Y%m%d-%H%M%S-%f"
+                )
+            except ValueError:
+                continue
+            backups.append(BackupFile(path, created, path.stat().st_size))
+        return sorted(backups, key=lambda backup: backup.created)
+
+    def create(
+        self,
+        method: str = "steps",
+        pages: int = 256,
+        sleep: float = 0.005,
+        max_restarts: int = 3,
+        progress: Optional[Callable[[BackupProgress], None]] = None,
+    ) -> BackupFile:
+        """Backs up the database, checks the copy and rotates old generations
+
+        Args:
+            method (str, optional): "steps" to use the online backup API,
+                "vacuum" to use VACUUM INTO. Defaults to "steps".
+            pages (int, optional): pages copied by each step. Defaults to 256.
+            sleep (float, optional): seconds to sleep between steps.
+                Defaults to 0.005.
+            max_restarts (int, optional): times the copy can start again
+                before the rest is copied in one step. Defaults to 3.
+            progress (Optional[Callable[[BackupProgress], None]], optional):
+                called after each step. Defaults to None.
+
+        Raises:
+            ValueError: if the method is not one of METHODS
+            RuntimeError: if the copy fails its integrity check
+
+        Returns:
+            BackupFile: the new backup
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown backup method {method}")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        created = datetime.datetime.now()
+        path = self.directory / f"{self.name}-{created:%Y%m%d-%H%M%S-%f}.db"
+        partial = path.with_suffix(".partial")
+        partial.unlink(missing_ok=True)
+
+        source = self._connect()
+        try:
+            if method == "vacuum":
+                source.execute("VACUUM INTO ?;", (str(partial),))
+            else:
+                self._copy_in_steps(
+                    source, partial, pages, sleep, max_restarts, progress
+                )
+        finally:
+            if source is not self.source:
+                source.close()
+
+        try:
+            self.verify(partial)
+        except RuntimeError:
+            partial.unlink()
+            raise
+        partial.rename(path)
+        self.rotate()
+        return BackupFile(path, created, path.stat().st_size)
+
+    @staticmethod
+    def _copy_in_steps(
+        source: sqlite3.Connection,
+        path: Path,
+        pages: int,
+        sleep: float,
+        max_restarts: int,
+        progress: Optional[Callable[[BackupProgress], None]],
+    ):
+        """[Internal] Copies a database with the online backup API"""
+        state = BackupProgress()
+
+        def step(_status: Any, remaining: int, total: int):
+            # The copy starts again when another connection writes between steps
+            if 0 <= state.remaining <= remaining:
+                state.restarts += 1
+            state.remaining, state.total = remaining, total
+            state.steps += 1
+            if progress is not None:
+                progress(state)
+            if state.restarts > max_restarts and remaining > 0:
+                raise _TooManyRestarts
+
+        target = sqlite3.connect(path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=step, sleep=sleep)
+            except _TooManyRestarts:
+                source.backup(target, pages=-1)
+        finally:
+            target.close()
+
+    @staticmethod
+    def verify(path: str | Path):
+        """Checks that a backup is a sound database
+
+        Args:
+            path (str | Path): backup to check
+
+        Raises:
+            RuntimeError: if the integrity check finds a problem
+        """
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            problems = [row[0] for row in conn.execute("PRAGMA integrity_check;")]
+        except sqlite3.DatabaseError as error:
+            problems = [str(error)]
+        finally:
+            conn.close()
+        if problems != ["ok"]:
+            raise RuntimeError(f"{path} failed its integrity check: {problems[:5]}")
+
+    def rotate(self) -> list[Path]:
+        """Deletes the oldest backups beyond the generations kept
+
+        Returns:
+            list[Path]: backups deleted
+        """
+        backups = self.list_backups()
+        expired = backups[: max(len(backups) - self.keep, 0)]
+        deleted = [backup.path for backup in expired]
+        for path in deleted:
+            path.unlink()
+        return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up a live database")
+    parser.add_argument("database")
+    parser.add_argument("--directory", default="backups")
+    parser.add_argument("--keep", type=int, default=7)
+    parser.add_argument("--method", choices=METHODS, default="steps")
+    parser.add_argument("--pages", type=int, default=256)
+    parser.add_argument("--sleep", type=float, default=0.005)
+    args = parser.parse_args()
+
+    backups = Backups(args.database, args.directory, args.keep)
+    backup = backups.create(args.method, args.pages, args.sleep)
+    print(f"Backed up {args.database} to {backup.path}, {backup.size / 1024:.0f} KiB")
+    for kept in backups.list_backups():
+        print(
+            f"{kept.created:%Y-%m-%d %H:%M:%S}"
+            + f"  {kept.size / 1024:>8.0f} KiB  {kept.path}"
+        )
@@ -0,0 +1,349 @@
+"""Keeps the open baskets of a register safe from crashes
+
+Every change to a basket being rung up is appended to the register's journal
+file as a line holding a checksum and the change, and the baskets are rebuilt
+from the journal when the app starts again. Each line is written to the
+operating system as soon as it is appended, so the baskets survive the till
+process dying. Flushing to disk with fsync is slow, so changes made within
+sync_interval of each other share one fsync, losing at most that much work if
+the machine itself loses power. A torn last line fails its checksum and is
+dropped when the journal is read.
+
+Lines of baskets that were paid for or abandoned are dead weight, so once the
+file is several times larger than the open baskets it is rewritten with only
+those, which bounds the bytes written per change.
+"""
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any, Iterable, Optional
+import uuid
+import zlib
+
+from draft_orders import DraftOrder
+from order_system import Item
+
+# Kinds of changes, each line is [kind, basket id, ...]
+OPENED = "open"  # user id, key the basket is placed with
+ADDED = "add"  # item id, quantity, then name, price, category, gst, pst if new
+REMOVED = "remove"  # item id, quantity
+CUSTOMER_SET = "customer"  # customer id
+CLOSED = "close"  # order id, None if abandoned
+
+
+def encode(change: list[Any]) -> bytes:
+    """Encodes a change as a journal line with its checksum
+
+    Args:
+        change (list[Any]): kind, basket id and arguments of the change
+
+    Returns:
+        bytes: line to append
+    """
+    payload = json.dumps(change, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def decode(line: bytes) -> Optional[list[Any]]:
+    """Decodes a journal line, checking its checksum
+
+    Args:
+        line (bytes): line read from the journal
+
+    Returns:
+        Optional[list[Any]]: the change, None if the line is torn or corrupt
+    """
+    if not line.endswith(b"\n") or len(line) < 10:
+        return None
+    checksum, payload = line[:8], line[9:-1]
+    try:
+        if int(checksum, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+class BasketJournal:
+    """Basket Journal Class"""
+
+    def __init__(
+        self,
+        path: str | Path,
+        sync_interval: float = 0.05,
+        compact_ratio: float = 4,
+        compact_bytes: int = 64 * 1024,
+    ) -> None:
+        """Opens a journal, rebuilding the baskets it holds
+
+        Args:
+            path (str | Path): journal file of the register
+            sync_interval (float, optional): seconds changes wait for an
+                fsync, 0 to fsync every change. Defaults to 0.05.
+            compact_ratio (float, optional): the journal is rewritten once it
+                is this many times the size of the open baskets.
+                Defaults to 4.
+            compact_bytes (int, optional): journals smaller than this are
+                never rewritten. Defaults to 64 * 1024.
+        """
+        self.path = Path(path)
+        self.sync_interval = sync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_bytes = compact_bytes
+        self.baskets: dict[int, DraftOrder] = {}
+        self.next_basket_id = 1
+        # Baskets restored from the journal that no window has taken yet
+        self.restored: list[int] = []
+        # Bytes appended for changes, and written again by rewrites
+        self.bytes_written = 0
+        self.bytes_rewritten = 0
+        self.syncs = 0
+        self.compactions = 0
+        self._unsynced_since: Optional[float] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        size = self._replay()
+        self.restored = sorted(self.baskets)
+        # Kept open for appending until close(), so it cannot be a with block
+        # pylint: disable-next=consider-using-with
+        self.file = open(self.path, "ab", buffering=0)
+        self.size = size
+        self._compact_if_needed()
+
+    def _replay(self) -> int:
+        """[Internal] Rebuilds the baskets from the journal, dropping a torn tail
+
+        Returns:
+            int: bytes of the journal that were read
+        """
+        if not self.path.exists():
+            return 0
+        good = 0
+        with open(self.path, "rb") as file:
+            for line in file:
+                change = decode(line)
+                if change is None:
+                    break
+                self._apply(change)
+                good += len(line)
+        if good < self.path.stat().st_size:
+            os.truncate(self.path, good)
+        return good
+
+    def _apply(self, change: list[Any]):
+        """[Internal] Applies a change to the baskets in memory"""
+        kind, basket_id, *arguments = change
+        self.next_basket_id = max(self.next_basket_id, basket_id + 1)
+        if kind == OPENED:
+            basket = DraftOrder(arguments[0])
+            # Journals written before baskets had keys
+            if len(arguments) > 1:
+                basket.key = arguments[1]
+            self.baskets[basket_id] = basket
+            return
+        basket = self.baskets.get(basket_id)
+        if basket is None:
+            return
+        if kind == ADDED:
+            item_id, quantity, *details = arguments
+            if item_id in basket.lines:
+                basket.lines[item_id].quantity += quantity
+            elif len(details) > 0:
+                name, price, category, gst, pst = details
+                item = Item(item_id, name, price, category, gst, pst)
+                basket.add_item(item, quantity)
+        elif kind == REMOVED:
+            basket.remove_item(arguments[0], arguments[1])
+        elif kind == CUSTOMER_SET:
+            basket.customer_id = arguments[0]
+        elif kind == CLOSED:
+            del self.baskets[basket_id]
+
+    def _append(self, changes: Iterable[list[Any]]):
+        """[Internal] Applies changes and appends them to the journal in one write"""
+        lines = []
+        for change in changes:
+            self._apply(change)
+            lines.append(encode(change))
+        data = b"".join(lines)
+        self.file.write(data)
+        self.size += len(data)
+        self.bytes_written += len(data)
+        now = time.monotonic()
+        if self._unsynced_since is None:
+            self._unsynced_since = now
+        if now - self._unsynced_since >= self.sync_interval:
+            self.sync()
+
+    def _snapshot(self) -> list[list[Any]]:
+        """[Internal] Gets the changes that recreate the open baskets"""
+        changes: list[list[Any]] = []
+        for basket_id, basket in self.baskets.items():
+            changes.append([OPENED, basket_id, basket.user_id, basket.key])
+            if basket.customer_id is not None:
+                changes.append([CUSTOMER_SET, basket_id, basket.customer_id])
+            for line in basket.lines.values():
+                changes.append(
+                    [
+                        ADDED,
+                        basket_id,
+                        line.item_id,
+                        line.quantity,
+                        line.name,
+                        line.price,
+                        line.category,
+                        line.gst,
+                        line.pst,
+                    ]
+                )
+        return changes
+
+    def _compact_if_needed(self):
+        """[Internal] Rewrites the journal with only the open baskets if it is large"""
+        if self.size < self.compact_bytes:
+            return
+        data = b"".join(map(encode, self._snapshot()))
+        if self.size < self.compact_ratio * len(data):
+            return
+        partial = self.path.with_suffix(self.path.suffix + ".partial")
+        with open(partial, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        self.file.close()
+        os.replace(partial, self.path)
+        self._sync_directory()
+        # pylint: disable-next=consider-using-with
+        self.file = open(self.path, "ab", buffering=0)
+        self.size = len(data)
+        self.bytes_rewritten += len(data)
+        self.compactions += 1
+        self._unsynced_since = None
+
+    def _sync_directory(self):
+        """[Internal] Makes a rename in the journal's directory durable"""
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        directory = os.open(self.path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def sync_pending(self) -> bool:
+        """Checks if changes are waiting for an fsync
+
+        Returns:
+            bool: True if sync needs calling
+        """
+        return self._unsynced_since is not None
+
+    def sync(self):
+        """Flushes the changes appended so far to disk"""
+        if self._unsynced_since is None:
+            return
+        os.fsync(self.file.fileno())
+        self.syncs += 1
+        self._unsynced_since = None
+
+    def open_basket(self, user_id: int) -> int:
+        """Takes a basket restored after a crash, or opens a new one
+
+        The basket's key is journaled with it, so a basket restored after
+        the app died between placing its order and closing it is not placed
+        twice.
+
+        Args:
+            user_id (int): id of the user ringing up the basket
+
+        Returns:
+            int: id of the basket
+        """
+        while len(self.restored) > 0:
+            basket_id = self.restored.pop(0)
+            if basket_id in self.baskets:
+                return basket_id
+        basket_id = self.next_basket_id
+        self._append([[OPENED, basket_id, user_id, uuid.uuid4().hex]])
+        return basket_id
+
+    def add_items(self, basket_id: int, quantities: dict[int, tuple[Item, int]]):
+        """Adds items to a basket
+
+        Args:
+            basket_id (int): id of the basket
+            quantities (dict[int, tuple[Item, int]]): item and quantity to add
+                of each item id
+        """
+        lines = self.baskets[basket_id].lines
+        self._append(
+            [ADDED, basket_id, item_id, quantity]
+            if item_id in lines
+            else [
+                ADDED,
+                basket_id,
+                item_id,
+                quantity,
+                item.name,
+                item.price,
+                item.category,
+                item.gst,
+                item.pst,
+            ]
+            for item_id, (item, quantity) in quantities.items()
+        )
+
+    def add_item(self, basket_id: int, item: Item, quantity: int = 1):
+        """Adds an item to a basket
+
+        Args:
+            basket_id (int): id of the basket
+            item (Item): item to add
+            quantity (int, optional): quantity to add. Defaults to 1.
+        """
+        self.add_items(basket_id, {item.item_id: (item, quantity)})
+
+    def remove_items(self, basket_id: int, quantities: dict[int, int]):
+        """Removes items from a basket
+
+        Args:
+            basket_id (int): id of the basket
+            quantities (dict[int, int]): quantity to remove of each item id
+        """
+        lines = self.baskets[basket_id].lines
+        self._append(
+            [REMOVED, basket_id, item_id, quantity]
+            for item_id, quantity in quantities.items()
+            if item_id in lines
+        )
+
+    def set_customer(self, basket_id: int, customer_id: int):
+        """Sets the customer of a basket
+
+        Args:
+            basket_id (int): id of the basket
+            customer_id (int): id of the customer
+        """
+        self._append([[CUSTOMER_SET, basket_id, customer_id]])
+
+    def close_basket(self, basket_id: int, order_id: Optional[int] = None):
+        """Closes a basket once it is paid for or abandoned
+
+        The close is flushed to disk straight away, so a paid basket is not
+        restored after a power loss.
+
+        Args:
+            basket_id (int): id of the basket
+            order_id (Optional[int], optional): id of the order it was placed
+                as, None if abandoned. Defaults to None.
+        """
+        if basket_id not in self.baskets:
+            return
+        self._append([[CLOSED, basket_id, order_id]])
+        self.sync()
+        self._compact_if_needed()
+
+    def close(self):
+        """Flushes and closes the journal file"""
+        self.sync()
+        self.file.close()
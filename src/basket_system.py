@@ -0,0 +1,374 @@
+"""Counts which items are bought together, for "frequently bought together" lists
+
+Paid sales are read order by order when the first list is asked for, and
+every pair of items in an order is counted in a sparse item by item matrix,
+so starting the app does not read the whole sales history. Orders paid after
+the change log's checkpoint taken before reading are added from the change
+log, then as they are paid, and the strongest associations of an item are
+cached until the next order is added.
+"""
+from dataclasses import dataclass
+import sqlite3
+from typing import Iterable, Optional
+
+import numpy as np
+
+from change_log import ORDER_PAID, ChangeLog, Subscription
+from partitions import Partitions
+
+# Pairs are stored as row << 32 | column, item ids fit in 32 bits
+COLUMN_BITS = 32
+COLUMN_MASK = (1 << COLUMN_BITS) - 1
+
+# Ways associations can be ranked
+METRICS = ("count", "confidence", "lift")
+
+
+@dataclass(slots=True)
+class Association:
+    """Represents how often an item is bought with another"""
+
+    item_id: int
+    other_item_id: int
+    count: int
+    confidence: float
+    lift: float
+
+
+def order_pairs(order_ids: np.ndarray, item_ids: np.ndarray) -> np.ndarray:
+    """Gets every ordered pair of items bought in the same order
+
+    Args:
+        order_ids (np.ndarray): order of each line, lines of an order together
+        item_ids (np.ndarray): item of each line, distinct within an order
+
+    Returns:
+        np.ndarray: both directions of each pair, as row << 32 | column
+    """
+    pairs = []
+    distance = 1
+    while distance < len(order_ids):
+        # Lines distance apart belong to the same order only if the order is long enough
+        same = order_ids[:-distance] == order_ids[distance:]
+        if not same.any():
+            break
+        first = item_ids[:-distance][same]
+        second = item_ids[distance:][same]
+        pairs.append((first << COLUMN_BITS) | second)
+        pairs.append((second << COLUMN_BITS) | first)
+        distance += 1
+    if len(pairs) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(pairs)
+
+
+def count_keys(keys: np.ndarray, weights: Optional[np.ndarray] = None):
+    """Adds up the weight of each distinct key
+
+    Args:
+        keys (np.ndarray): keys, repeated
+        weights (Optional[np.ndarray], optional): weight of each key, 1 if
+            None. Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: sorted distinct keys and their totals
+    """
+    if weights is None:
+        return np.unique(keys, return_counts=True)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=weights).astype(np.int64)
+
+
+class CoOccurrence:
+    """Sparse counts of the orders each pair of items was bought in"""
+
+    def __init__(self, compact_after: int = 100_000) -> None:
+        """Creates empty counts
+
+        Args:
+            compact_after (int, optional): pairs added one order at a time
+                before they are merged into the sorted arrays.
+                Defaults to 100_000.
+        """
+        self.compact_after = compact_after
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        # Number of orders containing each item, indexed by item id
+        self.item_orders = np.zeros(0, dtype=np.int64)
+        self.num_orders = 0
+        self._pending: dict[int, dict[int, int]] = {}
+        self._num_pending = 0
+        self._top: dict[tuple[int, int, str], list[Association]] = {}
+
+    def add_lines(self, order_ids: np.ndarray, item_ids: np.ndarray):
+        """Adds the lines of complete orders in bulk
+
+        Args:
+            order_ids (np.ndarray): order of each line, lines of an order
+                together and every line of an order included
+            item_ids (np.ndarray): item of each line, distinct within an order
+        """
+        if len(order_ids) == 0:
+            return
+        self.num_orders += int(np.count_nonzero(order_ids[1:] != order_ids[:-1])) + 1
+        self._grow(int(item_ids.max()))
+        self.item_orders += np.bincount(item_ids, minlength=len(self.item_orders))
+
+        keys, counts = count_keys(order_pairs(order_ids, item_ids))
+        if len(self.keys) > 0:
+            keys, counts = count_keys(
+                np.concatenate((self.keys, keys)), np.concatenate((self.counts, counts))
+            )
+        self.keys, self.counts = keys, counts
+        self._top.clear()
+
+    def add_order(self, item_ids: Iterable[int]):
+        """Adds a single order
+
+        Args:
+            item_ids (Iterable[int]): items in the order
+        """
+        items = sorted(set(item_ids))
+        if len(items) == 0:
+            return
+        self.num_orders += 1
+        self._grow(items[-1])
+        for item_id in items:
+            self.item_orders[item_id] += 1
+            row = self._pending.setdefault(item_id, {})
+            for other in items:
+                if other != item_id:
+                    row[other] = row.get(other, 0) + 1
+                    self._num_pending += 1
+        # Rankings use the order counts of both items, so any cached list may change
+        self._top.clear()
+        if self._num_pending >= self.compact_after:
+            self.compact()
+
+    def compact(self):
+        """Merges pairs added one order at a time into the sorted arrays"""
+        if self._num_pending == 0:
+            return
+        keys = np.fromiter(
+            (
+                (row << COLUMN_BITS) | column
+                for row, columns in self._pending.items()
+                for column in columns
+            ),
+            dtype=np.int64,
+            count=self._num_pending_keys(),
+        )
+        counts = np.fromiter(
+            (count for columns in self._pending.values() for count in columns.values()),
+            dtype=np.int64,
+            count=len(keys),
+        )
+        self.keys, self.counts = count_keys(
+            np.concatenate((self.keys, keys)), np.concatenate((self.counts, counts))
+        )
+        self._pending.clear()
+        self._num_pending = 0
+
+    def _grow(self, max_item_id: int):
+        """[Internal] Makes room for the order counts of items up to an id"""
+        if max_item_id >= len(self.item_orders):
+            size = max(max_item_id + 1, 2 * len(self.item_orders))
+            grown = np.zeros(size, dtype=np.int64)
+            grown[: len(self.item_orders)] = self.item_orders
+            self.item_orders = grown
+
+    def _num_pending_keys(self) -> int:
+        """[Internal] Counts the distinct pairs waiting to be merged"""
+        return sum(len(columns) for columns in self._pending.values())
+
+    def row(self, item_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Gets the items bought with an item and how many orders they share
+
+        Args:
+            item_id (int): item to look up
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: other item ids and counts
+        """
+        start, end = np.searchsorted(
+            self.keys, (item_id << COLUMN_BITS, (item_id + 1) << COLUMN_BITS)
+        )
+        columns = self.keys[start:end] & COLUMN_MASK
+        counts = self.counts[start:end]
+        pending = self._pending.get(item_id)
+        if pending:
+            columns = np.concatenate((columns, np.fromiter(pending, dtype=np.int64)))
+            counts = np.concatenate(
+                (counts, np.fromiter(pending.values(), dtype=np.int64))
+            )
+            columns, counts = count_keys(columns, counts)
+        return columns, counts
+
+    def top(self, item_id: int, k: int = 5, metric: str = "lift") -> list[Association]:
+        """Gets the items most associated with an item
+
+        Args:
+            item_id (int): item to look up
+            k (int, optional): number of associations. Defaults to 5.
+            metric (str, optional): "count" of shared orders, "confidence"
+                that the other item is in an order with this one, or "lift"
+                of that confidence over the other item's popularity.
+                Defaults to "lift".
+
+        Raises:
+            ValueError: if the metric is not one of METRICS
+
+        Returns:
+            list[Association]: strongest associations first
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric}")
+        cached = self._top.get((item_id, k, metric))
+        if cached is not None:
+            return cached
+
+        columns, counts = self.row(item_id)
+        item_orders = 0
+        if item_id < len(self.item_orders):
+            item_orders = int(self.item_orders[item_id])
+        other_orders = self.item_orders[columns]
+        confidence = counts / max(item_orders, 1)
+        lift = confidence * self.num_orders / np.maximum(other_orders, 1)
+        score = {"count": counts, "confidence": confidence, "lift": lift}[metric]
+        if len(score) > k:
+            best = np.argpartition(-score, k)[:k]
+        else:
+            best = np.arange(len(score))
+        best = best[np.lexsort((columns[best], -score[best]))]
+
+        associations = [
+            Association(
+                item_id,
+                int(columns[index]),
+                int(counts[index]),
+                float(confidence[index]),
+                float(lift[index]),
+            )
+            for index in best.tolist()
+        ]
+        self._top[(item_id, k, metric)] = associations
+        return associations
+
+
+class BasketSystem:
+    """Basket System Class"""
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        partitions: Optional[Partitions] = None,
+        changes: Optional[ChangeLog] = None,
+    ) -> None:
+        self.conn = conn
+        self.partitions = partitions
+        self.changes = changes
+        self.co_occurrence = CoOccurrence()
+        self.built = False
+        self._subscription: Optional[Subscription] = None
+
+    def build(self, chunk_size: int = 500_000) -> int:
+        """Counts the items bought together in every paid sale
+
+        Order lines are streamed in order id order, a chunk at a time.
+        Returns and their lines are not counted. Once built, orders paid
+        since the change log's last event before reading are added, and
+        orders paid later are added as they are published.
+
+        Args:
+            chunk_size (int, optional): order lines read at a time.
+                Defaults to 500_000.
+
+        Returns:
+            int: number of orders counted
+        """
+        self.co_occurrence = CoOccurrence()
+        checkpoint = None if self.changes is None else self.changes.last_sequence()
+        schemas = ["main"]
+        if self.partitions is not None:
+            schemas.extend(
+                self.partitions.attach(partition)
+                for partition in self.partitions.list_partitions()
+            )
+        for schema in schemas:
+            cur = self.conn.execute(
+                f"""
+SELECT
+    order_id,
+    item_id
+FROM
+    {schema}.orders
+    INNER JOIN {schema}.order_items ON orders.id = order_items.order_id
+WHERE
+    payment_type IS NOT NULL
+    AND order_reference IS NULL
+    AND quantity > 0
+ORDER BY
+    order_id;
+"""
+            )
+            carried = np.empty((0, 2), dtype=np.int64)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if len(rows) == 0:
+                    break
+                lines = np.concatenate((carried, np.array(rows, dtype=np.int64)))
+                # The last order may continue in the next chunk
+                last = np.searchsorted(lines[:, 0], lines[-1, 0])
+                carried = lines[last:]
+                self.co_occurrence.add_lines(lines[:last, 0], lines[:last, 1])
+            self.co_occurrence.add_lines(carried[:, 0], carried[:, 1])
+        self.built = True
+        if self.changes is not None and self._subscription is None:
+            self._subscription = self.changes.subscribe(
+                lambda event: self.add_paid_order(event.entity_id),
+                (ORDER_PAID,),
+                after=checkpoint,
+            )
+        return self.co_occurrence.num_orders
+
+    def add_paid_order(self, order_id: int):
+        """Counts the items of an order that was just paid for
+
+        Args:
+            order_id (int): id of the paid order
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    item_id
+FROM
+    orders
+    INNER JOIN order_items ON orders.id = order_items.order_id
+WHERE
+    order_id = ?
+    AND order_reference IS NULL
+    AND quantity > 0;
+""",
+            (order_id,),
+        )
+        self.co_occurrence.add_order(row[0] for row in cur)
+
+    def get_bought_together(
+        self, item_id: int, k: int = 5, metric: str = "lift"
+    ) -> list[Association]:
+        """Gets the items most often bought with an item
+
+        Paid sales are counted by the first call, if build() was not called.
+
+        Args:
+            item_id (int): item to look up
+            k (int, optional): number of items. Defaults to 5.
+            metric (str, optional): "count", "confidence" or "lift".
+                Defaults to "lift".
+
+        Returns:
+            list[Association]: strongest associations first
+        """
+        if not self.built:
+            self.build()
+        return self.co_occurrence.top(item_id, k, metric)
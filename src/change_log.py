@@ -0,0 +1,292 @@
+"""Announces every change made to orders and inventory
+
+OrderSystem and InventorySystem record a compact event for each change in
+the change_events table, in the same transaction as the change, and publish
+the events to subscribers in this process once the transaction commits.
+Events are numbered by a sequence that only increases, so a consumer that
+saves the last sequence it handled as a checkpoint can catch up later by
+reading the events after it.
+"""
+from dataclasses import dataclass
+import sqlite3
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from records import iter_records
+
+# Kinds of events, the entity is the order, count or adjustment changed
+ORDER_OPENED = "order_opened"  # reference is the customer id
+RETURN_OPENED = "return_opened"  # reference is the original order id
+LINE_CHANGED = "line_changed"  # quantity is the change in the line's quantity
+CUSTOMER_SET = "customer_set"  # reference is the customer id
+ORDER_PAID = "order_paid"  # reference is the payment type
+CUSTOMER_CREATED = "customer_created"
+COUNT_CREATED = "count_created"
+COUNT_ITEM_SET = "count_item_set"  # quantity is the quantity counted
+ADJUSTMENT_CREATED = "adjustment_created"
+ADJUSTMENT_ITEM_SET = "adjustment_item_set"  # quantity is the quantity adjusted
+
+
+@dataclass(slots=True)
+class ChangeEvent:
+    """Represents a change to an order, customer, count or adjustment"""
+
+    sequence: int
+    kind: str
+    entity_id: int
+    item_id: Optional[int]
+    quantity: Optional[int]
+    reference: Optional[int]
+    timestamp: str
+
+    @staticmethod
+    def from_row(row: Any) -> "ChangeEvent":
+        """Converts a sqlite row to a ChangeEvent
+
+        Args:
+            row (Any): Row from the database
+
+        Returns:
+            ChangeEvent: an event from the database
+        """
+        sequence, kind, entity_id, item_id, quantity, reference, timestamp = row
+        return ChangeEvent(
+            sequence, kind, entity_id, item_id, quantity, reference, timestamp
+        )
+
+
+@dataclass(slots=True)
+class Subscription:
+    """A function called with each event published, of some kinds or all"""
+
+    callback: Callable[[ChangeEvent], None]
+    kinds: Optional[frozenset[str]]
+
+
+class ChangeLog:
+    """Change Log Class"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.subscriptions: list[Subscription] = []
+        self._pending: list[ChangeEvent] = []
+
+    def record(
+        self,
+        kind: str,
+        entity_id: int,
+        item_id: Optional[int] = None,
+        quantity: Optional[int] = None,
+        reference: Optional[int] = None,
+    ) -> int:
+        """Appends an event to the change table without committing
+
+        The event is published by the next call to publish, after the
+        change it describes has been committed.
+
+        Args:
+            kind (str): kind of change, one of the constants of this module
+            entity_id (int): id of the order, customer, count or adjustment
+            item_id (Optional[int], optional): item changed. Defaults to None.
+            quantity (Optional[int], optional): quantity of the change.
+                Defaults to None.
+            reference (Optional[int], optional): id of a related row.
+                Defaults to None.
+
+        Returns:
+            int: sequence of the event
+        """
+        cur = self.conn.execute(
+            """
+INSERT INTO
+    change_events(kind, entity_id, item_id, quantity, reference)
+VALUES
+    (?, ?, ?, ?, ?) RETURNING sequence,
+    kind,
+    entity_id,
+    item_id,
+    quantity,
+    reference,
+    ts;
+""",
+            (kind, entity_id, item_id, quantity, reference),
+        )
+        event = ChangeEvent.from_row(cur.fetchall()[0])
+        self._pending.append(event)
+        return event.sequence
+
+    def publish(self) -> int:
+        """Calls subscribers with the events recorded since the last publish
+
+        Returns:
+            int: number of events published
+        """
+        events, self._pending = self._pending, []
+        for event in events:
+            for subscription in self.subscriptions:
+                if subscription.kinds is None or event.kind in subscription.kinds:
+                    subscription.callback(event)
+        return len(events)
+
+    def discard(self):
+        """Forgets events recorded since the last publish, after a rollback"""
+        self._pending.clear()
+
+    def subscribe(
+        self,
+        callback: Callable[[ChangeEvent], None],
+        kinds: Optional[Iterable[str]] = None,
+        after: Optional[int] = None,
+    ) -> Subscription:
+        """Calls a function with each event published from now on
+
+        Args:
+            callback (Callable[[ChangeEvent], None]): function to call
+            kinds (Optional[Iterable[str]], optional): kinds of events to
+                receive, all if None. Defaults to None.
+            after (Optional[int], optional): checkpoint to catch up from, the
+                events recorded after it are passed to the function before it
+                is subscribed. Defaults to None.
+
+        Returns:
+            Subscription: the subscription, for unsubscribe
+        """
+        subscription = Subscription(
+            callback, None if kinds is None else frozenset(kinds)
+        )
+        if after is not None:
+            for event in self.iter_changes(after, subscription.kinds):
+                callback(event)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Stops calling a subscribed function
+
+        Args:
+            subscription (Subscription): subscription returned by subscribe
+        """
+        self.subscriptions.remove(subscription)
+
+    def get_changes(
+        self, after: int = 0, kinds: Optional[Iterable[str]] = None
+    ) -> list[ChangeEvent]:
+        """Gets the events recorded after a checkpoint
+
+        Args:
+            after (int, optional): sequence of the last event already handled.
+                Defaults to 0.
+            kinds (Optional[Iterable[str]], optional): kinds of events to
+                read, all if None. Defaults to None.
+
+        Returns:
+            list[ChangeEvent]: events in sequence order
+        """
+        return list(self.iter_changes(after, kinds))
+
+    def iter_changes(
+        self, after: int = 0, kinds: Optional[Iterable[str]] = None
+    ) -> Iterator[ChangeEvent]:
+        """Iterates through the events recorded after a checkpoint as they are read
+
+        Args:
+            after (int, optional): sequence of the last event already handled.
+                Defaults to 0.
+            kinds (Optional[Iterable[str]], optional): kinds of events to
+                read, all if None. Defaults to None.
+
+        Returns:
+            Iterator[ChangeEvent]: events in sequence order
+        """
+        parameters: list[Any] = [after]
+        condition = ""
+        if kinds is not None:
+            kinds = list(kinds)
+            condition = f"AND kind IN ({', '.join('?' for _ in kinds)})"
+            parameters.extend(kinds)
+        cur = self.conn.execute(
+            f"""
+SELECT
+    sequence,
+    kind,
+    entity_id,
+    item_id,
+    quantity,
+    reference,
+    ts
+FROM
+    change_events
+WHERE
+    sequence > ? {condition}
+ORDER BY
+    sequence;
+""",
+            parameters,
+        )
+        return iter_records(cur, ChangeEvent.from_row)
+
+    def last_sequence(self) -> int:
+        """Gets the sequence of the latest event recorded
+
+        Returns:
+            int: sequence, 0 if nothing has been recorded
+        """
+        cur = self.conn.execute("SELECT COALESCE(MAX(sequence), 0) FROM change_events;")
+        return cur.fetchone()[0]
+
+    def load_checkpoint(self, consumer: str) -> int:
+        """Gets the sequence of the last event a consumer saved as handled
+
+        Args:
+            consumer (str): name of the consumer
+
+        Returns:
+            int: saved sequence, 0 if the consumer has never saved one
+        """
+        cur = self.conn.execute(
+            "SELECT sequence FROM change_checkpoints WHERE consumer = ?;", (consumer,)
+        )
+        row = cur.fetchone()
+        return 0 if row is None else row[0]
+
+    def save_checkpoint(self, consumer: str, sequence: int):
+        """Saves the sequence of the last event a consumer has handled
+
+        Args:
+            consumer (str): name of the consumer
+            sequence (int): sequence of the last event handled
+        """
+        self.conn.execute(
+            """
+INSERT INTO
+    change_checkpoints(consumer, sequence)
+VALUES
+    (?, ?) ON CONFLICT(consumer) DO
+UPDATE
+SET
+    sequence = excluded.sequence;
+""",
+            (consumer, sequence),
+        )
+        self.conn.commit()
+
+    def prune(self) -> int:
+        """Deletes the events every consumer with a checkpoint has handled
+
+        Returns:
+            int: number of events deleted
+        """
+        cur = self.conn.execute(
+            """
+DELETE FROM
+    change_events
+WHERE
+    sequence <= (
+        SELECT
+            MIN(sequence)
+        FROM
+            change_checkpoints
+    );
+"""
+        )
+        self.conn.commit()
+        return cur.rowcount
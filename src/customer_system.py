@@ -1,10 +1,34 @@
 """Handles operations centered around customers"""
 from dataclasses import dataclass
 import sqlite3
-from typing import Optional
+from typing import Iterator, Optional
 
+from partitions import Partition, Partitions
+from records import iter_records
 
-@dataclass
+ARCHIVED_ORDERS = """
+SELECT
+    order_summary.id AS order_id,
+    customer_name,
+    phone_number,
+    email,
+    payment_types.payment_type,
+    users.username as cashier,
+    TIMESTAMP,
+    subtotal,
+    gst_total,
+    pst_total
+FROM
+    {schema}.order_summary
+    INNER JOIN customers ON customers.id = order_summary.customer_id
+    LEFT JOIN payment_types ON order_summary.payment_type = payment_types.id
+    LEFT JOIN users ON order_summary.user_id = users.id
+WHERE
+    {condition};
+"""
+
+
+@dataclass(slots=True)
 class CustomerOrder:
     """Represents an order with customer information"""
 
@@ -23,8 +47,65 @@ class CustomerOrder:
 class CustomerSystem:
     """Customer System class"""
 
-    def __init__(self, conn: sqlite3.Connection) -> None:
+    def __init__(
+        self, conn: sqlite3.Connection, partitions: Optional[Partitions] = None
+    ) -> None:
         self.conn = conn
+        self.partitions = partitions
+
+    def _iter_archived_orders(
+        self, partitions: list[Partition], condition: str, parameters: tuple
+    ) -> Iterator[CustomerOrder]:
+        """[Internal] Iterates through customer orders in archived months
+
+        Args:
+            partitions (list[Partition]): partitions to search
+            condition (str): filter on the columns of customer_orders
+            parameters (tuple): parameters of the condition
+
+        Returns:
+            Iterator[CustomerOrder]: matching customer orders
+        """
+        for partition in partitions:
+            schema = self.partitions.attach(partition)
+            cur = self.conn.execute(
+                ARCHIVED_ORDERS.format(schema=schema, condition=condition), parameters
+            )
+            yield from iter_records(cur, lambda row: CustomerOrder(*row))
+
+    def _with_archived_orders(
+        self, cur: sqlite3.Cursor, condition: str, parameters: tuple
+    ) -> Iterator[CustomerOrder]:
+        """[Internal] Adds the orders of archived months to a customer search
+
+        Customers whose orders were all archived are listed without an order
+        by the main database, those rows are dropped.
+
+        Args:
+            cur (sqlite3.Cursor): search of the main database
+            condition (str): filter on the columns of customer_orders
+            parameters (tuple): parameters of the condition
+
+        Returns:
+            Iterator[CustomerOrder]: matching customer orders
+        """
+        orders = iter_records(cur, lambda row: CustomerOrder(*row))
+        if self.partitions is None:
+            return orders
+        partitions = self.partitions.list_partitions()
+        if len(partitions) == 0:
+            return orders
+        archived = list(self._iter_archived_orders(partitions, condition, parameters))
+        customers = {
+            (order.customer_name, order.phone_number, order.email) for order in archived
+        }
+        current = [
+            order
+            for order in orders
+            if order.order_id is not None
+            or (order.customer_name, order.phone_number, order.email) not in customers
+        ]
+        return iter(current + archived)
 
     def get_customer_order_by_id(self, order_id: int) -> Optional[CustomerOrder]:
         """Gets a customer order by id
@@ -56,9 +137,18 @@ WHERE
             (order_id,),
         )
         order = cur.fetchone()
-        if order is None:
+        if order is not None:
+            return CustomerOrder(*order)
+        if self.partitions is None:
             return None
-        return CustomerOrder(*order)
+        return next(
+            self._iter_archived_orders(
+                self.partitions.containing_order(order_id),
+                "order_summary.id = ?",
+                (order_id,),
+            ),
+            None,
+        )
 
     def search_orders_by_name(self, customer_name: str) -> list[CustomerOrder]:
         """Search customer orders by customer name
@@ -69,6 +159,17 @@ WHERE
         Returns:
             list[Customer]: list of customer orders matching a name
         """
+        return list(self.iter_orders_by_name(customer_name))
+
+    def iter_orders_by_name(self, customer_name: str) -> Iterator[CustomerOrder]:
+        """Iterates through customer orders matching a name as they are read
+
+        Args:
+            customer_name (str): name or partial name
+
+        Returns:
+            Iterator[CustomerOrder]: customer orders matching a name
+        """
         cur = self.conn.execute(
             """
 SELECT
@@ -89,7 +190,9 @@ WHERE
 """,
             (customer_name,),
         )
-        return list(map(lambda row: CustomerOrder(*row), cur.fetchall()))
+        return self._with_archived_orders(
+            cur, "customer_name LIKE '%' || ? || '%'", (customer_name,)
+        )
 
     def search_orders_by_email(self, customer_email: str) -> list[CustomerOrder]:
         """Search customer orders by customer email
@@ -100,6 +203,17 @@ WHERE
         Returns:
             list[Customer]: list of customer orders matching an email
         """
+        return list(self.iter_orders_by_email(customer_email))
+
+    def iter_orders_by_email(self, customer_email: str) -> Iterator[CustomerOrder]:
+        """Iterates through customer orders matching an email as they are read
+
+        Args:
+            customer_email (str): email or partial email
+
+        Returns:
+            Iterator[CustomerOrder]: customer orders matching an email
+        """
         cur = self.conn.execute(
             """
 SELECT
@@ -120,7 +234,9 @@ WHERE
 """,
             (customer_email,),
         )
-        return list(map(lambda row: CustomerOrder(*row), cur.fetchall()))
+        return self._with_archived_orders(
+            cur, "email LIKE '%' || ? || '%'", (customer_email,)
+        )
 
     def search_orders_by_phone_number(self, phone_number: str) -> list[CustomerOrder]:
         """Search customer orders by customer phone number
@@ -131,6 +247,17 @@ WHERE
         Returns:
             list[Customer]: list of customer orders matching a phone number
         """
+        return list(self.iter_orders_by_phone_number(phone_number))
+
+    def iter_orders_by_phone_number(self, phone_number: str) -> Iterator[CustomerOrder]:
+        """Iterates through customer orders matching a phone number as they are read
+
+        Args:
+            phone_number (str): phone number or partial phone number
+
+        Returns:
+            Iterator[CustomerOrder]: customer orders matching a phone number
+        """
         cur = self.conn.execute(
             """
 SELECT
@@ -151,4 +278,6 @@ WHERE
 """,
             (phone_number,),
         )
-        return list(map(lambda row: CustomerOrder(*row), cur.fetchall()))
+        return self._with_archived_orders(
+            cur, "phone_number LIKE '%' || ? || '%'", (phone_number,)
+        )
@@ -1,5 +1,6 @@
 """Handles the main dashboard window"""
-from tkinter import LEFT, RIDGE, TOP, Button, Frame, Label, PhotoImage, Tk
+import argparse
+from tkinter import LEFT, RIDGE, TOP, Button, Frame, Label, PhotoImage, Tk, messagebox
 from typing import Optional
 from PIL import Image, ImageTk
 from login_screen import LoginScreen
@@ -9,6 +10,13 @@ from reports_view import ReportsView
 from app import App
 
 from search_order_screen import SearchOrderScreen
+from ui_diagnostics import EventLoopMonitor
+
+# Milliseconds between replays of orders queued during an outage
+QUEUE_SYNC_MS = 30_000
+
+# Milliseconds between checks for bills the printer could not print
+PRINT_STATUS_MS = 1000
 
 
 class DashboardView(Tk):
@@ -19,10 +27,27 @@ class DashboardView(Tk):
     inventory_view: Optional[InventoryView]
     reports_view: Optional[ReportsView]
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        instrument_queries: bool = False,
+        diagnostics: bool = False,
+        printer: Optional[str] = None,
+        data_directory: str = ".",
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.geometry("1200x700")
-        self.app = App()
+        self.app = App(
+            instrument_queries=instrument_queries,
+            data_directory=data_directory,
+            printer=printer,
+        )
+
+        self.monitor = None
+        if diagnostics:
+            self.monitor = EventLoopMonitor(self)
+            self.monitor.start()
 
         self.title("Retail Billing System  |  By Team_23")
         self.config(bg="sienna")
@@ -164,6 +189,37 @@ class DashboardView(Tk):
         reports_button.grid(row=0, column=3)
 
         self.open_login_view()
+        # Orders left queued by the last run are replayed once the window is up
+        self.after_idle(self.sync_queued_orders)
+        self.after(PRINT_STATUS_MS, self.report_failed_prints)
+
+    def report_failed_prints(self):
+        """Warns about bills the printer could not print after retrying"""
+        # The spooler is only started by printing a bill
+        failed = []
+        if "print_spooler" in vars(self.app):
+            failed = self.app.print_spooler.take_failed()
+        if len(failed) > 0:
+            messagebox.showwarning(
+                "Printing Failed",
+                ", ".join(job.title for job in failed)
+                + f" could not be printed: {failed[-1].last_error}."
+                + " Reprint them from the search screen.",
+            )
+        self.after(PRINT_STATUS_MS, self.report_failed_prints)
+
+    def sync_queued_orders(self):
+        """Replays queued orders, warning about orders that conflict"""
+        if self.app.register_queue.count() > 0:
+            result = self.app.sync_queued_orders()
+            if len(result.conflicts) > 0:
+                messagebox.showwarning(
+                    "Orders Need Review",
+                    "Orders made during the outage were refused by the database,"
+                    + " or refunded more than was left to return: "
+                    + ", ".join(map(str, result.conflicts)),
+                )
+        self.after(QUEUE_SYNC_MS, self.sync_queued_orders)
 
     def handle_login_window_close(self):
         """Handle the login window being closed without the use logging in"""
@@ -203,5 +259,35 @@ class DashboardView(Tk):
 
 
 if __name__ == "__main__":
-    root = DashboardView()
+    parser = argparse.ArgumentParser(description="Retail Billing System")
+    parser.add_argument(
+        "--instrument-queries",
+        action="store_true",
+        help="record sql statement statistics and log slow queries to logs/",
+    )
+    parser.add_argument(
+        "--diagnostics",
+        action="store_true",
+        help="report main loop stalls and profile slow actions to logs/diagnostics",
+    )
+    parser.add_argument(
+        "--printer",
+        help='print bills to "file:<path>", "device:<path>" or "command:lp -d <name>"',
+    )
+    parser.add_argument(
+        "--data-directory",
+        default=".",
+        help="directory of the register's journal/ and receipts/",
+    )
+    args = parser.parse_args()
+    root = DashboardView(
+        instrument_queries=args.instrument_queries,
+        diagnostics=args.diagnostics,
+        printer=args.printer,
+        data_directory=args.data_directory,
+    )
     root.mainloop()
+    # Bills still queued are printed, and any that are not are listed
+    root.app.stop_printing()
+    if root.monitor is not None:
+        root.monitor.stop()
@@ -0,0 +1,322 @@
+"""Places orders rung up in memory once they are paid for
+
+Orders used to be inserted when the order window opened and filled in one
+line at a time, so every window closed without paying left an order behind.
+A DraftOrder holds the basket in memory instead, and DraftOrders writes it
+as a paid order, with its lines and totals, in one transaction at payment.
+Every draft carries a key stored with its order, so placing it again, after
+a failure whose reply was lost, returns the order already written. The
+empty orders left behind by earlier versions are deleted in batches by
+purge_abandoned_orders.
+"""
+from dataclasses import dataclass, field
+import json
+from typing import Callable, Optional
+import uuid
+
+from change_log import LINE_CHANGED, ORDER_OPENED, ORDER_PAID, RETURN_OPENED
+from order_system import ORDER_TOTALS, Item, ItemQuantity, Order, OrderSystem
+
+
+@dataclass(slots=True)
+class DraftOrder:
+    """An order being rung up, held in memory until it is paid for
+
+    Nothing is written to the database until the order is placed, so an
+    order abandoned before payment leaves no row behind in orders or the
+    reports read from it.
+    """
+
+    user_id: int
+    customer_id: Optional[int] = None
+    # Line of each item id, priced when the item was first added
+    lines: dict[int, ItemQuantity] = field(default_factory=dict)
+    # Order returned, whose lines are returned with negative quantities
+    order_reference: Optional[int] = None
+    # Placing an order twice with the same key only writes it once
+    key: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def add_item(self, item: Item, quantity: int = 1):
+        """Adds an item to the order
+
+        Args:
+            item (Item): item to add
+            quantity (int, optional): quantity to add. Defaults to 1.
+        """
+        line = self.lines.get(item.item_id)
+        if line is not None:
+            line.quantity += quantity
+            return
+        self.lines[item.item_id] = ItemQuantity(
+            item_id=item.item_id,
+            quantity=quantity,
+            name=item.name,
+            price=item.price,
+            category=item.category,
+            gst=item.gst,
+            pst=item.pst,
+        )
+
+    def remove_item(self, item_id: int, quantity: int = 1):
+        """Removes an item from the order, dropping its line once none are left
+
+        Args:
+            item_id (int): id of the item to remove
+            quantity (int, optional): quantity to remove. Defaults to 1.
+        """
+        line = self.lines.get(item_id)
+        if line is None:
+            return
+        line.quantity -= quantity
+        if line.quantity <= 0:
+            del self.lines[item_id]
+
+    def to_order(self) -> Order:
+        """Shows the draft as an order, for displaying its lines and totals
+
+        Returns:
+            Order: unsaved order with id 0
+        """
+        return Order(
+            0,
+            self.customer_id,
+            self.user_id,
+            None,
+            self.order_reference,
+            "",
+            list(self.lines.values()),
+            False,
+        )
+
+
+class DraftOrders:
+    """Draft Orders Class"""
+
+    def __init__(self, order_system: OrderSystem) -> None:
+        """Places drafts through an order system
+
+        Args:
+            order_system (OrderSystem): order system of the database, whose
+                change log and order ids the placed orders use
+        """
+        self.order_system = order_system
+        self.conn = order_system.conn
+        self.changes = order_system.changes
+
+    def place_order(
+        self,
+        draft: DraftOrder,
+        payment_type: int,
+        order_id: Optional[int] = None,
+        timestamp: Optional[str] = None,
+    ) -> int:
+        """Writes a draft order as a paid order in one transaction
+
+        The order, its lines and its totals are inserted and committed
+        together, with the same change events as opening, filling and
+        paying for an order one step at a time. An order whose key was
+        already placed is not written again, so placing an order can be
+        retried safely. Nothing is written if it fails part way.
+
+        Args:
+            draft (DraftOrder): order rung up in memory
+            payment_type (int): id of payment type
+            order_id (Optional[int], optional): id taken for the order when it
+                was sold, a new one if None. Defaults to None.
+            timestamp (Optional[str], optional): time the order was sold, now
+                if None. Defaults to None.
+
+        Raises:
+            RuntimeError: if db did not set last row id
+
+        Returns:
+            int: id of the order, the existing one if the key was placed
+        """
+        existing = self.find_placed_order(draft.key)
+        if existing is not None:
+            return existing
+        lines = [line for line in draft.lines.values() if line.quantity != 0]
+        try:
+            order_id = self._insert_placed_order(
+                draft, lines, payment_type, order_id, timestamp
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.changes.discard()
+            raise
+        self.changes.publish()
+        return order_id
+
+    def find_placed_order(self, key: str) -> Optional[int]:
+        """Finds the order placed from a draft with a key
+
+        Args:
+            key (str): key of the draft
+
+        Returns:
+            Optional[int]: id of the order, None if it was not placed
+        """
+        found = self.conn.execute(
+            "SELECT id FROM orders WHERE idempotency_key = ?;", (key,)
+        ).fetchone()
+        return None if found is None else found[0]
+
+    def _insert_placed_order(
+        self,
+        draft: DraftOrder,
+        lines: list[ItemQuantity],
+        payment_type: int,
+        order_id: Optional[int],
+        timestamp: Optional[str],
+    ) -> int:
+        """[Internal] Inserts a paid order and its lines without committing"""
+        if order_id is None and self.order_system.order_ids is not None:
+            order_id = self.order_system.order_ids.take()
+        cur = self.conn.execute(
+            """
+INSERT INTO
+    orders(
+        id,
+        customer_id,
+        user_id,
+        payment_type,
+        order_reference,
+        idempotency_key,
+        timestamp
+    )
+VALUES
+    (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP));
+""",
+            (
+                order_id,
+                draft.customer_id,
+                draft.user_id,
+                payment_type,
+                draft.order_reference,
+                draft.key,
+                timestamp,
+            ),
+        )
+        if cur.lastrowid is None:
+            raise RuntimeError
+        order_id = cur.lastrowid
+        if draft.order_reference is None:
+            self.changes.record(ORDER_OPENED, order_id, reference=draft.customer_id)
+        else:
+            self.changes.record(
+                RETURN_OPENED, order_id, reference=draft.order_reference
+            )
+        self.conn.executemany(
+            """
+INSERT INTO
+    order_items(order_id, item_id, quantity, price, gst, pst, gst_rate, pst_rate)
+VALUES
+    (?, ?, ?, ?, ?, ?, ?, ?);
+""",
+            [
+                (
+                    order_id,
+                    line.item_id,
+                    line.quantity,
+                    line.price,
+                    line.gst,
+                    line.pst,
+                    line.gst_rate,
+                    line.pst_rate,
+                )
+                for line in lines
+            ],
+        )
+        for line in lines:
+            self.changes.record(LINE_CHANGED, order_id, line.item_id, line.quantity)
+        self.conn.execute(
+            f"UPDATE orders SET {ORDER_TOTALS} WHERE id = ?;", (order_id,)
+        )
+        self.changes.record(ORDER_PAID, order_id, reference=payment_type)
+        return order_id
+
+    def purge_abandoned_orders(
+        self,
+        min_age_hours: float = 24,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        """Deletes unpaid orders without items, left by windows closed unpaid
+
+        Orders were once inserted when the order window opened, so every
+        window closed without paying left an empty order behind. Orders are
+        deleted a batch at a time, each committed on its own, so checkouts
+        are never blocked for long. Orders referenced by a return are kept.
+
+        Args:
+            min_age_hours (float, optional): only orders opened longer ago
+                than this are deleted, so orders still being rung up are
+                kept. Defaults to 24.
+            batch_size (int, optional): orders deleted per transaction.
+                Defaults to 1000.
+            progress (Optional[Callable[[int], None]], optional): called with
+                the number of orders deleted so far. Defaults to None.
+
+        Returns:
+            int: number of orders deleted
+        """
+        deleted = 0
+        last_id = 0
+        while True:
+            order_ids = [
+                row[0]
+                for row in self.conn.execute(
+                    """
+SELECT
+    id
+FROM
+    orders
+WHERE
+    id > ?
+    AND payment_type IS NULL
+    AND TIMESTAMP < DATETIME('now', ?)
+    AND NOT EXISTS (
+        SELECT
+            1
+        FROM
+            order_items
+        WHERE
+            order_items.order_id = orders.id
+            AND quantity > 0
+    )
+    AND NOT EXISTS (
+        SELECT
+            1
+        FROM
+            orders AS returns
+        WHERE
+            returns.order_reference = orders.id
+    )
+ORDER BY
+    id
+LIMIT
+    ?;
+""",
+                    (last_id, f"-{min_age_hours * 3600} seconds", batch_size),
+                )
+            ]
+            if len(order_ids) == 0:
+                break
+            # Lines whose items were all removed again are deleted with their order
+            batch = json.dumps(order_ids)
+            self.conn.execute(
+                "DELETE FROM order_items"
+                + " WHERE order_id IN (SELECT value FROM json_each(?));",
+                (batch,),
+            )
+            self.conn.execute(
+                "DELETE FROM orders WHERE id IN (SELECT value FROM json_each(?));",
+                (batch,),
+            )
+            self.conn.commit()
+            deleted += len(order_ids)
+            last_id = order_ids[-1]
+            if progress is not None:
+                progress(deleted)
+        return deleted
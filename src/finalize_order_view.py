@@ -1,6 +1,5 @@
 """Contains the functionality for finalizing orders"""
 import datetime
-from pathlib import Path
 import re
 from tkinter import (
     Button,
@@ -11,20 +10,35 @@ from tkinter import (
     Toplevel,
     messagebox,
 )
-import os
+from typing import Optional
 import requests
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 from app import App
+from draft_orders import DraftOrder
+from order_system import Order
 
 
 class FinalizeOrderView(Toplevel):
     """Finalize order GUI window"""
 
-    def __init__(self, app: App, order_id: int, *args, **kwargs):
+    def __init__(
+        self,
+        app: App,
+        order_id: Optional[int],
+        *args,
+        basket_id: Optional[int] = None,
+        draft: Optional[DraftOrder] = None,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.app = app
+        # A basket or draft is only written to the database once it is paid for
         self.order_id = order_id
+        self.basket_id = basket_id
+        self.draft = draft
+        # Details of the placed order, which may only be queued on the register
+        self.order: Optional[Order] = None
         self.geometry("300x300")
         Label(self, text="Customer Information").grid(row=0, column=0, columnspan=2)
 
@@ -85,21 +99,56 @@ class FinalizeOrderView(Toplevel):
         self.destroy()
 
     def close_order(self):
-        """Handles closing the order"""
+        """Handles closing the order
+
+        The order is only placed once, so clicking again or retrying after a
+        failed print or email does not place it, or its customer, twice.
+        """
+        if self.order is not None:
+            return
+        customer_id = None
         if self.name_entry.get() != "":
             customer_id = self.app.order_system.create_customer(
                 self.name_entry.get(), self.phone_entry.get(), self.email_entry.get()
             )
+
+        payment_type = self.payment_types[self.result.get()]
+        if self.basket_id is not None:
+            journal = self.app.basket_journal
+            basket = journal.baskets.get(self.basket_id)
+            # Closed once placed, so it is only missing if placed already
+            if basket is None:
+                return
+            if customer_id is not None:
+                journal.set_customer(self.basket_id, customer_id)
+            self.order = self.app.place_order(basket, payment_type)
+            self.order_id = self.order.order_id
+            journal.close_basket(self.basket_id, self.order_id)
+            return
+        if self.draft is not None:
+            if customer_id is not None:
+                self.draft.customer_id = customer_id
+            self.order = self.app.place_order(self.draft, payment_type)
+            self.order_id = self.order.order_id
+            return
+        if customer_id is not None:
             self.app.order_system.add_customer_to_order(self.order_id, customer_id)
+        self.app.order_system.pay_for_order(self.order_id, payment_type)
 
-        self.app.order_system.pay_for_order(
-            self.order_id, self.payment_types[self.result.get()]
-        )
+    def get_order_details(self) -> Order:
+        """Gets the details of the order for its bill
+
+        Returns:
+            Order: details of the order
+        """
+        if self.order is not None:
+            return self.order
+        return self.app.order_system.get_order_details(self.order_id)
 
     def send_email(self):
         """Handles sending the bill as an email"""
 
-        order_details = self.app.order_system.get_order_details(self.order_id)
+        order_details = self.get_order_details()
         bill_content = order_details.to_string().replace("\n", "<br />")
 
         # Validating the email address before sending email to the customer
@@ -154,16 +203,17 @@ class FinalizeOrderView(Toplevel):
     def print_bill_content(self):
         """Handles printing the bill contents"""
 
-        order_details = self.app.order_system.get_order_details(self.order_id)
+        order_details = self.get_order_details()
         bill_content = order_details.to_string()
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
 
-        # Ensure the bills directory exists
-        Path("bills").mkdir(parents=True, exist_ok=True)
-
-        path = Path("bills", f"bill-{timestamp}-{self.order_id}.txt")
-
-        # this is to read and print file
-        with open(path, "w", encoding="utf-8") as file:
-            file.write(bill_content)
-        os.startfile(path, "print")
+        # Bills are kept in the register's receipt journal, except orders
+        # queued during an outage without a bill number
+        title = "Bill"
+        if order_details.order_id != 0:
+            self.app.receipt_journal.append(
+                order_details.order_id,
+                bill_content,
+                datetime.date.fromisoformat(order_details.timestamp[:10]),
+            )
+            title = f"Bill {order_details.order_id}"
+        self.app.print_bill(bill_content, title)
@@ -0,0 +1,300 @@
+"""Forecasts the demand of every item and suggests what to reorder
+
+The net quantity of each item sold on each of the last HISTORY_DAYS closed
+days is kept in a dense array, one row per day and one column per item id.
+Weekday seasonality, an exponentially smoothed daily level and its error are
+computed for all items at once, and turned into days of cover, reorder
+points and suggested order quantities for the current stock on hand. Only
+days closed since the last refresh are read from the database. A store with
+fewer than SEASONAL_MIN_DAYS days of sales is forecast from its plain daily
+average, as a few weeks of weekday patterns add more noise than they remove.
+"""
+from dataclasses import dataclass
+import datetime
+import sqlite3
+from typing import Optional
+
+import numpy as np
+
+from partitions import Partitions
+
+# Closed days of sales the forecast is based on, eight of each weekday
+HISTORY_DAYS = 56
+
+# Days of sales needed before weekday patterns are used, four of each
+# weekday, shorter histories are forecast with their plain daily average
+SEASONAL_MIN_DAYS = 28
+
+# Units of an item's own sales needed before its weekday pattern counts as
+# much as the pattern of the whole store
+SEASONAL_PRIOR_UNITS = 28.0
+
+
+@dataclass(slots=True)
+class ReorderSuggestion:
+    """Represents the forecast demand and reorder suggestion of an item"""
+
+    item_id: int
+    weekly_average: float
+    daily_demand: float
+    days_of_cover: Optional[float]
+    reorder_point: int
+    order_quantity: int
+
+
+class ForecastSystem:
+    """Forecast System Class"""
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        partitions: Optional[Partitions] = None,
+        lead_time_days: int = 7,
+        review_days: int = 7,
+        smoothing: float = 0.05,
+        service_factor: float = 1.65,
+    ) -> None:
+        """Creates a forecast without any sales loaded
+
+        Args:
+            conn (sqlite3.Connection): connection to the database
+            partitions (Optional[Partitions], optional): archived months.
+                Defaults to None.
+            lead_time_days (int, optional): days between ordering stock and
+                receiving it. Defaults to 7.
+            review_days (int, optional): days between orders. Defaults to 7.
+            smoothing (float, optional): weight of the latest day in the
+                smoothed level. Defaults to 0.05.
+            service_factor (float, optional): standard deviations of demand
+                kept as safety stock, 1.65 runs out in about 5% of lead
+                times. Defaults to 1.65.
+        """
+        self.conn = conn
+        self.partitions = partitions
+        self.lead_time_days = lead_time_days
+        self.review_days = review_days
+        self.smoothing = smoothing
+        self.service_factor = service_factor
+
+        self.end: Optional[datetime.date] = None
+        self.sales = np.zeros((HISTORY_DAYS, 0))
+        self.weekly_average = np.zeros(0)
+        self.level = np.zeros(0)
+        self.lead_time_demand = np.zeros(0)
+        self.order_up_to = np.zeros(0)
+        self.safety_stock = np.zeros(0)
+
+    @property
+    def start(self) -> Optional[datetime.date]:
+        """First day of the sales loaded"""
+        if self.end is None:
+            return None
+        return self.end - datetime.timedelta(days=HISTORY_DAYS - 1)
+
+    def _last_sale_day(self) -> Optional[datetime.date]:
+        """[Internal] Gets the day of the most recent order, archived or not"""
+        timestamps = [
+            self.conn.execute("SELECT MAX(TIMESTAMP) FROM orders;").fetchone()[0]
+        ]
+        if self.partitions is not None:
+            timestamps.extend(
+                partition.last_ts for partition in self.partitions.list_partitions()
+            )
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+        if len(timestamps) == 0:
+            return None
+        return datetime.date.fromisoformat(max(timestamps)[:10])
+
+    def _load(self, start: datetime.date, end: datetime.date):
+        """[Internal] Adds the sales of a range of days to the array
+
+        Args:
+            start (datetime.date): first day to read
+            end (datetime.date): last day to read, the last row of the array
+        """
+        schemas = ["main"]
+        if self.partitions is not None:
+            schemas.extend(
+                self.partitions.attach(partition)
+                for partition in self.partitions.overlapping(start, end)
+            )
+        rows = []
+        for schema in schemas:
+            cur = self.conn.execute(
+                f"""
+SELECT
+    JULIANDAY(DATE(TIMESTAMP)) - JULIANDAY(?1) AS day,
+    item_id,
+    SUM(quantity) AS quantity_sold
+FROM
+    {schema}.orders
+    INNER JOIN {schema}.order_items ON orders.id = order_items.order_id
+WHERE
+    payment_type IS NOT NULL
+    AND TIMESTAMP >= ?2
+    AND TIMESTAMP < ?3
+GROUP BY
+    day,
+    item_id;
+""",
+                (str(end), str(start), str(end + datetime.timedelta(days=1))),
+            )
+            rows.extend(cur)
+        if len(rows) == 0:
+            return
+        days, item_ids, quantities = np.array(rows, dtype=np.float64).T
+        item_ids = item_ids.astype(np.int64)
+        if item_ids.max() >= self.sales.shape[1]:
+            grown = np.zeros((HISTORY_DAYS, item_ids.max() + 1))
+            grown[:, : self.sales.shape[1]] = self.sales
+            self.sales = grown
+        # Day offsets from the end are negative, so they index rows from the end
+        np.add.at(self.sales, (days.astype(np.int64) - 1, item_ids), quantities)
+
+    def refresh(self, end: Optional[datetime.date] = None) -> int:
+        """Reads the days closed since the last refresh and updates the forecast
+
+        Args:
+            end (Optional[datetime.date], optional): last day of sales to
+                use. Defaults to yesterday, or the day of the most recent
+                order if the store has not sold anything since.
+
+        Returns:
+            int: number of days read from the database
+        """
+        if end is None:
+            end = datetime.date.today() - datetime.timedelta(days=1)
+            last_sale_day = self._last_sale_day()
+            if last_sale_day is not None:
+                end = min(end, last_sale_day)
+        if self.end is not None and end == self.end:
+            return 0
+
+        if self.end is None or not 0 < (end - self.end).days < HISTORY_DAYS:
+            self.sales[:] = 0
+            start = end - datetime.timedelta(days=HISTORY_DAYS - 1)
+        else:
+            # Days already loaded are kept and move towards the start
+            shift = (end - self.end).days
+            self.sales = np.roll(self.sales, -shift, axis=0)
+            self.sales[-shift:] = 0
+            start = self.end + datetime.timedelta(days=1)
+        self._load(start, end)
+        self.end = end
+        self._forecast()
+        return (end - start).days + 1
+
+    def _forecast(self):
+        """[Internal] Computes the forecast of every item from the sales array"""
+        # Days before the store's first sale in the window are not history
+        sold_days = np.flatnonzero(self.sales.any(axis=1))
+        days = HISTORY_DAYS - sold_days[0] if len(sold_days) > 0 else 1
+        sales = np.maximum(self.sales[-days:], 0)
+        weekdays = (np.arange(-days, 0) + self.end.weekday() + 1) % 7
+        if days < SEASONAL_MIN_DAYS:
+            # Too few weeks for weekday patterns or smoothing to beat the mean
+            seasonal = np.ones((7, sales.shape[1]))
+            self.level = sales.mean(axis=0)
+            error = sales.std(axis=0)
+        else:
+            seasonal = self._seasonal(sales, weekdays)
+
+            # Exponential smoothing of the deseasonalized sales, as one
+            # weighted sum over the window with the weights of the recursive form
+            adjusted = sales / seasonal[weekdays]
+            weights = self.smoothing * (1 - self.smoothing) ** np.arange(
+                days - 1, -1, -1
+            )
+            weights /= weights.sum()
+            self.level = weights @ adjusted
+            error = np.sqrt(weights @ (adjusted - self.level) ** 2)
+
+        # Demand over the lead time and the review period that follows it
+        horizon = np.arange(1, self.lead_time_days + self.review_days + 1)
+        future = (horizon + self.end.weekday()) % 7
+        daily_forecast = self.level * seasonal[future]
+        self.lead_time_demand = daily_forecast[: self.lead_time_days].sum(axis=0)
+        self.safety_stock = self.service_factor * error * np.sqrt(self.lead_time_days)
+        self.order_up_to = daily_forecast.sum(axis=0) + self.safety_stock
+        self.weekly_average = sales[-7:].sum(axis=0) / min(days, 7)
+
+    @staticmethod
+    def _seasonal(sales: np.ndarray, weekdays: np.ndarray) -> np.ndarray:
+        """[Internal] Gets the sales of each weekday relative to an average day
+
+        Items with few sales lean on the pattern of the whole store.
+
+        Args:
+            sales (np.ndarray): days by items array of sales
+            weekdays (np.ndarray): weekday of each day
+
+        Returns:
+            np.ndarray: weekdays by items array of factors
+        """
+        days = len(sales)
+        totals = sales.sum(axis=0)
+        weekday_totals = np.eye(7)[weekdays].T @ sales
+        weekday_days = np.bincount(weekdays, minlength=7)[:, np.newaxis]
+        store_mean = max(totals.sum() / days, 1e-9)
+        store_index = (
+            weekday_totals.sum(axis=1, keepdims=True) / weekday_days / store_mean
+        )
+        store_index = np.where(store_index > 0, store_index, 1.0)
+        return (weekday_totals + SEASONAL_PRIOR_UNITS * store_index / 7) / (
+            weekday_days * (totals / days) + SEASONAL_PRIOR_UNITS / 7
+        )
+
+    def get_reorder_suggestions(
+        self, on_hand: dict[int, int]
+    ) -> dict[int, ReorderSuggestion]:
+        """Gets the forecast demand and what to reorder for items in stock
+
+        Call refresh first to include recent sales.
+
+        Args:
+            on_hand (dict[int, int]): quantity on hand of each item id
+
+        Returns:
+            dict[int, ReorderSuggestion]: suggestion for each item id
+        """
+        item_ids = np.fromiter(on_hand, dtype=np.int64, count=len(on_hand))
+        stock = np.fromiter(on_hand.values(), dtype=np.float64, count=len(on_hand))
+        known = item_ids < len(self.level)
+        columns = np.where(known, item_ids, 0)
+
+        def lookup(values: np.ndarray) -> np.ndarray:
+            if len(values) == 0:
+                return np.zeros(len(item_ids))
+            return np.where(known, values[columns], 0.0)
+
+        level = lookup(self.level)
+        weekly_average = lookup(self.weekly_average)
+        reorder_point = np.ceil(
+            lookup(self.lead_time_demand) + lookup(self.safety_stock)
+        )
+        order_quantity = np.where(
+            stock <= reorder_point,
+            np.ceil(np.maximum(lookup(self.order_up_to) - stock, 0)),
+            0,
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_of_cover = np.maximum(stock, 0) / level
+
+        return {
+            item_id: ReorderSuggestion(
+                item_id,
+                weekly,
+                demand,
+                cover if demand > 0 else None,
+                int(point),
+                int(quantity),
+            )
+            for item_id, weekly, demand, cover, point, quantity in zip(
+                item_ids.tolist(),
+                weekly_average.tolist(),
+                level.tolist(),
+                days_of_cover.tolist(),
+                reorder_point.tolist(),
+                order_quantity.tolist(),
+            )
+        }
@@ -2,10 +2,20 @@
 from dataclasses import dataclass
 import datetime
 import sqlite3
-from typing import Any
+from typing import Any, Iterator, Optional
 
+from change_log import (
+    ADJUSTMENT_CREATED,
+    ADJUSTMENT_ITEM_SET,
+    COUNT_CREATED,
+    COUNT_ITEM_SET,
+    ChangeLog,
+)
+from partitions import Partitions
+from records import iter_records
 
-@dataclass
+
+@dataclass(slots=True)
 class InventoryCount:
     """Represents a inventory count"""
 
@@ -26,7 +36,7 @@ class InventoryCount:
         return InventoryCount(count_id, timestamp)
 
 
-@dataclass
+@dataclass(slots=True)
 class CountDetailsRecord:
     """Represents an record in an count details report"""
 
@@ -71,7 +81,7 @@ class CountDetailsRecord:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class InventoryReportRecord:
     """Represents an record in an inventory report"""
 
@@ -122,11 +132,110 @@ class InventoryReportRecord:
         )
 
 
+@dataclass(slots=True)
+class InventorySnapshotRecord:
+    """Represents an item's current inventory and its last two counts"""
+
+    category_id: int
+    category_name: str
+    item_id: int
+    name: str
+    date: str
+    day_quantity: int
+    month_quantity: int
+    count_quantity: int
+    previous_quantity: int
+    adjustment_quantity: int
+    quantity_sold: int
+
+    @staticmethod
+    def from_row(row: Any) -> "InventorySnapshotRecord":
+        """Converts a sqlite row to an InventorySnapshotRecord
+
+        Args:
+            row (Any): Row from the database
+
+        Returns:
+            InventorySnapshotRecord: a record from the database
+        """
+        (
+            category_id,
+            category_name,
+            item_id,
+            name,
+            date,
+            day_quantity,
+            month_quantity,
+            count_quantity,
+            previous_quantity,
+            adjustment_quantity,
+            quantity_sold,
+        ) = row
+        return InventorySnapshotRecord(
+            category_id,
+            category_name,
+            item_id,
+            name,
+            date,
+            day_quantity,
+            month_quantity,
+            count_quantity,
+            previous_quantity,
+            adjustment_quantity,
+            quantity_sold,
+        )
+
+
 class InventorySystem:
     """Inventory System Class"""
 
-    def __init__(self, conn: sqlite3.Connection) -> None:
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        partitions: Optional[Partitions] = None,
+        changes: Optional[ChangeLog] = None,
+    ) -> None:
         self.conn = conn
+        self.partitions = partitions
+        self.changes = changes or ChangeLog(conn)
+
+    def _archived_sales(
+        self, condition: str, parameters: tuple, start: str, end: str
+    ) -> dict[int, int]:
+        """[Internal] Adds up the items sold in archived months
+
+        Args:
+            condition (str): filter on the order timestamp
+            parameters (tuple): parameters of the condition
+            start (str): first timestamp the condition can match
+            end (str): last timestamp the condition can match
+
+        Returns:
+            dict[int, int]: quantity sold of each item id
+        """
+        sold: dict[int, int] = {}
+        if self.partitions is None:
+            return sold
+        for partition in self.partitions.overlapping(start, end):
+            schema = self.partitions.attach(partition)
+            cur = self.conn.execute(
+                f"""
+SELECT
+    item_id,
+    SUM(quantity) AS quantity_sold
+FROM
+    {schema}.orders
+    INNER JOIN {schema}.order_items ON orders.id = order_items.order_id
+WHERE
+    {condition}
+GROUP BY
+    item_id;
+""",
+                parameters,
+            )
+            for item_id, quantity in cur:
+                sold[item_id] = sold.get(item_id, 0) + quantity
+        return sold
 
     def create_count(self) -> int:
         """Creates a new count using the current time
@@ -138,9 +247,11 @@ class InventorySystem:
             int: id of the new inventory count
         """
         cur = self.conn.execute("INSERT INTO inventory_counts DEFAULT VALUES;")
-        self.conn.commit()
         if cur.lastrowid is None:
             raise RuntimeError
+        self.changes.record(COUNT_CREATED, cur.lastrowid)
+        self.conn.commit()
+        self.changes.publish()
         return cur.lastrowid
 
     def set_item_in_count(self, count_id: int, item_id: int, quantity: int):
@@ -155,7 +266,9 @@ class InventorySystem:
             "INSERT INTO inventory_count_items (count_id, item_id, quantity) VALUES (?, ?, ?);",
             (count_id, item_id, quantity),
         )
+        self.changes.record(COUNT_ITEM_SET, count_id, item_id, quantity)
         self.conn.commit()
+        self.changes.publish()
 
     def create_adjustment(self, reason: str) -> int:
         """Creates a new stock adjustment
@@ -172,9 +285,11 @@ class InventorySystem:
         cur = self.conn.execute(
             "INSERT INTO stock_adjustments (reason) VALUES (?);", (reason,)
         )
-        self.conn.commit()
         if cur.lastrowid is None:
             raise RuntimeError
+        self.changes.record(ADJUSTMENT_CREATED, cur.lastrowid)
+        self.conn.commit()
+        self.changes.publish()
         return cur.lastrowid
 
     def set_item_in_adjustment(self, adjustment_id: int, item_id: int, quantity: int):
@@ -189,7 +304,9 @@ class InventorySystem:
             "INSERT INTO stock_adjustment_items (adjustment_id, item_id, quantity) VALUES (?,?,?);",
             (adjustment_id, item_id, quantity),
         )
+        self.changes.record(ADJUSTMENT_ITEM_SET, adjustment_id, item_id, quantity)
         self.conn.commit()
+        self.changes.publish()
 
     def list_inventory_counts(self) -> list[InventoryCount]:
         """Lists inventory counts in the database
@@ -197,8 +314,29 @@ class InventorySystem:
         Returns:
             list[InventoryCount] inventory counts from the database
         """
+        return list(self.iter_inventory_counts())
+
+    def iter_inventory_counts(self) -> Iterator[InventoryCount]:
+        """Iterates through inventory counts in the database as they are read
+
+        Returns:
+            Iterator[InventoryCount]: inventory counts from the database
+        """
         cur = self.conn.execute("SELECT id, ts FROM inventory_counts;")
-        return list(map(InventoryCount.from_row, cur.fetchall()))
+        return iter_records(cur, InventoryCount.from_row)
+
+    def get_latest_count(self) -> Optional[InventoryCount]:
+        """Gets the most recent inventory count
+
+        Returns:
+            Optional[InventoryCount]: latest count, None if there are none
+        """
+        row = self.conn.execute(
+            "SELECT id, ts FROM inventory_counts ORDER BY ts DESC, id DESC LIMIT 1;"
+        ).fetchone()
+        if row is None:
+            return None
+        return InventoryCount.from_row(row)
 
     def get_count_details(self, count_id: int) -> list[CountDetailsRecord]:
         """Gets details about a count
@@ -209,6 +347,17 @@ class InventorySystem:
         Returns:
             list[CountDetailsRecord]: count details for each item
         """
+        return list(self.iter_count_details(count_id))
+
+    def iter_count_details(self, count_id: int) -> Iterator[CountDetailsRecord]:
+        """Iterates through the details of a count as they are read
+
+        Args:
+            count_id (int): id of count
+
+        Returns:
+            Iterator[CountDetailsRecord]: count details for each item
+        """
         cur = self.conn.execute(
             """
 SELECT
@@ -307,7 +456,23 @@ FROM
 """,
             (count_id,),
         )
-        return list(map(CountDetailsRecord.from_row, cur.fetchall()))
+        window = None
+        if self.partitions is not None:
+            window = self.conn.execute(
+                "SELECT previous_ts, current_ts FROM inventory_count_windows WHERE id = ?;",
+                (count_id,),
+            ).fetchone()
+        sold = {}
+        if window is not None:
+            sold = self._archived_sales(
+                "TIMESTAMP BETWEEN ? AND ?", window, window[0], window[1]
+            )
+        if len(sold) == 0:
+            return iter_records(cur, CountDetailsRecord.from_row)
+        records = list(iter_records(cur, CountDetailsRecord.from_row))
+        for record in records:
+            record.quantity_sold += sold.get(record.item_id, 0)
+        return iter(records)
 
     def get_inventory_details(self) -> list[InventoryReportRecord]:
         """Gets a report of the current inventory information
@@ -315,6 +480,14 @@ FROM
         Returns:
             list[InventoryReportRecord]: inventory information for each item
         """
+        return list(self.iter_inventory_details())
+
+    def iter_inventory_details(self) -> Iterator[InventoryReportRecord]:
+        """Iterates through the current inventory information as it is read
+
+        Returns:
+            Iterator[InventoryReportRecord]: inventory information for each item
+        """
         today = datetime.date.today()
         cur = self.conn.execute(
             """
@@ -425,4 +598,177 @@ GROUP BY
 """,
             (today,),
         )
-        return list(map(InventoryReportRecord.from_row, cur.fetchall()))
+        last_count = None
+        if self.partitions is not None:
+            last_count = self.conn.execute(
+                "SELECT MAX(ts) FROM inventory_counts;"
+            ).fetchone()[0]
+        sold = {}
+        if last_count is not None:
+            # Sales since the last count can reach back into archived months
+            sold = self._archived_sales(
+                "TIMESTAMP > ?", (last_count,), last_count, str(today)
+            )
+        if len(sold) == 0:
+            return iter_records(cur, InventoryReportRecord.from_row)
+        records = list(iter_records(cur, InventoryReportRecord.from_row))
+        for record in records:
+            record.quantity_sold += sold.get(record.item_id, 0)
+        return iter(records)
+
+    def get_inventory_snapshot(self) -> list[InventorySnapshotRecord]:
+        """Gets the current inventory of each item with its last two counts
+
+        Returns:
+            list[InventorySnapshotRecord]: inventory snapshot for each item
+        """
+        return list(self.iter_inventory_snapshot())
+
+    def iter_inventory_snapshot(self) -> Iterator[InventorySnapshotRecord]:
+        """Iterates through the current inventory snapshot as it is read
+
+        Sales today, this month and since the latest count are added up in
+        one pass over the orders since whichever of the month's start and the
+        latest count is earlier, instead of one pass for each.
+
+        Returns:
+            Iterator[InventorySnapshotRecord]: inventory snapshot for each item
+        """
+        today = datetime.date.today()
+        cur = self.conn.execute(
+            """
+WITH
+    latest AS (
+        SELECT
+            id,
+            ts
+        FROM
+            inventory_counts
+        ORDER BY
+            ts DESC,
+            id DESC
+        LIMIT
+            1
+    ),
+    previous AS (
+        SELECT
+            id
+        FROM
+            inventory_counts
+        ORDER BY
+            ts DESC,
+            id DESC
+        LIMIT
+            1 OFFSET 1
+    ),
+    sales AS (
+        SELECT
+            item_id,
+            SUM(
+                CASE
+                    WHEN DATE(TIMESTAMP) = ?1 THEN quantity
+                    ELSE 0
+                END
+            ) AS day_quantity,
+            SUM(
+                CASE
+                    WHEN TIMESTAMP >= ?2 THEN quantity
+                    ELSE 0
+                END
+            ) AS month_quantity,
+            SUM(
+                CASE
+                    WHEN TIMESTAMP > (
+                        SELECT
+                            ts
+                        FROM
+                            latest
+                    ) THEN quantity
+                    ELSE 0
+                END
+            ) AS quantity_sold
+        FROM
+            orders
+            INNER JOIN order_items ON orders.id = order_items.order_id
+        WHERE
+            TIMESTAMP >= MIN(
+                ?2,
+                COALESCE(
+                    (
+                        SELECT
+                            ts
+                        FROM
+                            latest
+                    ),
+                    ?2
+                )
+            )
+        GROUP BY
+            item_id
+    ),
+    adjustments AS (
+        SELECT
+            item_id,
+            SUM(quantity) AS adjustment_quantity
+        FROM
+            stock_adjustments
+            INNER JOIN stock_adjustment_items ON stock_adjustments.id = stock_adjustment_items.adjustment_id
+        WHERE
+            ts > (
+                SELECT
+                    ts
+                FROM
+                    latest
+            )
+        GROUP BY
+            item_id
+    )
+SELECT
+    category_id,
+    categories.category AS category_name,
+    items.id AS item_id,
+    name AS item_name,
+    ?1 AS day,
+    COALESCE(day_quantity, 0) AS day_quantity,
+    COALESCE(month_quantity, 0) AS month_quantity,
+    COALESCE(counted.quantity, 0) AS count_quantity,
+    COALESCE(previous_counted.quantity, 0) AS previous_quantity,
+    COALESCE(adjustment_quantity, 0) AS adjustment_quantity,
+    COALESCE(quantity_sold, 0) AS quantity_sold
+FROM
+    items
+    LEFT JOIN categories ON items.category_id = categories.id
+    LEFT JOIN sales ON items.id = sales.item_id
+    LEFT JOIN adjustments ON items.id = adjustments.item_id
+    LEFT JOIN inventory_count_items counted ON counted.count_id = (
+        SELECT
+            id
+        FROM
+            latest
+    )
+    AND items.id = counted.item_id
+    LEFT JOIN inventory_count_items previous_counted ON previous_counted.count_id = (
+        SELECT
+            id
+        FROM
+            previous
+    )
+    AND items.id = previous_counted.item_id;
+""",
+            (str(today), today.strftime("%Y-%m-01")),
+        )
+        latest = None
+        if self.partitions is not None:
+            latest = self.get_latest_count()
+        sold = {}
+        if latest is not None:
+            # Sales since the last count can reach back into archived months
+            sold = self._archived_sales(
+                "TIMESTAMP > ?", (latest.timestamp,), latest.timestamp, str(today)
+            )
+        if len(sold) == 0:
+            return iter_records(cur, InventorySnapshotRecord.from_row)
+        records = list(iter_records(cur, InventorySnapshotRecord.from_row))
+        for record in records:
+            record.quantity_sold += sold.get(record.item_id, 0)
+        return iter(records)
@@ -0,0 +1,194 @@
+"""Holds the rows of the inventory screen for sorting and filtering
+
+Each item's row is kept with typed values, keyed by item id, so sorting
+compares numbers instead of reparsing the text shown in the table. Loading
+new data reports which rows changed, so the screen only redraws those and
+reorders the rest in one call.
+"""
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Iterable, Optional
+
+from forecast_system import ReorderSuggestion
+from inventory_system import InventorySnapshotRecord
+
+# Column headings of the table and the field each one shows
+COLUMNS = {
+    "Item Name": "name",
+    "ID": "item_id",
+    "Sold Today": "sold_today",
+    "Sold This Month": "sold_this_month",
+    "Total Sold": "sold_since_count",
+    "Theoretical Quantity": "theoretical_quantity",
+    "Actual Quantity": "actual_quantity",
+    "Difference": "difference",
+    "Sold Per Day": "daily_demand",
+    "Days of Cover": "days_of_cover",
+    "Reorder Point": "reorder_point",
+    "Suggested Order": "order_quantity",
+}
+
+# Columns a table is sorted by at once, the latest heading clicked first
+MAX_SORT_COLUMNS = 3
+
+
+@dataclass(slots=True)
+class InventoryRow:
+    """Represents an item's row on the inventory screen"""
+
+    item_id: int
+    name: str
+    category_id: int
+    sold_today: int
+    sold_this_month: int
+    sold_since_count: int
+    theoretical_quantity: int
+    actual_quantity: int
+    difference: int
+    daily_demand: float
+    days_of_cover: Optional[float]
+    reorder_point: int
+    order_quantity: int
+
+    def values(self) -> tuple:
+        """Formats the row's values for the columns after the item name
+
+        Returns:
+            tuple: text of each column
+        """
+        days_of_cover = ""
+        if self.days_of_cover is not None:
+            days_of_cover = f"{self.days_of_cover:.1f}"
+        return (
+            self.item_id,
+            self.sold_today,
+            self.sold_this_month,
+            self.sold_since_count,
+            self.theoretical_quantity,
+            self.actual_quantity,
+            self.difference,
+            f"{self.daily_demand:.1f}",
+            days_of_cover,
+            self.reorder_point,
+            self.order_quantity,
+        )
+
+
+class InventoryTable:
+    """Inventory Table Class"""
+
+    def __init__(self) -> None:
+        self.rows: dict[int, InventoryRow] = {}
+        # (heading, descending) for each column sorted by, most significant first
+        self.sort_columns: list[tuple[str, bool]] = []
+        self.category_id: Optional[int] = None
+        self.text = ""
+
+    def load(
+        self,
+        snapshot: Iterable[InventorySnapshotRecord],
+        suggestions: dict[int, ReorderSuggestion],
+    ) -> tuple[set[int], set[int]]:
+        """Replaces the rows with new inventory details
+
+        Args:
+            snapshot (Iterable[InventorySnapshotRecord]): current inventory
+                of each item
+            suggestions (dict[int, ReorderSuggestion]): reorder suggestion of
+                each item
+
+        Returns:
+            tuple[set[int], set[int]]: ids of the rows added or changed, and
+                of the rows removed
+        """
+        rows = {}
+        for item in snapshot:
+            theoretical = (
+                item.previous_quantity - item.quantity_sold + item.adjustment_quantity
+            )
+            actual = item.count_quantity - item.quantity_sold + item.adjustment_quantity
+            suggestion = suggestions[item.item_id]
+            rows[item.item_id] = InventoryRow(
+                item.item_id,
+                item.name,
+                item.category_id,
+                item.day_quantity,
+                item.month_quantity,
+                item.quantity_sold,
+                theoretical,
+                actual,
+                theoretical - actual,
+                suggestion.daily_demand,
+                suggestion.days_of_cover,
+                suggestion.reorder_point,
+                suggestion.order_quantity,
+            )
+        changed = {
+            item_id for item_id, row in rows.items() if self.rows.get(item_id) != row
+        }
+        removed = self.rows.keys() - rows.keys()
+        self.rows = rows
+        return changed, removed
+
+    def sort_by(self, heading: str) -> bool:
+        """Sorts by a column first, reversing it if it already is
+
+        A column is sorted descending the first time its heading is
+        clicked. The columns sorted by before it break ties.
+
+        Args:
+            heading (str): heading of the column, one of COLUMNS
+
+        Returns:
+            bool: True if the column is now sorted descending
+        """
+        descending = True
+        if len(self.sort_columns) > 0 and self.sort_columns[0][0] == heading:
+            descending = not self.sort_columns[0][1]
+        self.sort_columns = [(heading, descending)] + [
+            column for column in self.sort_columns if column[0] != heading
+        ][: MAX_SORT_COLUMNS - 1]
+        return descending
+
+    def set_filter(self, category_id: Optional[int] = None, text: str = ""):
+        """Shows only the rows of a category and with text in their name
+
+        Args:
+            category_id (Optional[int], optional): category shown, all if
+                None. Defaults to None.
+            text (str, optional): text the item names contain, any case.
+                Defaults to "".
+        """
+        self.category_id = category_id
+        self.text = text.strip().lower()
+
+    def view(self) -> list[int]:
+        """Gets the ids of the rows shown, filtered and in sorted order
+
+        Blank values, such as the days of cover of an item that is not
+        selling, are always sorted last.
+
+        Returns:
+            list[int]: ids of the rows shown
+        """
+        rows = [
+            row
+            for row in self.rows.values()
+            if (self.category_id is None or row.category_id == self.category_id)
+            and self.text in (row.name or "").lower()
+        ]
+        # Stable sorts from the least significant column leave the most
+        # significant one in charge
+        for heading, descending in reversed(self.sort_columns):
+            getter = attrgetter(COLUMNS[heading])
+            if all(getter(row) is not None for row in rows):
+                rows.sort(key=getter, reverse=descending)
+                continue
+
+            def key(row: InventoryRow, getter=getter, descending=descending):
+                value = getter(row)
+                # Blank values are the lowest when descending, the highest otherwise
+                return ((value is None) != descending, 0 if value is None else value)
+
+            rows.sort(key=key, reverse=descending)
+        return [row.item_id for row in rows]
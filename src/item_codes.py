@@ -0,0 +1,147 @@
+"""Finds items by the barcode or SKU scanned at the till
+
+Every item's code is held in a dict loaded once at startup, so a scan is
+resolved without a query. Keyboard-wedge scanners type each code followed by
+Enter in bursts much faster than a cashier clicks, so scans are queued and
+applied to the order together, one transaction and one screen update for
+each burst instead of each scan.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+import sqlite3
+from typing import Optional
+
+# Items without a manufacturer barcode get an EAN-13 in the in-store range
+STORE_CODE_PREFIX = "20"
+
+
+def ean13_check_digit(digits: str) -> str:
+    """Calculates the check digit of the first 12 digits of an EAN-13
+
+    Args:
+        digits (str): first 12 digits of the code
+
+    Returns:
+        str: the 13th digit
+    """
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits))
+    return str(-total % 10)
+
+
+def store_code(item_id: int) -> str:
+    """Creates the in-store EAN-13 of an item
+
+    Args:
+        item_id (int): id of the item
+
+    Returns:
+        str: code printed on the item's shelf label
+    """
+    digits = f"{STORE_CODE_PREFIX}{item_id:010d}"
+    return digits + ean13_check_digit(digits)
+
+
+class ItemCodes:
+    """Item Codes Class"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.codes: dict[str, int] = {}
+
+    def load(self) -> int:
+        """Reads the code of every item into memory
+
+        Returns:
+            int: number of codes loaded
+        """
+        cur = self.conn.execute(
+            "SELECT barcode, id FROM items WHERE barcode IS NOT NULL;"
+        )
+        self.codes = dict(cur.fetchall())
+        return len(self.codes)
+
+    def lookup(self, code: str) -> Optional[int]:
+        """Finds the item with a barcode or SKU
+
+        Args:
+            code (str): code scanned or typed
+
+        Returns:
+            Optional[int]: id of the item, None if no item has the code
+        """
+        return self.codes.get(code.strip())
+
+    def set_code(self, item_id: int, code: Optional[str]):
+        """Sets or clears the barcode or SKU of an item
+
+        Args:
+            item_id (int): id of the item
+            code (Optional[str]): new code, None to clear it
+
+        Raises:
+            ValueError: if another item has the code
+        """
+        if code is not None:
+            code = code.strip()
+            owner = self.codes.get(code)
+            if owner is not None and owner != item_id:
+                raise ValueError(f"Code {code} belongs to item {owner}")
+        self.conn.execute("UPDATE items SET barcode = ? WHERE id = ?;", (code, item_id))
+        self.conn.commit()
+        for existing in [key for key, owner in self.codes.items() if owner == item_id]:
+            del self.codes[existing]
+        if code is not None:
+            self.codes[code] = item_id
+
+    def assign_store_codes(self) -> int:
+        """Gives every item without a code its in-store EAN-13
+
+        Returns:
+            int: number of items given a code
+        """
+        cur = self.conn.execute("SELECT id FROM items WHERE barcode IS NULL;")
+        assigned = [(store_code(item_id), item_id) for (item_id,) in cur.fetchall()]
+        self.conn.executemany("UPDATE items SET barcode = ? WHERE id = ?;", assigned)
+        self.conn.commit()
+        self.codes.update(assigned)
+        return len(assigned)
+
+
+@dataclass(slots=True)
+class ScanQueue:
+    """Scans waiting to be applied to an order as one burst"""
+
+    codes: list[str] = field(default_factory=list)
+
+    def push(self, code: str) -> bool:
+        """Queues a scanned code
+
+        Args:
+            code (str): code scanned
+
+        Returns:
+            bool: True if the queue was empty, so a flush needs scheduling
+        """
+        self.codes.append(code)
+        return len(self.codes) == 1
+
+    def drain(self, item_codes: ItemCodes) -> tuple[Counter[int], list[str]]:
+        """Empties the queue, counting the items scanned
+
+        Args:
+            item_codes (ItemCodes): codes of the items
+
+        Returns:
+            tuple[Counter[int], list[str]]: quantity scanned of each item, and
+                the codes that matched no item
+        """
+        codes, self.codes = self.codes, []
+        quantities: Counter[int] = Counter()
+        unknown = []
+        for code in codes:
+            item_id = item_codes.lookup(code)
+            if item_id is None:
+                unknown.append(code)
+            else:
+                quantities[item_id] += 1
+        return quantities, unknown
@@ -0,0 +1,278 @@
+"""Finds items as their name or code is typed
+
+Each word used in item names has a list of the items named with it, kept in
+rank order, shorter names first, then alphabetical. The words starting with
+what was typed are found by a binary search of the sorted vocabulary, and
+their lists are merged lazily so a search stops as soon as it has enough
+matches. Text found inside words is matched through the items having each
+three letter sequence, and codes through a sorted list of them. The one and
+two letter prefixes match most of the catalog, so their best matches are
+kept ready.
+"""
+from bisect import bisect_left, insort
+import heapq
+import re
+import sqlite3
+from typing import Iterator, Optional
+
+from order_system import Item
+
+# Single words this short have their best matches ranked ahead of time
+CACHED_PREFIX_LENGTH = 2
+
+# Matches kept ranked for each cached prefix
+CACHED_MATCHES = 50
+
+WORD_PATTERN = re.compile(r"[0-9a-z]+")
+
+# Sort key of an item, its name's length, its lowercase name and its id
+RankKey = tuple[int, str, int]
+
+
+def words(text: str) -> list[str]:
+    """Splits text into lowercase words
+
+    Args:
+        text (str): name or search text
+
+    Returns:
+        list[str]: words of letters and digits
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+
+def trigrams(word: str) -> set[str]:
+    """Gets the three letter sequences of a word
+
+    Args:
+        word (str): lowercase word
+
+    Returns:
+        set[str]: sequences, empty if the word is shorter than three letters
+    """
+    return {word[i : i + 3] for i in range(len(word) - 2)}
+
+
+def _words_starting(vocabulary: list[str], prefix: str) -> list[str]:
+    """[Internal] Gets the words of a sorted vocabulary starting with a prefix"""
+    # "{" sorts after every letter and digit
+    return vocabulary[
+        bisect_left(vocabulary, prefix) : bisect_left(vocabulary, prefix + "{")
+    ]
+
+
+class ItemSearch:
+    """Item Search Class"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.items: dict[int, Item] = {}
+        self.keys: dict[int, RankKey] = {}
+        # Words of each name, each after a space
+        self.spaced_names: dict[int, str] = {}
+        # Sorted words, and the items named with each word in rank order
+        self.vocabulary: list[str] = []
+        self.postings: dict[str, list[RankKey]] = {}
+        # The same for the first word of each name only
+        self.first_vocabulary: list[str] = []
+        self.first_postings: dict[str, list[RankKey]] = {}
+        # The items with each three letter sequence in a word, in rank order
+        self.trigrams: dict[str, list[RankKey]] = {}
+        self.codes: list[tuple[str, int]] = []
+        self.cache: dict[str, list[int]] = {}
+
+    def _index(self, item: Item, code: Optional[str]) -> set[str]:
+        """[Internal] Adds an item to the end of the postings and codes
+
+        Returns:
+            set[str]: cached prefixes whose matches the item could change
+        """
+        name = (item.name or "").lower()
+        key = (len(name), name, item.item_id)
+        name_words = words(name)
+        self.items[item.item_id] = item
+        self.keys[item.item_id] = key
+        self.spaced_names[item.item_id] = " " + " ".join(name_words)
+        for word in set(name_words):
+            self.postings.setdefault(word, []).append(key)
+        for trigram in set().union(*map(trigrams, name_words)):
+            self.trigrams.setdefault(trigram, []).append(key)
+        if len(name_words) > 0:
+            self.first_postings.setdefault(name_words[0], []).append(key)
+        if code is not None:
+            self.codes.append((code.lower(), item.item_id))
+            name_words.append(code.lower())
+        return {
+            word[:length]
+            for word in name_words
+            for length in range(1, CACHED_PREFIX_LENGTH + 1)
+        }
+
+    def load(self) -> int:
+        """Reads every item into the index
+
+        Returns:
+            int: number of items indexed
+        """
+        cur = self.conn.execute(
+            "SELECT id, name, price, gst, pst, category_id, barcode FROM items;"
+        )
+        self.items, self.keys, self.spaced_names = {}, {}, {}
+        self.postings, self.first_postings, self.trigrams = {}, {}, {}
+        self.codes = []
+        # Indexed in rank order, every list of items is appended to in order
+        rows = [(row, (row[1] or "").lower()) for row in cur.fetchall()]
+        rows.sort(key=lambda entry: (len(entry[1]), entry[1], entry[0][0]))
+        prefixes = set()
+        for row, _ in rows:
+            prefixes.update(self._index(Item.from_row(row[:6]), row[6]))
+        self.vocabulary = sorted(self.postings)
+        self.first_vocabulary = sorted(self.first_postings)
+        self.codes.sort()
+        self.cache = {
+            prefix: self._search(prefix, CACHED_MATCHES) for prefix in prefixes
+        }
+        return len(self.items)
+
+    def add(self, item: Item, code: Optional[str] = None):
+        """Adds a new item to the index
+
+        Args:
+            item (Item): item added to the database
+            code (Optional[str], optional): barcode or SKU. Defaults to None.
+        """
+        prefixes = self._index(item, code)
+        key = self.keys[item.item_id]
+        name_words = self.spaced_names[item.item_id].split()
+        # Move what was appended into its sorted position
+        for vocabulary, postings, added in (
+            (self.vocabulary, self.postings, set(name_words)),
+            (self.first_vocabulary, self.first_postings, name_words[:1]),
+        ):
+            for word in added:
+                keys = postings[word]
+                keys.pop()
+                insort(keys, key)
+                if len(keys) == 1:
+                    insort(vocabulary, word)
+        for trigram in set().union(*map(trigrams, name_words)):
+            keys = self.trigrams[trigram]
+            insort(keys, keys.pop())
+        if code is not None:
+            insort(self.codes, self.codes.pop())
+        for prefix in prefixes:
+            self.cache[prefix] = self._search(prefix, CACHED_MATCHES)
+
+    def _merged(
+        self,
+        vocabulary: list[str],
+        postings: dict[str, list[RankKey]],
+        prefix: str,
+        others: list[str],
+    ) -> Iterator[int]:
+        """[Internal] Iterates in rank order through the items matching every word
+
+        Items have a word starting with prefix and one starting with each of
+        the others.
+        """
+        # A word of the name starts with other if " other" is in " name words"
+        starts = [" " + other for other in others]
+        seen = set()
+        for _, _, item_id in heapq.merge(
+            *(postings[word] for word in _words_starting(vocabulary, prefix))
+        ):
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            spaced = self.spaced_names[item_id]
+            if all(start in spaced for start in starts):
+                yield item_id
+
+    def _inside_words(self, text: str, others: list[str]) -> Iterator[int]:
+        """[Internal] Iterates in rank order through the items containing text
+
+        Text has three letters or more, and the names also contain each of
+        the others.
+        """
+        rarest = min(
+            (self.trigrams.get(trigram, []) for trigram in trigrams(text)), key=len
+        )
+        for _, name, item_id in rarest:
+            if text in name and all(other in name for other in others):
+                yield item_id
+
+    def _count(self, prefix: str) -> int:
+        """[Internal] Counts the items named with each word starting with prefix"""
+        return sum(
+            len(self.postings[word])
+            for word in _words_starting(self.vocabulary, prefix)
+        )
+
+    def _search(self, text: str, limit: int) -> list[int]:
+        """[Internal] Finds the ids of the items best matching text, uncached"""
+        typed = words(text)
+        found: list[int] = []
+        seen: set[int] = set()
+
+        def take(item_ids: Iterator[int]):
+            for item_id in item_ids:
+                if len(found) >= limit:
+                    return
+                if item_id not in seen:
+                    seen.add(item_id)
+                    found.append(item_id)
+
+        if len(typed) == 0:
+            return found
+        if len(typed) == 1:
+            start = bisect_left(self.codes, (typed[0],))
+            take(
+                item_id
+                for code, item_id in self.codes[start : start + limit]
+                if code.startswith(typed[0])
+            )
+        take(
+            self._merged(
+                self.first_vocabulary, self.first_postings, typed[0], typed[1:]
+            )
+        )
+        # Go through the items of the word typed that matches the fewest
+        rarest = min(
+            range(len(typed)),
+            key=lambda i: self._count(typed[i]),
+        )
+        take(
+            self._merged(
+                self.vocabulary,
+                self.postings,
+                typed[rarest],
+                typed[:rarest] + typed[rarest + 1 :],
+            )
+        )
+        if len(found) < limit and len(typed[-1]) >= 3:
+            # Then names with the last word typed inside one of their words
+            take(self._inside_words(typed[-1], typed[:-1]))
+        return found
+
+    def search(self, text: str, limit: int = 10) -> list[Item]:
+        """Finds the items best matching text typed so far
+
+        Every word typed must start a word of the item's name, or a single
+        word can start its code. Codes come first, then names starting with
+        the first word typed, then other names, shorter names first. If fewer
+        than limit items match, names with the last word typed inside one of
+        their words are added after them.
+
+        Args:
+            text (str): name or code typed
+            limit (int, optional): most items returned. Defaults to 10.
+
+        Returns:
+            list[Item]: best matches first
+        """
+        typed = words(text)
+        if len(typed) == 1 and typed[0] in self.cache and limit <= CACHED_MATCHES:
+            item_ids = self.cache[typed[0]][:limit]
+        else:
+            item_ids = self._search(text, limit)
+        return [self.items[item_id] for item_id in item_ids]
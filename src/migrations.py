@@ -0,0 +1,219 @@
+"""Upgrades databases created with an older version of the schema
+
+Columns added to existing tables are created with ALTER TABLE, then the
+schema script is rerun to recreate views that read them. Order lines that were
+sold before prices were recorded are backfilled in chunks, each committed on
+its own, so a large database is never rewritten in a single transaction.
+With --purge-abandoned, the empty unpaid orders left behind by order windows
+closed without paying are deleted in batches as well.
+
+Usage:
+    python ./src/migrations.py retail.db [--chunk-size 10000] [--purge-abandoned]
+"""
+import argparse
+import sqlite3
+import sys
+from typing import Callable, Optional
+
+from draft_orders import DraftOrders
+from order_system import GST_RATE, PST_RATE, OrderSystem
+
+# Columns added to tables after their creation, with their types
+ADDED_COLUMNS = {
+    "items": {"barcode": "TEXT"},
+    "orders": {
+        "num_items": "INTEGER",
+        "subtotal": "REAL",
+        "gst_total": "REAL",
+        "pst_total": "REAL",
+        "idempotency_key": "TEXT",
+    },
+    "order_items": {
+        "price": "REAL",
+        "gst": "INTEGER",
+        "pst": "INTEGER",
+        "gst_rate": "REAL",
+        "pst_rate": "REAL",
+    },
+}
+
+
+def add_missing_columns(conn: sqlite3.Connection) -> list[str]:
+    """Adds columns that are missing from existing tables
+
+    Args:
+        conn (sqlite3.Connection): database to upgrade
+
+    Returns:
+        list[str]: added columns as "table.column"
+    """
+    added = []
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table});")}
+        if len(existing) == 0:
+            continue
+        for column, column_type in columns.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type};")
+                added.append(f"{table}.{column}")
+    conn.commit()
+    return added
+
+
+def has_unpriced_order_items(conn: sqlite3.Connection) -> bool:
+    """Checks for order lines sold before prices were recorded
+
+    Reads the order_item_unpriced index, so checking a database where every
+    line has its price does not scan order_items.
+
+    Args:
+        conn (sqlite3.Connection): database to check
+
+    Returns:
+        bool: True if backfill_order_item_prices has lines to update
+    """
+    cur = conn.execute(
+        """
+SELECT
+    EXISTS(
+        SELECT
+            1
+        FROM
+            order_items
+        WHERE
+            price IS NULL
+    );
+"""
+    )
+    return cur.fetchone()[0] == 1
+
+
+def backfill_order_item_prices(
+    conn: sqlite3.Connection,
+    chunk_size: int = 10_000,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Records prices and taxes on order lines that do not have them
+
+    Lines are updated in rowid order, one chunk per transaction. The price a
+    line was sold at was never stored, so the item's current price is used.
+
+    Args:
+        conn (sqlite3.Connection): database to backfill
+        chunk_size (int, optional): lines per transaction. Defaults to 10_000.
+        progress (Optional[Callable[[int], None]], optional): called with the
+            number of lines updated so far after each chunk. Defaults to None.
+
+    Returns:
+        int: number of lines updated
+    """
+    updated = 0
+    last_rowid = 0
+    while True:
+        chunk_end = conn.execute(
+            """
+SELECT
+    MAX(rowid)
+FROM
+    (
+        SELECT
+            rowid
+        FROM
+            order_items
+        WHERE
+            rowid > ?
+        ORDER BY
+            rowid
+        LIMIT
+            ?
+    );
+""",
+            (last_rowid, chunk_size),
+        ).fetchone()[0]
+        if chunk_end is None:
+            break
+        cur = conn.execute(
+            """
+UPDATE
+    order_items
+SET
+    (price, gst, pst, gst_rate, pst_rate) = (
+        SELECT
+            price,
+            gst,
+            pst,
+            ?,
+            ?
+        FROM
+            items
+        WHERE
+            items.id = order_items.item_id
+    )
+WHERE
+    rowid > ?
+    AND rowid <= ?
+    AND price IS NULL;
+""",
+            (GST_RATE, PST_RATE, last_rowid, chunk_end),
+        )
+        conn.commit()
+        updated += cur.rowcount
+        last_rowid = chunk_end
+        if progress is not None:
+            progress(updated)
+    return updated
+
+
+def migrate(
+    conn: sqlite3.Connection,
+    schema_path: str = "create_tables_sqlite.sql",
+    chunk_size: int = 10_000,
+    progress: Optional[Callable[[int], None]] = None,
+) -> tuple[int, int]:
+    """Upgrades a database to the current schema and backfills its data
+
+    Args:
+        conn (sqlite3.Connection): database to upgrade
+        schema_path (str, optional): schema script.
+            Defaults to "create_tables_sqlite.sql".
+        chunk_size (int, optional): order lines per transaction. Defaults to 10_000.
+        progress (Optional[Callable[[int], None]], optional): called with the
+            number of order lines priced so far. Defaults to None.
+
+    Returns:
+        tuple[int, int]: order lines priced and orders totalled
+    """
+    add_missing_columns(conn)
+    with open(schema_path, encoding="utf8") as sql_file:
+        conn.executescript(sql_file.read())
+        conn.commit()
+    lines = backfill_order_item_prices(conn, chunk_size, progress)
+    orders = OrderSystem(conn).backfill_order_totals()
+    return lines, orders
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade a database to the current schema")
+    parser.add_argument("database")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--schema", default="create_tables_sqlite.sql")
+    parser.add_argument("--purge-abandoned", action="store_true")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    priced, totalled = migrate(
+        connection,
+        args.schema,
+        args.chunk_size,
+        lambda count: print(f"\rPriced {count} order lines", end="", file=sys.stderr),
+    )
+    print(f"\nPriced {priced} order lines, totalled {totalled} orders")
+    if args.purge_abandoned:
+        purged = DraftOrders(OrderSystem(connection)).purge_abandoned_orders(
+            batch_size=args.chunk_size,
+            progress=lambda count: print(
+                f"\rDeleted {count} abandoned orders", end="", file=sys.stderr
+            ),
+        )
+        print(f"\nDeleted {purged} abandoned orders")
+    connection.close()
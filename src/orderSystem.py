@@ -1,11 +1,14 @@
 from dataclasses import dataclass
 from datetime import datetime
 import sqlite3
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 import functools
 
+from order_system import GST_RATE, ORDER_TOTALS, PST_RATE
+from records import iter_records
 
-@dataclass
+
+@dataclass(slots=True)
 class Item:
     id: int
     name: str
@@ -20,7 +23,7 @@ class Item:
         return Item(id, name, price, categoryID, gst, pst)
 
 
-@dataclass
+@dataclass(slots=True)
 class ItemQuantity(Item):
     quantity: int
 
@@ -50,7 +53,7 @@ class ItemQuantity(Item):
         return self.subtotal() + self.get_gst() + self.get_pst()
 
 
-@dataclass
+@dataclass(slots=True)
 class Order:
     id: int
     customer_id: int
@@ -93,7 +96,7 @@ class Order:
         return string
 
 
-@dataclass
+@dataclass(slots=True)
 class OrderSummary:
     id: int
     customer_id: Optional[int]
@@ -128,7 +131,7 @@ class OrderSummary:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Customer:
     id: int
     name: str
@@ -141,7 +144,7 @@ class Customer:
         return Customer(id, name, phone_number, email)
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: int
     username: int
@@ -201,7 +204,7 @@ class OrderSystem:
             payment_type (int): id of payment type
         """
         self.conn.execute(
-            "UPDATE orders SET payment_type = ? WHERE id = ?;",
+            f"UPDATE orders SET payment_type = ?, {ORDER_TOTALS} WHERE id = ?;",
             (payment_type, order_id),
         )
         self.conn.commit()
@@ -228,8 +231,36 @@ class OrderSystem:
             item_id (int): id of item to add
         """
         self.conn.execute(
-            "INSERT INTO order_items(order_id, item_id, quantity) VALUES (?, ?, ?) ON CONFLICT(order_id, item_id) DO UPDATE SET quantity = quantity + 1;",
-            (order_id, item_id, 1),
+            """
+INSERT INTO
+    order_items(
+        order_id,
+        item_id,
+        quantity,
+        price,
+        gst,
+        pst,
+        gst_rate,
+        pst_rate
+    )
+SELECT
+    ?,
+    id,
+    1,
+    price,
+    gst,
+    pst,
+    ?,
+    ?
+FROM
+    items
+WHERE
+    id = ? ON CONFLICT(order_id, item_id) DO
+UPDATE
+SET
+    quantity = quantity + 1;
+""",
+            (order_id, GST_RATE, PST_RATE, item_id),
         )
         self.conn.commit()
 
@@ -241,7 +272,15 @@ class OrderSystem:
             item_id (int): id of item to remove
         """
         self.conn.execute(
-            "UPDATE order_items SET quantity = max(quantity - 1, 0) WHERE order_id = ? AND item_id = ?;",
+            """
+UPDATE
+    order_items
+SET
+    quantity = max(quantity - 1, 0)
+WHERE
+    order_id = ?
+    AND item_id = ?;
+""",
             (order_id, item_id),
         )
         self.conn.commit()
@@ -259,13 +298,41 @@ class OrderSystem:
         Returns:
             Order: details of the order
         """
-        cur = self.conn.execute("SELECT * FROM orders WHERE id = ?;", (order_id,))
+        cur = self.conn.execute(
+            """
+SELECT
+    id,
+    customer_id,
+    user_id,
+    payment_type,
+    timestamp
+FROM
+    orders
+WHERE
+    id = ?;
+""",
+            (order_id,),
+        )
         cur2 = self.conn.execute(
-            "SELECT items.id, quantity, name, price, gst, pst, category_id FROM order_items LEFT JOIN items ON order_items.item_id = items.id WHERE order_items.order_id = ?;",
+            """
+SELECT
+    order_items.item_id,
+    quantity,
+    name,
+    order_items.price,
+    order_items.gst,
+    order_items.pst,
+    category_id
+FROM
+    order_items
+    LEFT JOIN items ON order_items.item_id = items.id
+WHERE
+    order_items.order_id = ?;
+""",
             (order_id,),
         )
         order = Order.from_row(cur.fetchone())
-        order.items = list(map(ItemQuantity.from_row, cur2.fetchall()))
+        order.items = list(iter_records(cur2, ItemQuantity.from_row))
         return order
 
     def create_customer(
@@ -302,8 +369,16 @@ class OrderSystem:
         Returns:
             list[Customer]: list of customers from the database
         """
+        return list(self.iter_all_customers())
+
+    def iter_all_customers(self) -> Iterator[Customer]:
+        """Iterates through all customers in the database as they are read
+
+        Returns:
+            Iterator[Customer]: customers from the database
+        """
         cur = self.conn.execute("SELECT * FROM customers;")
-        return list(map(Customer.from_row, cur.fetchall()))
+        return iter_records(cur, Customer.from_row)
 
     def search_customer_by_name(self, customer_name: str) -> list[Customer]:
         """Search for customers by name
@@ -314,11 +389,22 @@ class OrderSystem:
         Returns:
             list[Customer]: list of customers based on the name
         """
+        return list(self.iter_customers_by_name(customer_name))
+
+    def iter_customers_by_name(self, customer_name: str) -> Iterator[Customer]:
+        """Iterates through customers matching a name as they are read
+
+        Args:
+            customer_name (str): name or partial name
+
+        Returns:
+            Iterator[Customer]: customers based on the name
+        """
         cur = self.conn.execute(
             "SELECT * FROM customers WHERE customer_name LIKE '%' || ? || '%';",
             (customer_name,),
         )
-        return list(map(Customer.from_row, cur.fetchall()))
+        return iter_records(cur, Customer.from_row)
 
     def search_customer_by_email(self, customer_email: str) -> list[Customer]:
         """Search for customers by email
@@ -329,11 +415,22 @@ class OrderSystem:
         Returns:
             list[Customer]: list of customers based on the email
         """
+        return list(self.iter_customers_by_email(customer_email))
+
+    def iter_customers_by_email(self, customer_email: str) -> Iterator[Customer]:
+        """Iterates through customers matching a email as they are read
+
+        Args:
+            customer_email (str): email or partial email
+
+        Returns:
+            Iterator[Customer]: customers based on the email
+        """
         cur = self.conn.execute(
             "SELECT * FROM customers WHERE email LIKE '%' || ? || '%';",
             (customer_email,),
         )
-        return list(map(Customer.from_row, cur.fetchall()))
+        return iter_records(cur, Customer.from_row)
 
     def search_customer_by_phone_number(self, phone_number: str) -> list[Customer]:
         """Search for customers by phone number
@@ -344,23 +441,60 @@ class OrderSystem:
         Returns:
             list[Customer]: list of customers based on phone number
         """
+        return list(self.iter_customers_by_phone_number(phone_number))
+
+    def iter_customers_by_phone_number(self, phone_number: str) -> Iterator[Customer]:
+        """Iterates through customers matching a phone number as they are read
+
+        Args:
+            phone_number (str): phone number or partial phone number
+
+        Returns:
+            Iterator[Customer]: customers based on phone number
+        """
         cur = self.conn.execute(
             "SELECT * FROM customers WHERE phone_number LIKE '%' || ? || '%';",
             (phone_number,),
         )
-        return list(map(Customer.from_row, cur.fetchall()))
+        return iter_records(cur, Customer.from_row)
 
     def get_all_order_items_raw(self):
-        cur = self.conn.execute(
+        return list(self.iter_all_order_items_raw())
+
+    def iter_all_order_items_raw(self) -> Iterator[tuple]:
+        """Iterates through all order items joined with their item as they are read
+
+        Returns:
+            Iterator[tuple]: order item and item columns
+        """
+        return self.conn.execute(
             "SELECT * FROM order_items LEFT JOIN items ON order_items.item_id = items.id;"
         )
-        return cur.fetchall()
 
     def get_all_order_items(self):
-        cur = self.conn.execute(
-            "SELECT order_items.order_id, order_items.item_id, items.name, items.category_id, items.price, items.price * items.gst * 0.05, items.price * items.pst * 0.06  FROM order_items LEFT JOIN items ON order_items.item_id = items.id;"
+        return list(self.iter_all_order_items())
+
+    def iter_all_order_items(self) -> Iterator[tuple]:
+        """Iterates through order items with their price and taxes as they are read
+
+        Returns:
+            Iterator[tuple]: order id, item id, name, category id, price, gst and pst
+        """
+        return self.conn.execute(
+            """
+SELECT
+    order_items.order_id,
+    order_items.item_id,
+    items.name,
+    items.category_id,
+    order_items.price,
+    order_items.price * order_items.gst * gst_rate,
+    order_items.price * order_items.pst * pst_rate
+FROM
+    order_items
+    LEFT JOIN items ON order_items.item_id = items.id;
+"""
         )
-        return cur.fetchall()
 
     def get_all_order_summaries(self) -> list[OrderSummary]:
         """Get all order summaries from the database
@@ -368,8 +502,30 @@ class OrderSystem:
         Returns:
             list[OrderSummary]: list of all order summaries
         """
-        cur = self.conn.execute("SELECT * FROM order_summary;")
-        return list(map(OrderSummary.from_row, cur.fetchall()))
+        return list(self.iter_all_order_summaries())
+
+    def iter_all_order_summaries(self) -> Iterator[OrderSummary]:
+        """Iterates through all order summaries as they are read
+
+        Returns:
+            Iterator[OrderSummary]: all order summaries
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    id,
+    customer_id,
+    user_id,
+    timestamp,
+    num_items,
+    subtotal,
+    gst_total,
+    pst_total
+FROM
+    order_summary;
+"""
+        )
+        return iter_records(cur, OrderSummary.from_row)
 
     def get_order_summary_by_order_id(self, order_id: int) -> OrderSummary:
         """Get order summary matching a specific id
@@ -381,7 +537,22 @@ class OrderSystem:
             OrderSummary: OrderSummary from the order id
         """
         cur = self.conn.execute(
-            "SELECT * FROM order_summary WHERE id = ?;", (order_id,)
+            """
+SELECT
+    id,
+    customer_id,
+    user_id,
+    timestamp,
+    num_items,
+    subtotal,
+    gst_total,
+    pst_total
+FROM
+    order_summary
+WHERE
+    id = ?;
+""",
+            (order_id,),
         )
         return OrderSummary.from_row(cur.fetchone())
 
@@ -396,11 +567,38 @@ class OrderSystem:
         Returns:
             list[OrderSummary]: list of all order summaries
         """
+        return list(self.iter_order_summaries_by_customer_id(customer_id))
 
+    def iter_order_summaries_by_customer_id(
+        self, customer_id: int
+    ) -> Iterator[OrderSummary]:
+        """Iterates through order summaries matching a customer id as they are read
+
+        Args:
+            customer_id (int): id of customer
+
+        Returns:
+            Iterator[OrderSummary]: order summaries of the customer
+        """
         cur = self.conn.execute(
-            "SELECT * FROM order_summary WHERE customer_id = ?;", (customer_id,)
+            """
+SELECT
+    id,
+    customer_id,
+    user_id,
+    timestamp,
+    num_items,
+    subtotal,
+    gst_total,
+    pst_total
+FROM
+    order_summary
+WHERE
+    customer_id = ?;
+""",
+            (customer_id,),
         )
-        return list(map(OrderSummary.from_row, cur.fetchall()))
+        return iter_records(cur, OrderSummary.from_row)
 
     def get_orders_by_date_range(
         self, start: datetime, end: datetime
@@ -414,7 +612,37 @@ class OrderSystem:
         Returns:
             list[OrderSummary]: list of order summaries within the date range
         """
+        return list(self.iter_orders_by_date_range(start, end))
+
+    def iter_orders_by_date_range(
+        self, start: datetime, end: datetime
+    ) -> Iterator[OrderSummary]:
+        """Iterates through order summaries within a date range as they are read
+
+        Args:
+            start (datetime): start of date range
+            end (datetime): end of date range
+
+        Returns:
+            Iterator[OrderSummary]: order summaries within the date range
+        """
         cur = self.conn.execute(
-            "SELECT * FROM order_summary WHERE timestamp BETWEEN ? AND ?;", (start, end)
+            """
+SELECT
+    id,
+    customer_id,
+    user_id,
+    timestamp,
+    num_items,
+    subtotal,
+    gst_total,
+    pst_total
+FROM
+    order_summary
+WHERE
+    timestamp BETWEEN ?
+    AND ?;
+""",
+            (start, end),
         )
-        return list(map(OrderSummary.from_row, cur.fetchall()))
+        return iter_records(cur, OrderSummary.from_row)
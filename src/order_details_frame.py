@@ -58,9 +58,9 @@ class OrderDetailsFrame(Frame):
                 text=item.name,
                 values=(item.quantity, f"${item.quantity * item.price:.2f}"),
             )
-            subtotal += item.quantity * item.price
-            gst += item.quantity * item.price * 0.05 * item.gst
-            pst += item.quantity * item.price * 0.06 * item.gst
+            subtotal += item.subtotal()
+            gst += item.get_gst()
+            pst += item.get_pst()
         self.subtotal.set(f"{subtotal:.2f}")
         self.gst.set(f"{gst:.2f}")
         self.pst.set(f"{pst:.2f}")
@@ -0,0 +1,258 @@
+"""Hands out order ids from blocks leased by each register
+
+Letting sqlite pick the next rowid means every register takes its order ids
+from one sequence in one database. Instead, each register leases a block of
+consecutive ids, recorded in the order_id_blocks table, and numbers its
+orders from it in memory. The table is only written when a block runs out,
+once every block_size orders, and ids from different registers never
+collide, even when their orders were written to different databases.
+
+A register that restarts carries on after the highest id of its latest
+block found in orders or archived months, or from the start of the block if
+none is, so ids are never reused and restarting does not use up blocks.
+Ids left in a block when it is given up are skipped, so order ids are
+unique and increasing for each register, but not consecutive. Once a
+register leases blocks, every writer of the database has to take its order
+ids from blocks too, since sqlite would number orders inside a leased block.
+
+A database created again, or one kept in memory, numbers its orders from
+the start again. numbering_key() tells the numberings apart, for records
+kept outside the database by order id, like the receipt journal.
+"""
+from dataclasses import dataclass
+import sqlite3
+from typing import Any, Optional
+import uuid
+
+from records import iter_records
+
+# Order ids leased at a time
+DEFAULT_BLOCK_SIZE = 1000
+
+
+@dataclass(slots=True)
+class OrderIdBlock:
+    """Represents a range of order ids leased by a register"""
+
+    block_id: int
+    register_id: int
+    first_id: int
+    last_id: int
+    leased: str
+
+    @staticmethod
+    def from_row(row: Any) -> "OrderIdBlock":
+        """Converts a sqlite row to an OrderIdBlock
+
+        Args:
+            row (Any): Row from the database
+
+        Returns:
+            OrderIdBlock: a block from the database
+        """
+        block_id, register_id, first_id, last_id, leased = row
+        return OrderIdBlock(block_id, register_id, first_id, last_id, leased)
+
+
+def numbering_key(conn: sqlite3.Connection) -> str:
+    """Gets the key of a database's order numbering, creating it the first time
+
+    Args:
+        conn (sqlite3.Connection): connection to the database
+
+    Returns:
+        str: key, different for every database created
+    """
+    conn.execute(
+        "INSERT OR IGNORE INTO numbering_keys(id, key) VALUES (1, ?);",
+        (uuid.uuid4().hex[:16],),
+    )
+    conn.commit()
+    return conn.execute("SELECT key FROM numbering_keys;").fetchone()[0]
+
+
+class OrderIds:
+    """Order Ids Class"""
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        register_id: int,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+    ) -> None:
+        self.conn = conn
+        self.register_id = register_id
+        self.block_size = block_size
+        self.block: Optional[OrderIdBlock] = None
+        self.next_id = 0
+        self.leases = 0
+        self._resume()
+
+    def _resume(self):
+        """[Internal] Carries on numbering from the register's latest block"""
+        row = self.conn.execute(
+            """
+SELECT
+    id,
+    register_id,
+    first_id,
+    last_id,
+    leased_ts
+FROM
+    order_id_blocks
+WHERE
+    register_id = ?
+ORDER BY
+    id DESC
+LIMIT
+    1;
+""",
+            (self.register_id,),
+        ).fetchone()
+        if row is None:
+            return
+        block = OrderIdBlock.from_row(row)
+        # Orders of the block may be archived, up to the highest id of an
+        # archived month that overlaps it
+        highest = self.conn.execute(
+            """
+SELECT
+    MAX(highest)
+FROM
+    (
+        SELECT
+            MAX(id) AS highest
+        FROM
+            main.orders
+        WHERE
+            id BETWEEN ?1 AND ?2
+        UNION ALL
+        SELECT
+            MIN(MAX(max_order_id), ?2)
+        FROM
+            sales_partitions
+        WHERE
+            min_order_id <= ?2
+            AND max_order_id >= ?1
+    );
+""",
+            (block.first_id, block.last_id),
+        ).fetchone()[0]
+        # A block without orders yet is carried on from its start, rather
+        # than leasing another block on every restart
+        self.block = block
+        self.next_id = block.first_id if highest is None else highest + 1
+
+    def lease(self) -> OrderIdBlock:
+        """Leases the next block of ids after every block and order so far
+
+        The block is found and recorded by one statement, which holds the
+        database's write lock throughout, so registers leasing at the same
+        time get different blocks.
+
+        Raises:
+            RuntimeError: if the database did not return the block
+
+        Returns:
+            OrderIdBlock: the new block
+        """
+        try:
+            cur = self.conn.execute(
+                """
+INSERT INTO
+    order_id_blocks(register_id, first_id, last_id)
+SELECT
+    ?1,
+    start,
+    start + ?2 - 1
+FROM
+    (
+        SELECT
+            MAX(
+                COALESCE(
+                    (
+                        SELECT
+                            MAX(last_id)
+                        FROM
+                            order_id_blocks
+                    ),
+                    0
+                ),
+                COALESCE(
+                    (
+                        SELECT
+                            MAX(id)
+                        FROM
+                            main.orders
+                    ),
+                    0
+                )
+            ) + 1 AS start
+    ) RETURNING id,
+    register_id,
+    first_id,
+    last_id,
+    leased_ts;
+""",
+                (self.register_id, self.block_size),
+            )
+            blocks = list(iter_records(cur, OrderIdBlock.from_row))
+            if len(blocks) == 0:
+                raise RuntimeError
+            self.conn.commit()
+        except Exception:
+            # A failed lease must not hold the write lock of every register
+            self.conn.rollback()
+            raise
+        self.block = blocks[0]
+        self.next_id = self.block.first_id
+        self.leases += 1
+        return self.block
+
+    def take(self) -> int:
+        """Takes the register's next order id, leasing a block when needed
+
+        Returns:
+            int: id for a new order
+        """
+        if self.block is None or self.next_id > self.block.last_id:
+            self.lease()
+        order_id = self.next_id
+        self.next_id += 1
+        return order_id
+
+    def skip_past(self, order_id: Optional[int]):
+        """Skips ids up to one taken without the database, if in the block
+
+        Orders queued by the register while the database was unreachable
+        took ids that restarting cannot find in orders.
+
+        Args:
+            order_id (Optional[int]): highest id taken, None if there is none
+        """
+        if self.block is None or order_id is None:
+            return
+        if self.block.first_id <= order_id <= self.block.last_id:
+            self.next_id = max(self.next_id, order_id + 1)
+
+    def list_blocks(self) -> list[OrderIdBlock]:
+        """Lists the blocks leased by every register
+
+        Returns:
+            list[OrderIdBlock]: blocks, oldest first
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    id,
+    register_id,
+    first_id,
+    last_id,
+    leased_ts
+FROM
+    order_id_blocks
+ORDER BY
+    id;
+"""
+        )
+        return list(iter_records(cur, OrderIdBlock.from_row))
@@ -1,11 +1,43 @@
 """Main Report Module"""
 from dataclasses import dataclass
 import sqlite3
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
 import functools
 
-
-@dataclass
+from change_log import (
+    CUSTOMER_CREATED,
+    CUSTOMER_SET,
+    LINE_CHANGED,
+    ORDER_OPENED,
+    ORDER_PAID,
+    RETURN_OPENED,
+    ChangeLog,
+)
+from order_ids import OrderIds
+from partitions import Partition, Partitions
+from records import iter_records, merge_records
+
+# Tax rates recorded on order lines when items are added to an order
+GST_RATE = 0.05
+PST_RATE = 0.06
+
+# Assignment of an order's stored totals, calculated from its items
+ORDER_TOTALS = """
+    (num_items, subtotal, gst_total, pst_total) = (
+        SELECT
+            COALESCE(SUM(order_items.quantity), 0),
+            COALESCE(SUM(quantity * price), 0.0),
+            COALESCE(SUM(quantity * price * gst * gst_rate), 0.0),
+            COALESCE(SUM(quantity * price * pst * pst_rate), 0.0)
+        FROM
+            order_items
+        WHERE
+            order_items.order_id = orders.id
+    )
+"""
+
+
+@dataclass(slots=True)
 class Item:
     """Represents an item"""
 
@@ -30,11 +62,17 @@ class Item:
         return Item(item_id, name, price, category_id, gst, pst)
 
 
-@dataclass
+@dataclass(slots=True)
 class ItemQuantity(Item):
-    """Represents an item with a quantity attached"""
+    """Represents an item with a quantity attached
+
+    The price, tax flags and tax rates are the ones recorded when the item
+    was added to its order.
+    """
 
     quantity: int
+    gst_rate: float = GST_RATE
+    pst_rate: float = PST_RATE
 
     @staticmethod
     def from_row(row: Any) -> "ItemQuantity":
@@ -46,7 +84,7 @@ class ItemQuantity(Item):
         Returns:
             ItemQuantity: an ItemQuantity from the database
         """
-        item_id, quantity, name, price, gst, pst, category_id = row
+        item_id, quantity, name, price, gst, pst, category_id, gst_rate, pst_rate = row
         return ItemQuantity(
             item_id=item_id,
             quantity=quantity,
@@ -55,6 +93,8 @@ class ItemQuantity(Item):
             category=category_id,
             gst=gst,
             pst=pst,
+            gst_rate=gst_rate,
+            pst_rate=pst_rate,
         )
 
     def __add__(self, item_quantity):
@@ -77,7 +117,7 @@ class ItemQuantity(Item):
         Returns:
             float: gst on this ItemQuantity
         """
-        return self.price * self.quantity * int(self.gst) * 0.05
+        return self.price * self.quantity * int(self.gst) * self.gst_rate
 
     def get_pst(self) -> float:
         """Calculates the pst of the item(if applicable)
@@ -85,7 +125,7 @@ class ItemQuantity(Item):
         Returns:
             float: pst on this ItemQuantity
         """
-        return self.price * self.quantity * int(self.pst) * 0.06
+        return self.price * self.quantity * int(self.pst) * self.pst_rate
 
     def total(self) -> float:
         """Calculates the total of the item
@@ -96,7 +136,7 @@ class ItemQuantity(Item):
         return self.subtotal() + self.get_gst() + self.get_pst()
 
 
-@dataclass
+@dataclass(slots=True)
 class Order:
     """Represents an order"""
 
@@ -198,7 +238,7 @@ class Order:
         return string
 
 
-@dataclass
+@dataclass(slots=True)
 class OrderSummary:
     """Represents the summary of an order"""
 
@@ -246,7 +286,7 @@ class OrderSummary:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Customer:
     """Represents a customer from the database"""
 
@@ -269,7 +309,7 @@ class Customer:
         return Customer(customer_id, name, phone_number, email)
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     """Represents a user from the database"""
 
@@ -294,8 +334,25 @@ class User:
 class OrderSystem:
     """Order System class"""
 
-    def __init__(self, conn: sqlite3.Connection) -> None:
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        partitions: Optional[Partitions] = None,
+        changes: Optional[ChangeLog] = None,
+        order_ids: Optional[OrderIds] = None,
+    ) -> None:
         self.conn = conn
+        self.partitions = partitions
+        # Every change is recorded, and published to subscribers once committed
+        self.changes = changes or ChangeLog(conn)
+        # Registers number orders from their own blocks, otherwise sqlite does
+        self.order_ids = order_ids
+
+    def _take_order_id(self) -> Optional[int]:
+        """[Internal] Takes the id of a new order, None to let sqlite pick it"""
+        if self.order_ids is None:
+            return None
+        return self.order_ids.take()
 
     def new_order(self, user_id: int, customer_id: Optional[int] = None) -> int:
         """Create a new order
@@ -311,12 +368,14 @@ class OrderSystem:
             int: id of the new order
         """
         cur = self.conn.execute(
-            "INSERT INTO orders(customer_id, user_id) VALUES (?,?);",
-            (customer_id, user_id),
+            "INSERT INTO orders(id, customer_id, user_id) VALUES (?, ?, ?);",
+            (self._take_order_id(), customer_id, user_id),
         )
-        self.conn.commit()
         if cur.lastrowid is None:
             raise RuntimeError
+        self.changes.record(ORDER_OPENED, cur.lastrowid, reference=customer_id)
+        self.conn.commit()
+        self.changes.publish()
         return cur.lastrowid
 
     def new_return_order(
@@ -336,27 +395,55 @@ class OrderSystem:
             int: id of new order
         """
         cur = self.conn.execute(
-            "INSERT INTO orders(user_id, order_reference, customer_id) VALUES (?, ?, ?);",
-            (user_id, order_id, customer_id),
+            "INSERT INTO orders(id, user_id, order_reference, customer_id)"
+            + " VALUES (?, ?, ?, ?);",
+            (self._take_order_id(), user_id, order_id, customer_id),
         )
-        self.conn.commit()
         if cur.lastrowid is None:
             raise RuntimeError
+        self.changes.record(RETURN_OPENED, cur.lastrowid, reference=order_id)
+        self.conn.commit()
+        self.changes.publish()
         return cur.lastrowid
 
     def set_order_item(self, order_id: int, item_id: int, quantity: int):
         """Sets the quantity of an item on an order
 
+        Lines of a return order are priced and taxed like the line on the
+        original order, other lines use the item's current price.
+
         Args:
             order_id (int): id of the order
             item_id (int): id of the item
             quantity (int): quantity of the item
         """
-        self.conn.execute(
-            "INSERT INTO order_items (order_id, item_id, quantity) VALUES (?, ?, ?);",
-            (order_id, item_id, quantity),
+        cur = self.conn.execute(
+            """
+INSERT INTO
+    order_items(order_id, item_id, quantity, price, gst, pst, gst_rate, pst_rate)
+SELECT
+    orders.id,
+    items.id,
+    ?,
+    COALESCE(sold.price, items.price),
+    COALESCE(sold.gst, items.gst),
+    COALESCE(sold.pst, items.pst),
+    COALESCE(sold.gst_rate, ?),
+    COALESCE(sold.pst_rate, ?)
+FROM
+    orders
+    INNER JOIN items ON items.id = ?
+    LEFT JOIN order_items AS sold ON sold.order_id = orders.order_reference
+    AND sold.item_id = items.id
+WHERE
+    orders.id = ?;
+""",
+            (quantity, GST_RATE, PST_RATE, item_id, order_id),
         )
+        if cur.rowcount > 0:
+            self.changes.record(LINE_CHANGED, order_id, item_id, quantity)
         self.conn.commit()
+        self.changes.publish()
 
     def add_customer_to_order(self, order_id: int, customer_id: int):
         """Link a customer to an order
@@ -368,20 +455,80 @@ class OrderSystem:
         self.conn.execute(
             "UPDATE orders SET customer_id = ? WHERE id = ?;", (customer_id, order_id)
         )
+        self.changes.record(CUSTOMER_SET, order_id, reference=customer_id)
         self.conn.commit()
+        self.changes.publish()
 
     def pay_for_order(self, order_id: int, payment_type: int):
         """Marks an order as paid for
 
+        The order's totals are calculated and stored at the same time, so
+        reports read them from the order instead of summing its items.
+        Subscribers to the change log receive an order_paid event afterwards.
+
         Args:
             order_id (int): id of order to pay for
             payment_type (int): id of payment type
         """
         self.conn.execute(
-            "UPDATE orders SET payment_type = ? WHERE id = ?;",
+            f"UPDATE orders SET payment_type = ?, {ORDER_TOTALS} WHERE id = ?;",
             (payment_type, order_id),
         )
+        self.changes.record(ORDER_PAID, order_id, reference=payment_type)
+        self.conn.commit()
+        self.changes.publish()
+
+    def has_untotalled_orders(self) -> bool:
+        """Checks for paid orders that were inserted without their totals
+
+        Reads the order_untotalled index, so checking a database where every
+        order has its totals does not scan orders.
+
+        Returns:
+            bool: True if backfill_order_totals has orders to update
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    EXISTS(
+        SELECT
+            1
+        FROM
+            orders
+        WHERE
+            payment_type IS NOT NULL
+            AND subtotal IS NULL
+    );
+"""
+        )
+        return cur.fetchone()[0] == 1
+
+    def backfill_order_totals(self) -> int:
+        """Stores the totals of paid orders that were inserted without them
+
+        Returns:
+            int: number of orders updated
+        """
+        cur = self.conn.execute(
+            f"UPDATE orders SET {ORDER_TOTALS}"
+            + " WHERE payment_type IS NOT NULL AND subtotal IS NULL;"
+        )
         self.conn.commit()
+        return cur.rowcount
+
+    def order_exists(self, order_id: int) -> bool:
+        """Checks if an order is in the database or its archived months
+
+        Args:
+            order_id (int): id of order to check
+
+        Returns:
+            bool: true if the order exists, otherwise false
+        """
+        found = self.conn.execute(
+            "SELECT 1 FROM main.orders WHERE id = ?;", (order_id,)
+        ).fetchone()
+        return found is not None or self._find_archived_order(order_id) is not None
 
     def order_paid(self, order_id: int) -> bool:
         """Checks if an order is marked paid
@@ -404,19 +551,69 @@ class OrderSystem:
             order_id (int): order to add item to
             item_id (int): id of item to add
         """
-        self.conn.execute(
+        cur = self.conn.execute(
             """
 INSERT INTO
-    order_items(order_id, item_id, quantity)
-VALUES
-    (?, ?, ?) ON CONFLICT(order_id, item_id) DO
+    order_items(order_id, item_id, quantity, price, gst, pst, gst_rate, pst_rate)
+SELECT
+    ?,
+    id,
+    1,
+    price,
+    gst,
+    pst,
+    ?,
+    ?
+FROM
+    items
+WHERE
+    id = ? ON CONFLICT(order_id, item_id) DO
 UPDATE
 SET
     quantity = quantity + 1;
 """,
-            (order_id, item_id, 1),
+            (order_id, GST_RATE, PST_RATE, item_id),
         )
+        if cur.rowcount > 0:
+            self.changes.record(LINE_CHANGED, order_id, item_id, 1)
         self.conn.commit()
+        self.changes.publish()
+
+    def add_order_items(self, order_id: int, quantities: dict[int, int]):
+        """Add several items to an order in one transaction, such as a burst of scans
+
+        Args:
+            order_id (int): order to add items to
+            quantities (dict[int, int]): quantity to add of each item id
+        """
+        for item_id, quantity in quantities.items():
+            cur = self.conn.execute(
+                """
+INSERT INTO
+    order_items(order_id, item_id, quantity, price, gst, pst, gst_rate, pst_rate)
+SELECT
+    ?,
+    id,
+    ?,
+    price,
+    gst,
+    pst,
+    ?,
+    ?
+FROM
+    items
+WHERE
+    id = ? ON CONFLICT(order_id, item_id) DO
+UPDATE
+SET
+    quantity = quantity + excluded.quantity;
+""",
+                (order_id, quantity, GST_RATE, PST_RATE, item_id),
+            )
+            if cur.rowcount > 0:
+                self.changes.record(LINE_CHANGED, order_id, item_id, quantity)
+        self.conn.commit()
+        self.changes.publish()
 
     def remove_order_item(self, order_id: int, item_id: int):
         """Remove an item from the order
@@ -425,19 +622,152 @@ SET
             order_id (int): order to remove item from
             item_id (int): id of item to remove
         """
-        self.conn.execute(
+        cur = self.conn.execute(
             """
 UPDATE
     order_items
 SET
-    quantity = max(quantity - 1, 0)
+    quantity = quantity - 1
 WHERE
     order_id = ?
-    AND item_id = ?;
+    AND item_id = ?
+    AND quantity > 0;
 """,
             (order_id, item_id),
         )
+        if cur.rowcount > 0:
+            self.changes.record(LINE_CHANGED, order_id, item_id, -1)
         self.conn.commit()
+        self.changes.publish()
+
+    def _find_archived_order(self, order_id: int) -> Optional[Partition]:
+        """[Internal] Finds the partition holding an order that is not in the main database
+
+        Args:
+            order_id (int): id of the order
+
+        Returns:
+            Optional[Partition]: partition holding the order, None if it is in
+                the main database or does not exist
+        """
+        if self.partitions is None:
+            return None
+        in_main = self.conn.execute(
+            "SELECT 1 FROM main.orders WHERE id = ?;", (order_id,)
+        ).fetchone()
+        if in_main is not None:
+            return None
+        for partition in self.partitions.containing_order(order_id):
+            schema = self.partitions.attach(partition)
+            archived = self.conn.execute(
+                f"SELECT 1 FROM {schema}.orders WHERE id = ?;", (order_id,)
+            ).fetchone()
+            if archived is not None:
+                return partition
+        return None
+
+    def _find_archived_returns(
+        self, partition: Partition, order_id: int
+    ) -> list[tuple[Optional[Partition], int]]:
+        """[Internal] Finds the returns of an archived order and returns of those returns
+
+        Returns are newer than the order they return, so they are in the main
+        database or in partitions of the same or later months. Registers
+        number orders from their own blocks, so a return can have a lower id
+        than the order it returns.
+
+        Args:
+            partition (Partition): partition holding the order
+            order_id (int): id of the archived order
+
+        Returns:
+            list[tuple[Optional[Partition], int]]: partition of each return, None
+                for the main database, and its id
+        """
+        later: list[Optional[Partition]] = [None]
+        later.extend(
+            later_partition
+            for later_partition in self.partitions.list_partitions()
+            if later_partition.month >= partition.month
+        )
+        returns = []
+        references = [order_id]
+        while len(references) > 0:
+            placeholders = ", ".join("?" for _ in references)
+            found = []
+            for source in later:
+                schema = "main" if source is None else self.partitions.attach(source)
+                cur = self.conn.execute(
+                    f"SELECT id FROM {schema}.orders WHERE order_reference IN ({placeholders});",
+                    references,
+                )
+                found.extend((source, row[0]) for row in cur)
+            returns.extend(found)
+            references = [return_id for _, return_id in found]
+        return returns
+
+    def _get_archived_order_details(
+        self, partition: Partition, order_id: int, with_returns: bool
+    ) -> Order:
+        """[Internal] Gets details of an order that was archived into a partition
+
+        Args:
+            partition (Partition): partition holding the order
+            order_id (int): id of the order
+            with_returns (bool): whether returned quantities are included
+
+        Returns:
+            Order: details of the order
+        """
+        returns = self._find_archived_returns(partition, order_id)
+        schema = self.partitions.attach(partition)
+        order = Order.from_row(
+            self.conn.execute(
+                f"""
+SELECT id,
+    customer_id,
+    user_id,
+    payment_type,
+    order_reference,
+    timestamp,
+    ? AS order_updated
+FROM {schema}.orders
+WHERE id = ?;
+""",
+                (len(returns) > 0, order_id),
+            ).fetchone()
+        )
+        sources: list[tuple[Optional[Partition], int]] = [(partition, order_id)]
+        if with_returns:
+            sources.extend(returns)
+        items: list[ItemQuantity] = []
+        for source, source_id in sources:
+            schema = "main" if source is None else self.partitions.attach(source)
+            cur = self.conn.execute(
+                f"""
+SELECT
+    order_items.item_id,
+    quantity,
+    name,
+    order_items.price,
+    order_items.gst,
+    order_items.pst,
+    category_id,
+    gst_rate,
+    pst_rate
+FROM
+    {schema}.order_items
+    LEFT JOIN items ON order_items.item_id = items.id
+WHERE
+    order_items.order_id = ?;
+""",
+                (source_id,),
+            )
+            items.extend(iter_records(cur, ItemQuantity.from_row))
+        if with_returns:
+            items = merge_records(items, lambda item: item.item_id, ("quantity",))
+        order.items = items
+        return order
 
     def get_order_details(self, order_id: int) -> Order:
         """Get details of an order
@@ -448,6 +778,9 @@ WHERE
         Returns:
             Order: details of the order
         """
+        partition = self._find_archived_order(order_id)
+        if partition is not None:
+            return self._get_archived_order_details(partition, order_id, False)
         cur = self.conn.execute(
             """
 SELECT id,
@@ -469,13 +802,15 @@ WHERE id = ?;
         cur2 = self.conn.execute(
             """
 SELECT
-    items.id,
+    order_items.item_id,
     quantity,
     name,
-    price,
-    gst,
-    pst,
-    category_id
+    order_items.price,
+    order_items.gst,
+    order_items.pst,
+    category_id,
+    gst_rate,
+    pst_rate
 FROM
     order_items
     LEFT JOIN items ON order_items.item_id = items.id
@@ -485,7 +820,7 @@ WHERE
             (order_id,),
         )
         order = Order.from_row(cur.fetchone())
-        order.items = list(map(ItemQuantity.from_row, cur2.fetchall()))
+        order.items = list(iter_records(cur2, ItemQuantity.from_row))
         return order
 
     def get_order_details_for_return(self, order_id: int) -> Order:
@@ -497,6 +832,9 @@ WHERE
         Returns:
             Order: details of the order
         """
+        partition = self._find_archived_order(order_id)
+        if partition is not None:
+            return self._get_archived_order_details(partition, order_id, True)
         cur = self.conn.execute(
             """
 SELECT id,
@@ -530,10 +868,12 @@ WITH RECURSIVE ord(id) AS (
 SELECT order_items.item_id,
     SUM(quantity),
     name,
-    price,
-    gst,
-    pst,
-    category_id
+    order_items.price,
+    order_items.gst,
+    order_items.pst,
+    category_id,
+    gst_rate,
+    pst_rate
 FROM ord
     INNER JOIN order_items ON ord.id = order_items.order_id
     LEFT JOIN items ON order_items.item_id = items.id
@@ -542,7 +882,7 @@ GROUP BY order_items.item_id;
             (order_id,),
         )
         order = Order.from_row(cur.fetchone())
-        order.items = list(map(ItemQuantity.from_row, cur2.fetchall()))
+        order.items = list(iter_records(cur2, ItemQuantity.from_row))
         return order
 
     def create_customer(
@@ -568,9 +908,11 @@ GROUP BY order_items.item_id;
             "INSERT INTO customers(customer_name, phone_number, email) VALUES(?, ?, ?);",
             (customer_name, customer_phone, customer_email),
         )
-        self.conn.commit()
         if cur.lastrowid is None:
             raise RuntimeError
+        self.changes.record(CUSTOMER_CREATED, cur.lastrowid)
+        self.conn.commit()
+        self.changes.publish()
         return cur.lastrowid
 
     def get_all_customers(self) -> list[Customer]:
@@ -579,5 +921,13 @@ GROUP BY order_items.item_id;
         Returns:
             list[Customer]: list of customers from the database
         """
+        return list(self.iter_all_customers())
+
+    def iter_all_customers(self) -> Iterator[Customer]:
+        """Iterates through all customers in the database as they are read
+
+        Returns:
+            Iterator[Customer]: customers from the database
+        """
         cur = self.conn.execute("SELECT * FROM customers;")
-        return list(map(Customer.from_row, cur.fetchall()))
+        return iter_records(cur, Customer.from_row)
@@ -2,17 +2,33 @@
 from tkinter import (
     Button,
     Checkbutton,
+    Entry,
     Frame,
     IntVar,
+    Label,
+    Listbox,
+    StringVar,
     Tk,
     Toplevel,
     ttk,
 )
 from typing import Optional
 from finalize_order_view import FinalizeOrderView
+from item_codes import ScanQueue
 from order_details_frame import OrderDetailsFrame
+from draft_orders import DraftOrder
+from order_system import Item
 from app import App
 
+# Items listed while searching
+SEARCH_RESULTS = 10
+
+# Scans within this long of the first scan of a burst are applied together
+SCAN_DEBOUNCE_MS = 20
+
+# Changes to the basket are flushed to disk this long after the first one
+JOURNAL_SYNC_MS = 50
+
 
 class OrderView(Toplevel):
     """New order GUI window"""
@@ -27,27 +43,40 @@ class OrderView(Toplevel):
         self.app = app
 
         self.add = True
-        self.categories = self.app.get_all_categories()
-        self.order_id = self.app.order_system.new_order(1)
-
-        width = 6  # how many buttons across?
-        self.category_tabs = ttk.Notebook(self)
-        self.item_frames = []
-
-        # Add all the category tabs
-        for category_name, category_items in self.categories.items():
+        # The order is only written to the database when it is paid for, until
+        # then the basket is kept in the journal, or restored from it
+        self.journal = self.app.basket_journal
+        self.basket_id = self.journal.open_basket(1)
+        self.sync_scheduled = False
+
+        catalog = Frame(self)
+        catalog.pack(side="left", fill="both", expand=True)
+
+        # Items are found by typing part of their name or code
+        search_bar = Frame(catalog)
+        search_bar.pack(side="top", fill="x")
+        Label(search_bar, text="Search").pack(side="left")
+        self.search_text = StringVar()
+        self.search_text.trace_add("write", self.search)
+        search_entry = Entry(search_bar, textvariable=self.search_text)
+        search_entry.pack(side="left", fill="x", expand=True)
+        search_entry.bind("<Return>", self.choose_search_result)
+        self.search_results: list[Item] = []
+        self.search_list = Listbox(catalog, height=SEARCH_RESULTS)
+        self.search_list.pack(side="top", fill="x")
+        self.search_list.bind("<Double-Button-1>", self.choose_search_result)
+        self.search_list.bind("<Return>", self.choose_search_result)
+
+        # Tabs get their buttons when first shown, large catalogs open quickly
+        self.category_tabs = ttk.Notebook(catalog)
+        self.unbuilt_tabs: dict[str, int] = {}
+        for category_id, category_name in self.app.get_categories().items():
             category_frame = Frame(self.category_tabs)
             category_frame.pack(fill="both", expand=True)
             self.category_tabs.add(category_frame, text=category_name)
-            for i in range(width):
-                category_frame.grid_columnconfigure(i, weight=1)
-            for i, item in enumerate(category_items):
-                Button(
-                    category_frame,
-                    text=item.name,
-                    command=lambda id=item.item_id: self.item_button(id),
-                ).grid(row=i // width, column=i % width, sticky="nesw")
-        self.category_tabs.pack(side="left", fill="both", expand=True)
+            self.unbuilt_tabs[str(category_frame)] = category_id
+        self.category_tabs.bind("<<NotebookTabChanged>>", self.show_tab)
+        self.category_tabs.pack(side="top", fill="both", expand=True)
 
         self.order_details = OrderDetailsFrame(self)
         self.order_details.pack(side="left", fill="both")
@@ -63,11 +92,90 @@ class OrderView(Toplevel):
             command=self.show_finalize,
         ).grid(row=6, column=0, columnspan=2)
 
+        # Keyboard-wedge scanners type each code followed by Enter
+        self.scans = ScanQueue()
+        self.scan_code = StringVar()
+        Label(self.order_details, text="Scan").grid(row=7, column=0)
+        scan_entry = Entry(self.order_details, textvariable=self.scan_code)
+        scan_entry.grid(row=7, column=1)
+        scan_entry.bind("<Return>", self.scan)
+        scan_entry.focus_set()
+        self.scan_status = StringVar()
+        Label(self.order_details, textvariable=self.scan_status).grid(
+            row=8, column=0, columnspan=2
+        )
+
+        self.order_details.update_order_details(self.basket().to_order())
+
         self.protocol("WM_DELETE_WINDOW", self.window_close)
 
+    def basket(self) -> DraftOrder:
+        """Gets the basket being rung up
+
+        Returns:
+            DraftOrder: the basket
+        """
+        return self.journal.baskets[self.basket_id]
+
+    def basket_changed(self):
+        """Updates the order shown, flushing the journal shortly after"""
+        self.order_details.update_order_details(self.basket().to_order())
+        if self.journal.sync_pending() and not self.sync_scheduled:
+            self.sync_scheduled = True
+            self.after(JOURNAL_SYNC_MS, self.sync_journal)
+
+    def sync_journal(self):
+        """Flushes the basket's changes to disk"""
+        self.sync_scheduled = False
+        self.journal.sync()
+
+    def show_tab(self, _evt):
+        """Creates the item buttons of a category tab the first time it is shown
+
+        Args:
+            _evt (_type_): unused event parameter
+        """
+        tab = self.category_tabs.select()
+        category_id = self.unbuilt_tabs.pop(tab, None)
+        if category_id is None:
+            return
+        category_frame = self.nametowidget(tab)
+        width = 6  # how many buttons across?
+        for i in range(width):
+            category_frame.grid_columnconfigure(i, weight=1)
+        for i, item in enumerate(self.app.get_items_by_category(category_id)):
+            Button(
+                category_frame,
+                text=item.name,
+                command=lambda item=item: self.item_button(item),
+            ).grid(row=i // width, column=i % width, sticky="nesw")
+
+    def search(self, *_args):
+        """Lists the items best matching the search text as it is typed"""
+        self.search_results = self.app.item_search.search(
+            self.search_text.get(), SEARCH_RESULTS
+        )
+        self.search_list.delete(0, "end")
+        for item in self.search_results:
+            self.search_list.insert("end", f"{item.name}  ${item.price:.2f}")
+
+    def choose_search_result(self, _evt):
+        """Adds or removes the selected search result, or the best one
+
+        Args:
+            _evt (_type_): unused event parameter
+        """
+        if len(self.search_results) == 0:
+            return
+        selection = self.search_list.curselection()
+        item = self.search_results[selection[0] if selection else 0]
+        self.item_button(item)
+
     def show_finalize(self):
         """Shows the finalize"""
-        FinalizeOrderView(self.app, self.order_id).bind("<<Finalized>>", self.handle_finalized)
+        FinalizeOrderView(self.app, None, basket_id=self.basket_id).bind(
+            "<<Finalized>>", self.handle_finalized
+        )
 
     def handle_finalized(self, _evt):
         """Handles the finalized event
@@ -78,21 +186,48 @@ class OrderView(Toplevel):
         self.parent.deiconify()
         self.destroy()
 
-    def item_button(self, item_id: int):
+    def item_button(self, item: Item):
         """Handle item button pressed, either adding or removing an item
 
         Args:
-            item_id (int): id of item to modify
+            item (Item): item to modify
         """
         if self.remove_mode.get() == 0:
-            self.app.order_system.add_order_item(self.order_id, item_id)
+            self.journal.add_item(self.basket_id, item)
         else:
-            self.app.order_system.remove_order_item(self.order_id, item_id)
-        self.order_details.update_order_details(
-            self.app.order_system.get_order_details(self.order_id)
-        )
+            self.journal.remove_items(self.basket_id, {item.item_id: 1})
+        self.basket_changed()
+
+    def scan(self, _evt):
+        """Queues a scanned code, applying the burst once scans pause
+
+        Args:
+            _evt (_type_): unused event parameter
+        """
+        code = self.scan_code.get()
+        self.scan_code.set("")
+        if code.strip() and self.scans.push(code):
+            self.after(SCAN_DEBOUNCE_MS, self.apply_scans)
+
+    def apply_scans(self):
+        """Adds or removes the items of the queued scans, then updates the order once"""
+        quantities, unknown = self.scans.drain(self.app.item_codes)
+        if self.remove_mode.get() == 0:
+            items = self.app.get_items(quantities)
+            self.journal.add_items(
+                self.basket_id,
+                {
+                    item_id: (item, quantities[item_id])
+                    for item_id, item in items.items()
+                },
+            )
+        else:
+            self.journal.remove_items(self.basket_id, quantities)
+        self.scan_status.set(f"Unknown code {unknown[-1]}" if unknown else "")
+        self.basket_changed()
 
     def window_close(self):
-        """Handles window close event"""
+        """Handles window close event, abandoning the basket"""
+        self.journal.close_basket(self.basket_id)
         self.parent.deiconify()
         self.destroy()
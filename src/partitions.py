@@ -0,0 +1,465 @@
+"""Moves closed months of sales into their own database files
+
+Paid orders of a month that has ended are moved with their order lines into
+archive/sales-YYYY-MM.db, keeping the tables written by checkout small.
+Archived months are recorded in the sales_partitions table. Reports,
+inventory and customer searches attach the archives that overlap the dates
+they read and combine the results with the main database.
+
+Usage:
+    python ./src/partitions.py retail.db --keep-months 1
+"""
+import argparse
+from collections import OrderedDict
+from dataclasses import dataclass
+import datetime
+from pathlib import Path
+import re
+import sqlite3
+from typing import Any, Optional
+
+from records import iter_records
+
+# Tables moved into partitions, order lines are moved with their orders
+PARTITIONED_TABLES = ("orders", "order_items")
+
+# Views recreated in each partition so reports can run against it
+PARTITIONED_VIEWS = ("order_summary", "hourly_sales", "daily_sales")
+
+CREATE_PATTERN = re.compile(
+    r"^\s*CREATE\s+(TABLE|INDEX|UNIQUE\s+INDEX|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)",
+    re.IGNORECASE,
+)
+
+
+@dataclass(slots=True)
+class Partition:
+    """Represents a month of sales archived into its own database"""
+
+    month: str
+    path: str
+    first_ts: str
+    last_ts: str
+    min_order_id: int
+    max_order_id: int
+    num_orders: int
+
+    @staticmethod
+    def from_row(row: Any) -> "Partition":
+        """Converts a sqlite row to a Partition
+
+        Args:
+            row (Any): Row from the database
+
+        Returns:
+            Partition: a Partition from the database
+        """
+        return Partition(*row)
+
+    @property
+    def schema(self) -> str:
+        """Name the partition is attached as"""
+        return f"sales_{self.month.replace('-', '_')}"
+
+
+def month_start(month: str) -> datetime.date:
+    """Gets the first day of a month
+
+    Args:
+        month (str): month as YYYY-MM
+
+    Returns:
+        datetime.date: first day of the month
+    """
+    return datetime.date.fromisoformat(f"{month}-01")
+
+
+def next_month(day: datetime.date) -> datetime.date:
+    """Gets the first day of the month after a day
+
+    Args:
+        day (datetime.date): any day of the month
+
+    Returns:
+        datetime.date: first day of the next month
+    """
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+class Partitions:
+    """Archives closed months of sales and attaches them when they are read"""
+
+    def __init__(
+        self, conn: sqlite3.Connection, directory: str = "archive", max_attached: int = 8
+    ) -> None:
+        """Creates a manager for the partitions of a database
+
+        Args:
+            conn (sqlite3.Connection): main database
+            directory (str, optional): directory of the partition files.
+                Defaults to "archive".
+            max_attached (int, optional): partitions attached at once, the least
+                recently used is detached first. sqlite allows 10 attached
+                databases. Defaults to 8.
+        """
+        self.conn = conn
+        self.directory = Path(directory)
+        self.max_attached = max_attached
+        self._attached: OrderedDict[str, None] = OrderedDict()
+
+    def list_partitions(self) -> list[Partition]:
+        """Lists every archived month
+
+        Returns:
+            list[Partition]: partitions, oldest month first
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    month,
+    path,
+    first_ts,
+    last_ts,
+    min_order_id,
+    max_order_id,
+    num_orders
+FROM
+    sales_partitions
+ORDER BY
+    month;
+"""
+        )
+        return list(iter_records(cur, Partition.from_row))
+
+    def overlapping(
+        self, start: datetime.date | str, end: datetime.date | str
+    ) -> list[Partition]:
+        """Lists the partitions holding sales between two dates
+
+        Args:
+            start (datetime.date | str): start of date range(inclusive), a date
+                or timestamp
+            end (datetime.date | str): end of date range(inclusive), a date
+                or timestamp
+
+        Returns:
+            list[Partition]: partitions overlapping the range, oldest month first
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    month,
+    path,
+    first_ts,
+    last_ts,
+    min_order_id,
+    max_order_id,
+    num_orders
+FROM
+    sales_partitions
+WHERE
+    SUBSTR(last_ts, 1, 10) >= SUBSTR(?, 1, 10)
+    AND SUBSTR(first_ts, 1, 10) <= SUBSTR(?, 1, 10)
+ORDER BY
+    month;
+""",
+            (str(start), str(end)),
+        )
+        return list(iter_records(cur, Partition.from_row))
+
+    def containing_order(self, order_id: int) -> list[Partition]:
+        """Lists the partitions whose range of order ids includes an order
+
+        Args:
+            order_id (int): id of the order
+
+        Returns:
+            list[Partition]: partitions that may hold the order
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    month,
+    path,
+    first_ts,
+    last_ts,
+    min_order_id,
+    max_order_id,
+    num_orders
+FROM
+    sales_partitions
+WHERE
+    ? BETWEEN min_order_id AND max_order_id
+ORDER BY
+    month;
+""",
+            (order_id,),
+        )
+        return list(iter_records(cur, Partition.from_row))
+
+    def attach(self, partition: Partition) -> str:
+        """Attaches a partition if it is not attached yet
+
+        Args:
+            partition (Partition): partition to attach
+
+        Raises:
+            FileNotFoundError: if the partition's file is missing
+
+        Returns:
+            str: schema name to qualify the partition's tables with
+        """
+        if partition.schema not in self._attached and not Path(partition.path).exists():
+            raise FileNotFoundError(partition.path)
+        return self._attach_path(partition.schema, partition.path)
+
+    def _attach_path(self, schema: str, path: str) -> str:
+        """[Internal] Attaches a database file, detaching the least recently used"""
+        if schema in self._attached:
+            self._attached.move_to_end(schema)
+            return schema
+        while len(self._attached) >= self.max_attached:
+            oldest, _ = self._attached.popitem(last=False)
+            self.conn.execute(f"DETACH DATABASE {oldest};")
+        self.conn.execute(f"ATTACH DATABASE ? AS {schema};", (path,))
+        self._attached[schema] = None
+        return schema
+
+    def detach_all(self):
+        """Detaches every attached partition"""
+        while len(self._attached) > 0:
+            schema, _ = self._attached.popitem()
+            self.conn.execute(f"DETACH DATABASE {schema};")
+
+    def closed_months(
+        self, keep_months: int = 1, today: Optional[datetime.date] = None
+    ) -> list[str]:
+        """Lists months with paid orders in the main database that can be archived
+
+        Args:
+            keep_months (int, optional): ended months to keep in the main
+                database, so recent orders can still be returned. Defaults to 1.
+            today (Optional[datetime.date], optional): current date.
+                Defaults to today.
+
+        Returns:
+            list[str]: months as YYYY-MM, oldest first
+        """
+        cutoff = (today or datetime.date.today()).replace(day=1)
+        for _ in range(keep_months):
+            cutoff = (cutoff - datetime.timedelta(days=1)).replace(day=1)
+        cur = self.conn.execute(
+            """
+SELECT DISTINCT
+    STRFTIME('%Y-%m', timestamp) AS month
+FROM
+    main.orders
+WHERE
+    payment_type IS NOT NULL
+    AND timestamp < ?
+ORDER BY
+    month;
+""",
+            (str(cutoff),),
+        )
+        return [row[0] for row in cur]
+
+    def archive_closed_months(
+        self, keep_months: int = 1, today: Optional[datetime.date] = None
+    ) -> list[Partition]:
+        """Archives every month that has ended, except the most recent ones
+
+        The month of the newest order is also kept.
+
+        Args:
+            keep_months (int, optional): ended months to keep in the main
+                database. Defaults to 1.
+            today (Optional[datetime.date], optional): current date.
+                Defaults to today.
+
+        Returns:
+            list[Partition]: partitions that were written
+        """
+        # orders.id is not AUTOINCREMENT, the newest order stays so its id is not reused
+        newest = self.conn.execute(
+            "SELECT STRFTIME('%Y-%m', timestamp) FROM main.orders ORDER BY id DESC LIMIT 1;"
+        ).fetchone()
+        return [
+            self.archive_month(month, today)
+            for month in self.closed_months(keep_months, today)
+            if newest is None or month != newest[0]
+        ]
+
+    def archive_month(
+        self, month: str, today: Optional[datetime.date] = None
+    ) -> Partition:
+        """Moves the paid orders of a month and their lines into its partition
+
+        Orders that are not paid for stay in the main database. Archiving a
+        month again adds orders paid since it was last archived.
+
+        Args:
+            month (str): month as YYYY-MM
+            today (Optional[datetime.date], optional): current date.
+                Defaults to today.
+
+        Raises:
+            ValueError: if the month has not ended, or archiving it would let
+                new orders reuse the ids of archived ones
+            FileExistsError: if an unrecorded partition file is in the way
+
+        Returns:
+            Partition: the month's partition
+        """
+        start = month_start(month)
+        end = next_month(start)
+        if end > (today or datetime.date.today()):
+            raise ValueError(f"Sales for {month} are not closed")
+
+        existing = self.conn.execute(
+            "SELECT path FROM sales_partitions WHERE month = ?;", (month,)
+        ).fetchone()
+        path = self.directory / f"sales-{month}.db"
+        if existing is None and path.exists():
+            raise FileExistsError(f"{path} is not a partition of this database")
+
+        condition = "payment_type IS NOT NULL AND timestamp >= ? AND timestamp < ?"
+        bounds = (str(start), str(end))
+        num_orders, min_id, max_id, first_ts, last_ts = self.conn.execute(
+            "SELECT COUNT(*), MIN(id), MAX(id), MIN(timestamp), MAX(timestamp)"
+            + f" FROM main.orders WHERE {condition};",
+            bounds,
+        ).fetchone()
+        if num_orders > 0:
+            self._check_ids_kept(max_id)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            schema = self._attach_path(f"sales_{month.replace('-', '_')}", str(path))
+            self._create_schema(schema)
+            order_ids = f"SELECT id FROM main.orders WHERE {condition}"
+            try:
+                for table in PARTITIONED_TABLES:
+                    columns = ", ".join(self._columns(table))
+                    key = "id" if table == "orders" else "order_id"
+                    self.conn.execute(
+                        f"INSERT INTO {schema}.{table} ({columns}) SELECT {columns}"
+                        + f" FROM main.{table} WHERE {key} IN ({order_ids});",
+                        bounds,
+                    )
+                for table in reversed(PARTITIONED_TABLES):
+                    key = "id" if table == "orders" else "order_id"
+                    self.conn.execute(
+                        f"DELETE FROM main.{table} WHERE {key} IN ({order_ids});", bounds
+                    )
+                self.conn.execute(
+                    """
+INSERT INTO
+    sales_partitions(
+        month,
+        path,
+        first_ts,
+        last_ts,
+        min_order_id,
+        max_order_id,
+        num_orders
+    )
+VALUES
+    (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(month) DO
+UPDATE
+SET
+    first_ts = MIN(first_ts, excluded.first_ts),
+    last_ts = MAX(last_ts, excluded.last_ts),
+    min_order_id = MIN(min_order_id, excluded.min_order_id),
+    max_order_id = MAX(max_order_id, excluded.max_order_id),
+    num_orders = num_orders + excluded.num_orders;
+""",
+                    (month, str(path), first_ts, last_ts, min_id, max_id, num_orders),
+                )
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+
+        partitions = [
+            partition
+            for partition in self.list_partitions()
+            if partition.month == month
+        ]
+        if len(partitions) == 0:
+            raise ValueError(f"No paid orders in {month}")
+        return partitions[0]
+
+    def _columns(self, table: str) -> list[str]:
+        """[Internal] Gets the column names of a table in the main database"""
+        return [row[1] for row in self.conn.execute(f"PRAGMA main.table_info({table});")]
+
+    def _check_ids_kept(self, max_id: int):
+        """[Internal] Makes sure order ids cannot be reused after archiving"""
+        has_sequence = self.conn.execute(
+            "SELECT COUNT(*) FROM main.sqlite_schema WHERE name = 'sqlite_sequence';"
+        ).fetchone()[0]
+        if has_sequence:
+            sequence = self.conn.execute(
+                "SELECT seq FROM main.sqlite_sequence WHERE name = 'orders';"
+            ).fetchone()
+            if sequence is not None and sequence[0] >= max_id:
+                return
+        highest = self.conn.execute("SELECT MAX(id) FROM main.orders;").fetchone()[0]
+        if highest == max_id:
+            raise ValueError(
+                "Archiving would remove the newest order, new orders would reuse its id"
+            )
+
+    def _create_schema(self, schema: str):
+        """[Internal] Creates the partitioned tables, their indexes and views"""
+        objects = self.conn.execute(
+            f"""
+SELECT
+    type,
+    name,
+    sql
+FROM
+    main.sqlite_schema
+WHERE
+    sql IS NOT NULL
+    AND (
+        tbl_name IN ({", ".join("?" for _ in PARTITIONED_TABLES)})
+        OR name IN ({", ".join("?" for _ in PARTITIONED_VIEWS)})
+    )
+ORDER BY
+    type = 'view',
+    type = 'index';
+""",
+            PARTITIONED_TABLES + PARTITIONED_VIEWS,
+        ).fetchall()
+        for object_type, name, sql in objects:
+            if object_type == "view":
+                # Views are recreated so they match the main database
+                self.conn.execute(f"DROP VIEW IF EXISTS {schema}.{name};")
+            self.conn.execute(
+                CREATE_PATTERN.sub(
+                    lambda match: f"CREATE {match.group(1)} IF NOT EXISTS"
+                    + f" {schema}.{match.group(2)}",
+                    sql,
+                    count=1,
+                )
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed months of sales")
+    parser.add_argument("database")
+    parser.add_argument("--keep-months", type=int, default=1)
+    parser.add_argument("--directory", default="archive")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    partitions = Partitions(connection, args.directory)
+    for archived in partitions.archive_closed_months(args.keep_months):
+        print(f"Archived {archived.month} to {archived.path}")
+    partitions.detach_all()
+    for listed in partitions.list_partitions():
+        print(
+            f"{listed.month}  {listed.num_orders:>8} orders"
+            + f"  {listed.first_ts} - {listed.last_ts}  {listed.path}"
+        )
+    connection.close()
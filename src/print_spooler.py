@@ -0,0 +1,468 @@
+"""Prints bills in the background so the till never waits for the printer
+
+Printing used to write the bill to a temporary file and hand it to
+os.startfile in the button handler, so the cashier waited for the printer
+driver, and printing failed outright where os.startfile does not exist.
+Bills are now submitted to a spooler, which queues them and returns at
+once, and a worker thread writes them to the register's sink: a file, a
+raw printer device, or a command such as CUPS's lp that reads the job from
+its input.
+
+Bills submitted while the worker is busy, or within coalesce_seconds of
+each other, are written to the sink together as one job, separated by form
+feeds, so a burst of reprints costs one lp run or one open of the device. A
+write that fails is retried with increasing delays, and bills still not
+printed after the last retry are marked failed and kept for the app to
+report, since the receipt can be reprinted from the receipt journal.
+
+Usage:
+    python ./src/print_spooler.py bill.txt
+    python ./src/print_spooler.py --printer "command:lp -d receipts" bill.txt
+    python ./src/print_spooler.py --printer device:/dev/usb/lp0 bill.txt
+"""
+from abc import ABC, abstractmethod
+import argparse
+from collections import OrderedDict
+from dataclasses import dataclass
+import itertools
+import os
+from pathlib import Path
+import queue
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+# Status of a print job
+QUEUED = "queued"
+PRINTING = "printing"
+PRINTED = "printed"
+FAILED = "failed"
+
+# Written between bills printed as one job
+FORM_FEED = "\f"
+
+# Finished jobs kept for status lookups
+FINISHED_JOBS = 1000
+
+
+class Sink(ABC):
+    """Somewhere bills are printed to"""
+
+    name = "sink"
+
+    @abstractmethod
+    def write(self, text: str):
+        """Prints text
+
+        Args:
+            text (str): bills to print
+
+        Raises:
+            OSError: if the text could not be printed, any other error fails
+                the job the same way
+        """
+
+
+class FileSink(Sink):
+    """Appends bills to a text file, for registers without a printer
+
+    Each write ends with a form feed, like the bills written together.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.name = f"file:{self.path}"
+
+    def write(self, text: str):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(text + FORM_FEED)
+
+
+class DeviceSink(Sink):
+    """Writes bills to a raw printer device, such as /dev/usb/lp0
+
+    The device is never created, so a printer that is unplugged fails the
+    job instead of leaving a file in its place.
+    """
+
+    def __init__(self, path: str | Path, encoding: str = "cp437") -> None:
+        self.path = Path(path)
+        self.encoding = encoding
+        self.name = f"device:{self.path}"
+
+    def write(self, text: str):
+        data = text.encode(self.encoding, errors="replace")
+        descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            while len(data) > 0:
+                data = data[os.write(descriptor, data) :]
+        finally:
+            os.close(descriptor)
+
+
+class CommandSink(Sink):
+    """Pipes bills to a print command, such as lp or lpr"""
+
+    def __init__(self, command: list[str], timeout: float = 30.0) -> None:
+        self.command = command
+        self.timeout = timeout
+        self.name = f"command:{shlex.join(command)}"
+
+    def write(self, text: str):
+        try:
+            process = subprocess.run(
+                self.command,
+                input=text.encode("utf-8"),
+                capture_output=True,
+                timeout=self.timeout,
+                check=False,
+            )
+        except subprocess.TimeoutExpired as error:
+            raise OSError(f"{self.command[0]} did not finish") from error
+        if process.returncode != 0:
+            message = f"{self.command[0]} exited with {process.returncode}"
+            output = process.stderr.decode("utf-8", errors="replace").strip()
+            raise OSError(message if output == "" else f"{message}: {output}")
+
+
+class StartfileSink(Sink):
+    """Prints bills with the default Windows printer, as the app always has"""
+
+    name = "startfile"
+
+    def write(self, text: str):
+        # os.startfile prints files, so the printer gets a temporary copy
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".txt", delete=False, encoding="utf-8"
+        ) as file:
+            file.write(text)
+        os.startfile(file.name, "print")  # pylint: disable=no-member
+
+
+class FakePrinter(Sink):
+    """Records what is printed, for trying the spooler without a printer
+
+    Args:
+        fail_writes (int, optional): writes to fail before printing.
+            Defaults to 0.
+        delay (float, optional): seconds each write takes. Defaults to 0.0.
+    """
+
+    name = "fake"
+
+    def __init__(self, fail_writes: int = 0, delay: float = 0.0) -> None:
+        self.fail_writes = fail_writes
+        self.delay = delay
+        self.writes: list[str] = []
+        self.attempts = 0
+
+    def write(self, text: str):
+        self.attempts += 1
+        time.sleep(self.delay)
+        if self.fail_writes > 0:
+            self.fail_writes -= 1
+            raise OSError("printer is out of paper")
+        self.writes.append(text)
+
+    def printed(self) -> list[str]:
+        """Lists the bills printed, split apart where they were coalesced
+
+        Returns:
+            list[str]: bills, in the order they were printed
+        """
+        return [bill for text in self.writes for bill in text.split(FORM_FEED)]
+
+
+def open_sink(printer: Optional[str] = None) -> Sink:
+    """Creates the sink for a printer setting
+
+    Settings are "file:<path>", "device:<path>", "command:<command line>",
+    "startfile" or "fake". Without one, bills go to the default Windows
+    printer, then to lp if it is installed, and otherwise to
+    logs/printed.txt.
+
+    Args:
+        printer (Optional[str], optional): printer setting. Defaults to None.
+
+    Raises:
+        ValueError: if the setting is not one of the above
+
+    Returns:
+        Sink: sink for the printer
+    """
+    if printer is None:
+        if sys.platform == "win32":
+            return StartfileSink()
+        if shutil.which("lp") is not None:
+            return CommandSink(["lp"])
+        return FileSink("logs/printed.txt")
+    kind, _, target = printer.partition(":")
+    if kind == "file" and target != "":
+        return FileSink(target)
+    if kind == "device" and target != "":
+        return DeviceSink(target)
+    if kind == "command" and target != "":
+        return CommandSink(shlex.split(target))
+    if printer == "startfile":
+        return StartfileSink()
+    if printer == "fake":
+        return FakePrinter()
+    raise ValueError(f"Unknown printer {printer!r}")
+
+
+@dataclass(slots=True)
+class PrintJob:
+    """Represents a bill submitted to the spooler"""
+
+    job_id: int
+    title: str
+    text: str
+    status: str = QUEUED
+    attempts: int = 0
+    last_error: Optional[str] = None
+    # perf_counter times the job was submitted and printed or failed
+    submitted: float = 0.0
+    finished: Optional[float] = None
+
+
+class PrintSpooler:
+    """Print Spooler Class
+
+    Args:
+        sink (Sink): where bills are printed
+        retries (int, optional): retries of a failed write. Defaults to 3.
+        retry_delay (float, optional): seconds before the first retry,
+            doubled for each one after. Defaults to 1.0.
+        coalesce_seconds (float, optional): time to wait for more bills
+            before printing. Defaults to 0.05.
+        max_batch (int, optional): most bills printed as one job.
+            Defaults to 20.
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        retries: int = 3,
+        retry_delay: float = 1.0,
+        coalesce_seconds: float = 0.05,
+        max_batch: int = 20,
+    ) -> None:
+        self.sink = sink
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.coalesce_seconds = coalesce_seconds
+        self.max_batch = max_batch
+        self.writes = 0
+
+        self._queue: queue.Queue[Optional[PrintJob]] = queue.Queue()
+        self._ids = itertools.count(1)
+        self._changed = threading.Condition()
+        self._active: dict[int, PrintJob] = {}
+        self._finished: OrderedDict[int, PrintJob] = OrderedDict()
+        self._failed: list[PrintJob] = []
+        self._stopping = threading.Event()
+        self._worker = threading.Thread(
+            target=self._run, name="print-spooler", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, text: str, title: str = "Bill") -> int:
+        """Queues a bill to print, without waiting for the printer
+
+        Args:
+            text (str): bill to print
+            title (str, optional): name of the bill in status reports.
+                Defaults to "Bill".
+
+        Raises:
+            RuntimeError: if the spooler has been stopped
+
+        Returns:
+            int: id of the print job
+        """
+        if self._stopping.is_set():
+            raise RuntimeError("The print spooler has been stopped")
+        job = PrintJob(next(self._ids), title, text, submitted=time.perf_counter())
+        with self._changed:
+            self._active[job.job_id] = job
+        self._queue.put(job)
+        return job.job_id
+
+    def status(self, job_id: int) -> Optional[PrintJob]:
+        """Gets a print job
+
+        Args:
+            job_id (int): id of the job
+
+        Returns:
+            Optional[PrintJob]: the job, None if it finished long ago
+        """
+        with self._changed:
+            return self._active.get(job_id) or self._finished.get(job_id)
+
+    def pending(self) -> int:
+        """Counts the jobs not yet printed or failed
+
+        Returns:
+            int: jobs queued or printing
+        """
+        with self._changed:
+            return len(self._active)
+
+    def take_failed(self) -> list[PrintJob]:
+        """Takes the jobs that failed since the last call, to report them
+
+        Returns:
+            list[PrintJob]: failed jobs, oldest first
+        """
+        with self._changed:
+            failed, self._failed = self._failed, []
+        return failed
+
+    def wait(
+        self, job_id: Optional[int] = None, timeout: Optional[float] = None
+    ) -> bool:
+        """Waits for a job, or every job submitted so far, to finish
+
+        Args:
+            job_id (Optional[int], optional): job to wait for, None for every
+                job. Defaults to None.
+            timeout (Optional[float], optional): seconds to wait, None to
+                wait until they finish. Defaults to None.
+
+        Returns:
+            bool: True if they finished, False if the wait timed out
+        """
+        with self._changed:
+            return self._changed.wait_for(
+                lambda: (len(self._active) == 0)
+                if job_id is None
+                else job_id not in self._active,
+                timeout,
+            )
+
+    def stop(self, timeout: Optional[float] = 5.0) -> list[PrintJob]:
+        """Prints the jobs already queued and stops the worker
+
+        Retries are not waited for, so jobs that keep failing are marked
+        failed. The worker is a daemon thread, so jobs still queued when the
+        wait runs out are lost once the app exits.
+
+        Args:
+            timeout (Optional[float], optional): seconds to wait for queued
+                jobs. Defaults to 5.0.
+
+        Returns:
+            list[PrintJob]: jobs still queued or printing, oldest first
+        """
+        if not self._stopping.is_set():
+            self._stopping.set()
+            self._queue.put(None)
+        self._worker.join(timeout)
+        with self._changed:
+            return list(self._active.values())
+
+    def _run(self):
+        """[Internal] Worker thread printing jobs as they are queued"""
+        stopped = False
+        while not stopped:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            # Bills arriving while the first waits are printed with it
+            deadline = time.perf_counter() + self.coalesce_seconds
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get(
+                        timeout=max(0.0, deadline - time.perf_counter())
+                    )
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopped = True
+                    break
+                batch.append(job)
+            self._print(batch)
+
+    def _print(self, batch: list[PrintJob]):
+        """[Internal] Writes a batch to the sink, retrying failed writes"""
+        self._update(batch, PRINTING)
+        text = FORM_FEED.join(job.text for job in batch)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                self._update(batch, PRINTING, str(error))
+                # Waits are cut short when the app closes
+                if self._stopping.wait(self.retry_delay * 2 ** (attempt - 1)):
+                    break
+            for job in batch:
+                job.attempts += 1
+            try:
+                self.sink.write(text)
+                self.writes += 1
+                error = None
+                break
+            except OSError as write_error:
+                error = write_error
+            # Any other error fails the batch without retrying, and must not
+            # stop the worker printing the jobs after it
+            except Exception as write_error:  # pylint: disable=broad-exception-caught
+                error = RuntimeError(f"{type(write_error).__name__}: {write_error}")
+                break
+        if error is None:
+            self._update(batch, PRINTED)
+        else:
+            self._update(batch, FAILED, str(error))
+
+    def _update(self, batch: list[PrintJob], status: str, error: Optional[str] = None):
+        """[Internal] Sets the status of jobs and wakes anyone waiting"""
+        now = time.perf_counter()
+        with self._changed:
+            for job in batch:
+                job.status = status
+                if error is not None:
+                    job.last_error = error
+                if status not in (PRINTED, FAILED):
+                    continue
+                job.finished = now
+                del self._active[job.job_id]
+                self._finished[job.job_id] = job
+                if len(self._finished) > FINISHED_JOBS:
+                    self._finished.popitem(last=False)
+                if status == FAILED:
+                    self._failed.append(job)
+            self._changed.notify_all()
+
+
+def main():
+    """Entry point for printing files through the spooler"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="text files to print")
+    parser.add_argument("--printer", help='e.g. "file:out.txt" or "command:lp"')
+    parser.add_argument("--retries", type=int, default=3)
+    args = parser.parse_args()
+
+    spooler = PrintSpooler(open_sink(args.printer), retries=args.retries)
+    job_ids = [
+        spooler.submit(Path(path).read_text(encoding="utf-8"), path)
+        for path in args.files
+    ]
+    spooler.wait()
+    for job_id in job_ids:
+        job = spooler.status(job_id)
+        if job is not None:
+            error = "" if job.last_error is None else f"  {job.last_error}"
+            print(f"{job.title:<32}{job.status:>10}{job.attempts:>4} tries{error}")
+    print(f"{len(job_ids)} files in {spooler.writes} writes to {spooler.sink.name}")
+    spooler.stop()
+
+
+if __name__ == "__main__":
+    main()
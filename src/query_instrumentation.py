@@ -0,0 +1,407 @@
+"""Opt-in instrumentation of the sql statements run by the app
+
+Connections created with InstrumentedConnection as their factory record how
+often each statement runs, how long it takes including fetching its rows, and
+how many rows it returns. Statements slower than a threshold are written with
+their query plan to a rotating slow query log.
+
+Usage:
+    python ./src/query_instrumentation.py query_stats.json [--limit 20]
+"""
+import argparse
+from collections import deque
+from dataclasses import dataclass, field
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import sqlite3
+import time
+from typing import Any, Optional
+
+SLOW_QUERY_LOGGER = "retail.slow_queries"
+
+# Executions kept per statement for calculating percentiles
+SAMPLE_SIZE = 1000
+
+
+@dataclass
+class StatementStats:
+    """Aggregated measurements of a sql statement"""
+
+    sql: str
+    calls: int = 0
+    total_ms: float = 0.0
+    rows: int = 0
+    executions: deque = field(default_factory=lambda: deque(maxlen=SAMPLE_SIZE))
+
+    def percentile_ms(self, fraction: float) -> float:
+        """Gets a percentile of the recent execution times
+
+        Args:
+            fraction (float): percentile as a fraction between 0 and 1
+
+        Returns:
+            float: execution time at the percentile
+        """
+        samples = sorted(execution.elapsed_ms for execution in self.executions)
+        if len(samples) == 0:
+            return 0.0
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def summary(self) -> dict[str, Any]:
+        """Summarizes the statement's measurements
+
+        Returns:
+            dict[str, Any]: calls, times and rows of the statement
+        """
+        return {
+            "sql": self.sql,
+            "calls": self.calls,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "p99_ms": self.percentile_ms(0.99),
+            "rows": self.rows,
+        }
+
+
+@dataclass
+class Execution:
+    """Time and rows of a single execution of a statement"""
+
+    statement: StatementStats
+    elapsed_ms: float
+    rows: int = 0
+    logged: bool = False
+
+
+class QueryStats:
+    """Collects measurements for every statement run on a connection"""
+
+    def __init__(self, slow_threshold_ms: float = 50.0) -> None:
+        self.slow_threshold_ms = slow_threshold_ms
+        self.statements: dict[str, StatementStats] = {}
+        self.logger = logging.getLogger(SLOW_QUERY_LOGGER)
+
+    def start(self, sql: str, elapsed_ms: float) -> Execution:
+        """Records a new execution of a statement
+
+        Args:
+            sql (str): statement that was executed
+            elapsed_ms (float): time taken to execute the statement
+
+        Returns:
+            Execution: the execution, updated as its rows are fetched
+        """
+        key = " ".join(sql.split())
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = StatementStats(key)
+        execution = Execution(statement, elapsed_ms)
+        statement.calls += 1
+        statement.total_ms += elapsed_ms
+        statement.executions.append(execution)
+        return execution
+
+    def fetched(self, execution: Execution, elapsed_ms: float, rows: int):
+        """Adds the time and rows of a fetch to an execution
+
+        Args:
+            execution (Execution): execution the rows belong to
+            elapsed_ms (float): time taken by the fetch
+            rows (int): number of rows fetched
+        """
+        execution.statement.total_ms += elapsed_ms
+        execution.statement.rows += rows
+        execution.elapsed_ms += elapsed_ms
+        execution.rows += rows
+
+    def is_slow(self, execution: Execution) -> bool:
+        """Checks if an execution should be written to the slow query log
+
+        Args:
+            execution (Execution): execution to check
+
+        Returns:
+            bool: true if the execution is slow and has not been logged yet
+        """
+        return not execution.logged and execution.elapsed_ms >= self.slow_threshold_ms
+
+    def log_slow(self, execution: Execution, plan: list[str]):
+        """Writes a slow execution and its query plan to the slow query log
+
+        Args:
+            execution (Execution): the slow execution
+            plan (list[str]): lines of the statement's query plan
+        """
+        execution.logged = True
+        self.logger.warning(
+            "%.1f ms, %d rows: %s\n%s",
+            execution.elapsed_ms,
+            execution.rows,
+            execution.statement.sql,
+            "\n".join(plan),
+        )
+
+    def summary(self) -> list[dict[str, Any]]:
+        """Summarizes every statement, slowest total time first
+
+        Returns:
+            list[dict[str, Any]]: summary of each statement
+        """
+        return sorted(
+            (statement.summary() for statement in self.statements.values()),
+            key=lambda summary: summary["total_ms"],
+            reverse=True,
+        )
+
+    def dump(self, path: str):
+        """Writes the statement summaries to a json file
+
+        Args:
+            path (str): file to write
+        """
+        with open(path, "w", encoding="utf8") as stats_file:
+            json.dump(self.summary(), stats_file, indent=2)
+
+    def reset(self):
+        """Discards all measurements"""
+        self.statements.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports its executions and fetches to QueryStats"""
+
+    connection: "InstrumentedConnection"
+    _sql: Optional[str] = None
+    _parameters: Any = ()
+    _execution: Optional[Execution] = None
+
+    def execute(self, sql, parameters=(), /):
+        """Runs a statement, timing it as a new execution
+
+        Args:
+            sql (str): statement to run
+            parameters (Any, optional): parameters of the statement.
+                Defaults to ().
+
+        Returns:
+            InstrumentedCursor: this cursor, for fetching the results
+        """
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._started(sql, parameters, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql, seq_of_parameters, /):
+        """Runs a statement for every set of parameters, timed as one execution
+
+        Args:
+            sql (str): statement to run
+            seq_of_parameters (Iterable[Any]): parameters of each run
+
+        Returns:
+            InstrumentedCursor: this cursor
+        """
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._started(sql, None, time.perf_counter() - start)
+        return self
+
+    def fetchone(self):
+        """Fetches the next row, adding the time to the current execution
+
+        Returns:
+            Any: the row, None if there are no more rows
+        """
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        """Fetches the next rows, adding the time to the current execution
+
+        Args:
+            size (Optional[int], optional): rows to fetch, None for the
+                cursor's arraysize. Defaults to None.
+
+        Returns:
+            list[Any]: the rows, empty if there are no more rows
+        """
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        """Fetches the remaining rows, adding the time to the current execution
+
+        Returns:
+            list[Any]: the rows
+        """
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(time.perf_counter() - start, 0)
+            raise
+        self._fetched(time.perf_counter() - start, 1)
+        return row
+
+    def _started(self, sql: str, parameters: Any, elapsed: float):
+        """[Internal] Records a new execution of this cursor"""
+        self._sql = sql
+        self._parameters = parameters
+        self._execution = self.connection.stats.start(sql, elapsed * 1000)
+        self._check_slow()
+
+    def _fetched(self, elapsed: float, rows: int):
+        """[Internal] Adds a fetch to this cursor's current execution"""
+        if self._sql is None or self._execution is None:
+            return
+        self.connection.stats.fetched(self._execution, elapsed * 1000, rows)
+        self._check_slow()
+
+    def _check_slow(self):
+        """[Internal] Logs the current execution if it has become slow"""
+        stats = self.connection.stats
+        if self._sql is None or self._execution is None:
+            return
+        if stats.is_slow(self._execution):
+            stats.log_slow(
+                self._execution,
+                self.connection.explain(self._sql, self._parameters),
+            )
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose statements are measured by QueryStats
+
+    Create with sqlite3.connect(uri, factory=InstrumentedConnection).
+    """
+
+    def __init__(self, *connect_args, **connect_kwargs):
+        super().__init__(*connect_args, **connect_kwargs)
+        self.stats = QueryStats()
+
+    def cursor(self, factory: Optional[type] = None) -> InstrumentedCursor:
+        """Opens a cursor whose statements are measured
+
+        Args:
+            factory (Optional[type], optional): subclass of InstrumentedCursor
+                to create, None for InstrumentedCursor. Defaults to None.
+
+        Returns:
+            InstrumentedCursor: the new cursor
+        """
+        return super().cursor(InstrumentedCursor if factory is None else factory)
+
+    def execute(self, sql, parameters=(), /):
+        """Runs a statement on a new measured cursor
+
+        Args:
+            sql (str): statement to run
+            parameters (Any, optional): parameters of the statement.
+                Defaults to ().
+
+        Returns:
+            InstrumentedCursor: cursor for fetching the results
+        """
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        """Runs a statement for every set of parameters on a new measured cursor
+
+        Args:
+            sql (str): statement to run
+            seq_of_parameters (Iterable[Any]): parameters of each run
+
+        Returns:
+            InstrumentedCursor: cursor the statement ran on
+        """
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def explain(self, sql: str, parameters: Any) -> list[str]:
+        """Gets the query plan of a statement without measuring it
+
+        Args:
+            sql (str): statement to explain
+            parameters (Any): parameters the statement ran with, None if the
+                statement ran with many sets of parameters
+
+        Returns:
+            list[str]: lines of the query plan, indented by depth
+        """
+        if parameters is None:
+            return ["(plan not captured for executemany)"]
+        try:
+            cur = super().cursor()
+            cur.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            rows = cur.fetchall()
+        except sqlite3.Error as error:
+            return [f"(plan not available: {error})"]
+
+        depths: dict[int, int] = {0: 0}
+        plan = []
+        for node_id, parent_id, _, detail in rows:
+            depths[node_id] = depths.get(parent_id, 0) + 1
+            plan.append(f"{'  ' * depths[node_id]}{detail}")
+        return plan
+
+
+def enable_slow_query_log(
+    path: str = "logs/slow_queries.log",
+    max_bytes: int = 1_000_000,
+    backup_count: int = 5,
+):
+    """Writes slow queries to a rotating log file
+
+    Args:
+        path (str, optional): log file. Defaults to "logs/slow_queries.log".
+        max_bytes (int, optional): size at which the log rotates. Defaults to 1_000_000.
+        backup_count (int, optional): rotated logs to keep. Defaults to 5.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf8"
+    )
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger = logging.getLogger(SLOW_QUERY_LOGGER)
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+
+
+def print_summary(summaries: list[dict[str, Any]], limit: int = 20):
+    """Prints a table of statement summaries
+
+    Args:
+        summaries (list[dict[str, Any]]): summaries from QueryStats.summary
+        limit (int, optional): number of statements to print. Defaults to 20.
+    """
+    print(
+        f"{'calls':>8}  {'total ms':>10}  {'mean ms':>9}  {'p99 ms':>9}  {'rows':>9}  sql"
+    )
+    for summary in summaries[:limit]:
+        sql = summary["sql"]
+        print(
+            f"{summary['calls']:>8}  {summary['total_ms']:>10.1f}"
+            + f"  {summary['mean_ms']:>9.3f}  {summary['p99_ms']:>9.3f}"
+            + f"  {summary['rows']:>9}  {sql if len(sql) <= 80 else sql[:77] + '...'}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize dumped query statistics")
+    parser.add_argument("stats_file", help="json file written by QueryStats.dump")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    with open(args.stats_file, encoding="utf8") as stats_json:
+        print_summary(json.load(stats_json), args.limit)
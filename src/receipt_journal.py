@@ -0,0 +1,581 @@
+"""Keeps every printed receipt of a register in an electronic journal
+
+Receipts are appended as text to the journal's active segment, and each
+receipt's place in the segment is written to the segment's index: a header
+followed by one fixed-width slot per bill number, at the bill number's
+distance from the segment's first bill. Bill numbers come from the blocks
+leased by the register, so they increase and the slots between them are few.
+Reprinting a receipt reads one slot and the receipt from memory maps of the
+two files, however many receipts the journal holds, and a range of dates is
+read by scanning the slots in order.
+
+Bill numbers start again when the register's database is recreated, so
+segments are named with the key of the database their bills were numbered
+by, and a bill number is only looked up in segments of the journal's key,
+or of the one given with --key. Each receipt is flushed to disk as it is
+appended.
+
+A new segment is started for every month, for a new database key, and when
+the active one reaches max_bytes. The closed segment is compressed in blocks
+of about block_size bytes, with its slots pointing into the blocks, so a
+receipt from a closed segment costs decompressing one block. The compressed
+file and index are written under temporary names and renamed into place,
+and the plain file is only deleted after both are in place, so the journal
+can be read after a crash at any point.
+
+Usage:
+    python ./src/receipt_journal.py receipts/register-1
+    python ./src/receipt_journal.py receipts/register-1 --order 1234
+    python ./src/receipt_journal.py receipts/register-1 --from 2024-01-01
+    python ./src/receipt_journal.py receipts/register-1 --import-bills bills
+"""
+import argparse
+from dataclasses import dataclass
+import datetime
+import mmap
+import os
+from pathlib import Path
+import re
+import struct
+from typing import Iterator, Optional
+import zlib
+
+# Index header: magic, first bill number, flags, unused
+HEADER = struct.Struct("<8sQII")
+INDEX_MAGIC = b"RCPTIDX1"
+# Flag of an index whose slots point into compressed blocks
+COMPRESSED = 1
+# Index slot: block, offset in the block, length, day as YYYYMMDD, 0 if empty
+SLOT = struct.Struct("<IIII")
+# Compressed file trailer: number of blocks, magic
+TRAILER = struct.Struct("<I8s")
+BLOCKS_MAGIC = b"RCPTLOGZ"
+# Receipts are separated by a blank line, so segments read as plain text
+SEPARATOR = b"\n\n"
+
+BILL_PATTERN = re.compile(r"bill-(\d{4}-\d{2}-\d{2})-\d{2}-\d{2}-\d{2}-(\d+)\.txt$")
+
+
+@dataclass(slots=True)
+class Receipt:
+    """Represents a receipt kept in the journal"""
+
+    order_id: int
+    day: datetime.date
+    text: str
+
+
+@dataclass(slots=True)
+class SegmentInfo:
+    """Represents a segment of the journal"""
+
+    name: str
+    key: str
+    first_id: int
+    first_day: datetime.date
+    num_receipts: int
+    size: int
+    compressed: bool
+
+
+def day_number(day: datetime.date) -> int:
+    """Converts a date to the YYYYMMDD number stored in index slots
+
+    Args:
+        day (datetime.date): date to convert
+
+    Returns:
+        int: the date as YYYYMMDD
+    """
+    return day.year * 10_000 + day.month * 100 + day.day
+
+
+def number_day(number: int) -> datetime.date:
+    """Converts a YYYYMMDD number from an index slot to a date
+
+    Args:
+        number (int): date as YYYYMMDD
+
+    Returns:
+        datetime.date: the date
+    """
+    return datetime.date(number // 10_000, number // 100 % 100, number % 100)
+
+
+class _Segment:
+    """[Internal] Receipts of a segment and the index of their bill numbers"""
+
+    def __init__(self, stem: Path, first_id: Optional[int] = None) -> None:
+        """[Internal] Opens a segment, creating it if first_id is given"""
+        self.stem = stem
+        self.index_path = stem.with_suffix(".idx")
+        self.log_path = stem.with_suffix(".log")
+        self.logz_path = stem.with_suffix(".logz")
+        # Segments are named <sequence>-<first day>-<first bill number>-<key>,
+        # segments written before keys were kept have none
+        _, day, _, *key = stem.name.split("-")
+        self.first_day = datetime.datetime.strptime(day, "%Y%m%d").date()
+        self.key = "".join(key)
+        if first_id is not None:
+            self.index_path.write_bytes(HEADER.pack(INDEX_MAGIC, first_id, 0, 0))
+        self._open()
+
+    def _open(self):
+        """[Internal] Opens the segment's files as they are on disk"""
+        magic, self.first_id, flags, _ = HEADER.unpack(
+            self.index_path.read_bytes()[: HEADER.size]
+        )
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{self.index_path} is not a receipt index")
+        self.compressed = bool(flags & COMPRESSED)
+        # A crash while compressing leaves one of the data files behind
+        stale = self.log_path if self.compressed else self.logz_path
+        stale.unlink(missing_ok=True)
+        self.data_path = self.logz_path if self.compressed else self.log_path
+        self.data_path.touch()
+        # Torn slots are dropped, so every slot is whole
+        index_size = self.index_path.stat().st_size
+        whole = HEADER.size + (index_size - HEADER.size) // SLOT.size * SLOT.size
+        if whole < index_size:
+            os.truncate(self.index_path, whole)
+        # Kept open and mapped until close(), so they cannot be with blocks
+        # pylint: disable-next=consider-using-with
+        self.index_file = open(self.index_path, "r+b", buffering=0)
+        # pylint: disable-next=consider-using-with
+        self.data_file = open(self.data_path, "a+b", buffering=0)
+        self.index_size = whole
+        self.data_size = self.data_path.stat().st_size
+        self._index_map: Optional[mmap.mmap] = None
+        self._data_map: Optional[mmap.mmap] = None
+        self._blocks: list[int] = []
+        self._cached_block: tuple[int, bytes] = (-1, b"")
+        if self.compressed:
+            self._read_blocks()
+
+    def _map(self, current: Optional[mmap.mmap], size: int, file) -> mmap.mmap:
+        """[Internal] Maps a file, mapping it again if it has grown"""
+        if current is not None and len(current) >= size:
+            return current
+        if current is not None:
+            current.close()
+        return mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _index(self, needed: int) -> Optional[mmap.mmap]:
+        """[Internal] Gets a map of the index holding at least needed bytes"""
+        if self.index_size < needed:
+            return None
+        self._index_map = self._map(self._index_map, self.index_size, self.index_file)
+        return self._index_map
+
+    def _data(self, needed: int) -> Optional[mmap.mmap]:
+        """[Internal] Gets a map of the data holding at least needed bytes"""
+        if self.data_size < needed or needed == 0:
+            return None
+        self._data_map = self._map(self._data_map, self.data_size, self.data_file)
+        return self._data_map
+
+    def _read_blocks(self):
+        """[Internal] Reads the offsets of the compressed blocks from the trailer"""
+        data = self._data(self.data_size)
+        if data is None:
+            return
+        num_blocks, magic = TRAILER.unpack_from(data, self.data_size - TRAILER.size)
+        if magic != BLOCKS_MAGIC:
+            raise ValueError(f"{self.data_path} is not a compressed receipt file")
+        table = self.data_size - TRAILER.size - 8 * (num_blocks + 1)
+        self._blocks = list(struct.unpack_from(f"<{num_blocks + 1}Q", data, table))
+
+    def _block(self, block: int) -> bytes:
+        """[Internal] Decompresses a block, keeping the last one read"""
+        if self._cached_block[0] != block:
+            data = self._data(self.data_size)
+            if data is None:
+                return b""
+            start, end = self._blocks[block], self._blocks[block + 1]
+            self._cached_block = (block, zlib.decompress(data[start:end]))
+        return self._cached_block[1]
+
+    def _text(self, block: int, offset: int, length: int) -> Optional[str]:
+        """[Internal] Reads the text of a receipt a slot points to"""
+        if self.compressed:
+            return self._block(block)[offset : offset + length].decode()
+        data = self._data(offset + length)
+        if data is None:
+            return None
+        return data[offset : offset + length].decode()
+
+    def num_slots(self) -> int:
+        """[Internal] Counts the slots of the index, empty or not"""
+        return (self.index_size - HEADER.size) // SLOT.size
+
+    def get(self, order_id: int) -> Optional[Receipt]:
+        """[Internal] Reads the receipt of a bill number, if the segment has it"""
+        position = HEADER.size + (order_id - self.first_id) * SLOT.size
+        if order_id < self.first_id:
+            return None
+        index = self._index(position + SLOT.size)
+        if index is None:
+            return None
+        block, offset, length, day = SLOT.unpack_from(index, position)
+        if day == 0:
+            return None
+        text = self._text(block, offset, length)
+        if text is None:
+            return None
+        return Receipt(order_id, number_day(day), text)
+
+    def iter_slots(self) -> Iterator[tuple[int, int, int, int, int]]:
+        """[Internal] Iterates over the bill number and fields of full slots"""
+        index = self._index(HEADER.size + SLOT.size)
+        if index is None:
+            return
+        slots = struct.iter_unpack(SLOT.format, index[HEADER.size : self.index_size])
+        for slot, (block, offset, length, day) in enumerate(slots):
+            if day != 0:
+                yield self.first_id + slot, block, offset, length, day
+
+    def iter_receipts(
+        self, start: datetime.date, end: datetime.date
+    ) -> Iterator[Receipt]:
+        """[Internal] Iterates over the receipts of days in a range"""
+        first, last = day_number(start), day_number(end)
+        for order_id, block, offset, length, day in self.iter_slots():
+            if first <= day <= last:
+                text = self._text(block, offset, length)
+                if text is not None:
+                    yield Receipt(order_id, number_day(day), text)
+
+    def append(self, order_id: int, day: datetime.date, text: str):
+        """[Internal] Appends a receipt and points its bill number's slot at it"""
+        data = text.encode()
+        offset = self.data_size
+        self.data_file.write(data + SEPARATOR)
+        self.data_size += len(data) + len(SEPARATOR)
+        position = HEADER.size + (order_id - self.first_id) * SLOT.size
+        self.index_file.seek(position)
+        self.index_file.write(SLOT.pack(0, offset, len(data), day_number(day)))
+        self.index_size = max(self.index_size, position + SLOT.size)
+
+    def compress(self, block_size: int):
+        """[Internal] Rewrites the segment's receipts in compressed blocks"""
+        slots = sorted(self.iter_slots(), key=lambda slot: slot[2])
+        blocks: list[bytes] = []
+        block = bytearray()
+        new_slots = []
+        for order_id, _, offset, length, day in slots:
+            text = self._text(0, offset, length)
+            if text is None:
+                continue
+            data = text.encode()
+            new_slots.append((order_id, len(blocks), len(block), len(data), day))
+            block += data + SEPARATOR
+            if len(block) >= block_size:
+                blocks.append(zlib.compress(bytes(block), 9))
+                block = bytearray()
+        if len(block) > 0:
+            blocks.append(zlib.compress(bytes(block), 9))
+
+        offsets = [0]
+        for compressed in blocks:
+            offsets.append(offsets[-1] + len(compressed))
+        trailer = struct.pack(f"<{len(offsets)}Q", *offsets) + TRAILER.pack(
+            len(blocks), BLOCKS_MAGIC
+        )
+        data = b"".join(blocks) + trailer
+        _write_durably(self.logz_path, [(0, data)], len(data))
+
+        # Empty slots are left as holes, which take no space on most disks
+        index = [(0, HEADER.pack(INDEX_MAGIC, self.first_id, COMPRESSED, 0))]
+        for order_id, block_number, offset, length, day in new_slots:
+            position = HEADER.size + (order_id - self.first_id) * SLOT.size
+            index.append((position, SLOT.pack(block_number, offset, length, day)))
+        _write_durably(self.index_path, index, self.index_size)
+        self.close()
+        self.log_path.unlink()
+        self._open()
+
+    def info(self) -> SegmentInfo:
+        """[Internal] Describes the segment"""
+        return SegmentInfo(
+            self.stem.name,
+            self.key,
+            self.first_id,
+            self.first_day,
+            sum(1 for _ in self.iter_slots()),
+            self.data_size + self.index_size,
+            self.compressed,
+        )
+
+    def sync(self):
+        """[Internal] Flushes the segment's files to disk"""
+        os.fsync(self.data_file.fileno())
+        os.fsync(self.index_file.fileno())
+
+    def close(self):
+        """[Internal] Closes the segment's maps and files"""
+        for current in (self._index_map, self._data_map):
+            if current is not None:
+                current.close()
+        self._index_map = self._data_map = None
+        self.index_file.close()
+        self.data_file.close()
+
+
+def _write_durably(path: Path, chunks: list[tuple[int, bytes]], size: int):
+    """[Internal] Replaces a file with chunks written at their positions"""
+    partial = path.with_suffix(path.suffix + ".partial")
+    with open(partial, "wb") as file:
+        for position, data in chunks:
+            file.seek(position)
+            file.write(data)
+        file.truncate(size)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(partial, path)
+    if hasattr(os, "O_DIRECTORY"):
+        directory = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+class ReceiptJournal:
+    """Receipt Journal Class"""
+
+    def __init__(
+        self,
+        directory: str | Path = "receipts",
+        max_bytes: int = 64 * 1024 * 1024,
+        block_size: int = 64 * 1024,
+        max_gap: int = 100_000,
+        key: Optional[str] = None,
+    ) -> None:
+        """Opens a register's journal, compressing segments left closed
+
+        Args:
+            directory (str | Path, optional): directory of the register's
+                segments. Defaults to "receipts".
+            max_bytes (int, optional): size at which a new segment is
+                started. Defaults to 64 * 1024 * 1024.
+            block_size (int, optional): bytes of receipts compressed
+                together in closed segments. Defaults to 64 * 1024.
+            max_gap (int, optional): a bill number further than this from
+                the last one starts a new segment instead of leaving this
+                many empty slots. Defaults to 100_000.
+            key (Optional[str], optional): key of the database numbering the
+                bills, from order_ids.numbering_key(), None to look bills up
+                in every segment and append them without one. Defaults to None.
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.max_gap = max_gap
+        self.key = key
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for partial in self.directory.glob("*.partial"):
+            partial.unlink()
+        self.segments = [
+            _Segment(path.with_suffix(""))
+            for path in sorted(self.directory.glob("*.idx"))
+        ]
+        for segment in self.segments[:-1]:
+            if not segment.compressed:
+                segment.compress(self.block_size)
+
+    @property
+    def active(self) -> Optional[_Segment]:
+        """Gets the segment receipts are appended to, None if it is closed"""
+        if len(self.segments) == 0 or self.segments[-1].compressed:
+            return None
+        return self.segments[-1]
+
+    def _needs_new_segment(self, order_id: int, day: datetime.date) -> bool:
+        """[Internal] Checks if a receipt belongs in a new segment"""
+        active = self.active
+        if active is None:
+            return True
+        slot = order_id - active.first_id
+        first_day = active.first_day
+        return (
+            (day.year, day.month) != (first_day.year, first_day.month)
+            or active.key != (self.key or "")
+            or active.data_size >= self.max_bytes
+            or slot < 0
+            or slot - active.num_slots() > self.max_gap
+        )
+
+    def rollover(self, order_id: int, day: datetime.date):
+        """Closes and compresses the active segment, and starts a new one
+
+        Args:
+            order_id (int): first bill number of the new segment
+            day (datetime.date): day of the new segment's first receipt
+        """
+        active = self.active
+        if active is not None:
+            active.compress(self.block_size)
+        stem = self.directory / f"{len(self.segments) + 1:06d}-{day:%Y%m%d}-{order_id}"
+        if self.key:
+            stem = stem.with_name(f"{stem.name}-{self.key}")
+        self.segments.append(_Segment(stem, order_id))
+
+    def append(
+        self,
+        order_id: int,
+        text: str,
+        day: Optional[datetime.date] = None,
+        sync: bool = True,
+    ):
+        """Appends a receipt, replacing any receipt kept for its bill number
+
+        Args:
+            order_id (int): bill number of the receipt
+            text (str): receipt as printed
+            day (Optional[datetime.date], optional): day of the sale.
+                Defaults to today.
+            sync (bool, optional): flush the receipt to disk before
+                returning, otherwise on sync() or close(). Defaults to True.
+        """
+        day = day or datetime.date.today()
+        if self._needs_new_segment(order_id, day):
+            self.rollover(order_id, day)
+        active = self.active
+        if active is not None:
+            active.append(order_id, day, text)
+            if sync:
+                active.sync()
+
+    def get_receipt(self, order_id: int) -> Optional[Receipt]:
+        """Gets the receipt kept for a bill number
+
+        Only segments of the journal's key, or without a key, are read, so a
+        bill number given out again by a recreated database finds its own
+        receipt.
+
+        Args:
+            order_id (int): bill number of the receipt
+
+        Returns:
+            Optional[Receipt]: the receipt, None if none was kept
+        """
+        for segment in reversed(self.segments):
+            if self.key is not None and segment.key not in ("", self.key):
+                continue
+            receipt = segment.get(order_id)
+            if receipt is not None:
+                return receipt
+        return None
+
+    def get_receipts(
+        self, start: datetime.date, end: datetime.date
+    ) -> list[Receipt]:
+        """Lists the receipts of a range of days
+
+        Args:
+            start (datetime.date): first day
+            end (datetime.date): last day
+
+        Returns:
+            list[Receipt]: receipts, segment by segment in bill number order
+        """
+        return list(self.iter_receipts(start, end))
+
+    def iter_receipts(
+        self, start: datetime.date, end: datetime.date
+    ) -> Iterator[Receipt]:
+        """Iterates over the receipts of a range of days
+
+        Receipts of a segment are all from the month it was started in, so
+        only segments of the range's months are read.
+
+        Args:
+            start (datetime.date): first day
+            end (datetime.date): last day
+
+        Returns:
+            Iterator[Receipt]: receipts, segment by segment in bill number order
+        """
+        first, last = (start.year, start.month), (end.year, end.month)
+        for segment in self.segments:
+            if first <= (segment.first_day.year, segment.first_day.month) <= last:
+                yield from segment.iter_receipts(start, end)
+
+    def list_segments(self) -> list[SegmentInfo]:
+        """Describes the segments of the journal
+
+        Returns:
+            list[SegmentInfo]: segments, oldest first
+        """
+        return [segment.info() for segment in self.segments]
+
+    def import_bills(self, directory: str | Path) -> int:
+        """Appends the bill files written before the journal, oldest first
+
+        The files are left in place.
+
+        Args:
+            directory (str | Path): directory of bill-<time>-<id>.txt files
+
+        Returns:
+            int: bills appended
+        """
+        bills = []
+        for path in Path(directory).glob("bill-*.txt"):
+            match = BILL_PATTERN.search(path.name)
+            if match is not None:
+                day = datetime.date.fromisoformat(match.group(1))
+                bills.append((day, int(match.group(2)), path))
+        for day, order_id, path in sorted(bills):
+            self.append(order_id, path.read_text(encoding="utf-8"), day, sync=False)
+        self.sync()
+        return len(bills)
+
+    def sync(self):
+        """Flushes the active segment to disk"""
+        active = self.active
+        if active is not None:
+            active.sync()
+
+    def close(self):
+        """Flushes and closes the journal's files"""
+        self.sync()
+        for segment in self.segments:
+            segment.close()
+
+
+def main():
+    """Entry point for reading a register's receipt journal"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--order", type=int, help="print the receipt of a bill")
+    parser.add_argument(
+        "--key", help="key of the database numbering the bills, as in segment names"
+    )
+    parser.add_argument("--from", dest="start", type=datetime.date.fromisoformat)
+    parser.add_argument("--to", dest="end", type=datetime.date.fromisoformat)
+    parser.add_argument("--import-bills", help="append bill files from a directory")
+    args = parser.parse_args()
+
+    journal = ReceiptJournal(args.directory, key=args.key)
+    if args.import_bills is not None:
+        print(f"Imported {journal.import_bills(args.import_bills)} bills")
+    if args.order is not None:
+        receipt = journal.get_receipt(args.order)
+        print(f"No receipt for bill {args.order}" if receipt is None else receipt.text)
+    elif args.start is not None or args.end is not None:
+        start = args.start or datetime.date.min
+        for receipt in journal.iter_receipts(start, args.end or datetime.date.max):
+            print(f"{receipt.text}\n")
+    else:
+        for info in journal.list_segments():
+            state = "compressed" if info.compressed else "active"
+            print(
+                f"{info.name:<40}{info.num_receipts:>8} receipts"
+                + f"{info.size:>12} bytes  {state}"
+            )
+    journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Helpers for reading query results as record types"""
+import sqlite3
+from typing import Any, Callable, Hashable, Iterable, Iterator, TypeVar
+
+RecordT = TypeVar("RecordT")
+
+
+def iter_records(
+    cur: sqlite3.Cursor, from_row: Callable[[Any], RecordT]
+) -> Iterator[RecordT]:
+    """Makes a cursor produce records instead of tuples
+
+    Rows are converted one at a time as the cursor is iterated, so a result
+    set is never held in memory as both tuples and records.
+
+    Args:
+        cur (sqlite3.Cursor): executed cursor
+        from_row (Callable[[Any], RecordT]): converts a row into a record
+
+    Returns:
+        Iterator[RecordT]: the cursor, yielding records
+    """
+    cur.row_factory = lambda _cursor, row: from_row(row)
+    return cur
+
+
+def merge_records(
+    records: Iterable[RecordT],
+    key: Callable[[RecordT], Hashable],
+    totals: tuple[str, ...],
+) -> list[RecordT]:
+    """Combines records that share a key by adding up their totals
+
+    Used when a report is read from several databases, each of which
+    returns its own row for the same group.
+
+    Args:
+        records (Iterable[RecordT]): records to combine
+        key (Callable[[RecordT], Hashable]): gets the group of a record
+        totals (tuple[str, ...]): names of the fields to add up
+
+    Returns:
+        list[RecordT]: one record per group, ordered by group
+    """
+    merged: dict[Hashable, RecordT] = {}
+    for record in records:
+        group = key(record)
+        existing = merged.get(group)
+        if existing is None:
+            merged[group] = record
+            continue
+        for name in totals:
+            setattr(
+                existing,
+                name,
+                (getattr(existing, name) or 0) + (getattr(record, name) or 0),
+            )
+    return [merged[group] for group in sorted(merged, key=_sort_key)]
+
+
+def _sort_key(group: Hashable) -> tuple:
+    """[Internal] Orders groups with missing values last"""
+    values = group if isinstance(group, tuple) else (group,)
+    return tuple((value is None, "" if value is None else value) for value in values)
@@ -0,0 +1,472 @@
+"""Queues the orders of a register while the store database is unreachable
+
+A register writes orders to the store database shared by every till. When
+that database cannot be reached, placing an order fails with an operational
+error, and instead of losing the sale the order is written to a small sqlite
+database on the register, with the id, time and lines it was sold with. The
+queue is replayed in the order it was written once the store is back.
+
+Every order carries the key of the basket it was rung up in, and the store
+only writes an order once for each key, so an order is never placed twice,
+even if placing it failed after the store had committed it, or the register
+died between placing an entry and removing it from the queue.
+
+A return of a sale that is still queued on the register is replayed after
+the sale. A return whose sale is not in the store yet, such as a sale still
+queued on another register, is left in the queue until it is. A refund has
+already been given by the time a return is replayed, so a return of more
+than was left to return, because the same items were returned at another
+register during the outage, is placed anyway and reported as a conflict.
+An order the store refuses, such as one whose id the store already has after
+its database was recreated, is kept in the queue and reported as a conflict
+too, and the orders after it are replayed.
+"""
+from dataclasses import asdict, dataclass, field
+import json
+from pathlib import Path
+import sqlite3
+from typing import Any, Iterator, Optional
+
+from draft_orders import DraftOrder, DraftOrders
+from order_system import ItemQuantity, Order, OrderSystem
+from records import iter_records
+
+
+@dataclass(slots=True)
+class QueuedOrder:
+    """Represents an order waiting to be written to the store database"""
+
+    sequence: int
+    key: str
+    order_id: Optional[int]
+    user_id: int
+    customer_id: Optional[int]
+    payment_type: int
+    order_reference: Optional[int]
+    timestamp: str
+    lines: list[ItemQuantity]
+    attempts: int
+    last_error: Optional[str]
+
+    @staticmethod
+    def from_row(row: Any) -> "QueuedOrder":
+        """Converts a sqlite row to a QueuedOrder
+
+        Args:
+            row (Any): Row from the database
+
+        Returns:
+            QueuedOrder: an order from the queue
+        """
+        (
+            sequence,
+            key,
+            order_id,
+            user_id,
+            customer_id,
+            payment_type,
+            order_reference,
+            timestamp,
+            lines,
+            attempts,
+            last_error,
+        ) = row
+        return QueuedOrder(
+            sequence,
+            key,
+            order_id,
+            user_id,
+            customer_id,
+            payment_type,
+            order_reference,
+            timestamp,
+            [ItemQuantity(**line) for line in json.loads(lines)],
+            attempts,
+            last_error,
+        )
+
+    def to_draft(self) -> DraftOrder:
+        """Converts the queued order back to the draft it was sold as
+
+        Returns:
+            DraftOrder: draft with the order's key and lines
+        """
+        return DraftOrder(
+            self.user_id,
+            self.customer_id,
+            {line.item_id: line for line in self.lines},
+            self.order_reference,
+            self.key,
+        )
+
+    def to_order(self) -> Order:
+        """Converts the queued order to an Order for its receipt
+
+        Returns:
+            Order: the order, with id 0 if it has no id yet
+        """
+        return Order(
+            self.order_id or 0,
+            self.customer_id,
+            self.user_id,
+            self.payment_type,
+            self.order_reference,
+            self.timestamp,
+            list(self.lines),
+            False,
+        )
+
+
+@dataclass(slots=True)
+class SyncResult:
+    """Represents what replaying the queue did"""
+
+    applied: int = 0
+    # Orders the store already had, placed before a failure was reported
+    duplicates: int = 0
+    # Sequences of returns left queued until their sale reaches the store
+    waiting: list[int] = field(default_factory=list)
+    # Ids of returns of items refunded more than they were sold, and of
+    # orders the store refused, which are kept in the queue
+    conflicts: list[int] = field(default_factory=list)
+    # Error that stopped the replay, None if the queue was replayed
+    error: Optional[str] = None
+
+
+class RegisterQueue:
+    """Register Queue Class"""
+
+    def __init__(self, path: str | Path) -> None:
+        """Opens the register's queue, creating it if needed
+
+        Args:
+            path (str | Path): queue database of the register
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            """
+CREATE TABLE IF NOT EXISTS queued_orders (
+    sequence INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    order_id INTEGER,
+    user_id INTEGER NOT NULL,
+    customer_id INTEGER,
+    payment_type INTEGER NOT NULL,
+    order_reference INTEGER,
+    timestamp TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    lines TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+"""
+        )
+        self.conn.commit()
+
+    def enqueue(
+        self, draft: DraftOrder, payment_type: int, order_id: Optional[int] = None
+    ) -> QueuedOrder:
+        """Queues a paid order that could not be written to the store
+
+        Queueing the same draft again returns the order already queued.
+
+        Args:
+            draft (DraftOrder): order rung up in memory
+            payment_type (int): id of payment type
+            order_id (Optional[int], optional): id taken for the order, None
+                to number it when it is replayed. Defaults to None.
+
+        Returns:
+            QueuedOrder: the queued order
+        """
+        lines = [asdict(line) for line in draft.lines.values() if line.quantity != 0]
+        self.conn.execute(
+            """
+INSERT INTO
+    queued_orders(
+        idempotency_key,
+        order_id,
+        user_id,
+        customer_id,
+        payment_type,
+        order_reference,
+        lines
+    )
+VALUES
+    (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING;
+""",
+            (
+                draft.key,
+                order_id,
+                draft.user_id,
+                draft.customer_id,
+                payment_type,
+                draft.order_reference,
+                json.dumps(lines),
+            ),
+        )
+        self.conn.commit()
+        queued = self._find("idempotency_key = ?", (draft.key,))
+        if queued is None:
+            raise RuntimeError
+        return queued
+
+    def _find(self, condition: str, parameters: tuple) -> Optional[QueuedOrder]:
+        """[Internal] Gets the first queued order matching a condition"""
+        cur = self.conn.execute(
+            f"""
+SELECT
+    sequence,
+    idempotency_key,
+    order_id,
+    user_id,
+    customer_id,
+    payment_type,
+    order_reference,
+    timestamp,
+    lines,
+    attempts,
+    last_error
+FROM
+    queued_orders
+WHERE
+    {condition}
+ORDER BY
+    sequence
+LIMIT
+    1;
+""",
+            parameters,
+        )
+        return next(iter_records(cur, QueuedOrder.from_row), None)
+
+    def get_queued(self) -> list[QueuedOrder]:
+        """Lists the queued orders
+
+        Returns:
+            list[QueuedOrder]: orders, oldest first
+        """
+        return list(self.iter_queued())
+
+    def iter_queued(self) -> Iterator[QueuedOrder]:
+        """Iterates over the queued orders
+
+        Returns:
+            Iterator[QueuedOrder]: orders, oldest first
+        """
+        cur = self.conn.execute(
+            """
+SELECT
+    sequence,
+    idempotency_key,
+    order_id,
+    user_id,
+    customer_id,
+    payment_type,
+    order_reference,
+    timestamp,
+    lines,
+    attempts,
+    last_error
+FROM
+    queued_orders
+ORDER BY
+    sequence;
+"""
+        )
+        return iter_records(cur, QueuedOrder.from_row)
+
+    def count(self) -> int:
+        """Counts the queued orders
+
+        Returns:
+            int: orders waiting to be replayed
+        """
+        return self.conn.execute("SELECT COUNT(*) FROM queued_orders;").fetchone()[0]
+
+    def highest_order_id(self) -> Optional[int]:
+        """Gets the highest order id taken by a queued order
+
+        Returns:
+            Optional[int]: the id, None if no queued order has one
+        """
+        cur = self.conn.execute("SELECT MAX(order_id) FROM queued_orders;")
+        return cur.fetchone()[0]
+
+    def get_order_details_for_return(self, order_id: int) -> Optional[Order]:
+        """Gets a queued sale, with item quantities updated by queued returns
+
+        Lets a sale made during an outage be returned before it is replayed.
+
+        Args:
+            order_id (int): id of the sale
+
+        Returns:
+            Optional[Order]: details of the sale, None if it is not queued
+        """
+        queued = self._find("order_id = ?", (order_id,))
+        if queued is None:
+            return None
+        order = queued.to_order()
+        returned: dict[int, int] = {}
+        for queued_return in self.iter_queued():
+            if queued_return.order_reference == order_id:
+                for line in queued_return.lines:
+                    previous = returned.get(line.item_id, 0)
+                    returned[line.item_id] = previous + line.quantity
+        order.order_updated = len(returned) > 0
+        for line in order.items:
+            line.quantity += returned.get(line.item_id, 0)
+        return order
+
+    def place_order(
+        self, draft_orders: DraftOrders, draft: DraftOrder, payment_type: int
+    ) -> Order:
+        """Places a paid order, queueing it if the store is unreachable
+
+        The order keeps the id it was given when queued, if the register had
+        ids left in its leased block. A return of a sale still in the queue is
+        queued behind it, since the store does not have the sale yet. An order
+        the store refuses is queued too, so the sale is kept for review.
+
+        Args:
+            draft_orders (DraftOrders): draft orders of the store database
+            draft (DraftOrder): order rung up in memory
+            payment_type (int): id of payment type
+
+        Returns:
+            Order: details of the order for its receipt
+        """
+        order_system = draft_orders.order_system
+        order_id = None
+        try:
+            # Ids left in the leased block are taken without the database
+            if order_system.order_ids is not None:
+                order_id = order_system.order_ids.take()
+            reference = draft.order_reference
+            if reference is None or self._find("order_id = ?", (reference,)) is None:
+                order_id = draft_orders.place_order(draft, payment_type, order_id)
+                return order_system.get_order_details(order_id)
+        except (sqlite3.OperationalError, sqlite3.IntegrityError):
+            pass
+        return self.enqueue(draft, payment_type, order_id).to_order()
+
+    def find_order_for_return(self, order_system: OrderSystem, order_id: int) -> Order:
+        """Gets an order to return from the store, or the queue if it is not there
+
+        A sale queued on this register can be returned before it is replayed,
+        whether or not the store is reachable.
+
+        Args:
+            order_system (OrderSystem): order system of the store database
+            order_id (int): id of order to get
+
+        Raises:
+            sqlite3.OperationalError: if the store is unreachable and the order
+                is not queued on this register
+            KeyError: if the order is in neither the store nor the queue
+
+        Returns:
+            Order: details of the order, with quantities updated by returns
+        """
+        try:
+            if order_system.order_exists(order_id):
+                return order_system.get_order_details_for_return(order_id)
+        except sqlite3.OperationalError:
+            order = self.get_order_details_for_return(order_id)
+            if order is None:
+                raise
+            return order
+        order = self.get_order_details_for_return(order_id)
+        if order is None:
+            raise KeyError(order_id)
+        return order
+
+    def _remove(self, sequence: int):
+        """[Internal] Removes an order from the queue once the store has it"""
+        self.conn.execute("DELETE FROM queued_orders WHERE sequence = ?;", (sequence,))
+        self.conn.commit()
+
+    def _over_returned(
+        self, order_system: OrderSystem, reference: int, lines: list[ItemQuantity]
+    ) -> bool:
+        """[Internal] Checks if items of a return are refunded more than sold"""
+        remaining = order_system.get_order_details_for_return(reference)
+        returned = {line.item_id for line in lines}
+        return any(
+            item.item_id in returned and item.quantity < 0 for item in remaining.items
+        )
+
+    def sync(self, draft_orders: DraftOrders) -> SyncResult:
+        """Replays the queued orders to the store in the order they were sold
+
+        Replaying stops at the first operational error, which is recorded on
+        the order that hit it, and carries on from there on the next sync. An
+        order the store refuses is recorded the same way and reported as a
+        conflict the first time, and the orders after it are replayed.
+
+        Args:
+            draft_orders (DraftOrders): draft orders of the store database
+
+        Returns:
+            SyncResult: orders applied, skipped, left waiting and conflicting
+        """
+        order_system = draft_orders.order_system
+        result = SyncResult()
+        for queued in self.get_queued():
+            try:
+                reference = queued.order_reference
+                order_id = draft_orders.find_placed_order(queued.key)
+                if order_id is None:
+                    sold = reference is None or order_system.order_exists(reference)
+                    if not sold:
+                        result.waiting.append(queued.sequence)
+                        continue
+                    order_id = draft_orders.place_order(
+                        queued.to_draft(),
+                        queued.payment_type,
+                        queued.order_id,
+                        queued.timestamp,
+                    )
+                    result.applied += 1
+                else:
+                    result.duplicates += 1
+                # Checked until the entry is removed, even if placed by a
+                # replay that failed before checking
+                if reference is not None and self._over_returned(
+                    order_system, reference, queued.lines
+                ):
+                    result.conflicts.append(order_id)
+            except sqlite3.IntegrityError as error:
+                # Refused again on every sync, so only reported when it changes
+                if queued.last_error != str(error):
+                    result.conflicts.append(queued.order_id or 0)
+                self._record_error(queued.sequence, str(error))
+                continue
+            except sqlite3.OperationalError as error:
+                result.error = str(error)
+                self._record_error(queued.sequence, result.error)
+                break
+            self._remove(queued.sequence)
+        return result
+
+    def _record_error(self, sequence: int, error: str):
+        """[Internal] Records an error replaying an order on its entry"""
+        self.conn.execute(
+            """
+UPDATE
+    queued_orders
+SET
+    attempts = attempts + 1,
+    last_error = ?
+WHERE
+    sequence = ?;
+""",
+            (error, sequence),
+        )
+        self.conn.commit()
+
+    def close(self):
+        """Closes the queue database"""
+        self.conn.close()
@@ -2,10 +2,19 @@
 from dataclasses import dataclass
 from datetime import date
 import sqlite3
-from typing import Any
+from typing import Any, Callable, Hashable, Iterator, Optional, TypeVar
 
+from partitions import Partitions
+from records import iter_records, merge_records
 
-@dataclass
+RecordT = TypeVar("RecordT")
+
+# Fields added together when rows of a report come from several partitions
+SALES_TOTALS = ("num_orders", "num_items", "subtotal", "gst_total", "pst_total")
+ITEM_TOTALS = ("quantity", "subtotal", "gst_total", "pst_total")
+
+
+@dataclass(slots=True)
 class HourlySales:
     """Represents a record of sales over an hour"""
 
@@ -30,7 +39,7 @@ class HourlySales:
         return HourlySales(hour, num_orders, num_items, subtotal, gst_total, pst_total)
 
 
-@dataclass
+@dataclass(slots=True)
 class DailySales:
     """Represents a record of sales over a day"""
 
@@ -55,7 +64,7 @@ class DailySales:
         return DailySales(day, num_orders, num_items, subtotal, gst_total, pst_total)
 
 
-@dataclass
+@dataclass(slots=True)
 class CashierRow:
     """Represents a record of sales grouped by user and payment type"""
 
@@ -103,7 +112,7 @@ class CashierRow:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ItemSales:
     """Represents a record of sales grouped by item"""
 
@@ -151,8 +160,46 @@ class ItemSales:
 class ReportSystem:
     """Report System Class"""
 
-    def __init__(self, conn: sqlite3.Connection) -> None:
+    def __init__(
+        self, conn: sqlite3.Connection, partitions: Optional[Partitions] = None
+    ) -> None:
         self.conn = conn
+        self.partitions = partitions
+
+    def _report(
+        self,
+        sql: str,
+        parameters: tuple,
+        from_row: Callable[[Any], RecordT],
+        dates: tuple[date, date],
+        key: Callable[[RecordT], Hashable],
+        totals: tuple[str, ...],
+    ) -> Iterator[RecordT]:
+        """[Internal] Runs a report on the main database and the partitions it covers
+
+        Args:
+            sql (str): query, with its tables qualified by {schema}
+            parameters (tuple): query parameters
+            from_row (Callable[[Any], RecordT]): converts a row into a record
+            dates (tuple[date, date]): first and last day read by the report
+            key (Callable[[RecordT], Hashable]): groups rows from different partitions
+            totals (tuple[str, ...]): fields added up when rows are grouped
+
+        Returns:
+            Iterator[RecordT]: records of the report
+        """
+        cur = self.conn.execute(sql.format(schema="main"), parameters)
+        if self.partitions is None:
+            return iter_records(cur, from_row)
+        partitions = self.partitions.overlapping(*dates)
+        if len(partitions) == 0:
+            return iter_records(cur, from_row)
+        records = list(iter_records(cur, from_row))
+        for partition in partitions:
+            schema = self.partitions.attach(partition)
+            cur = self.conn.execute(sql.format(schema=schema), parameters)
+            records.extend(iter_records(cur, from_row))
+        return iter(merge_records(records, key, totals))
 
     def get_hourly_sales_for_date(self, day: date) -> list[HourlySales]:
         """Get a report of sales grouped by hour for a given day
@@ -163,7 +210,18 @@ class ReportSystem:
         Returns:
             list[HourlySales]: Records of sales by hour
         """
-        cur = self.conn.execute(
+        return list(self.iter_hourly_sales_for_date(day))
+
+    def iter_hourly_sales_for_date(self, day: date) -> Iterator[HourlySales]:
+        """Iterates through hourly sales for a given day as they are read
+
+        Args:
+            day (date): date to generate report for
+
+        Returns:
+            Iterator[HourlySales]: Records of sales by hour
+        """
+        return self._report(
             """
 SELECT
     hour,
@@ -173,13 +231,16 @@ SELECT
     gst_total,
     pst_total
 FROM
-    hourly_sales
+    {schema}.hourly_sales
 WHERE
     date = ?;
 """,
             (day,),
+            HourlySales.from_row,
+            (day, day),
+            lambda sales: sales.hour,
+            SALES_TOTALS,
         )
-        return list(map(HourlySales.from_row, cur.fetchall()))
 
     def get_hourly_sales_for_date_range(
         self, start: date, end: date
@@ -193,7 +254,21 @@ WHERE
         Returns:
             list[HourlySales]: Records of sales by hour
         """
-        cur = self.conn.execute(
+        return list(self.iter_hourly_sales_for_date_range(start, end))
+
+    def iter_hourly_sales_for_date_range(
+        self, start: date, end: date
+    ) -> Iterator[HourlySales]:
+        """Iterates through hourly sales for a given date range as they are read
+
+        Args:
+            start (date): start of date range(inclusive)
+            end (date): end of date range(inclusive)
+
+        Returns:
+            Iterator[HourlySales]: Records of sales by hour
+        """
+        return self._report(
             """
 SELECT
     hour,
@@ -203,15 +278,18 @@ SELECT
     SUM(gst_total),
     SUM(pst_total)
 FROM
-    hourly_sales
+    {schema}.hourly_sales
 WHERE
     date BETWEEN ? AND ?
 GROUP BY
     hour;
 """,
             (start, end),
+            HourlySales.from_row,
+            (start, end),
+            lambda sales: sales.hour,
+            SALES_TOTALS,
         )
-        return list(map(HourlySales.from_row, cur.fetchall()))
 
     def get_daily_sales_for_date_range(
         self, start: date, end: date
@@ -225,8 +303,22 @@ GROUP BY
         Returns:
             list[DailySales]: records of sales by day
         """
+        return list(self.iter_daily_sales_for_date_range(start, end))
+
+    def iter_daily_sales_for_date_range(
+        self, start: date, end: date
+    ) -> Iterator[DailySales]:
+        """Iterates through daily sales for a given date range as they are read
 
-        cur = self.conn.execute(
+        Args:
+            start (date): start of date range(inclusive)
+            end (date): end of date range(inclusive)
+
+        Returns:
+            Iterator[DailySales]: records of sales by day
+        """
+
+        return self._report(
             """
 SELECT
     day,
@@ -236,13 +328,16 @@ SELECT
     gst_total,
     pst_total
 FROM
-    daily_sales
+    {schema}.daily_sales
 WHERE
     day BETWEEN ? AND ?;
 """,
             (start, end),
+            DailySales.from_row,
+            (start, end),
+            lambda sales: sales.day,
+            SALES_TOTALS,
         )
-        return list(map(DailySales.from_row, cur.fetchall()))
 
     def get_cashier_sales_for_date(self, day: date) -> list[CashierRow]:
         """Get a report of sales grouped by cashier and payment_type
@@ -253,7 +348,18 @@ WHERE
         Returns:
             list[CashierRow]: records of sales for each cashier and payment_type
         """
-        cur = self.conn.execute(
+        return list(self.iter_cashier_sales_for_date(day))
+
+    def iter_cashier_sales_for_date(self, day: date) -> Iterator[CashierRow]:
+        """Iterates through sales by cashier and payment_type for a day as they are read
+
+        Args:
+            day (date): date to generate report for
+
+        Returns:
+            Iterator[CashierRow]: records of sales for each cashier and payment_type
+        """
+        return self._report(
             """
 SELECT
     user_id,
@@ -266,7 +372,7 @@ SELECT
     SUM(gst_total) AS gst_total,
     SUM(pst_total) AS pst_total
 FROM
-    order_summary
+    {schema}.order_summary
     LEFT JOIN users ON user_id = users.id
     LEFT JOIN payment_types ON order_summary.payment_type = payment_types.id
 WHERE
@@ -276,8 +382,11 @@ GROUP BY
     order_summary.payment_type;
 """,
             (day,),
+            CashierRow.from_row,
+            (day, day),
+            lambda row: (row.user_id, row.payment_type_id),
+            SALES_TOTALS,
         )
-        return list(map(CashierRow.from_row, cur.fetchall()))
 
     def get_cashier_sales_for_date_range(
         self, start: date, end: date
@@ -291,7 +400,21 @@ GROUP BY
         Returns:
             list[CashierRow]: records of sales for each cashier and payment type
         """
-        cur = self.conn.execute(
+        return list(self.iter_cashier_sales_for_date_range(start, end))
+
+    def iter_cashier_sales_for_date_range(
+        self, start: date, end: date
+    ) -> Iterator[CashierRow]:
+        """Iterates through sales by cashier and payment_type as they are read
+
+        Args:
+            start (date): start of date range(inclusive)
+            end (date): end of date range(inclusive)
+
+        Returns:
+            Iterator[CashierRow]: records of sales for each cashier and payment type
+        """
+        return self._report(
             """
 SELECT
     user_id,
@@ -304,7 +427,7 @@ SELECT
     SUM(gst_total) AS gst_total,
     SUM(pst_total) AS pst_total
 FROM
-    order_summary
+    {schema}.order_summary
     LEFT JOIN users ON user_id = users.id
     LEFT JOIN payment_types ON order_summary.payment_type = payment_types.id
 WHERE
@@ -314,8 +437,11 @@ GROUP BY
     order_summary.payment_type;
 """,
             (start, end),
+            CashierRow.from_row,
+            (start, end),
+            lambda row: (row.user_id, row.payment_type_id),
+            SALES_TOTALS,
         )
-        return list(map(CashierRow.from_row, cur.fetchall()))
 
     def get_item_sales_for_date(self, day: date) -> list[ItemSales]:
         """Get a report of sales broken down by item for a given day
@@ -326,30 +452,53 @@ GROUP BY
         Returns:
             list[ItemSales]: records of sales by item
         """
-        cur = self.conn.execute(
+        return list(self.iter_item_sales_for_date(day))
+
+    def iter_item_sales_for_date(self, day: date) -> Iterator[ItemSales]:
+        """Iterates through sales by item for a given day as they are read
+
+        Args:
+            day (date): date to generate report for
+
+        Returns:
+            Iterator[ItemSales]: records of sales by item
+        """
+        return self._report(
             """
 SELECT
     item_id,
     name AS item_name,
     category_id,
     category AS category_name,
-    SUM(quantity) AS quantity,
-    SUM(quantity) * price AS subtotal,
-    SUM(quantity) * price * gst * 0.05 AS gst_total,
-    SUM(quantity) * price * pst * 0.06 AS pst_total
+    quantity,
+    subtotal,
+    gst_total,
+    pst_total
 FROM
-    orders
-    LEFT JOIN order_items ON orders.id = order_items.order_id
-    LEFT JOIN items ON order_items.item_id = items.id
-    LEFT JOIN categories ON items.category_id = categories.id
-WHERE
-    DATE(TIMESTAMP) = ?
-GROUP BY
-    order_items.item_id;
+    (
+        SELECT
+            item_id,
+            SUM(quantity) AS quantity,
+            SUM(quantity * price) AS subtotal,
+            SUM(quantity * price * gst * gst_rate) AS gst_total,
+            SUM(quantity * price * pst * pst_rate) AS pst_total
+        FROM
+            {schema}.orders
+            INNER JOIN {schema}.order_items ON orders.id = order_items.order_id
+        WHERE
+            DATE(TIMESTAMP) = ?
+        GROUP BY
+            item_id
+    ) AS sales
+    LEFT JOIN items ON sales.item_id = items.id
+    LEFT JOIN categories ON items.category_id = categories.id;
 """,
             (day,),
+            ItemSales.from_row,
+            (day, day),
+            lambda sales: sales.item_id,
+            ITEM_TOTALS,
         )
-        return list(map(ItemSales.from_row, cur.fetchall()))
 
     def get_item_sales_for_date_range(self, start: date, end: date) -> list[ItemSales]:
         """Generates a report of sales broken down by item
@@ -361,27 +510,53 @@ GROUP BY
         Returns:
             list[ItemSales]: records of sales by item
         """
-        cur = self.conn.execute(
+        return list(self.iter_item_sales_for_date_range(start, end))
+
+    def iter_item_sales_for_date_range(
+        self, start: date, end: date
+    ) -> Iterator[ItemSales]:
+        """Iterates through sales by item for a date range as they are read
+
+        Args:
+            start (date): start of date range(inclusive)
+            end (date): end of date range(inclusive)
+
+        Returns:
+            Iterator[ItemSales]: records of sales by item
+        """
+        return self._report(
             """
 SELECT
     item_id,
     name AS item_name,
     category_id,
     category AS category_name,
-    SUM(quantity) AS quantity,
-    SUM(quantity) * price AS subtotal,
-    SUM(quantity) * price * gst * 0.05 AS gst_total,
-    SUM(quantity) * price * pst * 0.06 AS pst_total
+    quantity,
+    subtotal,
+    gst_total,
+    pst_total
 FROM
-    orders
-    LEFT JOIN order_items ON orders.id = order_items.order_id
-    LEFT JOIN items ON order_items.item_id = items.id
-    LEFT JOIN categories ON items.category_id = categories.id
-WHERE
-    DATE(TIMESTAMP) BETWEEN ? AND ?
-GROUP BY
-    order_items.item_id;
+    (
+        SELECT
+            item_id,
+            SUM(quantity) AS quantity,
+            SUM(quantity * price) AS subtotal,
+            SUM(quantity * price * gst * gst_rate) AS gst_total,
+            SUM(quantity * price * pst * pst_rate) AS pst_total
+        FROM
+            {schema}.orders
+            INNER JOIN {schema}.order_items ON orders.id = order_items.order_id
+        WHERE
+            DATE(TIMESTAMP) BETWEEN ? AND ?
+        GROUP BY
+            item_id
+    ) AS sales
+    LEFT JOIN items ON sales.item_id = items.id
+    LEFT JOIN categories ON items.category_id = categories.id;
 """,
             (start, end),
+            ItemSales.from_row,
+            (start, end),
+            lambda sales: sales.item_id,
+            ITEM_TOTALS,
         )
-        return list(map(ItemSales.from_row, cur.fetchall()))
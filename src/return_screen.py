@@ -1,9 +1,11 @@
 """handles processing a return"""
+import dataclasses
 from tkinter import Entry, IntVar, Label, StringVar, Toplevel, messagebox
 from tkinter.ttk import Button, Frame, Separator, Spinbox
 from finalize_order_view import FinalizeOrderView
 
 from app import App
+from draft_orders import DraftOrder
 from order_system import ItemQuantity
 
 
@@ -18,7 +20,7 @@ class ReturnScreen(Toplevel):
         self.parent = parent
         self.title("Return Items")
 
-        self.order = self.app.order_system.get_order_details_for_return(order_id)
+        self.order = self.app.get_order_details_for_return(order_id)
         item_frame = Frame(self)
         self.items = []
         Label(item_frame, text="Name").grid(row=0, column=0)
@@ -95,8 +97,8 @@ class ReturnScreen(Toplevel):
         pst = 0.0
         for item, return_quantity in self.items:
             subtotal -= item.price * return_quantity.get()
-            gst -= item.price * return_quantity.get() * item.gst * 0.05
-            pst -= item.price * return_quantity.get() * item.pst * 0.06
+            gst -= item.price * return_quantity.get() * item.gst * item.gst_rate
+            pst -= item.price * return_quantity.get() * item.pst * item.pst_rate
         self.subtotal.set(f"{subtotal:.2f}")
         self.gst.set(f"{gst:.2f}")
         self.pst.set(f"{pst:.2f}")
@@ -104,18 +106,19 @@ class ReturnScreen(Toplevel):
 
     def process_return(self):
         """Attempts to process the return"""
-        # Get returned item ids and quantities
-        returned_items = []
+        # Returned items are lines with negative quantities at the price sold
+        draft = DraftOrder(1, order_reference=self.order.order_id)
         for item, return_quantity in self.items:
             if return_quantity.get() > 0:
-                returned_items.append((item.item_id, return_quantity.get()))
+                draft.lines[item.item_id] = dataclasses.replace(
+                    item, quantity=-return_quantity.get()
+                )
 
         # Check that at least one item is returned, otherwise show an error
-        if len(returned_items) > 0:
-            order_id = self.app.order_system.new_return_order(1, self.order.order_id)
-            for item_id, quantity in returned_items:
-                self.app.order_system.set_order_item(order_id, item_id, -quantity)
-            FinalizeOrderView(self.app, order_id).bind("<<Finalized>>", self.handle_finalize)
+        if len(draft.lines) > 0:
+            FinalizeOrderView(self.app, None, draft=draft).bind(
+                "<<Finalized>>", self.handle_finalize
+            )
         else:
             messagebox.showerror(
                 "No Items To Return", "Please add items to the return!"
@@ -104,6 +104,14 @@ class SearchOrderScreen(Toplevel):
         )
         self.return_button.grid(row=6, column=0, columnspan=2)
 
+        self.reprint_button = ttk.Button(
+            self.order_details,
+            state="disabled",
+            text="Reprint Receipt",
+            command=self.reprint_receipt,
+        )
+        self.reprint_button.grid(row=7, column=0, columnspan=2)
+
         self.protocol("WM_DELETE_WINDOW", self.window_close)
 
     def open_return_screen(self):
@@ -113,6 +121,20 @@ class SearchOrderScreen(Toplevel):
         else:
             messagebox.showerror("No Order Selected", "Please select an order")
 
+    def reprint_receipt(self):
+        """Handles reprinting the receipt of the selected order"""
+        if self.order_id is None:
+            messagebox.showerror("No Order Selected", "Please select an order")
+            return
+        # Receipts printed at another register, or before the journal, are
+        # printed again from the order
+        receipt = self.app.receipt_journal.get_receipt(self.order_id)
+        if receipt is None:
+            order = self.app.order_system.get_order_details(self.order_id)
+            self.app.print_bill(order.to_string(), f"Bill {self.order_id}")
+        else:
+            self.app.print_bill(receipt.text, f"Bill {self.order_id}")
+
     def search_order_number(self):
         """Handles searching by order number"""
         try:
@@ -206,6 +228,7 @@ class SearchOrderScreen(Toplevel):
             _evt (Event): unused event parameter
         """
         self.return_button.config(state="normal")
+        self.reprint_button.config(state="normal")
         self.order_id = int(self.order_list.item(self.order_list.focus())["text"])
         order = self.app.order_system.get_order_details(self.order_id)
         self.order_details.update_order_details(order)
@@ -0,0 +1,346 @@
+"""Mergeable summaries of sales used for approximate reports
+
+HyperLogLog estimates the number of distinct values added to it and
+QuantileSketch estimates quantiles. Both are small, serialize to bytes, and
+sketches of separate days can be merged into the sketch of a longer range.
+"""
+from array import array
+import hashlib
+import math
+import struct
+from typing import Any, Iterable, Optional
+
+
+def hash64(value: Any) -> int:
+    """Hashes a value to 64 bits, the same way in every process
+
+    Args:
+        value (Any): value to hash, converted with str
+
+    Returns:
+        int: 64 bit hash
+    """
+    return int.from_bytes(
+        hashlib.blake2b(str(value).encode("utf8"), digest_size=8).digest(), "big"
+    )
+
+
+# 2 ** -rank for every possible register value, used by estimates
+INVERSE_POWERS = [2.0**-rank for rank in range(65)]
+
+
+class HyperLogLog:
+    """Estimates the number of distinct values in a set"""
+
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None) -> None:
+        """Creates an empty sketch, or one from stored registers
+
+        Args:
+            precision (int, optional): 2 ** precision registers are kept, each
+                one byte. Defaults to 12, 4 KiB with a 1.6% standard error.
+            registers (Optional[bytes], optional): registers of a stored
+                sketch. Defaults to None.
+        """
+        self.precision = precision
+        self.registers = bytearray(registers or bytes(1 << precision))
+
+    @property
+    def relative_error(self) -> float:
+        """Standard error of the estimate, relative to the true count"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, value: Any):
+        """Adds a value to the set
+
+        Args:
+            value (Any): value to add
+        """
+        hashed = hash64(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, *others: "HyperLogLog"):
+        """Adds the values of other sketches to this one
+
+        Registers are compared all at once as the bytes of one large integer.
+        Every register is below 0x80, so subtracting from a copy with the high
+        bit of each byte set leaves that bit set where this register is at
+        least as large as the other's, without borrowing across bytes.
+
+        Args:
+            others (HyperLogLog): sketches with the same precision
+
+        Raises:
+            ValueError: if a sketch has a different precision
+        """
+        size = len(self.registers)
+        high_bits = int.from_bytes(b"\x80" * size, "big")
+        all_bits = int.from_bytes(b"\xff" * size, "big")
+        merged = int.from_bytes(self.registers, "big")
+        for other in others:
+            if other.precision != self.precision:
+                raise ValueError("Sketches have different precisions")
+            registers = int.from_bytes(other.registers, "big")
+            larger = (((merged | high_bits) - registers) & high_bits) >> 7
+            mask = larger * 0xFF
+            merged = (merged & mask) | (registers & (all_bits ^ mask))
+        self.registers = bytearray(merged.to_bytes(size, "big"))
+
+    def estimate(self) -> float:
+        """Estimates the number of distinct values added
+
+        Returns:
+            float: estimated count
+        """
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = (
+            alpha * size * size / sum(map(INVERSE_POWERS.__getitem__, self.registers))
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros > 0:
+            # Linear counting is more accurate while most registers are empty
+            return size * math.log(size / zeros)
+        return estimate
+
+    def to_bytes(self) -> bytes:
+        """Serializes the sketch
+
+        Sketches of a few values only store the registers that are set.
+
+        Returns:
+            bytes: precision, then every register, or with the high bit of the
+                precision set, the indexes and values of the registers set
+        """
+        indexes = array(
+            "H", (index for index, rank in enumerate(self.registers) if rank)
+        )
+        if len(indexes) * 3 >= len(self.registers):
+            return bytes([self.precision]) + bytes(self.registers)
+        ranks = bytes(self.registers[index] for index in indexes)
+        return bytes([self.precision | 0x80]) + indexes.tobytes() + ranks
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "HyperLogLog":
+        """Reads a sketch serialized by to_bytes
+
+        Args:
+            data (bytes): serialized sketch
+
+        Returns:
+            HyperLogLog: the sketch
+        """
+        if data[0] & 0x80 == 0:
+            return HyperLogLog(data[0], data[1:])
+        sketch = HyperLogLog(data[0] & 0x7F)
+        count = (len(data) - 1) // 3
+        indexes = array("H")
+        indexes.frombytes(data[1 : 1 + 2 * count])
+        for index, rank in zip(indexes, data[1 + 2 * count :]):
+            sketch.registers[index] = rank
+        return sketch
+
+
+class QuantileSketch:
+    """Estimates quantiles of values within a relative error
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    quantile returned is within relative_accuracy of a value at that rank.
+    Negative values, such as refunds, are counted in their own buckets.
+    """
+
+    HEADER = struct.Struct("<dqqddd")
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        """Creates an empty sketch
+
+        Args:
+            relative_accuracy (float, optional): largest relative error of a
+                quantile. Defaults to 0.01.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.positive: dict[int, int] = {}
+        self.negative: dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.total = 0.0
+
+    def _bucket(self, value: float) -> int:
+        """[Internal] Gets the bucket of a positive value"""
+        return math.ceil(math.log(value, self.gamma))
+
+    def _value(self, bucket: int) -> float:
+        """[Internal] Gets the value representing a bucket"""
+        return 2 * self.gamma**bucket / (self.gamma + 1)
+
+    def add(self, value: float, weight: int = 1):
+        """Adds a value to the sketch
+
+        Args:
+            value (float): value to add
+            weight (int, optional): times the value is added. Defaults to 1.
+        """
+        if value > 0:
+            bucket = self._bucket(value)
+            self.positive[bucket] = self.positive.get(bucket, 0) + weight
+        elif value < 0:
+            bucket = self._bucket(-value)
+            self.negative[bucket] = self.negative.get(bucket, 0) + weight
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.total += value * weight
+
+    def merge(self, *others: "QuantileSketch"):
+        """Adds the values of other sketches to this one
+
+        Args:
+            others (QuantileSketch): sketches with the same accuracy
+
+        Raises:
+            ValueError: if a sketch has a different accuracy
+        """
+        for other in others:
+            if other.relative_accuracy != self.relative_accuracy:
+                raise ValueError("Sketches have different accuracies")
+            for bucket, count in other.positive.items():
+                self.positive[bucket] = self.positive.get(bucket, 0) + count
+            for bucket, count in other.negative.items():
+                self.negative[bucket] = self.negative.get(bucket, 0) + count
+            self.zero_count += other.zero_count
+            self.count += other.count
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+            self.total += other.total
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Estimates a quantile
+
+        Args:
+            fraction (float): quantile as a fraction between 0 and 1
+
+        Returns:
+            Optional[float]: estimated value at the quantile, None if the
+                sketch is empty
+        """
+        if self.count == 0:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return max(-self._value(bucket), self.minimum)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return min(self._value(bucket), self.maximum)
+        return self.maximum
+
+    def mean(self) -> Optional[float]:
+        """Gets the exact mean of the values added
+
+        Returns:
+            Optional[float]: mean, None if the sketch is empty
+        """
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def to_bytes(self) -> bytes:
+        """Serializes the sketch
+
+        Returns:
+            bytes: header, then bucket and count pairs of positive and
+                negative values
+        """
+        buckets = array("q")
+        for bucket, count in self.positive.items():
+            buckets.extend((bucket, count))
+        for bucket, count in self.negative.items():
+            buckets.extend((bucket, count))
+        return (
+            self.HEADER.pack(
+                self.relative_accuracy,
+                len(self.positive),
+                self.zero_count,
+                self.minimum,
+                self.maximum,
+                self.total,
+            )
+            + buckets.tobytes()
+        )
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "QuantileSketch":
+        """Reads a sketch serialized by to_bytes
+
+        Args:
+            data (bytes): serialized sketch
+
+        Returns:
+            QuantileSketch: the sketch
+        """
+        header = QuantileSketch.HEADER
+        relative_accuracy, num_positive, zero_count, minimum, maximum, total = (
+            header.unpack_from(data)
+        )
+        sketch = QuantileSketch(relative_accuracy)
+        buckets = array("q")
+        buckets.frombytes(data[header.size :])
+        pairs = iter(buckets)
+        counts = list(zip(pairs, pairs))
+        sketch.positive = dict(counts[:num_positive])
+        sketch.negative = dict(counts[num_positive:])
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + sum(count for _, count in counts)
+        sketch.minimum = minimum
+        sketch.maximum = maximum
+        sketch.total = total
+        return sketch
+
+
+def merge_hyperloglogs(
+    sketches: Iterable[HyperLogLog], precision: int = 12
+) -> HyperLogLog:
+    """Merges sketches of distinct values into one
+
+    Args:
+        sketches (Iterable[HyperLogLog]): sketches to merge
+        precision (int, optional): precision of an empty result. Defaults to 12.
+
+    Returns:
+        HyperLogLog: sketch of the union of the sets
+    """
+    merged = HyperLogLog(precision)
+    merged.merge(*sketches)
+    return merged
+
+
+def merge_quantile_sketches(
+    sketches: Iterable[QuantileSketch], relative_accuracy: float = 0.01
+) -> QuantileSketch:
+    """Merges quantile sketches into one
+
+    Args:
+        sketches (Iterable[QuantileSketch]): sketches to merge
+        relative_accuracy (float, optional): accuracy of an empty result.
+            Defaults to 0.01.
+
+    Returns:
+        QuantileSketch: sketch of every value in the sketches
+    """
+    merged = QuantileSketch(relative_accuracy)
+    merged.merge(*sketches)
+    return merged
@@ -0,0 +1,503 @@
+"""Ships the changes of each store to a consolidated head office database
+
+A store exports the orders, customers, inventory counts and stock
+adjustments changed since its last export into a compressed batch file,
+using the change log to find them, so a batch holds one day's activity
+however long the store's history is. Head office imports batches from many
+stores into one database with the app's schema. Store ids are added to the
+ids of rows a store creates, so reports over the consolidated database
+cover every store. Items, users and payment types are assumed to be the
+same head office lists at every store.
+
+Batches are applied in order, each in one transaction with the sequence it
+was exported through, so importing a batch again changes nothing. Batches
+of different stores are read in parallel.
+
+Usage:
+    python ./src/store_sync.py export retail.db --store 7 --outbox outbox
+    python ./src/store_sync.py import head_office.db outbox/*.json.gz --workers 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import gzip
+import json
+import os
+from pathlib import Path
+import re
+import sqlite3
+import tempfile
+from typing import Any, Iterable, Optional
+
+from change_log import (
+    ADJUSTMENT_CREATED,
+    ADJUSTMENT_ITEM_SET,
+    COUNT_CREATED,
+    COUNT_ITEM_SET,
+    CUSTOMER_CREATED,
+    CUSTOMER_SET,
+    LINE_CHANGED,
+    ORDER_OPENED,
+    ORDER_PAID,
+    RETURN_OPENED,
+    ChangeLog,
+)
+
+# Version of the batch file layout
+BATCH_FORMAT = 1
+
+# Checkpoint of the change log saved by each export
+EXPORT_CONSUMER = "head_office_export"
+
+# Ids created by store n are n * STORE_ID_SPAN + the id at the store
+STORE_ID_SPAN = 1_000_000_000
+
+# Event kinds that change each kind of entity, named by its table
+ENTITY_KINDS = {
+    "customers": (CUSTOMER_CREATED,),
+    "orders": (ORDER_OPENED, RETURN_OPENED, LINE_CHANGED, CUSTOMER_SET, ORDER_PAID),
+    "inventory_counts": (COUNT_CREATED, COUNT_ITEM_SET),
+    "stock_adjustments": (ADJUSTMENT_CREATED, ADJUSTMENT_ITEM_SET),
+}
+
+# Tables shipped in the order they are applied, with the entity their rows
+# belong to, the column holding the entity's id, and columns of store ids
+SHIPPED_TABLES = {
+    "customers": ("customers", "id", ("id",)),
+    "orders": ("orders", "id", ("id", "customer_id", "order_reference")),
+    "order_items": ("orders", "order_id", ("order_id",)),
+    "inventory_counts": ("inventory_counts", "id", ("id",)),
+    "inventory_count_items": ("inventory_counts", "count_id", ("count_id",)),
+    "stock_adjustments": ("stock_adjustments", "id", ("id",)),
+    "stock_adjustment_items": (
+        "stock_adjustments",
+        "adjustment_id",
+        ("adjustment_id",),
+    ),
+}
+
+# Batch files smaller than this in total are imported without starting processes
+PARALLEL_MIN_BYTES = 1 << 20
+
+BATCH_PATTERN = re.compile(r"store-(\d+)-(\d+)-(\d+)(-full)?\.json\.gz$")
+
+
+@dataclass(slots=True)
+class Batch:
+    """Represents the rows a store changed between two change log sequences"""
+
+    store_id: int
+    after: int
+    through: int
+    tables: dict[str, tuple[list[str], list[list[Any]]]]
+    full: bool = False
+
+    @property
+    def name(self) -> str:
+        """File name of the batch, sorting in the order batches are applied"""
+        suffix = "-full" if self.full else ""
+        return (
+            f"store-{self.store_id:04}-{self.after:012}-{self.through:012}{suffix}"
+            + ".json.gz"
+        )
+
+    @property
+    def num_rows(self) -> int:
+        """Number of rows in every table of the batch"""
+        return sum(len(rows) for _, rows in self.tables.values())
+
+    def write(self, directory: str | Path) -> Path:
+        """Writes the batch to a compressed file
+
+        The file is written under a temporary name and renamed, so a batch
+        file is never seen half written.
+
+        Args:
+            directory (str | Path): directory to write to
+
+        Returns:
+            Path: path of the batch file
+        """
+        path = Path(directory) / self.name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(".partial")
+        contents = {
+            "format": BATCH_FORMAT,
+            "store_id": self.store_id,
+            "after": self.after,
+            "through": self.through,
+            "full": self.full,
+            "tables": {
+                table: {"columns": columns, "rows": rows}
+                for table, (columns, rows) in self.tables.items()
+            },
+        }
+        # dumps encodes in C, dump to a file encodes in Python
+        data = json.dumps(contents, separators=(",", ":")).encode("utf8")
+        with gzip.open(partial, "wb", compresslevel=6) as batch_file:
+            batch_file.write(data)
+        os.replace(partial, path)
+        return path
+
+    @staticmethod
+    def read(path: str | Path) -> "Batch":
+        """Reads a batch written by write
+
+        Args:
+            path (str | Path): path of the batch file
+
+        Raises:
+            ValueError: if the file was written in another format
+
+        Returns:
+            Batch: the batch
+        """
+        with gzip.open(path, "rt", encoding="utf8") as batch_file:
+            contents = json.load(batch_file)
+        if contents["format"] != BATCH_FORMAT:
+            raise ValueError(f"{path} has batch format {contents['format']}")
+        return Batch(
+            contents["store_id"],
+            contents["after"],
+            contents["through"],
+            {
+                table: (table_rows["columns"], table_rows["rows"])
+                for table, table_rows in contents["tables"].items()
+            },
+            contents["full"],
+        )
+
+
+def read_batches(paths: Iterable[str | Path]) -> list[Batch]:
+    """Reads batch files, in the order they are applied
+
+    Args:
+        paths (Iterable[str | Path]): paths of the batch files
+
+    Returns:
+        list[Batch]: batches sorted by store and sequence
+    """
+    batches = [Batch.read(path) for path in paths]
+    return sorted(
+        batches, key=lambda batch: (batch.store_id, batch.after, batch.through)
+    )
+
+
+def stage_batches(
+    paths: Iterable[str | Path], directory: str | Path
+) -> list[tuple[Batch, Path]]:
+    """Reads batch files and writes the rows of each to a database of its own
+
+    Args:
+        paths (Iterable[str | Path]): paths of the batch files
+        directory (str | Path): directory to write the databases to
+
+    Returns:
+        list[tuple[Batch, Path]]: batches without their rows and the
+            databases holding them, in the order they are applied
+    """
+    staged = []
+    for batch in read_batches(paths):
+        path = Path(directory) / batch.name.replace(".json.gz", ".db")
+        path.unlink(missing_ok=True)
+        conn = sqlite3.connect(path)
+        for table, (columns, rows) in batch.tables.items():
+            conn.execute(f"CREATE TABLE {table} ({', '.join(columns)});")
+            conn.executemany(
+                f"INSERT INTO {table} VALUES ({', '.join('?' for _ in columns)});",
+                rows,
+            )
+            rows.clear()
+        conn.commit()
+        conn.close()
+        staged.append((batch, path))
+    return staged
+
+
+class StoreExporter:
+    """Store Exporter Class"""
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        store_id: int,
+        changes: Optional[ChangeLog] = None,
+    ) -> None:
+        """Creates an exporter of a store's database
+
+        Args:
+            conn (sqlite3.Connection): store database
+            store_id (int): id of the store, at least 1
+            changes (Optional[ChangeLog], optional): change log of the store.
+                Defaults to one on the connection.
+
+        Raises:
+            ValueError: if the store id is out of range
+        """
+        if not 0 < store_id < 2**63 // STORE_ID_SPAN:
+            raise ValueError(f"Store id {store_id} is out of range")
+        self.conn = conn
+        self.store_id = store_id
+        self.changes = changes or ChangeLog(conn)
+
+    def _changed_ids(self, after: int, through: int) -> dict[str, list[int]]:
+        """[Internal] Gets the ids of the entities changed between two sequences"""
+        ids: dict[str, set[int]] = {entity: set() for entity in ENTITY_KINDS}
+        entities = {
+            kind: entity for entity, kinds in ENTITY_KINDS.items() for kind in kinds
+        }
+        for event in self.changes.iter_changes(after):
+            if event.sequence > through:
+                break
+            ids[entities[event.kind]].add(event.entity_id)
+        return {entity: sorted(entity_ids) for entity, entity_ids in ids.items()}
+
+    def _select(
+        self, table: str, column: str, ids: Optional[list[int]]
+    ) -> tuple[list[str], list[list[Any]]]:
+        """[Internal] Reads the rows of a table belonging to some entities, or all"""
+        sql = f"SELECT * FROM {table}"
+        parameters: tuple = ()
+        if ids is not None:
+            sql += f" WHERE {column} IN (SELECT value FROM json_each(?))"
+            parameters = (json.dumps(ids),)
+        cur = self.conn.execute(sql + ";", parameters)
+        columns = [description[0] for description in cur.description]
+        return columns, [list(row) for row in cur]
+
+    def export(self, outbox: str | Path, full: bool = False) -> Optional[Path]:
+        """Writes a batch of the rows changed since the last export
+
+        The export is saved as the store's checkpoint once the batch is
+        written, so the next export starts where this one ended.
+
+        Args:
+            outbox (str | Path): directory to write the batch to
+            full (bool, optional): export every row, for the first sync of a
+                store with history from before the change log.
+                Defaults to False.
+
+        Returns:
+            Optional[Path]: path of the batch, None if nothing changed
+        """
+        after = 0 if full else self.changes.load_checkpoint(EXPORT_CONSUMER)
+        through = self.changes.last_sequence()
+        if through == after and not full:
+            return None
+        changed = None if full else self._changed_ids(after, through)
+
+        tables = {}
+        for table, (entity, column, _) in SHIPPED_TABLES.items():
+            if table == "customers":
+                continue
+            tables[table] = self._select(
+                table, column, None if changed is None else changed[entity]
+            )
+        customer_ids = None
+        if changed is not None:
+            # Orders reference customers created before the change log
+            columns, rows = tables["orders"]
+            customer_column = columns.index("customer_id")
+            customer_ids = sorted(
+                set(changed["customers"])
+                | {row[customer_column] for row in rows if row[customer_column]}
+            )
+        tables = {"customers": self._select("customers", "id", customer_ids), **tables}
+
+        path = Batch(self.store_id, after, through, tables, full).write(outbox)
+        self.changes.save_checkpoint(EXPORT_CONSUMER, through)
+        return path
+
+
+class HeadOffice:
+    """Head Office Class"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def get_watermark(self, store_id: int) -> Optional[int]:
+        """Gets the sequence a store's batches have been imported through
+
+        Args:
+            store_id (int): id of the store
+
+        Returns:
+            Optional[int]: sequence of the last batch imported, None if no
+                batch of the store has been imported
+        """
+        cur = self.conn.execute(
+            "SELECT sequence FROM store_watermarks WHERE store_id = ?;", (store_id,)
+        )
+        row = cur.fetchone()
+        return None if row is None else row[0]
+
+    def apply(self, batch: Batch, staged: Optional[str | Path] = None) -> bool:
+        """Imports a batch in a single transaction
+
+        Rows replace the rows with the same ids, and the rows belonging to
+        an entity in the batch, such as the lines of an order, replace all
+        the rows it had before. A full export is imported unless a batch
+        exported after it already has been.
+
+        Args:
+            batch (Batch): batch to import
+            staged (Optional[str | Path], optional): database the batch's
+                rows were written to by stage_batches, copied by sqlite
+                instead of inserted one at a time. Defaults to None.
+
+        Raises:
+            ValueError: if an earlier batch of the store was not imported
+
+        Returns:
+            bool: True if imported, False if it had already been imported
+        """
+        watermark = self.get_watermark(batch.store_id)
+        if watermark is not None and batch.through <= watermark:
+            return False
+        if not batch.full and batch.after > (watermark or 0):
+            raise ValueError(
+                f"Store {batch.store_id} is imported through {watermark or 0},"
+                + f" batch {batch.name} starts after {batch.after}"
+            )
+        offset = batch.store_id * STORE_ID_SPAN
+        if staged is not None:
+            self.conn.execute("ATTACH DATABASE ? AS staged;", (str(staged),))
+        try:
+            for table, (entity, column, id_columns) in SHIPPED_TABLES.items():
+                if table not in batch.tables:
+                    continue
+                columns, rows = batch.tables[table]
+                names = ", ".join(columns)
+                if table != entity:
+                    # Rows of the batch's entities that no longer exist are dropped
+                    if staged is None:
+                        entity_columns, entity_rows = batch.tables[entity]
+                        id_index = entity_columns.index("id")
+                        parents = "SELECT value FROM json_each(?)"
+                        parameters: tuple = (
+                            json.dumps([row[id_index] for row in entity_rows]),
+                        )
+                    else:
+                        parents = f"SELECT id AS value FROM staged.{entity}"
+                        parameters = ()
+                    self.conn.execute(
+                        f"DELETE FROM main.{table} WHERE {column} IN"
+                        + f" (SELECT value + {offset} FROM ({parents}));",
+                        parameters,
+                    )
+                # Store ids are offset by sqlite, NULL stays NULL
+                if staged is None:
+                    placeholders = ", ".join(
+                        f"? + {offset}" if name in id_columns else "?"
+                        for name in columns
+                    )
+                    self.conn.executemany(
+                        f"INSERT OR REPLACE INTO main.{table} ({names})"
+                        + f" VALUES ({placeholders});",
+                        rows,
+                    )
+                else:
+                    values = ", ".join(
+                        f"{name} + {offset}" if name in id_columns else name
+                        for name in columns
+                    )
+                    self.conn.execute(
+                        f"INSERT OR REPLACE INTO main.{table} ({names})"
+                        + f" SELECT {values} FROM staged.{table};"
+                    )
+            self.conn.execute(
+                """
+INSERT INTO
+    store_watermarks(store_id, sequence)
+VALUES
+    (?, ?) ON CONFLICT(store_id) DO
+UPDATE
+SET
+    sequence = excluded.sequence,
+    imported_ts = CURRENT_TIMESTAMP;
+""",
+                (batch.store_id, batch.through),
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            if staged is not None:
+                self.conn.execute("DETACH DATABASE staged;")
+        return True
+
+    def import_batches(self, paths: Iterable[str | Path], workers: int = 4) -> int:
+        """Imports batch files from any number of stores
+
+        With more than one worker and at least PARALLEL_MIN_BYTES of files,
+        each store's files are read, decompressed and written to staging
+        databases by a separate process, and its batches are copied in
+        sequence order as soon as they are staged.
+
+        Args:
+            paths (Iterable[str | Path]): paths of the batch files
+            workers (int, optional): processes staging files. Defaults to 4.
+
+        Raises:
+            ValueError: if a file name is not the name of a batch
+
+        Returns:
+            int: number of batches imported
+        """
+        stores: dict[int, list[str | Path]] = {}
+        for path in paths:
+            match = BATCH_PATTERN.search(str(path))
+            if match is None:
+                raise ValueError(f"{path} is not a batch file")
+            stores.setdefault(int(match.group(1)), []).append(path)
+
+        imported = 0
+        size = sum(
+            os.path.getsize(path)
+            for store_paths in stores.values()
+            for path in store_paths
+        )
+        if workers <= 1 or len(stores) <= 1 or size < PARALLEL_MIN_BYTES:
+            for store_paths in stores.values():
+                for batch in read_batches(store_paths):
+                    imported += self.apply(batch)
+            return imported
+        with tempfile.TemporaryDirectory() as directory:
+            with ProcessPoolExecutor(workers) as executor:
+                futures = [
+                    executor.submit(stage_batches, store_paths, directory)
+                    for store_paths in stores.values()
+                ]
+                for future in as_completed(futures):
+                    for batch, staged in future.result():
+                        imported += self.apply(batch, staged)
+                        os.remove(staged)
+        return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ship store changes to head office")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="export a store's changes")
+    export_parser.add_argument("database")
+    export_parser.add_argument("--store", type=int, required=True)
+    export_parser.add_argument("--outbox", default="outbox")
+    export_parser.add_argument("--full", action="store_true")
+    import_parser = commands.add_parser("import", help="import batches at head office")
+    import_parser.add_argument("database")
+    import_parser.add_argument("batches", nargs="+")
+    import_parser.add_argument("--workers", type=int, default=4)
+    import_parser.add_argument("--schema", default="create_tables_sqlite.sql")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    if args.command == "export":
+        exported = StoreExporter(connection, args.store).export(args.outbox, args.full)
+        print("Nothing changed" if exported is None else f"Exported {exported}")
+    else:
+        with open(args.schema, encoding="utf8") as schema_file:
+            connection.executescript(schema_file.read())
+        count = HeadOffice(connection).import_batches(args.batches, args.workers)
+        print(f"Imported {count} batches")
+    connection.close()
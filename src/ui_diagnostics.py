@@ -0,0 +1,300 @@
+"""Diagnostics for finding what freezes the GUI
+
+EventLoopMonitor schedules a heartbeat on the Tk main loop and measures how
+late each beat runs. A watchdog thread notices when the heartbeat stops,
+attributes the stall to the Tk callback that is running and samples the main
+thread's stack until the loop recovers. Callbacks that run longer than a
+threshold can also be captured with cProfile. Reports are written to
+logs/diagnostics for later analysis.
+"""
+from collections import Counter, deque
+import cProfile
+from dataclasses import dataclass, field
+import datetime
+import json
+from pathlib import Path
+import re
+import sys
+import threading
+import time
+import tkinter
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class ActiveCallback:
+    """A Tk callback that is currently running"""
+
+    name: str
+    start: float
+
+
+@dataclass
+class Stall:
+    """A period where the main loop did not process events"""
+
+    start: float
+    callbacks: list[str]
+    samples: Counter = field(default_factory=Counter)
+
+
+def describe_callback(wrapper: Any) -> str:
+    """Creates a readable name for a Tk callback
+
+    Args:
+        wrapper (Any): tkinter.CallWrapper of the callback
+
+    Returns:
+        str: qualified name of the function and the widget it belongs to
+    """
+    func = wrapper.func
+    # Callbacks scheduled with after are wrapped in a closure holding the function
+    code = getattr(func, "__code__", None)
+    if code is not None and func.__closure__ and "func" in code.co_freevars:
+        func = func.__closure__[code.co_freevars.index("func")].cell_contents
+    name = getattr(func, "__qualname__", repr(func))
+    module = getattr(func, "__module__", None)
+    if module is not None:
+        name = f"{module}.{name}"
+    widget = getattr(wrapper, "widget", None)
+    if widget is not None:
+        name += f" [{widget}]"
+    return name
+
+
+def file_safe(text: str) -> str:
+    """Converts text into something usable in a file name
+
+    Args:
+        text (str): text to convert
+
+    Returns:
+        str: text with unsafe characters replaced
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text)[:80]
+
+
+class CallbackTracker:
+    """Tracks which Tk callback is running, optionally profiling each one"""
+
+    stack: list[ActiveCallback]
+
+    def __init__(self, output_dir: Path, profile_threshold_ms: Optional[float]):
+        self.output_dir = output_dir
+        self.profile_threshold_ms = profile_threshold_ms
+        self.stack = []
+        self._original_call: Optional[Callable] = None
+
+    def install(self):
+        """Wraps every Tk callback so it is tracked"""
+        if self._original_call is not None:
+            return
+        original_call = tkinter.CallWrapper.__call__
+        tracker = self
+
+        def tracked_call(wrapper, *args):
+            return tracker.run(wrapper, original_call, args)
+
+        self._original_call = original_call
+        tkinter.CallWrapper.__call__ = tracked_call
+
+    def uninstall(self):
+        """Stops tracking Tk callbacks"""
+        if self._original_call is not None:
+            tkinter.CallWrapper.__call__ = self._original_call
+            self._original_call = None
+
+    def current(self) -> list[str]:
+        """Gets the running callbacks, outermost first
+
+        Returns:
+            list[str]: names of the running callbacks
+        """
+        return [callback.name for callback in list(self.stack)]
+
+    def run(self, wrapper: Any, original_call: Callable, args: tuple) -> Any:
+        """Runs a Tk callback while tracking it
+
+        Args:
+            wrapper (Any): tkinter.CallWrapper of the callback
+            original_call (Callable): unwrapped tkinter.CallWrapper.__call__
+            args (tuple): arguments from Tk
+
+        Returns:
+            Any: result of the callback
+        """
+        callback = ActiveCallback(describe_callback(wrapper), time.perf_counter())
+        profiler = None
+        # Only the outermost callback is profiled, nested event loops included
+        if self.profile_threshold_ms is not None and len(self.stack) == 0:
+            profiler = cProfile.Profile()
+        self.stack.append(callback)
+        try:
+            if profiler is None:
+                return original_call(wrapper, *args)
+            return profiler.runcall(original_call, wrapper, *args)
+        finally:
+            self.stack.pop()
+            elapsed_ms = (time.perf_counter() - callback.start) * 1000
+            if (
+                profiler is not None
+                and self.profile_threshold_ms is not None
+                and elapsed_ms >= self.profile_threshold_ms
+            ):
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+                timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+                profiler.dump_stats(
+                    self.output_dir
+                    / f"profile-{timestamp}-{elapsed_ms:.0f}ms-{file_safe(callback.name)}.prof"
+                )
+
+
+class EventLoopMonitor:
+    """Measures main loop latency and reports stalls of a Tk application"""
+
+    def __init__(
+        self,
+        root: tkinter.Misc,
+        interval_ms: int = 100,
+        stall_threshold_ms: float = 250,
+        profile_threshold_ms: Optional[float] = 500,
+        sample_interval_ms: float = 5,
+        output_dir: str = "logs/diagnostics",
+    ):
+        """Creates a monitor, call start to begin monitoring
+
+        Args:
+            root (tkinter.Misc): widget whose main loop is monitored
+            interval_ms (int, optional): time between heartbeats. Defaults to 100.
+            stall_threshold_ms (float, optional): lateness of the heartbeat that
+                counts as a stall. Defaults to 250.
+            profile_threshold_ms (Optional[float], optional): callbacks running
+                longer than this are saved as cProfile stats, None disables
+                profiling. Defaults to 500.
+            sample_interval_ms (float, optional): time between stack samples
+                during a stall. Defaults to 5.
+            output_dir (str, optional): directory for reports.
+                Defaults to "logs/diagnostics".
+        """
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.stall_threshold = stall_threshold_ms / 1000
+        self.sample_interval = sample_interval_ms / 1000
+        self.output_dir = Path(output_dir)
+        self.tracker = CallbackTracker(self.output_dir, profile_threshold_ms)
+        self.latencies_ms: deque[float] = deque(maxlen=10_000)
+
+        self._lock = threading.Lock()
+        self._stall: Optional[Stall] = None
+        self._expected_beat = 0.0
+        self._running = False
+        self._main_thread_id = threading.main_thread().ident
+        self._watchdog: Optional[threading.Thread] = None
+        self._command = f"heartbeat{id(self)}"
+
+    def start(self):
+        """Starts the heartbeat and watchdog"""
+        if self._running:
+            return
+        self._running = True
+        self.tracker.install()
+        # The heartbeat is registered directly so it is not tracked as a callback
+        self.root.tk.createcommand(self._command, self._beat)
+        self._schedule()
+        self._watchdog = threading.Thread(
+            target=self._watch, name="event-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self):
+        """Stops monitoring and writes the latency summary"""
+        if not self._running:
+            return
+        self._running = False
+        self.tracker.uninstall()
+        if self._watchdog is not None:
+            self._watchdog.join()
+        self.write_summary()
+
+    def latency_summary(self) -> dict[str, float]:
+        """Summarizes how late the heartbeat has run
+
+        Returns:
+            dict[str, float]: beats, median, p99 and max lateness in ms
+        """
+        samples = sorted(self.latencies_ms)
+        if len(samples) == 0:
+            return {"beats": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "beats": len(samples),
+            "p50_ms": samples[len(samples) // 2],
+            "p99_ms": samples[min(len(samples) - 1, int(0.99 * len(samples)))],
+            "max_ms": samples[-1],
+        }
+
+    def write_summary(self):
+        """Writes the latency summary to the output directory"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.output_dir / "event_loop.json", "w", encoding="utf8") as file:
+            json.dump(self.latency_summary(), file, indent=2)
+
+    def _schedule(self):
+        """[Internal] Schedules the next heartbeat"""
+        self._expected_beat = time.perf_counter() + self.interval
+        self.root.tk.call("after", int(self.interval * 1000), self._command)
+
+    def _beat(self):
+        """[Internal] Records the lateness of a heartbeat and ends any stall"""
+        now = time.perf_counter()
+        self.latencies_ms.append(max(0.0, now - self._expected_beat) * 1000)
+        with self._lock:
+            stall, self._stall = self._stall, None
+        if stall is not None:
+            self._write_stall(stall, now)
+        if self._running:
+            self._schedule()
+        else:
+            self.root.tk.deletecommand(self._command)
+
+    def _watch(self):
+        """[Internal] Watchdog thread detecting stalls and sampling the main thread"""
+        while self._running:
+            time.sleep(self.sample_interval)
+            late = time.perf_counter() - self._expected_beat
+            if late < self.stall_threshold:
+                continue
+            with self._lock:
+                if self._stall is None:
+                    self._stall = Stall(self._expected_beat, self.tracker.current())
+                stall = self._stall
+            frame = sys._current_frames().get(  # pylint: disable=protected-access
+                self._main_thread_id
+            )
+            if frame is not None:
+                stall.samples[self._fold_stack(frame)] += 1
+
+    @staticmethod
+    def _fold_stack(frame: Any) -> str:
+        """[Internal] Converts a stack into a single line, outermost frame first"""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def _write_stall(self, stall: Stall, end: float):
+        """[Internal] Writes a report of a stall that has ended"""
+        duration_ms = (end - stall.start) * 1000
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = self.output_dir / f"stall-{timestamp}.txt"
+        total_samples = sum(stall.samples.values())
+        with open(path, "w", encoding="utf8") as report:
+            report.write(f"Stall of {duration_ms:.0f} ms\n")
+            report.write("Running callbacks:\n")
+            for callback in stall.callbacks or ["(none, idle or between callbacks)"]:
+                report.write(f"  {callback}\n")
+            report.write(f"Stack samples ({total_samples}):\n")
+            for stack, count in stall.samples.most_common(20):
+                report.write(f"{count:>6} {stack}\n")